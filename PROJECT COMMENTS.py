@@ -4,6 +4,22 @@ import psutil
 
 # Импорт библиотеки для работы со временем (используется для пауз в мониторинге)
 import time
+# Импорт модуля для работы с файлами и системными вызовами ОС (чтение /proc)
+import os
+# Импорт модуля для запуска дочерних процессов (используется в бенчмарке)
+import subprocess
+# Импорт модуля для доступа к интерпретатору (потоки stdout и stderr)
+import sys
+# Импорт генератора случайных чисел (синтетические данные для бенчмарков)
+import random
+# Импорт модуля для разбора аргументов командной строки
+import argparse
+# Импорт модуля регулярных выражений (поиск процессов по шаблону)
+import re
+# Импорт модуля для формирования JSON (экспорт в NDJSON)
+import json
+# Импорт упорядоченного словаря (вытеснение давно не обновлявшихся историй)
+from collections import OrderedDict, deque
 
 # Импорт модуля для создания абстрактных базовых классов
 # ABC - Abstract Base Class, abstractmethod - декоратор для абстрактных методов
@@ -15,11 +31,185 @@ from dataclasses import dataclass
 
 # Импорт типов для аннотаций (указания типов переменных и возвращаемых значений)
 # List - тип для списков, Generator - тип для генераторов
-from typing import List, Generator
+from typing import List, Generator, Iterable
 
 # Импорт модуля для работы с декораторами
 # wraps используется для сохранения метаданных декорируемой функции
-from functools import wraps
+from functools import wraps, partial
+# Импорт декоратора для создания контекстных менеджеров (замер времени этапов)
+from contextlib import contextmanager
+# Импорт функций-операторов сравнения (operator.le и др.) для работы без lambda
+import operator
+# Импорт компактного массива чисел (хранит значения без отдельных объектов Python)
+from array import array
+# Импорт модуля кучи для выбора k наибольших элементов без полной сортировки
+import heapq
+# Импорт функций compress (отбор элементов по маске) и chain (склейка списков)
+from itertools import compress, chain
+# Импорт функций бинарного поиска в упорядоченном списке (рейтинг по разнице снимков)
+from bisect import bisect_left, insort
+# Импорт модулей для сокета netlink и разбора событий ядра о процессах
+import socket
+# Импорт модуля для упаковки и распаковки двоичных структур (заголовки netlink)
+import struct
+# Импорт модуля ожидания готовности сокетов (события без активного опроса)
+import select
+# Импорт кодов ошибок ОС (переполнение буфера сокета - ENOBUFS)
+import errno
+# Импорт модуля сжатия (полные кадры протокола агента)
+import zlib
+# Импорт отображения файлов в память (запись и воспроизведение замеров)
+import mmap
+# Импорт асинхронного ввода-вывода (асинхронный интерфейс для встраивания в службы)
+import asyncio
+# Импорт блокировки потоков (один замер на общий кэш снимка)
+import threading
+# Импорт шаблонов имен как в оболочке (правила "by name=worker*")
+import fnmatch
+# Импорт пулов потоков и процессов для параллельного чтения /proc
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, BrokenExecutor
+# Импорт модулей для набора бенчмарков: учет выделений памяти и сведения о системе
+import tracemalloc
+# Импорт сведений о платформе (версия Python и ОС в отчете бенчмарков)
+import platform
+
+# Импорт библиотеки полноэкранного терминального интерфейса (живой просмотр)
+# В Windows модуля curses нет - тогда живой просмотр недоступен
+try:
+    # Пытаемся импортировать модуль (есть в Linux и macOS)
+    import curses
+# Модуля нет (Windows без дополнительного пакета)
+except ImportError:
+    # None означает, что живой просмотр недоступен
+    curses = None
+
+# Корневой каталог файловой системы procfs (только Linux)
+PROC_ROOT = "/proc"
+
+# Число тиков системных часов в секунду - единица измерения времени CPU в /proc/<pid>/stat
+# На системах без sysconf (Windows) значение не используется
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+# Размер страницы памяти в байтах - в /proc/<pid>/statm память указана в страницах
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+# Доступные источники данных о процессах:
+# psutil - через объекты psutil.Process (работает везде)
+# proc - прямое чтение /proc (только Linux, быстрее на больших системах)
+BACKENDS = ("psutil", "proc")
+
+# Поля процесса, которые можно запросить у process_generator() и collect_snapshot()
+# Читаются только файлы /proc, нужные для запрошенных полей
+PROCESS_FIELDS = ("pid", "name", "cpu_percent", "memory_percent", "rss", "ppid", "num_threads",
+                  "create_time")
+
+# Самонаблюдение: сколько стоит работа самого диспетчера задач
+# Таймеры этапов горячего пути (перечисление PID, чтение атрибутов, сортировка,
+# вывод) и счетчики процессов, пропущенных при замере
+class Instrumentation:
+    # Этапы, время которых измеряется
+    # (system - проход по системным метрикам, см. SystemSampler;
+    # leaks - обновление трендов RSS, см. LeakDetector)
+    STAGES = ("enumerate", "fetch", "sort", "render", "system", "leaks")
+    # Причины пропуска процесса: завершился, нет доступа, не удалось разобрать данные
+    COUNTERS = ("vanished", "denied", "malformed")
+    
+    # Конструктор класса
+    def __init__(self):
+        # Этап -> [число вызовов, суммарное время, время последнего вызова] в секундах
+        self.stages = {stage: [0, 0.0, 0.0] for stage in self.STAGES}
+        # Причина -> число пропущенных процессов
+        self.counters = dict.fromkeys(self.COUNTERS, 0)
+        # Точки отсчета процессорного времени диспетчера: с запуска и с прошлого вызова overhead()
+        self.started = (time.monotonic(), time.process_time())
+        # Точка отсчета для следующего вызова overhead()
+        self.last = self.started
+    
+    # Учет одного выполнения этапа длительностью seconds
+    def record(self, name: str, seconds: float):
+        # Запись этапа: [число вызовов, суммарное время, последнее время]
+        entry = self.stages[name]
+        # Увеличиваем число вызовов
+        entry[0] += 1
+        # Прибавляем время к сумме
+        entry[1] += seconds
+        # Запоминаем время последнего вызова
+        entry[2] = seconds
+    
+    # Замер этапа: with instrumentation.stage("sort"): ...
+    @contextmanager
+    def stage(self, name: str):
+        # Время начала по точным монотонным часам
+        started = time.perf_counter()
+        # try/finally: время учитывается, даже если внутри блока возникло исключение
+        try:
+            # Выполняется тело блока with
+            yield
+        # После выхода из блока (в том числе по исключению)
+        finally:
+            # Учитываем прошедшее время
+            self.record(name, time.perf_counter() - started)
+    
+    # Увеличение счетчика пропущенных процессов
+    def count(self, name: str, amount: int = 1):
+        # Прибавляем amount к счетчику причины
+        self.counters[name] += amount
+    
+    # Собственная нагрузка диспетчера: CPU в процентах одного ядра
+    # (с прошлого вызова и с запуска), RSS, доля памяти и число потоков
+    # Рабочие процессы параллельного чтения /proc сюда не входят
+    def overhead(self) -> dict:
+        # Текущие значения: время по монотонным часам и процессорное время диспетчера
+        now = (time.monotonic(), time.process_time())
+        
+        # Процент одного ядра: процессорное время / прошедшее время * 100
+        def percent(since):
+            # Прошедшее время в секундах
+            elapsed = now[0] - since[0]
+            # Деление на ноль невозможно: при нулевом интервале возвращаем 0.0
+            return (now[1] - since[1]) / elapsed * 100 if elapsed > 0 else 0.0
+        
+        # Нагрузка с прошлого вызова и с запуска диспетчера
+        result = {"cpu_percent": percent(self.last), "cpu_percent_total": percent(self.started)}
+        # Следующий вызов считает нагрузку от этой точки
+        self.last = now
+        # Процесс диспетчера читается как любой другой процесс
+        try:
+            # psutil.Process() без аргумента - текущий процесс
+            own = psutil.Process()
+            # oneshot() читает /proc один раз для нескольких полей
+            with own.oneshot():
+                # Резидентная память в байтах
+                result["rss"] = own.memory_info().rss
+                # Доля от всей памяти системы в процентах
+                result["memory_percent"] = own.memory_percent()
+                # Число потоков диспетчера (пул асинхронного интерфейса и др.)
+                result["threads"] = own.num_threads()
+        # Чтение может не удаться (например, в ограниченной песочнице)
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            # Тогда значения нулевые
+            result.update(rss=0, memory_percent=0.0, threads=0)
+        # Возвращаем словарь с нагрузкой
+        return result
+    
+    # Полный отчет: этапы (в мс), счетчики пропусков и нагрузка диспетчера
+    def report(self) -> dict:
+        # Словарь этап -> статистика в миллисекундах
+        stages = {}
+        # Перебираем этапы с распаковкой [вызовы, сумма, последнее]
+        for name, (calls, total, last) in self.stages.items():
+            # Переводим секунды в миллисекунды; среднее - только при ненулевом числе вызовов
+            stages[name] = {
+                "calls": calls,
+                "total_ms": total * 1000,
+                "avg_ms": total / calls * 1000 if calls else 0.0,
+                "last_ms": last * 1000,
+            }
+        # Отчет: этапы, счетчики пропусков (копия) и собственная нагрузка
+        return {"stages": stages, "skipped": dict(self.counters), "self": self.overhead()}
+
+# Общий экземпляр: его используют все сборщики и представления
+instrumentation = Instrumentation()
 
 # Определение декоратора для создания форматированных заголовков
 # Декоратор принимает заголовок в качестве параметра
@@ -43,109 +233,5698 @@ def header_decorator(title: str):
     # Возвращаем декоратор
     return decorator
 
-# Создаем класс для хранения информации о процессе
-# @dataclass(order=True) автоматически генерирует:
-# - __init__ для инициализации
-# - __repr__ для строкового представления
-# - методы сравнения (__lt__, __gt__ и др.) благодаря order=True
-@dataclass(order=True)
-class ProcessInfo:
-    # Поле для хранения идентификатора процесса (целое число)
-    pid: int
+# Создаем класс для хранения информации о процессе
+# @dataclass(order=True) автоматически генерирует:
+# - __init__ для инициализации
+# - __repr__ для строкового представления
+# - методы сравнения (__lt__, __gt__ и др.) благодаря order=True
+@dataclass(order=True)
+class ProcessInfo:
+    # Поле для хранения идентификатора процесса (целое число)
+    pid: int
+    
+    # Поле для хранения имени процесса (строка)
+    name: str
+    
+    # Поле для хранения процента использования CPU (число с плавающей точкой)
+    cpu_percent: float
+    
+    # Поле для хранения процента использования памяти (число с плавающей точкой)
+    memory_percent: float
+    
+    # PID родительского процесса (0 - нет данных) и число потоков
+    ppid: int = 0
+    # Поле для хранения числа потоков процесса (целое число)
+    num_threads: int = 0
+    
+    # Определяем метод для преобразования объекта в строку
+    # Используется при печати объекта
+    def __str__(self):
+        # Форматируем вывод с фиксированной шириной колонок:
+        # - PID: 8 символов, выравнивание по левому краю
+        # - Имя: максимум 20 символов, выравнивание по левому краю
+        # - CPU%: 8 символов, 1 знак после точки
+        # - Память%: 10 символов, 2 знака после точки
+        return f"{self.pid:<8} {self.name[:20]:<20} {self.cpu_percent:<8.1f} {self.memory_percent:<10.2f}"
+
+# Таблица имен процессов: каждое имя хранится один раз, а снимок хранит только его номер
+# Тысячи процессов с одинаковым именем (например, worker) не создают тысячи строк
+class NameTable:
+    # Конструктор класса
+    def __init__(self):
+        # Список имен: номер имени - это индекс в списке
+        self.names = []
+        # Словарь ключ -> номер имени (ключ - строка или сырые байты из /proc)
+        self.ids = {}
+    
+    # Возвращает номер имени, добавляя его в таблицу при первом появлении
+    def intern(self, key) -> int:
+        # Ищем ключ в словаре; get() возвращает None, если имени еще нет
+        index = self.ids.get(key)
+        # Имя встретилось впервые - добавляем его в таблицу
+        if index is None:
+            # Байты из /proc декодируем в строку только один раз для каждого имени
+            name = key.decode(errors="replace") if isinstance(key, bytes) else key
+            # Номер нового имени - текущая длина списка
+            index = len(self.names)
+            # Добавляем имя в конец списка
+            self.names.append(name)
+            # Запоминаем номер по ключу для следующих поисков
+            self.ids[key] = index
+        # Возвращаем номер имени
+        return index
+
+# Снимок процессов в колоночном виде
+# Вместо списка объектов ProcessInfo (по объекту на процесс) значения хранятся
+# в массивах array: по одному массиву на колонку
+# Объекты ProcessInfo создаются только для тех строк, которые выводятся на экран
+class ProcessSnapshot:
+    # Колонки, по которым можно сортировать и фильтровать
+    COLUMNS = ("pid", "cpu", "memory", "rss", "ppid", "threads", "started")
+    
+    # Конструктор принимает таблицу имен (общую для снимков одного сборщика)
+    def __init__(self, table: NameTable = None):
+        # Время снимка (секунды с начала эпохи)
+        self.timestamp = time.time()
+        # Таблица имен: общая (если передана) или собственная
+        self.table = table if table is not None else NameTable()
+        # Колонки: 'i' - целое, 'd' - число с плавающей точкой, 'Q' - беззнаковое 64 бит
+        self.pid = array("i")
+        # CPU% процесса
+        self.cpu = array("d")
+        # Доля памяти процесса в процентах
+        self.memory = array("d")
+        # Резидентная память в байтах
+        self.rss = array("Q")
+        # PID родителя и число потоков (для дерева процессов)
+        self.ppid = array("i")
+        # Число потоков ('I' - беззнаковое целое)
+        self.threads = array("I")
+        # Время запуска процесса (секунды с начала эпохи, 0.0 - нет данных)
+        # Пара (PID, время запуска) отличает процесс от нового с тем же PID
+        self.started = array("d")
+        # Номер имени процесса в таблице имен
+        self.name_id = array("I")
+    
+    # Добавление строки; name - строка или байты имени процесса
+    def append(self, pid: int, name, cpu: float, memory: float, rss: int,
+               ppid: int = 0, threads: int = 0, started: float = 0.0):
+        # Каждое значение дописывается в конец своей колонки
+        self.pid.append(pid)
+        # Вместо имени хранится его номер в таблице имен
+        self.name_id.append(self.table.intern(name))
+        # CPU%
+        self.cpu.append(cpu)
+        # Память%
+        self.memory.append(memory)
+        # RSS в байтах
+        self.rss.append(rss)
+        # PID родителя
+        self.ppid.append(ppid)
+        # Число потоков
+        self.threads.append(threads)
+        # Время запуска
+        self.started.append(started)
+    
+    # Число процессов в снимке
+    def __len__(self):
+        # Число строк равно длине любой колонки, например колонки PID
+        return len(self.pid)
+    
+    # Перебор снимка создает объекты ProcessInfo по одному, по мере необходимости
+    def __iter__(self):
+        # Выражение-генератор: объекты создаются по одному при переборе
+        return (self.view(i) for i in range(len(self.pid)))
+    
+    # Имя процесса в строке i
+    def name(self, i: int) -> str:
+        # Номер имени в строке i -> строка из таблицы имен
+        return self.table.names[self.name_id[i]]
+    
+    # Объект ProcessInfo для строки i (создается только для вывода)
+    def view(self, i: int) -> ProcessInfo:
+        # Собираем ProcessInfo из значений колонок строки i
+        return ProcessInfo(
+            pid=self.pid[i],
+            name=self.table.names[self.name_id[i]],
+            cpu_percent=self.cpu[i],
+            memory_percent=self.memory[i],
+            ppid=self.ppid[i],
+            num_threads=self.threads[i]
+        )
+    
+    # Объекты ProcessInfo для списка строк
+    def views(self, indices) -> List[ProcessInfo]:
+        # Список объектов для каждого номера строки
+        return [self.view(i) for i in indices]
+    
+    # Колонка по имени ("pid", "cpu", "memory", "rss", "ppid", "threads", "started")
+    def column(self, key: str) -> array:
+        # Проверяем, что такая колонка существует
+        if key not in self.COLUMNS:
+            # Неизвестное имя колонки - ошибка вызывающего кода
+            raise ValueError(f"Неизвестная колонка: {key}")
+        # getattr() возвращает атрибут объекта по его имени
+        return getattr(self, key)
+    
+    # Номера строк, упорядоченные по колонке
+    # Ключом служит метод __getitem__ массива, поэтому сравнение идет на уровне C
+    def order(self, key: str = "cpu", reverse: bool = True) -> List[int]:
+        # Сортируем номера строк по значению колонки в этих строках
+        return sorted(range(len(self.pid)), key=self.column(key).__getitem__, reverse=reverse)
+    
+    # Номера строк, для которых predicate(значение колонки) истинно
+    # map() и compress() проходят колонку целиком без цикла на Python
+    def where(self, key: str, predicate) -> List[int]:
+        # compress() оставляет номера строк, для которых predicate вернул True
+        return list(compress(range(len(self.pid)), map(predicate, self.column(key))))
+    
+    # Номера k строк с наибольшими (или наименьшими) значениями колонки
+    # heapq выбирает k элементов за O(n log k) вместо полной сортировки
+    # key - имя колонки или кортеж имен (составной ключ, например ("cpu", "memory"))
+    # При равных значениях первым идет процесс с меньшим PID, поэтому порядок стабилен
+    # rows - номера строк, среди которых выбирать (по умолчанию все строки)
+    def top(self, k: int, key="cpu", reverse: bool = True, rows=None) -> List[int]:
+        # Одно имя колонки превращаем в кортеж из одного элемента
+        keys = (key,) if isinstance(key, str) else tuple(key)
+        # Массивы колонок в порядке важности
+        columns = [self.column(name) for name in keys]
+        # По умолчанию выбираем среди всех строк снимка
+        if rows is None:
+            # range не создает список - номера строк генерируются по мере надобности
+            rows = range(len(self.pid))
+        # Выбор выполняет рекурсивный вспомогательный метод
+        return self._select(rows, columns, k, reverse)
+    
+    # Выбор k строк из indices по списку колонок (первая колонка главная)
+    def _select(self, indices, columns, k: int, reverse: bool) -> List[int]:
+        # Выбирать нечего - возвращаем пустой список
+        if k <= 0:
+            # Пустой список строк
+            return []
+        # Колонки закончились - остались полностью равные строки, берем меньшие PID
+        if not columns:
+            # nsmallest с ключом PID - меньшие PID идут первыми
+            return heapq.nsmallest(k, indices, key=self.pid.__getitem__)
+        
+        # Главная колонка текущего уровня
+        column = columns[0]
+        # Значения колонки для выбранных строк; для всех строк - сама колонка без копии
+        if isinstance(indices, range):
+            # Для всех строк значения - это сама колонка
+            values = column
+        # Для части строк собираем их значения
+        else:
+            # map() со срезом __getitem__ берет значения на уровне C
+            values = list(map(column.__getitem__, indices))
+        # Функция выбора: наибольшие или наименьшие значения
+        select = heapq.nlargest if reverse else heapq.nsmallest
+        
+        # Шаг 1: k-е по величине значение колонки
+        # heapq сравнивает сами числа, без функции-ключа на Python, поэтому быстро
+        best = select(k, values)
+        # Строк нет - выбирать не из чего
+        if not best:
+            # Пустой результат
+            return []
+        # Граница: последнее (k-е) значение в отобранных
+        bound = best[-1]
+        
+        # Шаг 2: кандидаты - строки не хуже границы; весь топ-k обязательно среди них
+        inside = partial(operator.le if reverse else operator.ge, bound)
+        # Строки, значения которых проходят границу
+        candidates = list(compress(indices, map(inside, values)))
+        
+        # Полный ключ: значения всех колонок, затем PID
+        # При выборе наибольших PID берется со знаком минус, чтобы меньший PID шел первым
+        sign = -1 if reverse else 1
+        # Колонка PID для последнего элемента ключа
+        pid = self.pid
+        # Ключ - кортеж: значения колонок и PID со знаком
+        full_key = lambda i: tuple([c[i] for c in columns] + [sign * pid[i]])
+        
+        # Обычно кандидатов немного - выбираем среди них по полному ключу
+        if len(candidates) <= 4 * k:
+            # Выбираем k лучших кандидатов по полному ключу
+            return select(k, candidates, key=full_key)
+        
+        # Много равных значений (например, CPU 0.0 у простаивающих процессов):
+        # строки строго лучше границы входят точно, а равные границе
+        # делят оставшиеся места по следующим колонкам
+        winners = [i for i in candidates if column[i] != bound]
+        # Строки, равные границе
+        ties = [i for i in candidates if column[i] == bound]
+        # Строки лучше границы упорядочиваем по полному ключу
+        winners.sort(key=full_key, reverse=reverse)
+        # Остальные места делят равные строки по следующим колонкам (рекурсивно)
+        return winners + self._select(ties, columns[1:], k - len(winners), reverse)
+
+# Класс-итератор для перебора процессов
+# Итератор позволяет использовать объект в цикле for
+class ProcessIterator:
+    # Конструктор принимает источник данных: "psutil" или "proc"
+    def __init__(self, backend: str = "psutil"):
+        self.backend = backend
+    
+    # Метод, который вызывается при создании итератора
+    # Возвращает сам объект с инициализированными атрибутами
+    def __iter__(self):
+        # Собираем колоночный снимок процессов из выбранного источника данных
+        # Объекты ProcessInfo создаются только в __next__, по одному
+        self.snapshot = collect_snapshot(self.backend)
+        
+        # Инициализируем индекс для отслеживания текущей позиции в списке
+        self.index = 0
+        
+        # Возвращаем сам объект как итератор
+        return self
+    
+    # Метод для получения следующего элемента итератора
+    def __next__(self):
+        # Проверяем, не достигли ли мы конца снимка
+        if self.index < len(self.snapshot):
+            # Создаем объект ProcessInfo для строки с текущим индексом
+            process = self.snapshot.view(self.index)
+            # Увеличиваем индекс для следующего вызова
+            self.index += 1
+            # Возвращаем процесс
+            return process
+        # Если достигли конца списка, вызываем исключение StopIteration
+        # Это сигнализирует Python о завершении итерации
+        raise StopIteration
+
+# Функция-генератор для получения информации о процессах
+# Генератор отличается от итератора тем, что использует yield
+# и сохраняет свое состояние между вызовами
+# fields - какие поля нужны (по умолчанию pid, name, cpu_percent, memory_percent)
+# Незапрошенные поля не читаются и заполняются пустыми значениями
+def process_generator(backend: str = "psutil", fields=None) -> Generator[ProcessInfo, None, None]:
+    # Для источника "proc" читаем /proc напрямую, без объектов psutil.Process
+    if backend == "proc":
+        # yield from отдает все элементы другого генератора по очереди
+        yield from get_proc_reader().sample(fields)
+        # Все процессы выданы - завершаем генератор
+        return
+    
+    # Проходим по всем процессам в системе
+    for pid, name, cpu, memory, rss, ppid, threads, _ in _psutil_rows(fields):
+        # Используем yield для возврата значения без завершения функции
+        # При следующем вызове функция продолжит с этого места
+        yield ProcessInfo(pid=pid, name=name, cpu_percent=cpu, memory_percent=memory,
+                          ppid=ppid, num_threads=threads)
+
+# Метка недоступного поля для process_iter(ad_value=...): отличается от любого значения psutil
+_DENIED = object()
+
+# Генератор строк (pid, name, cpu, memory%, rss, ppid, потоки, время запуска)
+# через psutil только с нужными полями
+def _psutil_rows(fields=None):
+    # Множество запрошенных полей (по умолчанию - поля исходного вывода)
+    wanted = set(fields) if fields is not None else {"pid", "name", "cpu_percent", "memory_percent"}
+    # Атрибуты для process_iter(): psutil прочитает только их
+    attrs = ['pid']
+    # Имя процесса
+    if "name" in wanted:
+        # Добавляем атрибут name
+        attrs.append('name')
+    # Процент CPU
+    if "cpu_percent" in wanted:
+        # Добавляем атрибут cpu_percent
+        attrs.append('cpu_percent')
+    # Память% и RSS считаются из одного memory_info
+    need_memory = "memory_percent" in wanted or "rss" in wanted
+    # Если память нужна
+    if need_memory:
+        # Добавляем атрибут memory_info
+        attrs.append('memory_info')
+    # PID родителя
+    if "ppid" in wanted:
+        # Добавляем атрибут ppid
+        attrs.append('ppid')
+    # Число потоков
+    if "num_threads" in wanted:
+        # Добавляем атрибут num_threads
+        attrs.append('num_threads')
+    # Время запуска процесса
+    if "create_time" in wanted:
+        # Добавляем атрибут create_time
+        attrs.append('create_time')
+    # Общий объем памяти читаем один раз на снимок; memory_percent от psutil
+    # перечитывал бы его для каждого процесса
+    total_memory = psutil.virtual_memory().total if need_memory else 1
+    # Число процессов до прохода: process_iter() молча пропускает завершившиеся,
+    # поэтому исчезнувшие считаются как разница с числом прочитанных
+    expected = len(psutil.pids())
+    # Сколько процессов прочитано (выдано или отброшено из-за доступа)
+    seen = 0
+    
+    # process_iter() с attrs заполняет proc.info только запрошенными атрибутами
+    # Вместо AccessDenied psutil подставляет ad_value - по нему и считаем отказы
+    for proc in psutil.process_iter(attrs, ad_value=_DENIED):
+        # Получаем информацию о процессе
+        info = proc.info
+        # Учитываем прочитанный процесс
+        seen += 1
+        # Хотя бы одно поле недоступно - пропускаем процесс, как раньше при AccessDenied
+        if any(value is _DENIED for value in info.values()):
+            # Учитываем пропуск по причине "нет доступа"
+            instrumentation.count("denied")
+            # Переходим к следующему процессу
+            continue
+        # memory_info может отсутствовать (не запрошен)
+        memory_info = info.get('memory_info')
+        # Резидентная память в байтах или 0
+        rss = memory_info.rss if memory_info else 0
+        # Возвращаем строку снимка
+        yield (info['pid'], info.get('name') or "", info.get('cpu_percent') or 0.0,
+               rss / total_memory * 100, rss, info.get('ppid') or 0, info.get('num_threads') or 0,
+               info.get('create_time') or 0.0)
+    
+    # Процессы, завершившиеся во время прохода (новые процессы могут дать отрицательную разницу)
+    instrumentation.count("vanished", max(0, expected - seen))
+
+# Таблица имен для снимков, собранных через psutil функцией collect_snapshot()
+_psutil_names = NameTable()
+
+# Функция собирает колоночный снимок всех процессов за один проход
+# fields - какие поля нужны (по умолчанию все из PROCESS_FIELDS)
+def collect_snapshot(backend: str = "psutil", fields=PROCESS_FIELDS) -> ProcessSnapshot:
+    # Для источника "proc" снимок собирает общий ProcReader
+    if backend == "proc":
+        # Снимок через прямое чтение /proc
+        return get_proc_reader().sample(fields)
+    
+    # Пустой снимок с общей таблицей имен psutil
+    snapshot = ProcessSnapshot(_psutil_names)
+    # process_iter() перечисляет и читает процессы вперемешку, поэтому весь проход - этап fetch
+    with instrumentation.stage("fetch"):
+        # Значения сразу записываются в колонки, без объекта ProcessInfo
+        for row in _psutil_rows(fields):
+            # Распаковываем кортеж строки в аргументы append()
+            snapshot.append(*row)
+    # Возвращаем готовый снимок
+    return snapshot
+
+# Ленивая загрузка дорогих полей процесса (командная строка, открытые файлы, потоки)
+# Значения читаются только по запросу и запоминаются по ключу (PID, время запуска),
+# поэтому новый процесс с тем же PID не получит чужие данные
+class DetailCache:
+    # Функции загрузки полей через объект psutil.Process
+    LOADERS = {
+        "cmdline": lambda proc: " ".join(proc.cmdline()),
+        "username": lambda proc: proc.username(),
+        "open_files": lambda proc: [f.path for f in proc.open_files()],
+        "num_threads": lambda proc: proc.num_threads(),
+        "exe": lambda proc: proc.exe(),
+    }
+    
+    # Конструктор класса
+    def __init__(self):
+        # PID -> (время запуска, объект psutil.Process, {поле: значение})
+        # Процесс определяется парой (PID, время запуска), как в снимке
+        self.entries = {}
+    
+    # Запись процесса; создается заново, если PID занят уже другим процессом
+    # started - время запуска из снимка: тогда процесс заново не проверяется,
+    # и повторное обращение к кэшу не делает системных вызовов
+    def _entry(self, pid: int, started: float = None):
+        # Время запуска неизвестно (PID введен вручную) - читаем его один раз
+        if started is None:
+            # Время запуска процесса, который сейчас занимает PID
+            started = psutil.Process(pid).create_time()
+        # Сохраненная запись (None - еще не создавалась)
+        entry = self.entries.get(pid)
+        # Записи нет или она относится к прошлому процессу с этим PID
+        if entry is None or abs(entry[0] - started) > 1 / CLOCK_TICKS:
+            # Старые данные о PID больше не действительны
+            self.forget(pid)
+            # Объект процесса создается один раз на процесс
+            proc = psutil.Process(pid)
+            # PID уже занят не тем процессом, что был в снимке
+            if not same_process(proc, started):
+                # Тот процесс завершился
+                raise psutil.NoSuchProcess(pid)
+            # Запоминаем запись
+            entry = self.entries[pid] = (started, proc, {})
+        # Возвращаем запись
+        return entry
+    
+    # Значение поля; None, если процесс завершился или нет доступа
+    # started - время запуска из снимка (None - проверить по самому процессу)
+    def get(self, pid: int, field: str, started: float = None):
+        # Процесс мог завершиться или стать недоступным
+        try:
+            # Объект процесса и загруженные значения
+            _, proc, values = self._entry(pid, started)
+            # Значение еще не загружалось
+            if field not in values:
+                # Загружаем поле функцией из LOADERS и запоминаем
+                values[field] = self.LOADERS[field](proc)
+            # Возвращаем значение из кэша
+            return values[field]
+        # Процесс завершился или нет доступа
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            # Значение недоступно
+            return None
+    
+    # Забыть все данные о PID (процесс завершился)
+    def forget(self, pid: int):
+        # Удаляем запись процесса, если она есть
+        self.entries.pop(pid, None)
+
+# Отслеживание появления и завершения процессов опросом списка PID
+# Используется, когда события ядра недоступны (не Linux, нет прав и т.д.)
+# Процессы, которые появились и завершились между замерами, при опросе не видны
+class PollingEvents:
+    # Способ отслеживания (для вывода)
+    kind = "опрос"
+    
+    # Ожидание до следующего замера; при опросе - просто пауза
+    def wait(self, timeout: float):
+        # Обычная пауза на timeout секунд
+        time.sleep(timeout)
+    
+    # Текущее множество PID - полный просмотр списка процессов
+    def pids(self) -> set:
+        # psutil.pids() читает список каталогов /proc
+        return set(psutil.pids())
+    
+    # Кратковременные процессы с прошлого вызова: список (PID, имя)
+    def drain_short_lived(self) -> list:
+        # При опросе такие процессы не видны - список всегда пуст
+        return []
+    
+    # Освобождение ресурсов (при опросе их нет)
+    def close(self):
+        # Ничего делать не нужно
+        pass
+
+# Отслеживание процессов по событиям ядра через netlink proc connector (только Linux)
+# Ядро само сообщает о fork, exec и exit, поэтому множество живых PID
+# обновляется без полного просмотра /proc, а процессы, прожившие меньше
+# интервала между замерами, тоже попадают в отчет
+# Для подписки нужны права root (CAP_NET_ADMIN)
+class NetlinkEvents:
+    # Способ отслеживания (для вывода)
+    kind = "netlink"
+    # Константы из linux/connector.h и linux/cn_proc.h
+    NETLINK_CONNECTOR = 11
+    # Индекс и значение подписчика proc connector
+    CN_IDX_PROC = 1
+    CN_VAL_PROC = 1
+    # Команды подписки и отписки от событий
+    PROC_CN_MCAST_LISTEN = 1
+    PROC_CN_MCAST_IGNORE = 2
+    # Коды событий: fork, exec и exit
+    PROC_EVENT_FORK = 0x00000001
+    PROC_EVENT_EXEC = 0x00000002
+    PROC_EVENT_EXIT = 0x80000000
+    # Заголовки: nlmsghdr (16 байт) и cn_msg (20 байт); за ними proc_event:
+    # what, cpu, timestamp (16 байт) и данные события
+    NLMSG = struct.Struct("=IHHII")
+    # Формат cn_msg: idx, val, seq, ack, len, flags
+    CN_MSG = struct.Struct("=IIIIHH")
+    # Смещения поля what и данных события от начала сообщения netlink
+    EVENT_OFFSET = 36
+    DATA_OFFSET = 52
+    # Тип сообщения netlink "последнее в серии"
+    NLMSG_DONE = 3
+    # Размер буфера приема: события копятся в нем между замерами
+    RECEIVE_BUFFER = 1 << 20
+    # Полная сверка со списком /proc раз в RESYNC секунд на случай потерянных событий
+    RESYNC = 30.0
+    # Сколько последних кратковременных процессов хранится до вызова drain_short_lived()
+    # (их забирает только мониторинг; в остальных режимах старые записи вытесняются)
+    SHORT_LIVED_LIMIT = 1000
+    
+    # Конструктор: подписка на события; OSError, если подписаться нельзя
+    def __init__(self):
+        # Сокет netlink для событий о процессах
+        self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, self.NETLINK_CONNECTOR)
+        # Если дальше что-то не удастся, сокет нужно закрыть
+        try:
+            # Увеличиваем буфер приема, чтобы события не терялись между замерами
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.RECEIVE_BUFFER)
+            # Адрес 0 - ядро само назначит уникальный порт
+            self.sock.bind((0, self.CN_IDX_PROC))
+            # Подписываемся на события о процессах
+            self._control(self.PROC_CN_MCAST_LISTEN)
+            # Неблокирующий режим: recv() не ждет, если событий нет
+            self.sock.setblocking(False)
+            # Список PID читаем уже после подписки, чтобы не пропустить события между ними
+            self.live = set(psutil.pids())
+            # Время последней полной сверки со списком /proc
+            self.synced = time.monotonic()
+            # PID -> имя процессов, появившихся после прошлого замера
+            self.born = {}
+            # Процессы, появившиеся и завершившиеся между замерами: (PID, имя)
+            # deque с maxlen хранит только последние SHORT_LIVED_LIMIT записей
+            self.short_lived = deque(maxlen=self.SHORT_LIVED_LIMIT)
+            # Проверяем, что события действительно приходят
+            self._probe()
+        # Подписаться не удалось или события не приходят
+        except OSError:
+            # Закрываем сокет, чтобы он не остался открытым
+            self.sock.close()
+            # Передаем исключение вызывающему коду (он перейдет на опрос)
+            raise
+    
+    # Команда подписки или отписки
+    def _control(self, op: int):
+        # Данные команды - одно беззнаковое 32-битное число
+        payload = struct.pack("=I", op)
+        # Заголовок cn_msg с длиной данных
+        cn_msg = self.CN_MSG.pack(self.CN_IDX_PROC, self.CN_VAL_PROC, 0, 0, len(payload), 0)
+        # Полная длина сообщения netlink
+        length = self.NLMSG.size + len(cn_msg) + len(payload)
+        # Отправляем заголовок nlmsghdr, cn_msg и команду одним сообщением
+        self.sock.send(self.NLMSG.pack(length, self.NLMSG_DONE, 0, 0, os.getpid()) + cn_msg + payload)
+    
+    # Проверка, что события действительно приходят и PID в них совпадают с нашими
+    # (в контейнере со своим пространством имен PID ядро сообщает чужие номера)
+    def _probe(self):
+        # Порождаем проверочный процесс
+        child = os.fork()
+        # В дочернем процессе fork() возвращает 0
+        if child == 0:
+            # Потомок сразу завершается, не выполняя код родителя
+            os._exit(0)
+        # Родитель ждет завершения потомка
+        os.waitpid(child, 0)
+        # Ждем события не больше секунды
+        deadline = time.monotonic() + 1.0
+        # Пока завершение потомка не появилось среди кратковременных процессов
+        while child not in dict(self.short_lived):
+            # Оставшееся время ожидания
+            remaining = deadline - time.monotonic()
+            # Время вышло или за это время ничего не пришло
+            if remaining <= 0 or not select.select([self.sock], [], [], remaining)[0]:
+                # События не приходят или PID не совпадают - подписка бесполезна
+                raise OSError("события proc connector не приходят")
+            # Обрабатываем пришедшие события
+            self._drain()
+        # Проверочный процесс в отчет не попадает
+        self.short_lived = deque((item for item in self.short_lived if item[0] != child),
+                                 maxlen=self.SHORT_LIVED_LIMIT)
+    
+    # Имя процесса из /proc/<pid>/comm ("" - процесс уже завершился)
+    @staticmethod
+    # Файл может исчезнуть в любой момент
+    def _comm(pid: int) -> str:
+        # Открываем файл имени процесса в двоичном режиме
+        try:
+            # Убираем перевод строки и декодируем байты в строку
+            with open(f"{PROC_ROOT}/{pid}/comm", "rb") as file:
+                # Процесс уже завершился
+                return file.read().rstrip(b"\n").decode(errors="replace")
+        # Имени нет
+        except OSError:
+            return ""
+    
+    # Разбор одного пакета с сообщениями netlink
+    def _parse(self, data: bytes):
+        # Смещение текущего сообщения в пакете
+        offset = 0
+        # Пока в пакете есть целое сообщение с данными события
+        while offset + self.DATA_OFFSET <= len(data):
+            # Длина сообщения из заголовка nlmsghdr
+            length = self.NLMSG.unpack_from(data, offset)[0]
+            # Тип события (what)
+            what = struct.unpack_from("=I", data, offset + self.EVENT_OFFSET)[0]
+            # Начало данных события
+            body = offset + self.DATA_OFFSET
+            # Потоки тоже порождают события; учитываем только процессы (pid == tgid)
+            if what == self.PROC_EVENT_FORK:
+                # Данные fork: PID и TGID родителя, затем PID и TGID потомка
+                _, _, pid, tgid = struct.unpack_from("=4I", data, body)
+                # Новый процесс, а не поток
+                if pid == tgid:
+                    # Добавляем его в множество живых PID
+                    self.live.add(pid)
+                    # До exec у потомка имя родителя
+                    self.born[pid] = self._comm(pid)
+            # Процесс заменил свою программу (exec)
+            elif what == self.PROC_EVENT_EXEC:
+                # PID процесса, выполнившего exec
+                pid = struct.unpack_from("=I", data, body)[0]
+                # Только для процессов, появившихся после прошлого замера
+                if pid in self.born:
+                    # После exec имя новое; если прочитать не удалось, оставляем старое
+                    self.born[pid] = self._comm(pid) or self.born[pid]
+            # Процесс или поток завершился
+            elif what == self.PROC_EVENT_EXIT:
+                # PID и TGID завершившегося
+                pid, tgid = struct.unpack_from("=2I", data, body)
+                # Завершился процесс, а не поток
+                if pid == tgid:
+                    # Удаляем его из множества живых PID
+                    self.live.discard(pid)
+                    # Процесс появился после прошлого замера - замер его не увидит
+                    if pid in self.born:
+                        # Запоминаем PID и имя кратковременного процесса
+                        self.short_lived.append((pid, self.born.pop(pid)))
+            # Некорректная длина - дальше разбирать нельзя
+            if length <= 0:
+                # Прерываем разбор пакета
+                break
+            # Сообщения выровнены по 4 байта
+            offset += (length + 3) & ~3
+    
+    # Чтение всех накопившихся событий без ожидания
+    def _drain(self):
+        # Читаем, пока в сокете есть данные
+        while True:
+            # recv() в неблокирующем режиме
+            try:
+                # Один пакет (в нем может быть несколько сообщений)
+                data = self.sock.recv(65536)
+            # Данных больше нет
+            except BlockingIOError:
+                # Все события прочитаны
+                return
+            # Другая ошибка сокета
+            except OSError as error:
+                # Любая ошибка, кроме переполнения буфера, передается дальше
+                if error.errno != errno.ENOBUFS:
+                    # Повторно возбуждаем исключение
+                    raise
+                # Буфер переполнился и события потеряны - сверяемся со списком /proc
+                self.live = set(psutil.pids())
+                # Запоминаем время сверки
+                self.synced = time.monotonic()
+                # Продолжаем чтение событий
+                continue
+            # Разбираем сообщения пакета
+            self._parse(data)
+    
+    # Ожидание до timeout секунд с обработкой событий по мере прихода:
+    # имена кратковременных процессов читаются, пока процессы еще живы
+    def wait(self, timeout: float):
+        # Момент окончания ожидания
+        deadline = time.monotonic() + timeout
+        # Ждем событий до окончания времени
+        while True:
+            # Сколько осталось ждать
+            remaining = deadline - time.monotonic()
+            # Время вышло
+            if remaining <= 0:
+                # Выходим
+                return
+            # select() ждет, пока в сокете появятся данные, но не дольше remaining
+            ready, _, _ = select.select([self.sock], [], [], remaining)
+            # Сокет готов к чтению
+            if ready:
+                # Обрабатываем события сразу, пока процессы еще живы
+                self._drain()
+    
+    # Текущее множество PID без полного просмотра /proc
+    def pids(self) -> set:
+        # Сначала применяем накопившиеся события
+        self._drain()
+        # Давно не сверялись со списком /proc
+        if time.monotonic() - self.synced > self.RESYNC:
+            # Полная сверка на случай потерянных событий
+            self.live = set(psutil.pids())
+            # Запоминаем время сверки
+            self.synced = time.monotonic()
+        # Все появившиеся до этого момента процессы попадут в замер
+        self.born.clear()
+        # Возвращаем копию, чтобы вызывающий код не изменил наше множество
+        return set(self.live)
+    
+    # Кратковременные процессы с прошлого вызова: список (PID, имя)
+    def drain_short_lived(self) -> list:
+        # Применяем накопившиеся события
+        self._drain()
+        # Копия списка кратковременных процессов
+        result = list(self.short_lived)
+        # Очищаем очередь для следующего вызова
+        self.short_lived.clear()
+        # Возвращаем копию
+        return result
+    
+    # Отписка от событий и закрытие сокета
+    def close(self):
+        # Отписка может не удаться, если сокет уже сломан
+        try:
+            # Отписываемся от событий
+            self._control(self.PROC_CN_MCAST_IGNORE)
+        # Ошибку отписки игнорируем
+        except OSError:
+            # Ничего не делаем
+            pass
+        # Закрываем сокет
+        self.sock.close()
+
+# Функция выбирает способ отслеживания процессов:
+# события ядра, если они доступны, иначе опрос списка PID
+def open_process_events():
+    # События ядра есть только в Linux (сокеты AF_NETLINK и каталог /proc)
+    if hasattr(socket, "AF_NETLINK") and os.path.isdir(PROC_ROOT):
+        # Подписка может не удаться
+        try:
+            # Подписываемся на события ядра
+            return NetlinkEvents()
+        # Подписаться не удалось
+        except OSError:
+            # Нет прав (нужен root) или ядро без proc connector
+            pass
+    # Запасной вариант - опрос списка PID
+    return PollingEvents()
+
+# Время запуска процесса в тиках с загрузки из уже прочитанного /proc/<pid>/stat
+# Внутри oneshot() файл stat разобран один раз, поэтому значение ничего не стоит;
+# Process.create_time() для этого не подходит - он возвращает первое запомненное значение
+# None - psutil без разбора stat (не Linux): тогда проверяется is_running()
+def _stat_start(proc):
+    # Разбор stat есть только в реализации psutil для Linux
+    parse = getattr(proc._proc, "_parse_stat_file", None)
+    # Другая ОС
+    if parse is None:
+        # Время запуска недоступно
+        return None
+    # Поле starttime из /proc/<pid>/stat
+    return parse()["create_time"]
+
+# Долгоживущий сборщик замеров процессов
+# В отличие от process_generator(), объекты psutil.Process не создаются заново
+# на каждом шаге: они хранятся между замерами, а CPU% считается по разнице
+# накопленного процессорного времени (jiffies) между двумя замерами
+class ProcessSampler:
+    # Конструктор класса; events - источник списка PID (по умолчанию psutil.pids())
+    def __init__(self, events=None):
+        # Источник списка PID (события ядра или опрос)
+        self.events = events
+        # Словарь PID -> объект psutil.Process (хранится между замерами)
+        self.handles = {}
+        # Словарь PID -> имя процесса (имя читается один раз при добавлении)
+        self.names = {}
+        # Словарь PID -> время запуска (тоже читается один раз)
+        self.started = {}
+        # Словарь PID -> время запуска в тиках из /proc/<pid>/stat (см. _stat_start)
+        self.start_ticks = {}
+        # Таблица имен, общая для всех снимков этого сборщика
+        self.table = NameTable()
+        # Словарь PID -> суммарное процессорное время (user + system) на прошлом замере
+        self.cpu_totals = {}
+        # Время прошлого замера по монотонным часам (None - замеров еще не было)
+        self.last_time = None
+    
+    # Добавление нового процесса в набор отслеживаемых
+    def _add(self, pid: int):
+        # Процесс может завершиться или быть недоступен
+        try:
+            # Создаем объект процесса один раз на все время его жизни
+            proc = psutil.Process(pid)
+            # Имя запоминаем сразу, чтобы не читать его на каждом шаге
+            self.names[pid] = proc.name()
+            # Время запуска тоже читается один раз
+            self.started[pid] = proc.create_time()
+            # То же время в тиках - для проверки повторного использования PID
+            self.start_ticks[pid] = _stat_start(proc)
+            # Запоминаем объект процесса
+            self.handles[pid] = proc
+        # Процесс завершился до чтения
+        except psutil.NoSuchProcess:
+            # Процесс успел завершиться - пропускаем
+            instrumentation.count("vanished")
+        # Нет доступа к процессу
+        except psutil.AccessDenied:
+            # К процессу нет доступа - пропускаем
+            instrumentation.count("denied")
+    
+    # Удаление завершившегося процесса из всех словарей
+    def _drop(self, pid: int):
+        # Удаляем объект процесса (если он есть)
+        self.handles.pop(pid, None)
+        # Удаляем имя
+        self.names.pop(pid, None)
+        # Удаляем время запуска
+        self.started.pop(pid, None)
+        # Удаляем время запуска в тиках
+        self.start_ticks.pop(pid, None)
+        # Удаляем процессорное время прошлого замера
+        self.cpu_totals.pop(pid, None)
+    
+    # Один замер: возвращает колоночный снимок всех живых процессов
+    def sample(self) -> ProcessSnapshot:
+        # Фиксируем время замера и прошедший интервал
+        now = time.monotonic()
+        # Интервал с прошлого замера (0.0 для первого замера)
+        elapsed = now - self.last_time if self.last_time is not None else 0.0
+        
+        # Получаем текущий список PID - это дешевле, чем process_iter()
+        # При событиях ядра список уже обновлен и /proc заново не просматривается
+        with instrumentation.stage("enumerate"):
+            # Множество PID: от источника событий или полный список psutil
+            current = self.events.pids() if self.events is not None else set(psutil.pids())
+        
+        # Удаляем процессы, которые завершились с прошлого замера
+        for pid in self.handles.keys() - current:
+            # Удаляем все данные о завершившемся процессе
+            self._drop(pid)
+        
+        # Добавляем только новые процессы, уже известные не пересоздаем
+        for pid in current - self.handles.keys():
+            # Создаем объект процесса и читаем его имя и время запуска
+            self._add(pid)
+        
+        # Общий объем памяти читаем один раз на снимок, а не для каждого процесса
+        total_memory = psutil.virtual_memory().total
+        # Пустой снимок с общей таблицей имен сборщика
+        snapshot = ProcessSnapshot(self.table)
+        # Список PID, которые исчезли во время замера
+        vanished = []
+        
+        # Один проход по всем отслеживаемым процессам
+        fetch_started = time.perf_counter()
+        # Перебираем сохраненные объекты процессов
+        for pid, proc in self.handles.items():
+            # Процесс может завершиться в любой момент
+            try:
+                # oneshot() кэширует чтение /proc/<pid>/stat для нескольких вызовов
+                with proc.oneshot():
+                    # Накопленное процессорное время (user и system)
+                    times = proc.cpu_times()
+                    # Резидентная память в байтах
+                    rss = proc.memory_info().rss
+                    # PPID берется из того же /proc/<pid>/stat (родитель меняется,
+                    # если процесс осиротел, поэтому читаем на каждом замере)
+                    ppid = proc.ppid()
+                    # Число потоков
+                    threads = proc.num_threads()
+                    # Время запуска из того же разобранного stat
+                    ticks = _stat_start(proc)
+            # Процесс завершился или доступ пропал
+            except (psutil.NoSuchProcess, psutil.AccessDenied) as error:
+                # Процесс завершился между pids() и чтением (или доступ пропал) -
+                # удалим его после цикла
+                instrumentation.count("denied" if isinstance(error, psutil.AccessDenied) else "vanished")
+                # Запоминаем PID для удаления
+                vanished.append(pid)
+                # Переходим к следующему процессу
+                continue
+            
+            # PID мог достаться новому процессу между замерами: время запуска
+            # не совпадает с запомненным при добавлении
+            # Такой PID удаляем после цикла, и на следующем замере он добавляется заново
+            # с новым именем и временем запуска (иначе CPU% считался бы по прошлому процессу)
+            if ticks != self.start_ticks[pid] or (ticks is None and not proc.is_running()):
+                # Запоминаем PID для удаления
+                vanished.append(pid)
+                # Переходим к следующему процессу
+                continue
+            
+            # Суммарное процессорное время процесса в секундах
+            total = times.user + times.system
+            # Значение на прошлом замере (None для новых процессов)
+            previous = self.cpu_totals.get(pid)
+            # Запоминаем текущее значение для следующего замера
+            self.cpu_totals[pid] = total
+            
+            # CPU% = прирост процессорного времени / прошедшее время * 100
+            if previous is not None and elapsed > 0:
+                # Прирост времени делим на интервал и переводим в проценты
+                cpu = (total - previous) / elapsed * 100
+            # Первый замер процесса
+            else:
+                # Для нового процесса еще не с чем сравнивать
+                cpu = 0.0
+            
+            # Записываем значения сразу в колонки снимка
+            snapshot.append(pid, self.names[pid], cpu, rss / total_memory * 100, rss, ppid, threads,
+                            self.started[pid])
+        # Учитываем время прохода по процессам (этап fetch)
+        instrumentation.record("fetch", time.perf_counter() - fetch_started)
+        
+        # Удаляем исчезнувшие процессы уже после прохода по словарю
+        for pid in vanished:
+            # Удаляем все данные исчезнувшего процесса
+            self._drop(pid)
+        
+        # Запоминаем время этого замера для следующего
+        self.last_time = now
+        # Возвращаем готовый снимок
+        return snapshot
+
+# Чтение /proc для части PID (шарда); функция верхнего уровня, чтобы ее можно
+# было выполнить и в рабочем процессе, и в потоке
+# Незапрошенные файлы не читаются (need_stat - /proc/<pid>/stat, need_values -
+# разбор полей после имени, need_statm - /proc/<pid>/statm)
+# Возвращает сырые колонки: PID, имена (байты), PPID, потоки, время CPU в тиках,
+# время запуска и RSS в страницах; последним идет массив числа пропущенных
+# процессов по причинам Instrumentation.COUNTERS (завершился, нет доступа, ошибка разбора)
+def read_proc_shard(root: str, pids, need_stat: bool = True, need_values: bool = True,
+                    need_statm: bool = True) -> tuple:
+    # Буфер для чтения файлов создается один раз на шард (потоки не делят буфер)
+    buf = bytearray(4096)
+    # os.readv() принимает список буферов - создаем его тоже один раз
+    buffers = [buf]
+    # Выходные колонки: PID, имена, PPID, потоки, тики CPU, время запуска, страницы RSS, пропуски
+    rows = (array("i"), [], array("i"), array("I"), array("Q"), array("Q"), array("Q"), array("I", [0, 0, 0]))
+    # Распаковываем кортеж колонок в отдельные переменные
+    out_pid, out_name, out_ppid, out_threads, out_ticks, out_start, out_pages, skipped = rows
+    
+    # Перебираем PID шарда
+    for pid in pids:
+        # Значения по умолчанию для незапрошенных полей
+        name = b""
+        # Все числовые поля по умолчанию нулевые
+        ppid = threads = total = started = pages = 0
+        # Файлы процесса могут исчезнуть или быть недоступны
+        try:
+            # Файл stat нужен для имени, CPU, PPID и потоков
+            if need_stat:
+                # Формат /proc/<pid>/stat: "pid (comm) state ppid ..."
+                # Низкоуровневое открытие без создания объекта файла Python;
+                # читаем прямо в существующий буфер, без новых объектов bytes
+                fd = os.open(f"{root}/{pid}/stat", os.O_RDONLY)
+                # Файл закрывается, даже если чтение не удалось
+                try:
+                    # readv() читает содержимое в наш буфер и возвращает число байт
+                    size = os.readv(fd, buffers)
+                # В любом случае
+                finally:
+                    # Закрываем файловый дескриптор
+                    os.close(fd)
+                # Имя может содержать пробелы и скобки, поэтому ищем последнюю ")"
+                start = buf.find(b"(", 0, size)
+                # Последняя закрывающая скобка - конец имени
+                end = buf.rfind(b")", 0, size)
+                # Имя процесса между скобками (сырые байты)
+                name = bytes(buf[start + 1:end])
+                # Поля после имени нужны для CPU, PPID и потоков
+                if need_values:
+                    # Поля после имени; values[0] - это поле 3 (state) из man proc
+                    values = buf[end + 2:size].split()
+                    # ppid (поле 4) и num_threads (поле 20)
+                    ppid = int(values[1])
+                    # Число потоков
+                    threads = int(values[17])
+                    # utime (поле 14) + stime (поле 15) в тиках часов
+                    total = int(values[11]) + int(values[12])
+                    # starttime (поле 22) отличает процесс от нового с тем же PID
+                    started = int(values[19])
+            
+            # Файл statm нужен для памяти
+            if need_statm:
+                # Формат /proc/<pid>/statm: "size resident shared ..." в страницах
+                fd = os.open(f"{root}/{pid}/statm", os.O_RDONLY)
+                # Файл закрывается, даже если чтение не удалось
+                try:
+                    # Читаем statm в тот же буфер
+                    size = os.readv(fd, buffers)
+                # В любом случае
+                finally:
+                    # Закрываем файловый дескриптор
+                    os.close(fd)
+                # Второе поле - резидентная память в страницах
+                pages = int(buf[:size].split(None, 2)[1])
+        # Нет доступа к файлам процесса
+        except PermissionError:
+            # Файл недоступен (например, hidepid в /proc)
+            skipped[1] += 1
+            # Переходим к следующему PID
+            continue
+        # Файла нет - процесс завершился
+        except OSError:
+            # Процесс завершился во время чтения
+            skipped[0] += 1
+            # Переходим к следующему PID
+            continue
+        # Не удалось разобрать поля
+        except (ValueError, IndexError):
+            # Неожиданный формат файла
+            skipped[2] += 1
+            # Переходим к следующему PID
+            continue
+        
+        # Дописываем значения процесса в выходные колонки
+        out_pid.append(pid)
+        # Имя (байты)
+        out_name.append(name)
+        # PID родителя
+        out_ppid.append(ppid)
+        # Число потоков
+        out_threads.append(threads)
+        # Процессорное время в тиках
+        out_ticks.append(total)
+        # Время запуска в тиках от загрузки
+        out_start.append(started)
+        # RSS в страницах
+        out_pages.append(pages)
+    # Возвращаем кортеж колонок
+    return rows
+
+# Источник данных, читающий /proc напрямую (только Linux)
+# psutil создает объект Process на каждый PID и делает несколько системных
+# вызовов на процесс; здесь на процесс читаются ровно два файла
+# (/proc/<pid>/stat и /proc/<pid>/statm) в один заранее выделенный буфер
+class ProcReader:
+    # Конструктор принимает корень procfs (можно подменить для проверки)
+    # и источник списка PID (по умолчанию - каталоги /proc)
+    def __init__(self, root: str = PROC_ROOT, events=None):
+        # Запоминаем корень procfs
+        self.root = root
+        # Запоминаем источник списка PID (None - просмотр каталогов /proc)
+        self.events = events
+        # Словарь PID -> (время запуска, суммарное время CPU в тиках) с прошлого прохода
+        self.cpu_totals = {}
+        # Время прошлого прохода по монотонным часам
+        self.last_time = None
+        # Таблица имен; ключом служат сырые байты имени из /proc/<pid>/stat,
+        # поэтому строка декодируется только для нового имени
+        self.table = NameTable()
+        # Время загрузки системы: время запуска в /proc указано в тиках от загрузки
+        # (psutil считает create_time так же, поэтому значения источников совпадают)
+        self.boot_time = psutil.boot_time()
+    
+    # Список PID: в /proc каждому процессу соответствует каталог с числовым именем
+    def pids(self) -> List[int]:
+        # Есть источник событий - список PID берется из него
+        if self.events is not None:
+            # Сортируем, чтобы порядок строк был как у просмотра /proc
+            return sorted(self.events.pids())
+        # Иначе - все каталоги /proc с числовыми именами
+        return [int(entry) for entry in os.listdir(self.root) if entry.isdigit()]
+    
+    # Чтение сырых колонок для списка PID; у ShardedProcReader - параллельно по шардам
+    def _read_parts(self, pids: List[int], need_stat: bool, need_values: bool, need_statm: bool) -> list:
+        # Последовательное чтение - одна часть на все PID
+        return [read_proc_shard(self.root, pids, need_stat, need_values, need_statm)]
+    
+    # Один проход по /proc: возвращает колоночный снимок всех процессов
+    # fields - нужные поля (по умолчанию все из PROCESS_FIELDS):
+    # /proc/<pid>/stat читается только для name, cpu_percent, ppid и num_threads,
+    # /proc/<pid>/statm - только для memory_percent и rss
+    def sample(self, fields=None) -> ProcessSnapshot:
+        # Запрошенные поля (по умолчанию все)
+        wanted = PROCESS_FIELDS if fields is None else fields
+        # CPU% нужен, только если запрошен
+        need_cpu = "cpu_percent" in wanted
+        # Поля stat после имени разбираются, только если нужны CPU, PPID или потоки
+        need_values = need_cpu or "ppid" in wanted or "num_threads" in wanted
+        # Файл stat нужен еще и для имени
+        need_stat = need_values or "name" in wanted
+        # Файл statm нужен для памяти
+        need_statm = "memory_percent" in wanted or "rss" in wanted
+        
+        # Считаем интервал с прошлого прохода для расчета CPU%
+        now = time.monotonic()
+        # Интервал с прошлого прохода (0.0 для первого)
+        elapsed = now - self.last_time if self.last_time is not None else 0.0
+        # Перечисление PID - этап enumerate
+        with instrumentation.stage("enumerate"):
+            # Список PID процессов
+            pids = self.pids()
+        # Начало этапа fetch
+        fetch_started = time.perf_counter()
+        # Читаем сырые колонки (последовательно или по шардам)
+        parts = self._read_parts(pids, need_stat, need_values, need_statm)
+        
+        # Значения прошлого прохода; новый словарь заполняется заново,
+        # поэтому завершившиеся процессы в него просто не попадут
+        previous_totals = self.cpu_totals
+        # Новый словарь PID -> (время запуска, тики CPU)
+        totals = {}
+        # Общий объем памяти читаем один раз на снимок
+        total_memory = psutil.virtual_memory().total if need_statm else 1
+        # Пустой снимок с таблицей имен источника
+        snapshot = ProcessSnapshot(self.table)
+        
+        # Части склеиваются целыми колонками: extend() копирует массив на уровне C
+        for pids, names, ppids, threads, ticks, starts, pages, skipped in parts:
+            # Счетчики пропусков части прибавляем к общим
+            for reason, amount in zip(Instrumentation.COUNTERS, skipped):
+                # Учитываем пропуски по каждой причине
+                instrumentation.count(reason, amount)
+            # Колонка PID
+            snapshot.pid.extend(pids)
+            # Колонка PPID
+            snapshot.ppid.extend(ppids)
+            # Колонка потоков
+            snapshot.threads.extend(threads)
+            # Имена (байты) превращаются в номера таблицы имен
+            snapshot.name_id.extend(map(self.table.intern, names))
+            # Страницы -> байты
+            rss = [count * PAGE_SIZE for count in pages]
+            # Колонка RSS
+            snapshot.rss.extend(rss)
+            # Доля памяти в процентах
+            snapshot.memory.extend([value / total_memory * 100 for value in rss])
+            # Время запуска известно, только если разбирались поля stat
+            if need_values:
+                # Тики от загрузки -> секунды с начала эпохи
+                snapshot.started.extend([self.boot_time + start / CLOCK_TICKS for start in starts])
+            # stat не разбирался
+            else:
+                # Колонка нулей нужной длины (bytes дает нулевые байты)
+                snapshot.started.extend(array("d", bytes(8 * len(pids))))
+            
+            # CPU% не запрошен
+            if not need_cpu:
+                # Колонка нулей
+                snapshot.cpu.extend(array("d", bytes(8 * len(pids))))
+                # Переходим к следующей части
+                continue
+            # CPU% процессов части
+            cpu = []
+            # Перебираем PID, тики CPU и время запуска
+            for pid, total, started in zip(pids, ticks, starts):
+                # Запоминаем значения для следующего прохода
+                totals[pid] = (started, total)
+                # Значения прошлого прохода (None - процесс новый)
+                previous = previous_totals.get(pid)
+                # CPU% считаем, только если процесс тот же самый (совпадает время запуска)
+                if previous is not None and previous[0] == started and elapsed > 0:
+                    # Прирост тиков -> секунды -> доля интервала в процентах
+                    cpu.append((total - previous[1]) / CLOCK_TICKS / elapsed * 100)
+                # Новый процесс или PID занят другим процессом
+                else:
+                    # Не с чем сравнивать
+                    cpu.append(0.0)
+            # Дописываем CPU% части в колонку снимка
+            snapshot.cpu.extend(cpu)
+        
+        # Учитываем время чтения и склейки (этап fetch)
+        instrumentation.record("fetch", time.perf_counter() - fetch_started)
+        
+        # Запоминаем значения и время прохода для следующего расчета CPU%
+        # (проход без CPU не сбивает точку отсчета)
+        if need_cpu:
+            # Новые значения станут прошлыми для следующего прохода
+            self.cpu_totals = totals
+            # Время этого прохода
+            self.last_time = now
+        # Возвращаем готовый снимок
+        return snapshot
+
+# Параллельное чтение /proc: список PID делится на шарды, каждый шард читается
+# в отдельном рабочем процессе (или потоке), а колонки склеиваются в один снимок
+# CPU% считается в основном процессе, поэтому рабочие процессы ничего не хранят
+# Если PID мало или рабочие процессы недоступны, чтение идет последовательно
+class ShardedProcReader(ProcReader):
+    # Меньше стольких PID на шард параллельное чтение не окупает пересылку данных
+    MIN_SHARD_SIZE = 2000
+    
+    # shards - число шардов (None - по числу ядер); use_threads - потоки вместо процессов
+    def __init__(self, root: str = PROC_ROOT, events=None, shards: int = None, use_threads: bool = False):
+        # Инициализация базового класса ProcReader
+        super().__init__(root, events)
+        # Число шардов: заданное, иначе число ядер (или 1)
+        self.shards = shards or os.cpu_count() or 1
+        # Потоки вместо рабочих процессов
+        self.use_threads = use_threads
+        # Пул создается при первом параллельном чтении
+        self.pool = None
+        # После сбоя пула чтение навсегда становится последовательным
+        self.serial = self.shards < 2
+    
+    # Пул рабочих процессов (или потоков)
+    def _pool(self):
+        # Пул еще не создан
+        if self.pool is None:
+            # Класс пула: потоки или процессы
+            executor = ThreadPoolExecutor if self.use_threads else ProcessPoolExecutor
+            # Создаем пул с рабочим на каждый шард
+            self.pool = executor(max_workers=self.shards)
+        # Возвращаем пул
+        return self.pool
+    
+    # Чтение сырых колонок: параллельно по шардам, если это окупается
+    def _read_parts(self, pids: List[int], need_stat: bool, need_values: bool, need_statm: bool) -> list:
+        # Число шардов ограничено числом PID (не меньше MIN_SHARD_SIZE на шард)
+        shards = min(self.shards, len(pids) // self.MIN_SHARD_SIZE)
+        # Параллельное чтение отключено или PID слишком мало
+        if self.serial or shards < 2:
+            # Читаем последовательно, как базовый класс
+            return super()._read_parts(pids, need_stat, need_values, need_statm)
+        
+        # Непрерывные куски отсортированного списка PID примерно одинакового размера
+        size = -(-len(pids) // shards)
+        # Режем список PID на куски
+        chunks = [pids[start:start + size] for start in range(0, len(pids), size)]
+        # Создание пула или чтение может не удаться
+        try:
+            # Пул рабочих (создается при первом вызове)
+            pool = self._pool()
+            # Функция чтения с общими параметрами; рабочему передается только кусок PID
+            read = partial(read_proc_shard, self.root, need_stat=need_stat,
+                           need_values=need_values, need_statm=need_statm)
+            # map() возвращает результаты в порядке шардов
+            return list(pool.map(read, chunks))
+        except (OSError, BrokenExecutor) as error:
+            # Нельзя создать процессы (лимиты, нет /dev/shm) или рабочий процесс упал
+            print(f"Параллельное чтение /proc недоступно ({error}), используется последовательное",
+                  file=sys.stderr)
+            # Останавливаем сломанный пул
+            self.close()
+            # Дальше читаем только последовательно
+            self.serial = True
+            # Читаем этот проход последовательно
+            return super()._read_parts(pids, need_stat, need_values, need_statm)
+    
+    # Остановка пула рабочих процессов
+    def close(self):
+        # Пул создавался
+        if self.pool is not None:
+            # Останавливаем пул, не дожидаясь рабочих
+            # Незапущенные задачи уже отменены: map() отменяет оставшиеся задачи,
+            # если чтение шарда упало (cancel_futures= есть только с Python 3.9)
+            self.pool.shutdown(wait=False)
+            # Пул больше не используется
+            self.pool = None
+
+# Общий экземпляр ProcReader для process_generator(), создается при первом обращении
+# Один экземпляр нужен, чтобы CPU% считался по разнице между вызовами
+_proc_reader = None
+
+# Функция возвращает общий экземпляр ProcReader
+def get_proc_reader() -> ProcReader:
+    # global позволяет изменить переменную модуля внутри функции
+    global _proc_reader
+    # Экземпляр еще не создан
+    if _proc_reader is None:
+        # Создаем общий экземпляр
+        _proc_reader = ProcReader()
+    # Возвращаем общий экземпляр
+    return _proc_reader
+
+# Функция создает сборщик замеров для выбранного источника данных
+# events - общий источник списка PID (см. open_process_events())
+# shards - число шардов для параллельного чтения /proc (1 - последовательно,
+# 0 - по числу ядер); для psutil не используется: объекты Process живут в одном процессе
+def make_sampler(backend: str = "psutil", events=None, shards: int = 1, use_threads: bool = False):
+    # Прямое чтение /proc
+    if backend == "proc":
+        # Несколько шардов (или 0 - по числу ядер)
+        if shards != 1:
+            # Параллельное чтение; 0 превращается в None (по числу ядер)
+            return ShardedProcReader(events=events, shards=shards or None, use_threads=use_threads)
+        # Последовательное чтение
+        return ProcReader(events=events)
+    # Сборщик на объектах psutil.Process
+    return ProcessSampler(events)
+
+# Общий кэш снимка процессов с временем жизни (TTL)
+# Пункты меню и представления, вызванные с разницей в несколько секунд, берут
+# один и тот же снимок вместо нового перечисления процессов
+# Снимок после замера не меняется, поэтому все читатели видят согласованные
+# данные; одновременно выполняется только один замер, остальные ждут его результат
+class SnapshotCache:
+    # Конструктор принимает сборщик замеров и время жизни снимка в секундах
+    def __init__(self, sampler, ttl: float = 2.0):
+        # Сборщик, который делает замеры
+        self.sampler = sampler
+        # Время жизни снимка
+        self.ttl = ttl
+        # Пара (снимок, время начала замера по монотонным часам) - читается
+        # и заменяется целиком, поэтому снимок и его время всегда согласованы
+        self.entry = (None, 0.0)
+        # Блокировка: замер выполняет только один поток за раз
+        self.lock = threading.Lock()
+    
+    # Снимок из кэша, если он не старше max_age секунд (None - ttl кэша)
+    # или замер начат не раньше момента requested; иначе None
+    def fresh(self, max_age: float = None, requested: float = None):
+        # Читаем пару целиком (одно присваивание атомарно)
+        snapshot, taken = self.entry
+        # Снимка еще нет
+        if snapshot is None:
+            # Нечего отдавать
+            return None
+        # Допустимый возраст: заданный или ttl кэша
+        max_age = self.ttl if max_age is None else max_age
+        # Снимок достаточно свежий или замер начат после запроса
+        if time.monotonic() - taken < max_age or (requested is not None and taken >= requested):
+            # Отдаем снимок из кэша
+            return snapshot
+        # Снимок устарел
+        return None
+    
+    # Снимок не старше max_age секунд (None - ttl кэша, 0 - обязательно новый замер)
+    def get(self, max_age: float = None) -> ProcessSnapshot:
+        # Момент запроса: замер, начатый позже, подходит любому ожидающему
+        requested = time.monotonic()
+        # Сначала пробуем кэш без блокировки
+        snapshot = self.fresh(max_age)
+        # Свежий снимок есть
+        if snapshot is not None:
+            # Отдаем его
+            return snapshot
+        # Берем блокировку: замер делает только один поток
+        with self.lock:
+            # Пока ждали блокировку, замер мог сделать другой читатель
+            snapshot = self.fresh(max_age, requested)
+            # Снимка по-прежнему нет
+            if snapshot is None:
+                # Время начала замера
+                started = time.monotonic()
+                # Новый замер
+                snapshot = self.sampler.sample()
+                # Заменяем пару целиком
+                self.entry = (snapshot, started)
+            # Возвращаем снимок
+            return snapshot
+    
+    # Сброс кэша (например, после завершения процессов)
+    def invalidate(self):
+        # Пустая пара: следующий запрос сделает новый замер
+        self.entry = (None, 0.0)
+
+# Проверка, что psutil.Process - тот самый процесс, который был в снимке:
+# время запуска совпадает с точностью до тика часов (0.0 - время неизвестно)
+# Защищает от завершения нового процесса, получившего освободившийся PID
+def same_process(proc, started: float) -> bool:
+    # Время запуска неизвестно или совпадает с точностью до тика
+    return not started or abs(proc.create_time() - started) <= 1 / CLOCK_TICKS
+
+# Индекс имен процессов, который хранится рядом со снимком
+# Вместо полного прохода по процессам на каждый поиск используются словари:
+# имя в нижнем регистре -> множество PID и триграмма -> множество имен
+# Индекс обновляется по разнице снимков: добавляются только новые PID,
+# удаляются только завершившиеся
+class NameIndex:
+    # Конструктор принимает кэш лениво загружаемых полей (общий с другими представлениями)
+    def __init__(self, details: DetailCache = None):
+        # Словарь PID -> (имя, имя в нижнем регистре, время запуска)
+        self.entries = {}
+        # Словарь имя в нижнем регистре -> множество PID
+        self.by_name = {}
+        # Словарь триграмма (3 подряд идущих символа) -> множество имен в нижнем регистре
+        self.trigrams = {}
+        # Кэш полей cmdline и username для поиска cmd: и user:
+        self.details = details if details is not None else DetailCache()
+        # Поле -> {PID: значение в нижнем регистре}; заполняется при первом поиске по полю
+        self.lowered = {"cmdline": {}, "username": {}}
+        # Поле -> {значение в нижнем регистре: множество PID}
+        # Поиск проверяет различные значения (пользователей обычно единицы), а не процессы
+        self.by_detail = {"cmdline": {}, "username": {}}
+        # Поле -> PID, чье значение еще не загружено (новые процессы с прошлого поиска)
+        self.pending = {"cmdline": set(), "username": set()}
+    
+    # Множество триграмм строки
+    @staticmethod
+    # Метод без self: триграммы зависят только от строки
+    def _grams(text: str) -> set:
+        # Множество всех подстрок длины 3
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+    
+    # Добавление процесса в индекс; started - время запуска из снимка
+    def add(self, pid: int, name: str, started: float = 0.0):
+        # Имя в нижнем регистре для поиска без учета регистра
+        lower = name.lower()
+        # Запоминаем имя процесса и время запуска
+        self.entries[pid] = (name, lower, started)
+        # Перебираем множества незагруженных полей
+        for pending in self.pending.values():
+            # Поля нового процесса загрузятся при поиске
+            pending.add(pid)
+        # Множество PID с таким именем
+        pids = self.by_name.get(lower)
+        # Имя встречается впервые
+        if pids is None:
+            # Новое имя: добавляем его триграммы (одно имя - один раз, сколько бы ни было процессов)
+            pids = self.by_name[lower] = set()
+            # Для каждой триграммы имени
+            for gram in self._grams(lower):
+                # Добавляем имя в множество имен триграммы
+                self.trigrams.setdefault(gram, set()).add(lower)
+        # Добавляем PID в множество имени
+        pids.add(pid)
+    
+    # Удаление процесса из индекса
+    def remove(self, pid: int):
+        # Удаляем запись процесса и получаем его имя
+        name, lower, _ = self.entries.pop(pid)
+        # Множество PID с этим именем
+        pids = self.by_name[lower]
+        # Удаляем PID из множества
+        pids.discard(pid)
+        # Множество опустело
+        if not pids:
+            # Процессов с таким именем не осталось - убираем имя из триграмм
+            del self.by_name[lower]
+            # Для каждой триграммы имени
+            for gram in self._grams(lower):
+                # Множество имен триграммы
+                names = self.trigrams[gram]
+                # Удаляем имя
+                names.discard(lower)
+                # Триграмма больше ни в одном имени не встречается
+                if not names:
+                    # Удаляем ее из словаря
+                    del self.trigrams[gram]
+        # Перебираем поля cmdline и username
+        for field, values in self.lowered.items():
+            # Поле больше не нужно загружать
+            self.pending[field].discard(pid)
+            # Значение поля процесса (None - еще не загружалось)
+            value = values.pop(pid, None)
+            # Значение было загружено
+            if value is not None:
+                # Множество PID с этим значением
+                pids = self.by_detail[field][value]
+                # Удаляем PID
+                pids.discard(pid)
+                # Процессов с таким значением не осталось
+                if not pids:
+                    # Удаляем значение
+                    del self.by_detail[field][value]
+        # Забываем лениво загруженные поля процесса
+        self.details.forget(pid)
+    
+    # Обновление индекса по новому снимку: меняются только изменившиеся записи
+    # Повторное использование PID определяется здесь, раз на замер, по времени
+    # запуска из снимка, поэтому поиск не проверяет процессы заново
+    def update(self, snapshot: ProcessSnapshot):
+        # Таблица имен снимка
+        names = snapshot.table.names
+        # Словарь PID -> (имя, время запуска) для текущего снимка
+        current = dict(zip(snapshot.pid, zip(map(names.__getitem__, snapshot.name_id), snapshot.started)))
+        # Завершившиеся процессы
+        for pid in self.entries.keys() - current.keys():
+            # Удаляем их из индекса
+            self.remove(pid)
+        # Новые процессы и процессы, сменившие имя (после exec)
+        entries = self.entries
+        # Перебираем процессы снимка
+        for pid, (name, started) in current.items():
+            # Запись индекса для PID
+            entry = entries.get(pid)
+            # Процесс новый
+            if entry is None:
+                # Добавляем его в индекс
+                self.add(pid, name, started)
+            # Процесс сменил имя (после exec) или PID занят другим процессом
+            elif entry[0] != name or entry[2] != started:
+                # Удаляем старую запись вместе с загруженными полями
+                self.remove(pid)
+                # Добавляем заново
+                self.add(pid, name, started)
+    
+    # Имя процесса по PID (в исходном регистре)
+    def name(self, pid: int) -> str:
+        # Имя из записи индекса
+        return self.entries[pid][0]
+    
+    # Имена (в нижнем регистре), содержащие подстроку
+    def _substring(self, text: str) -> List[str]:
+        # Запрос короче трех символов
+        if len(text) < 3:
+            # Для коротких запросов триграмм нет - проверяем различные имена (их немного)
+            return [lower for lower in self.by_name if text in lower]
+        # Кандидаты - имена, содержащие все триграммы запроса
+        sets = sorted((self.trigrams.get(gram, set()) for gram in self._grams(text)), key=len)
+        # Пересечение множеств: начинаем с самого маленького (sorted по len)
+        candidates = set.intersection(*sets)
+        # Триграммы могут совпасть в разных местах - проверяем подстроку точно
+        return [lower for lower in candidates if text in lower]
+    
+    # Различные значения поля в нижнем регистре -> множества PID
+    # Загружаются только поля процессов, которых еще не было в прошлых поисках
+    def _details(self, field: str) -> dict:
+        # PID -> значение поля
+        values = self.lowered[field]
+        # Значение -> множество PID
+        by_value = self.by_detail[field]
+        # Перебираем процессы, чье поле еще не загружено
+        for pid in self.pending[field]:
+            # None (нет доступа) превращаем в пустую строку
+            value = values[pid] = (self.details.get(pid, field, self.entries[pid][2]) or "").lower()
+            # Добавляем PID в множество значения
+            by_value.setdefault(value, set()).add(pid)
+        # Все поля загружены
+        self.pending[field].clear()
+        # Возвращаем значения
+        return by_value
+    
+    # Поиск процессов; возвращает отсортированный список PID
+    # Формат запроса:
+    #   текст       - подстрока имени (без учета регистра)
+    #   cmd:текст   - подстрока командной строки
+    #   user:текст  - подстрока имени пользователя
+    #   re:шаблон   - регулярное выражение по имени
+    def search(self, query: str) -> List[int]:
+        # Поиск по командной строке или пользователю
+        if query.startswith("cmd:") or query.startswith("user:"):
+            # Делим запрос на префикс и текст по первому двоеточию
+            prefix, text = query.split(":", 1)
+            # Поле процесса, по которому ищем
+            field = "cmdline" if prefix == "cmd" else "username"
+            # Сравнение без учета регистра
+            text = text.lower()
+            # Поля загружаются лениво; подстрока проверяется по различным значениям
+            return sorted(pid for value, pids in self._details(field).items() if text in value for pid in pids)
+        
+        # Поиск по регулярному выражению
+        if query.startswith("re:"):
+            # Компилируем шаблон без учета регистра
+            pattern = re.compile(query[3:], re.IGNORECASE)
+            # Шаблон проверяется по различным именам, а не по каждому процессу
+            names = [lower for lower in self.by_name if pattern.search(lower)]
+        # Обычный поиск подстроки
+        else:
+            # Имена через индекс триграмм
+            names = self._substring(query.lower())
+        # Все PID найденных имен по возрастанию
+        return sorted(pid for lower in names for pid in self.by_name[lower])
+
+# Дерево процессов с суммами ресурсов по поддеревьям (CPU%, RSS, потоки, число процессов)
+# Строится за один проход по колонке ppid снимка; на следующих замерах суммы
+# меняются только вдоль цепочек предков тех процессов, у которых что-то изменилось
+class ProcessTree:
+    # Номера значений в списках own и totals
+    CPU, RSS, THREADS, COUNT = range(4)
+    # Колонка для сортировки -> номер значения
+    KEYS = {"cpu": CPU, "rss": RSS, "threads": THREADS, "count": COUNT}
+    
+    # Конструктор класса
+    def __init__(self):
+        # PID -> собственные значения процесса [CPU%, RSS, потоки, 1]
+        self.own = {}
+        # PID -> суммы по поддереву (сам процесс и все потомки)
+        self.totals = {}
+        # PID -> родитель в дереве (None - корень)
+        self.parent = {}
+        # PID -> множество детей в дереве
+        self.children = {}
+        # PID -> PPID из последнего снимка (родителя может не быть в дереве)
+        self.ppid = {}
+        # PPID -> множество PID, чьего родителя нет в дереве: они прицепляются,
+        # когда родитель появится в снимке (например, после пропуска при замере)
+        self.waiting = {}
+        # PID -> имя процесса
+        self.names = {}
+    
+    # Прибавление разницы к суммам процесса и всех его предков
+    def _propagate(self, pid, cpu: float, rss: int, threads: int, count: int):
+        # Локальные переменные быстрее обращения к атрибутам в цикле
+        totals = self.totals
+        # Словарь родителей
+        parent = self.parent
+        # Поднимаемся от процесса до корня
+        while pid is not None:
+            # Суммы текущего процесса
+            total = totals[pid]
+            # CPU%
+            total[0] += cpu
+            # RSS
+            total[1] += rss
+            # Потоки
+            total[2] += threads
+            # Число процессов
+            total[3] += count
+            # Переходим к родителю
+            pid = parent[pid]
+    
+    # Отцепить поддерево от родителя: суммы предков уменьшаются на сумму поддерева
+    def _detach(self, pid: int):
+        # Текущий родитель в дереве
+        parent = self.parent[pid]
+        # Процесс уже корень
+        if parent is None:
+            # Отцеплять нечего
+            return
+        # Суммы поддерева
+        cpu, rss, threads, count = self.totals[pid]
+        # Вычитаем их из сумм родителя и всех предков
+        self._propagate(parent, -cpu, -rss, -threads, -count)
+        # Удаляем процесс из детей родителя
+        self.children[parent].discard(pid)
+        # Процесс становится корнем
+        self.parent[pid] = None
+    
+    # Прицепить поддерево (корень pid) к родителю parent
+    def _attach(self, pid: int, parent: int):
+        # Не допускаем цикла (возможен при повторном использовании PID)
+        ancestor = parent
+        # Поднимаемся по предкам будущего родителя
+        while ancestor is not None:
+            # Сам процесс оказался среди предков - получился бы цикл
+            if ancestor == pid:
+                # Не прицепляем
+                return
+            # Следующий предок
+            ancestor = self.parent[ancestor]
+        # Запоминаем родителя
+        self.parent[pid] = parent
+        # Добавляем процесс в дети родителя
+        self.children[parent].add(pid)
+        # Прибавляем суммы поддерева к родителю и всем предкам
+        self._propagate(parent, *self.totals[pid])
+    
+    # Процесс больше не ждет своего родителя (сменился PPID или процесс удален)
+    def _unwait(self, pid: int):
+        # PPID, появления которого ждал процесс
+        parent = self.ppid[pid]
+        # Множество ждущих этого PPID
+        waiting = self.waiting.get(parent)
+        # Процесс мог быть в этом множестве
+        if waiting is not None:
+            # Убираем его
+            waiting.discard(pid)
+            # Пустое множество удаляем, чтобы словарь не рос
+            if not waiting:
+                # Удаляем пустое множество
+                del self.waiting[parent]
+    
+    # Удаление завершившегося процесса; его дети становятся корнями,
+    # пока в снимке не появится их родитель (тот же PID) или новый родитель
+    def _remove(self, pid: int):
+        # Копия множества: _detach() меняет его во время перебора
+        for child in list(self.children[pid]):
+            # Ребенок становится корнем
+            self._detach(child)
+            # Ребенок ждет появления процесса с этим PID
+            self.waiting.setdefault(pid, set()).add(child)
+        # Отцепляем сам процесс от его родителя
+        self._detach(pid)
+        # Процесс больше не ждет своего родителя
+        self._unwait(pid)
+        # Удаляем процесс из всех словарей
+        for table in (self.own, self.totals, self.parent, self.children, self.ppid, self.names):
+            # Удаляем запись по PID
+            del table[pid]
+    
+    # Обновление дерева по новому снимку
+    # Первый вызов строит дерево за один проход; дальше пересчитываются
+    # только цепочки предков новых, завершившихся и изменившихся процессов
+    def update(self, snapshot: ProcessSnapshot):
+        # Локальная переменная для быстрого доступа
+        own = self.own
+        # Процессы, которых нет в новом снимке, завершились
+        for pid in own.keys() - set(snapshot.pid):
+            # Удаляем их из дерева
+            self._remove(pid)
+        
+        # Процессы, которые нужно (пере)прицепить к родителю после прохода:
+        # родитель нового процесса может идти в снимке позже него
+        relink = []
+        # Таблица имен снимка
+        names = snapshot.table.names
+        # Нужные колонки снимка построчно
+        rows = zip(snapshot.pid, snapshot.ppid, snapshot.cpu, snapshot.rss, snapshot.threads, snapshot.name_id)
+        # Один проход по строкам снимка
+        for pid, ppid, cpu, rss, threads, name_id in rows:
+            # Собственные значения процесса с прошлого снимка
+            values = own.get(pid)
+            # Процесс новый
+            if values is None:
+                # Собственные значения
+                own[pid] = [cpu, rss, threads, 1]
+                # Суммы поддерева пока равны собственным значениям
+                self.totals[pid] = [cpu, rss, threads, 1]
+                # Пока корень
+                self.parent[pid] = None
+                # Детей пока нет
+                self.children[pid] = set()
+                # Запоминаем PPID
+                self.ppid[pid] = ppid
+                # Запоминаем имя
+                self.names[pid] = names[name_id]
+                # Прицепим после прохода, когда все процессы будут в дереве
+                relink.append(pid)
+                # Переходим к следующей строке
+                continue
+            
+            # Изменились собственные значения - поправляем суммы предков на разницу
+            if values[0] != cpu or values[1] != rss or values[2] != threads:
+                # Прибавляем разницу к процессу и всем предкам
+                self._propagate(pid, cpu - values[0], rss - values[1], threads - values[2], 0)
+                # Запоминаем новые значения
+                values[0] = cpu
+                # RSS
+                values[1] = rss
+                # Потоки
+                values[2] = threads
+            # Сменился родитель (процесс осиротел и был усыновлен)
+            if self.ppid[pid] != ppid:
+                # Больше не ждет старого родителя
+                self._unwait(pid)
+                # Запоминаем новый PPID
+                self.ppid[pid] = ppid
+                # Перецепим после прохода
+                relink.append(pid)
+        
+        # Перецепляем процессы после прохода по снимку
+        for pid in relink:
+            # Отцепляем от старого родителя (если был)
+            self._detach(pid)
+            # Родитель по PPID
+            parent = self.ppid[pid]
+            # Процесс сам себе родитель (PID 0 в некоторых системах)
+            if parent == pid:
+                # Остается корнем
+                continue
+            # Родитель есть в дереве
+            if parent in own:
+                # Прицепляем к нему
+                self._attach(pid, parent)
+            # Родителя нет
+            else:
+                # Родителя нет в снимке - процесс ждет его появления
+                self.waiting.setdefault(parent, set()).add(pid)
+        
+        # Новые процессы забирают детей, которые ждали их появления
+        for pid in relink:
+            # Дети, которые ждали появления этого PID
+            for child in self.waiting.pop(pid, ()):
+                # Ребенок, уже прицепленный выше, повторно не прицепляется
+                if self.parent[child] is None:
+                    # Прицепляем ребенка к появившемуся родителю
+                    self._attach(child, pid)
+    
+    # Корни дерева (процессы без известного родителя)
+    def roots(self) -> List[int]:
+        # Корни - процессы, у которых нет родителя в дереве
+        return [pid for pid, parent in self.parent.items() if parent is None]
+    
+    # PID, упорядоченные по сумме поддерева (по убыванию)
+    def ranked(self, pids, key: str = "rss") -> List[int]:
+        # Номер значения для сортировки
+        index = self.KEYS[key]
+        # Сортируем по сумме поддерева
+        return sorted(pids, key=lambda pid: self.totals[pid][index], reverse=True)
+    
+    # Суммы по службам: поддеревья детей корневых процессов (init, kthreadd),
+    # сложенные по имени процесса; корень учитывается своими собственными значениями
+    # Возвращает словарь имя -> [CPU%, RSS, потоки, число процессов]
+    def services(self) -> dict:
+        # Словарь имя службы -> суммы
+        groups = {}
+        # Перебираем корни дерева
+        for root in self.roots():
+            # Корень учитывается только собственными значениями
+            members = [(root, self.own[root])]
+            # Каждый ребенок корня - со всем своим поддеревом
+            members += [(child, self.totals[child]) for child in self.children[root]]
+            # Перебираем участников
+            for pid, values in members:
+                # Суммы группы с таким именем (создаются при первом появлении)
+                group = groups.setdefault(self.names[pid], [0.0, 0, 0, 0])
+                # Прибавляем значения по номерам
+                for i, value in enumerate(values):
+                    # Прибавляем значение
+                    group[i] += value
+        # Возвращаем словарь служб
+        return groups
+    
+    # Топ-k служб по сумме колонки ("cpu", "rss", "threads", "count")
+    def top_services(self, k: int, key: str = "rss") -> List[tuple]:
+        # Номер значения для сравнения
+        index = self.KEYS[key]
+        # k служб с наибольшей суммой без полной сортировки
+        return heapq.nlargest(k, self.services().items(), key=lambda item: item[1][index])
+
+# ---------- Группы cgroup ----------
+# Принадлежность процессов контейнерам и юнитам systemd по cgroup v2
+# Путь cgroup процесса читается из /proc/<pid>/cgroup один раз на процесс
+# (ключ - PID и время запуска), а счетчики ядра (memory.current, cpu.stat,
+# io.stat) - один раз на группу, а не на каждый процесс
+# Корни procfs и cgroupfs задаются параметрами, поэтому все можно проверить
+# на поддельном дереве каталогов
+
+# Каталоги, где обычно смонтирована иерархия cgroup v2 (единая или гибридная схема)
+CGROUP_ROOTS = ("/sys/fs/cgroup", "/sys/fs/cgroup/unified")
+
+# Корень иерархии cgroup v2 (None - cgroup v2 недоступна)
+def find_cgroup_root(candidates=CGROUP_ROOTS):
+    # Проверяем каталоги по порядку
+    for root in candidates:
+        # Файл cgroup.controllers есть только в корне иерархии v2
+        if os.path.exists(os.path.join(root, "cgroup.controllers")):
+            # Нашли корень
+            return root
+    # cgroup v2 не смонтирована
+    return None
+
+# Компонент пути контейнера: docker-<id>.scope, cri-containerd-<id>.scope и т.п.
+# (драйвер systemd) или 64 шестнадцатеричных символа (драйвер cgroupfs)
+CONTAINER_PATTERN = re.compile(r"^(?:(docker|cri-containerd|crio|libpod)-)?([0-9a-f]{64})(?:\.scope)?$")
+
+# Счетчики ядра одной группы
+@dataclass
+class CgroupStats:
+    # Память группы вместе со страничным кэшем (memory.current), байты
+    memory: int = 0
+    # Процессорное время группы (cpu.stat, usage_usec), секунды
+    cpu_seconds: float = 0.0
+    # Загрузка CPU группой с прошлого чтения, проценты одного ядра (None - не с чем сравнить)
+    cpu_percent: float = None
+    # Прочитано и записано на диск (io.stat, сумма по устройствам), байты
+    io_read: int = 0
+    # Записано на диск, байты
+    io_write: int = 0
+
+# Группа для отображения: подпись и каталог cgroup, счетчики которого
+# покрывают всю группу (вложенные cgroup входят в счетчики родителя)
+def cgroup_group(path: str) -> tuple:
+    # Компоненты пути без начального и конечного "/" (для корня - пустой список)
+    parts = path.strip("/").split("/") if path.strip("/") else []
+    # Контейнер: первый компонент с идентификатором контейнера
+    for depth, part in enumerate(parts):
+        # Проверяем компонент по шаблону контейнера
+        match = CONTAINER_PATTERN.match(part)
+        # Компонент - контейнер
+        if match:
+            # Среда выполнения из префикса (для cgroupfs - просто "container")
+            runtime = match.group(1) or "container"
+            # Подпись с коротким идентификатором и каталог до этого компонента
+            return f"{runtime}:{match.group(2)[:12]}", "/" + "/".join(parts[:depth + 1])
+    # Юнит systemd: самый глубокий компонент .service или .scope
+    for depth in range(len(parts) - 1, -1, -1):
+        # Компонент - юнит systemd
+        if parts[depth].endswith((".service", ".scope")):
+            # Подпись - имя юнита, каталог - путь до него
+            return parts[depth], "/" + "/".join(parts[:depth + 1])
+    # Ни контейнера, ни юнита - группа по полному пути
+    return path or "/", path or "/"
+
+# Определение cgroup процессов и чтение счетчиков групп
+class CgroupResolver:
+    # proc_root - корень procfs, cgroup_root - корень cgroup v2
+    # ttl - сколько секунд счетчики группы считаются свежими
+    def __init__(self, proc_root: str = PROC_ROOT, cgroup_root: str = None, ttl: float = 1.0):
+        # Корень procfs
+        self.proc_root = proc_root
+        # Корень cgroup: заданный или найденный автоматически
+        self.cgroup_root = cgroup_root if cgroup_root is not None else find_cgroup_root()
+        # Время жизни счетчиков
+        self.ttl = ttl
+        # (PID, время запуска) -> путь cgroup (строки путей общие для процессов группы)
+        self.paths = {}
+        # Словарь путь -> тот же объект строки (одна строка на группу)
+        self.interned = {}
+        # Каталог группы -> (время чтения по монотонным часам, CgroupStats)
+        self.stats_cache = {}
+    
+    # Путь cgroup v2 процесса (строка "0::<путь>"); None - процесс завершился
+    def _read_path(self, pid: int):
+        # Файл исчезает вместе с процессом
+        try:
+            # Открываем /proc/<pid>/cgroup в двоичном режиме
+            with open(f"{self.proc_root}/{pid}/cgroup", "rb") as file:
+                # Перебираем строки файла
+                for line in file:
+                    # Строка иерархии v2 начинается с "0::"
+                    if line.startswith(b"0::"):
+                        # Путь после префикса
+                        path = line[3:].strip().decode(errors="replace")
+                        # Общий объект строки для одинаковых путей
+                        return self.interned.setdefault(path, path)
+        # Процесс завершился
+        except OSError:
+            # Пути нет
+            return None
+        # Процесс только в иерархии v1
+        return "/"
+    
+    # Пути cgroup для строк снимка; читаются только новые процессы,
+    # записи завершившихся удаляются
+    def resolve(self, snapshot: ProcessSnapshot) -> List[str]:
+        # Словарь (PID, время запуска) -> путь
+        paths = self.paths
+        # Ключи строк снимка
+        keys = list(zip(snapshot.pid, snapshot.started))
+        # Пути в порядке строк
+        result = []
+        # Перебираем строки снимка
+        for key in keys:
+            # Путь из кэша
+            path = paths.get(key)
+            # Процесс еще не встречался
+            if path is None:
+                # Читаем /proc/<pid>/cgroup
+                path = self._read_path(key[0])
+                # Процесс жив
+                if path is not None:
+                    # Запоминаем путь
+                    paths[key] = path
+            # Путь строки (None - процесс завершился)
+            result.append(path)
+        # В кэше есть лишние записи - процессы завершились
+        if len(paths) > len(keys):
+            # Ключи, которых нет в снимке
+            for key in paths.keys() - set(keys):
+                # Удаляем запись
+                del paths[key]
+        # Возвращаем пути
+        return result
+    
+    # Содержимое файла группы (None - файла нет или контроллер выключен)
+    def _read(self, directory: str, name: str):
+        # Файла может не быть
+        try:
+            # Читаем файл целиком
+            with open(os.path.join(directory, name), "rb") as file:
+                # Содержимое в байтах
+                return file.read()
+        # Файла нет
+        except OSError:
+            # Значения нет
+            return None
+    
+    # Счетчики ядра группы (из кэша, если они моложе ttl)
+    def stats(self, group_path: str) -> CgroupStats:
+        # Текущее время по монотонным часам
+        now = time.monotonic()
+        # Прошлое чтение группы
+        cached = self.stats_cache.get(group_path)
+        # Счетчики еще свежие
+        if cached is not None and now - cached[0] < self.ttl:
+            # Отдаем из кэша
+            return cached[1]
+        
+        # Новые счетчики (нули по умолчанию)
+        stats = CgroupStats()
+        # Читаем файлы, только если cgroup v2 доступна
+        if self.cgroup_root is not None:
+            # Каталог группы в файловой системе cgroup
+            directory = self.cgroup_root + group_path.rstrip("/")
+            # Память группы
+            memory = self._read(directory, "memory.current")
+            # Значение - одно целое число
+            if memory is not None and memory.strip().isdigit():
+                # Байты
+                stats.memory = int(memory)
+            # Статистика процессора группы
+            cpu = self._read(directory, "cpu.stat")
+            # Строки вида "usage_usec 12345"
+            for line in (cpu or b"").splitlines():
+                # Имя и значение через пробел
+                name, _, value = line.partition(b" ")
+                # Общее процессорное время в микросекундах
+                if name == b"usage_usec":
+                    # Переводим в секунды
+                    stats.cpu_seconds = int(value) / 1e6
+            # Строка io.stat: "<устройство> rbytes=... wbytes=... rios=... ..."
+            io = self._read(directory, "io.stat")
+            # Строки по устройствам
+            for line in (io or b"").splitlines():
+                # Поля после имени устройства
+                for field in line.split()[1:]:
+                    # Имя и значение через "="
+                    name, _, value = field.partition(b"=")
+                    # Прочитано байт
+                    if name == b"rbytes":
+                        # Прибавляем к сумме по устройствам
+                        stats.io_read += int(value)
+                    # Записано байт
+                    elif name == b"wbytes":
+                        # Прибавляем к сумме
+                        stats.io_write += int(value)
+        # Есть прошлое чтение - считаем загрузку CPU
+        if cached is not None and now > cached[0]:
+            # Прирост процессорного времени / прошедшее время * 100
+            stats.cpu_percent = (stats.cpu_seconds - cached[1].cpu_seconds) / (now - cached[0]) * 100
+        # Запоминаем счетчики и время чтения
+        self.stats_cache[group_path] = (now, stats)
+        # Возвращаем счетчики
+        return stats
+    
+    # Суммы процессов по группам для снимка
+    # Возвращает словарь каталог группы -> [подпись, число процессов, CPU%, RSS]
+    def groups(self, snapshot: ProcessSnapshot) -> dict:
+        # Словарь каталог группы -> суммы
+        groups = {}
+        # Подпись и каталог группы считаются один раз на путь cgroup
+        labels = {}
+        # Путь, CPU% и RSS каждой строки снимка
+        for path, cpu, rss in zip(self.resolve(snapshot), snapshot.cpu, snapshot.rss):
+            # Процесс завершился во время чтения
+            if path is None:
+                # Пропускаем
+                continue
+            # Подпись и каталог пути
+            label = labels.get(path)
+            # Путь еще не встречался
+            if label is None:
+                # Определяем группу по пути
+                label = labels[path] = cgroup_group(path)
+            # Суммы группы
+            group = groups.get(label[1])
+            # Группа встретилась впервые
+            if group is None:
+                # Подпись, число процессов, CPU%, RSS
+                group = groups[label[1]] = [label[0], 0, 0.0, 0]
+            # Число процессов
+            group[1] += 1
+            # CPU%
+            group[2] += cpu
+            # RSS
+            group[3] += rss
+        # Возвращаем группы
+        return groups
+
+# Одновременный мониторинг набора процессов (или дерева процессов)
+# На каждый PID хранится один объект psutil.Process; cpu_percent(interval=None)
+# не блокирует, а считает CPU% по разнице с прошлым вызовом, поэтому все
+# процессы опрашиваются за один проход, а не по секунде на каждый
+class MultiMonitor:
+    # Конструктор: pids - PID для наблюдения, include_children - следить и за потомками
+    def __init__(self, pids: Iterable[int], include_children: bool = False, interval: float = 1.0):
+        # PID корневых процессов для наблюдения
+        self.roots = list(pids)
+        # Следить ли за потомками
+        self.include_children = include_children
+        # Интервал между замерами
+        self.interval = interval
+        # Словарь PID -> объект psutil.Process
+        self.handles = {}
+        # Словарь PID -> имя процесса
+        self.names = {}
+        # Словарь PID -> время запуска
+        self.started = {}
+        # Таблица имен для снимков
+        self.table = NameTable()
+        # Наибольшее опоздание замера относительно расписания (секунды)
+        self.max_lag = 0.0
+        
+        # Начинаем наблюдение за каждым корневым процессом
+        for pid in self.roots:
+            # Создаем объект процесса
+            self._watch(pid)
+        # Потомков добавляем сразу
+        if include_children:
+            # Обходим деревья корневых процессов
+            self._add_children()
+    
+    # Начать наблюдение за процессом
+    def _watch(self, pid: int):
+        # Процесс может не существовать или быть недоступен
+        try:
+            # Объект процесса
+            proc = psutil.Process(pid)
+            # Имя процесса
+            self.names[pid] = proc.name()
+            # Время запуска
+            self.started[pid] = proc.create_time()
+            # Первый вызов с interval=None "заряжает" счетчик CPU и сразу возвращает 0.0
+            proc.cpu_percent(interval=None)
+            # Запоминаем объект
+            self.handles[pid] = proc
+        # Процесса нет или нет доступа
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            # Не наблюдаем
+            pass
+    
+    # Добавить появившихся потомков наблюдаемых корневых процессов
+    # Карта PPID -> дочерние PID строится один раз за замер для всех корней
+    # (proc.children() строит такую карту по всей системе при каждом вызове)
+    def _add_children(self):
+        # Один проход по всем процессам системы: PPID каждого процесса
+        children = {}
+        # process_iter() с attrs читает только PPID
+        for proc in psutil.process_iter(["ppid"]):
+            # Добавляем PID в список детей его родителя
+            children.setdefault(proc.info["ppid"], []).append(proc.pid)
+        
+        # Обход в глубину от живых корневых процессов по готовой карте
+        stack = [pid for pid in self.roots if pid in self.handles]
+        # Уже посещенные PID
+        seen = set(stack)
+        # Пока есть необойденные процессы
+        while stack:
+            # Дети очередного процесса
+            for child in children.get(stack.pop(), ()):
+                # seen защищает от повторного обхода общего поддерева
+                if child in seen:
+                    # Пропускаем
+                    continue
+                # Отмечаем посещенным
+                seen.add(child)
+                # Обойдем и его потомков
+                stack.append(child)
+                # Новый потомок
+                if child not in self.handles:
+                    # Начинаем наблюдение
+                    self._watch(child)
+    
+    # Один замер всех наблюдаемых процессов за один проход
+    # Возвращает снимок и список PID, завершившихся с прошлого замера
+    def sample(self):
+        # Режим с потомками
+        if self.include_children:
+            # Начинаем наблюдение за новыми потомками
+            self._add_children()
+        
+        # Общий объем памяти читаем один раз на снимок
+        total_memory = psutil.virtual_memory().total
+        # Пустой снимок с общей таблицей имен
+        snapshot = ProcessSnapshot(self.table)
+        # PID завершившихся процессов
+        exited = []
+        # Начало опроса процессов
+        fetch_started = time.perf_counter()
+        # Перебираем наблюдаемые процессы
+        for pid, proc in self.handles.items():
+            # Процесс может завершиться во время опроса
+            try:
+                # Все данные процесса за один системный вызов
+                with proc.oneshot():
+                    # Не блокирует: CPU% с момента прошлого вызова
+                    cpu = proc.cpu_percent(interval=None)
+                    # Резидентная память в байтах
+                    rss = proc.memory_info().rss
+                    # PID родителя
+                    ppid = proc.ppid()
+                    # Число потоков
+                    threads = proc.num_threads()
+            # Процесс завершился или нет доступа
+            except (psutil.NoSuchProcess, psutil.AccessDenied) as error:
+                # Считаем причину
+                instrumentation.count("denied" if isinstance(error, psutil.AccessDenied) else "vanished")
+                # Запоминаем PID
+                exited.append(pid)
+                # Переходим к следующему процессу
+                continue
+            # Добавляем строку в снимок
+            snapshot.append(pid, self.names[pid], cpu, rss / total_memory * 100, rss, ppid, threads,
+                            self.started[pid])
+        # Время опроса
+        instrumentation.record("fetch", time.perf_counter() - fetch_started)
+        
+        # Завершившиеся процессы больше не опрашиваем
+        for pid in exited:
+            # Удаляем объект процесса
+            del self.handles[pid]
+        # Возвращаем снимок и завершившиеся PID
+        return snapshot, exited
+    
+    # Генератор замеров по расписанию на монотонных часах (см. tick_schedule)
+    def run(self, ticks: int):
+        # Ждем очередного тика
+        for tick, lag in tick_schedule(self.interval, ticks):
+            # Наибольшее опоздание тика
+            self.max_lag = max(self.max_lag, lag)
+            # Делаем замер
+            snapshot, exited = self.sample()
+            # Отдаем замер
+            yield tick, snapshot, exited
+            
+            # Если все наблюдаемые процессы завершились, мониторинг окончен
+            if not self.handles:
+                # Завершаем генератор
+                return
+
+# Генератор тиков по расписанию на монотонных часах
+# Время тика n = старт + n * interval, поэтому задержки не накапливаются
+# Возвращает пары (номер тика, опоздание в секундах); count=None - бесконечно
+def tick_schedule(interval: float, count: int = None) -> Generator[tuple, None, None]:
+    # Время первого тика
+    next_tick = time.monotonic() + interval
+    # Счетчик тиков
+    tick = 0
+    # Пока тики не закончились
+    while count is None or tick < count:
+        # Спим ровно до времени следующего тика
+        delay = next_tick - time.monotonic()
+        # Время еще не пришло
+        if delay > 0:
+            # Ждем
+            time.sleep(delay)
+        # Следующий тик
+        tick += 1
+        # Отдаем номер тика и опоздание
+        yield tick, max(0.0, -delay)
+        
+        # Время следующего тика
+        next_tick += interval
+        # Если обработка тика заняла больше интервала, пропускаем опоздавшие тики,
+        # чтобы не делать замеры подряд без паузы
+        now = time.monotonic()
+        # Опаздываем больше чем на интервал
+        if next_tick < now:
+            # Переносим тик на ближайшую границу интервала в будущем
+            next_tick += (now - next_tick) // interval * interval + interval
+
+# ---------- Разница снимков ----------
+# Между соседними замерами большинство процессов почти не меняется, поэтому
+# сортировка, вывод, экспорт и история работают с разницей снимков:
+# новые, завершившиеся и заметно изменившиеся процессы
+# Процесс определяется парой (PID, время запуска): PID, занятый новым процессом,
+# дает удаление старого и добавление нового, а не изменение
+
+# Разница двух снимков
+# added и changed - номера строк в snapshot, removed - ключи (PID, время запуска)
+class SnapshotDelta:
+    # Снимок, номера новых и изменившихся строк, ключи завершившихся процессов
+    def __init__(self, snapshot: ProcessSnapshot, added: List[int], changed: List[int], removed: List[tuple]):
+        # Снимок
+        self.snapshot = snapshot
+        # Новые строки
+        self.added = added
+        # Изменившиеся строки
+        self.changed = changed
+        # Завершившиеся процессы
+        self.removed = removed
+    
+    # Число изменений (новые + изменившиеся + завершившиеся)
+    def __len__(self):
+        # Сумма длин списков
+        return len(self.added) + len(self.changed) + len(self.removed)
+    
+    # Номера строк, которые нужно заново записать (новые и изменившиеся)
+    def rows(self):
+        # Новые, затем изменившиеся
+        return chain(self.added, self.changed)
+
+# Построение разницы между последовательными снимками
+# Для каждого процесса хранятся последние выданные значения, а не последние
+# замеренные: медленный рост накапливается и попадает в разницу, как только
+# превысит порог, а мелкие колебания CPU% и памяти подавляются
+# Выданные значения лежат в массивах в порядке строк прошлого снимка, поэтому
+# сравнение идет целыми колонками через map() на уровне C, без цикла на Python
+class DeltaTracker:
+    # Сравниваемые колонки снимка
+    TRACKED = ("cpu", "memory", "ppid", "threads")
+    
+    # Пороги: изменение CPU% и Память% (в процентных пунктах), не больше которого
+    # процесс считается неизменившимся; PPID и число потоков сравниваются точно
+    def __init__(self, cpu_threshold: float = 0.5, memory_threshold: float = 0.02):
+        # Порог CPU%
+        self.cpu_threshold = cpu_threshold
+        # Порог памяти
+        self.memory_threshold = memory_threshold
+        # Пустое начальное состояние
+        self.reset()
+    
+    # Сброс состояния: следующий снимок будет выдан целиком
+    def reset(self):
+        # Колонки PID и времени запуска прошлого снимка и ключи (PID, время запуска) его строк
+        self.pids = array("i")
+        # Время запуска
+        self.starts = array("d")
+        # Ключи строк
+        self.keys = []
+        # Последние выданные значения TRACKED в порядке self.keys
+        self.reported = [array("d"), array("d"), array("i"), array("I")]
+    
+    # Разница нового снимка с прошлым; первый снимок целиком попадает в added
+    def diff(self, snapshot: ProcessSnapshot) -> SnapshotDelta:
+        # Число строк снимка
+        count = len(snapshot)
+        # Текущие значения сравниваемых колонок
+        current = [snapshot.column(name) for name in self.TRACKED]
+        # Новые строки
+        added = []
+        # Завершившиеся процессы
+        removed = []
+        
+        # Набор или порядок процессов изменился - выданные значения выравниваются
+        # по строкам нового снимка (массивы сравниваются целиком на уровне C,
+        # ключи строятся только при изменении)
+        if snapshot.pid != self.pids or snapshot.started != self.starts:
+            # Ключи строк нового снимка
+            keys = list(zip(snapshot.pid, snapshot.started))
+            # Ключ -> номер строки в прошлом снимке
+            position = dict(zip(self.keys, range(len(self.keys))))
+            # Строка прошлого снимка для каждой новой строки (None - процесса не было)
+            rows = list(map(position.get, keys))
+            # Номера строк без прошлой строки - новые процессы
+            added = list(compress(range(count), map(operator.is_, rows, [None] * count)))
+            # Новые строки берут значения из текущего снимка: колонка текущего снимка
+            # приписывается к выданным значениям, и индекс указывает в эту часть
+            offset = len(self.keys)
+            # Перебираем новые строки
+            for i in added:
+                # Индекс в приписанной колонке
+                rows[i] = offset + i
+            # Выравниваем выданные значения по строкам нового снимка
+            self.reported = [array(old.typecode, map((old + column).__getitem__, rows))
+                             for old, column in zip(self.reported, current)]
+            # Завершившиеся: ключи прошлого снимка, которых нет в новом
+            if offset > count - len(added):
+                # Разность множеств ключей
+                removed = list(position.keys() - set(keys))
+            # Запоминаем ключи
+            self.keys = keys
+            # Колонка PID
+            self.pids = array("i", snapshot.pid)
+            # Колонка времени запуска
+            self.starts = array("d", snapshot.started)
+        
+        # Изменившиеся строки: превышен порог CPU% или памяти, либо сменились PPID или число потоков
+        # Каждая маска почти вся ложная, поэтому compress() дает короткие списки, которые объединяются
+        cpu, memory, ppid, threads = current
+        # Выданные значения
+        old_cpu, old_memory, old_ppid, old_threads = self.reported
+        # Маски изменений по каждой колонке
+        masks = (
+            map(partial(operator.lt, self.cpu_threshold), map(abs, map(operator.sub, cpu, old_cpu))),
+            map(partial(operator.lt, self.memory_threshold), map(abs, map(operator.sub, memory, old_memory))),
+            map(operator.ne, ppid, old_ppid),
+            map(operator.ne, threads, old_threads),
+        )
+        # Объединение номеров строк со всех масок
+        changed = sorted(set().union(*(compress(range(count), mask) for mask in masks)))
+        
+        # Выданными становятся значения изменившихся строк
+        for i in changed:
+            # Перебираем колонки
+            for old, column in zip(self.reported, current):
+                # Запоминаем значение
+                old[i] = column[i]
+        # Возвращаем разницу
+        return SnapshotDelta(snapshot, added, changed, removed)
+
+# Рейтинг процессов, который обновляется по разнице снимков
+# Упорядоченный список хранится между замерами; на замер выполняется
+# по одной вставке бинарным поиском на изменившийся процесс, поэтому
+# полная сортировка всех процессов не нужна
+class RankedView:
+    # key - имя колонки или кортеж имен (составной ключ, как в ProcessSnapshot.top())
+    def __init__(self, key="cpu", reverse: bool = True):
+        # Колонки ключа сортировки
+        self.keys = (key,) if isinstance(key, str) else tuple(key)
+        # Знак: по убыванию значения берутся с минусом
+        self.sign = -1 if reverse else 1
+        # Упорядоченный список записей (значения ключа со знаком, PID, время запуска)
+        # При равных значениях первым идет процесс с меньшим PID, как в top()
+        self.order = []
+        # (PID, время запуска) -> (запись в order, строка последней выдачи:
+        # имя, CPU%, Память%, PPID, потоки); ProcessInfo создается только для вывода
+        self.entries = {}
+    
+    # Удаление записи процесса из упорядоченного списка
+    def _discard(self, key: tuple):
+        # Удаляем запись из словаря
+        entry = self.entries.pop(key, None)
+        # Запись была
+        if entry is not None:
+            # Удаляем ее из списка бинарным поиском
+            del self.order[bisect_left(self.order, entry[0])]
+    
+    # Применение разницы снимков
+    def apply(self, delta: SnapshotDelta):
+        # Перебираем завершившиеся процессы
+        for key in delta.removed:
+            # Удаляем их записи
+            self._discard(key)
+        # Снимок разницы
+        snapshot = delta.snapshot
+        # Колонки ключа
+        columns = [snapshot.column(name) for name in self.keys]
+        # Знак ключа
+        sign = self.sign
+        # Новые записи
+        batch = []
+        # Перебираем новые и изменившиеся строки
+        for i in delta.rows():
+            # Ключ процесса
+            key = (snapshot.pid[i], snapshot.started[i])
+            # Старая запись удаляется
+            self._discard(key)
+            # Новая запись: значения ключа со знаком, PID и время запуска
+            entry = tuple([sign * column[i] for column in columns]) + key
+            # Добавляем в пакет
+            batch.append(entry)
+            # Запоминаем запись и строку для вывода
+            self.entries[key] = (entry, (snapshot.name(i), snapshot.cpu[i], snapshot.memory[i],
+                                         snapshot.ppid[i], snapshot.threads[i]))
+        # Немного изменений - вставка бинарным поиском; много (например, первый
+        # снимок) - одна сортировка, которая быстрее тысяч вставок
+        if len(batch) * 8 < len(self.order):
+            # Перебираем записи пакета
+            for entry in batch:
+                # Вставляем с сохранением порядка
+                insort(self.order, entry)
+        # Много изменений
+        else:
+            # Добавляем все записи
+            self.order.extend(batch)
+            # Сортируем один раз
+            self.order.sort()
+    
+    # k первых процессов рейтинга (значения - на момент последнего изменения)
+    def top(self, k: int) -> List[ProcessInfo]:
+        # Результат
+        result = []
+        # Первые k записей
+        for entry in self.order[:k]:
+            # PID записи
+            pid = entry[-2]
+            # Строка последней выдачи по ключу (PID, время запуска)
+            name, cpu, memory, ppid, threads = self.entries[entry[-2:]][1]
+            # Создаем ProcessInfo для вывода
+            result.append(ProcessInfo(pid=pid, name=name, cpu_percent=cpu, memory_percent=memory,
+                                      ppid=ppid, num_threads=threads))
+        # Возвращаем результат
+        return result
+    
+    # Число процессов в рейтинге
+    def __len__(self):
+        # Длина упорядоченного списка
+        return len(self.order)
+
+# ---------- Потоковый экспорт замеров ----------
+# Конвейер генераторов: замеры -> строки выбранного формата -> буферизованная запись
+# Форматтеры выдают строки по одной и None в конце каждого замера;
+# по None запись сбрасывает буфер - один раз за тик, а не на каждой строке
+
+# Поддерживаемые форматы экспорта
+EXPORT_FORMATS = ("ndjson", "csv", "prometheus")
+
+# Генератор замеров: первый замер служит точкой отсчета для CPU%,
+# дальше сборщик опрашивается по расписанию
+# observe - функция, которая получает каждый замер (например, LeakReporter.update)
+def sample_stream(sampler, interval: float = 1.0, count: int = None,
+                  observe=None) -> Generator[ProcessSnapshot, None, None]:
+    # Первый замер - точка отсчета
+    sampler.sample()
+    # Ждем очередного тика
+    for _ in tick_schedule(interval, count):
+        # Новый замер
+        snapshot = sampler.sample()
+        # Функция задана
+        if observe is not None:
+            # Передаем ей замер
+            observe(snapshot)
+        # Отдаем замер
+        yield snapshot
+
+# Формат NDJSON: один JSON-объект на строку
+def format_ndjson(snapshots) -> Generator[str, None, None]:
+    # Перебираем замеры
+    for snapshot in snapshots:
+        # Время замера
+        ts = snapshot.timestamp
+        # Таблица имен
+        names = snapshot.table.names
+        # Перебираем строки снимка
+        for pid, name_id, cpu, memory, rss in zip(snapshot.pid, snapshot.name_id, snapshot.cpu,
+                                                  snapshot.memory, snapshot.rss):
+            # json.dumps нужен только для имени (экранирование кавычек и т.п.)
+            yield (f'{{"ts": {ts:.3f}, "pid": {pid}, "name": {json.dumps(names[name_id])}, '
+                   f'"cpu_percent": {cpu:.2f}, "memory_percent": {memory:.3f}, "rss": {rss}}}\n')
+        # Конец замера
+        yield None
+
+# Экранирование поля CSV: кавычки нужны, только если в значении есть спецсимволы
+def _csv_field(value: str) -> str:
+    # Есть запятая, кавычка или перевод строки
+    if any(char in value for char in ',"\n\r'):
+        # Берем в кавычки, удваивая внутренние
+        return '"' + value.replace('"', '""') + '"'
+    # Значение без изменений
+    return value
+
+# Формат CSV: строка заголовка один раз, затем по строке на процесс
+def format_csv(snapshots) -> Generator[str, None, None]:
+    # Заголовок
+    yield "ts,pid,name,cpu_percent,memory_percent,rss\n"
+    # Перебираем замеры
+    for snapshot in snapshots:
+        # Время замера
+        ts = snapshot.timestamp
+        # Экранированные имена кэшируются по номеру имени в таблице
+        escaped = {}
+        # Таблица имен
+        names = snapshot.table.names
+        # Перебираем строки снимка
+        for pid, name_id, cpu, memory, rss in zip(snapshot.pid, snapshot.name_id, snapshot.cpu,
+                                                  snapshot.memory, snapshot.rss):
+            # Имя из кэша
+            name = escaped.get(name_id)
+            # Имя еще не экранировано
+            if name is None:
+                # Экранируем и запоминаем
+                name = escaped[name_id] = _csv_field(names[name_id])
+            # Строка CSV
+            yield f"{ts:.3f},{pid},{name},{cpu:.2f},{memory:.3f},{rss}\n"
+        # Конец замера
+        yield None
+
+# Экранирование значения метки Prometheus: \\, " и перевод строки
+def _prometheus_label(value: str) -> str:
+    # Экранируем обратную косую черту, кавычки и перевод строки
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+# Метрики Prometheus: имя метрики, колонка снимка и описание
+PROMETHEUS_METRICS = (
+    ("process_cpu_percent", "cpu", "CPU usage of the process in percent"),
+    ("process_memory_percent", "memory", "Resident memory of the process in percent of total"),
+    ("process_resident_memory_bytes", "rss", "Resident memory of the process in bytes"),
+)
+
+# Формат Prometheus (текстовый формат экспозиции) с отметкой времени в миллисекундах
+def format_prometheus(snapshots) -> Generator[str, None, None]:
+    # Перебираем замеры
+    for snapshot in snapshots:
+        # Время в миллисекундах
+        ts = int(snapshot.timestamp * 1000)
+        # Таблица имен
+        names = snapshot.table.names
+        # Метки процесса строятся один раз на замер и используются для всех метрик
+        labels = [f'pid="{pid}",name="{_prometheus_label(names[name_id])}"'
+                  for pid, name_id in zip(snapshot.pid, snapshot.name_id)]
+        # Перебираем метрики
+        for metric, column, description in PROMETHEUS_METRICS:
+            # Описание и тип метрики
+            yield f"# HELP {metric} {description}\n# TYPE {metric} gauge\n"
+            # Значения метрики по процессам
+            for label, value in zip(labels, snapshot.column(column)):
+                # Строка метрики
+                yield f"{metric}{{{label}}} {value} {ts}\n"
+        # Конец замера
+        yield None
+
+# Соответствие формата и функции-форматтера
+FORMATTERS = {
+    "ndjson": format_ndjson,
+    "csv": format_csv,
+    "prometheus": format_prometheus,
+}
+
+# Генератор разниц снимков (см. DeltaTracker): первая разница содержит все процессы
+def delta_stream(snapshots, tracker: DeltaTracker = None) -> Generator[SnapshotDelta, None, None]:
+    # Сборщик разниц по умолчанию
+    tracker = tracker if tracker is not None else DeltaTracker()
+    # Перебираем замеры
+    for snapshot in snapshots:
+        # Отдаем разницу с прошлым замером
+        yield tracker.diff(snapshot)
+
+# Формат NDJSON для разниц: поле op - add (новый), change (изменился) или remove (завершился)
+# У завершившегося процесса выводятся только ключ и время
+def format_ndjson_delta(deltas) -> Generator[str, None, None]:
+    # Перебираем разницы
+    for delta in deltas:
+        # Снимок разницы
+        snapshot = delta.snapshot
+        # Время замера
+        ts = snapshot.timestamp
+        # Таблица имен
+        names = snapshot.table.names
+        # Новые и изменившиеся строки
+        for op, rows in (("add", delta.added), ("change", delta.changed)):
+            # Перебираем строки
+            for i in rows:
+                # Строка NDJSON
+                yield (f'{{"ts": {ts:.3f}, "op": "{op}", "pid": {snapshot.pid[i]}, '
+                       f'"started": {snapshot.started[i]:.2f}, "name": {json.dumps(names[snapshot.name_id[i]])}, '
+                       f'"cpu_percent": {snapshot.cpu[i]:.2f}, "memory_percent": {snapshot.memory[i]:.3f}, '
+                       f'"rss": {snapshot.rss[i]}}}\n')
+        # Завершившиеся процессы
+        for pid, started in delta.removed:
+            # Только ключ и время
+            yield f'{{"ts": {ts:.3f}, "op": "remove", "pid": {pid}, "started": {started:.2f}}}\n'
+        # Конец замера
+        yield None
+
+# Формат CSV для разниц: колонки op и started; у завершившихся значения пустые
+def format_csv_delta(deltas) -> Generator[str, None, None]:
+    # Заголовок
+    yield "ts,op,pid,started,name,cpu_percent,memory_percent,rss\n"
+    # Перебираем разницы
+    for delta in deltas:
+        # Снимок разницы
+        snapshot = delta.snapshot
+        # Время замера
+        ts = snapshot.timestamp
+        # Таблица имен
+        names = snapshot.table.names
+        # Новые и изменившиеся строки
+        for op, rows in (("add", delta.added), ("change", delta.changed)):
+            # Перебираем строки
+            for i in rows:
+                # Строка CSV
+                yield (f"{ts:.3f},{op},{snapshot.pid[i]},{snapshot.started[i]:.2f},"
+                       f"{_csv_field(names[snapshot.name_id[i]])},{snapshot.cpu[i]:.2f},"
+                       f"{snapshot.memory[i]:.3f},{snapshot.rss[i]}\n")
+        # Завершившиеся процессы
+        for pid, started in delta.removed:
+            # Пустые значения
+            yield f"{ts:.3f},remove,{pid},{started:.2f},,,,\n"
+        # Конец замера
+        yield None
+
+# Форматы, поддерживающие вывод разниц; Prometheus всегда отдает полное состояние
+DELTA_FORMATTERS = {
+    "ndjson": format_ndjson_delta,
+    "csv": format_csv_delta,
+}
+
+# Буферизованная запись строк в файл или stdout (path=None или "-")
+# Буфер сбрасывается только на границе замера (None от форматтера)
+def write_stream(lines, path: str = None, buffer_size: int = 1 << 16):
+    # Вывод в stdout
+    if path is None or path == "-":
+        # Отдельный буферизованный поток поверх дескриптора stdout
+        out = open(sys.stdout.fileno(), "w", buffering=buffer_size, encoding="utf-8", closefd=False)
+    # Вывод в файл
+    else:
+        # Открываем файл с буфером
+        out = open(path, "w", buffering=buffer_size, encoding="utf-8")
+    # Файл закрывается по завершении
+    with out:
+        # Метод записи
+        write = out.write
+        # Перебираем строки
+        for line in lines:
+            # Граница замера
+            if line is None:
+                # Сбрасываем буфер
+                out.flush()
+            # Обычная строка
+            else:
+                # Пишем в буфер
+                write(line)
+
+# Экспорт без интерактивного меню: замеры идут прямо в файл или stdout
+# delta=True - выводятся только изменения между замерами (см. DELTA_FORMATTERS)
+def run_export(fmt: str, backend: str = "psutil", interval: float = 1.0,
+               count: int = None, path: str = None, shards: int = 1, delta: bool = False):
+    # Генератор замеров выбранного сборщика; подозрения на утечки пишутся в stderr
+    snapshots = sample_stream(make_sampler(backend, shards=shards), interval, count,
+                              observe=LeakReporter().update)
+    # Запись может быть прервана
+    try:
+        # Режим разниц
+        if delta:
+            # Пишем разницы
+            write_stream(DELTA_FORMATTERS[fmt](delta_stream(snapshots)), path)
+        # Полные замеры
+        else:
+            # Пишем замеры
+            write_stream(FORMATTERS[fmt](snapshots), path)
+    # Ctrl+C или закрытый канал
+    except (KeyboardInterrupt, BrokenPipeError):
+        # Остановка по Ctrl+C или закрытие читающей стороны - штатное завершение
+        pass
+
+# ---------- Запись и воспроизведение ----------
+# Запись - файл только для дописывания, отображенный в память (mmap)
+# Формат:
+#   заголовок RECORD_HEADER: сигнатура и размер строки процесса в байтах
+#   кадры подряд: заголовок RECORD_FRAME (метка, число строк, время замера),
+#   затем колонки целиком в порядке RECORD_COLUMNS (little-endian) и колонка
+#   имен по RECORD_NAME_BYTES байт на процесс
+# Рядом лежит индекс <файл>.idx: по записи INDEX_ENTRY (время, смещение кадра)
+# на кадр; по нему кадр находится бинарным поиском без чтения всего файла
+# Кадр считается записанным только после записи в индекс, поэтому после
+# аварийного завершения недописанный хвост файла просто не виден
+
+RECORD_MAGIC = b"PMREC\x00\x00\x01"
+# Заголовок файла: сигнатура, размер строки, выравнивание
+RECORD_HEADER = struct.Struct("<8sI4x")
+# Метка кадра
+RECORD_FRAME_MAGIC = b"PMFR"
+# Заголовок кадра: метка, число строк, время замера
+RECORD_FRAME = struct.Struct("<4sId")
+# Колонки снимка и их тип в файле (CPU% и Память% хранятся как float 4 байта)
+RECORD_COLUMNS = (("pid", "i"), ("cpu", "f"), ("memory", "f"), ("rss", "Q"),
+                  ("ppid", "i"), ("threads", "I"), ("started", "d"))
+# Имя хранится в фиксированном поле: для вывода нужны первые 20 символов
+RECORD_NAME_BYTES = 24
+# Размер строки процесса: колонки и поле имени
+RECORD_ROW_BYTES = sum(array(typecode).itemsize for _, typecode in RECORD_COLUMNS) + RECORD_NAME_BYTES
+# Запись индекса: время и смещение кадра
+INDEX_ENTRY = struct.Struct("<dQ")
+
+# Запись замеров в файл
+# Файл растет кусками по GROW_BYTES (ftruncate + mmap.resize), при закрытии
+# обрезается до фактического размера; существующая запись дописывается
+class Recorder:
+    # Шаг роста файла
+    GROW_BYTES = 64 * 1024 * 1024
+    
+    # Открытие (или создание) файла записи
+    def __init__(self, path: str):
+        # Путь к файлу
+        self.path = path
+        # Дескриптор файла записи
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        # Индекс открываем для дописывания
+        self.index = open(path + ".idx", "ab")
+        # Текущий размер файла
+        size = os.fstat(self.fd).st_size
+        # Файл уже существует
+        if size:
+            # Читаем заголовок
+            with open(path, "rb") as existing:
+                # Сигнатура и размер строки
+                magic, row_bytes = RECORD_HEADER.unpack(existing.read(RECORD_HEADER.size))
+            # Файл не наш или другой версии
+            if magic != RECORD_MAGIC or row_bytes != RECORD_ROW_BYTES:
+                # Закрываем файл
+                os.close(self.fd)
+                # Закрываем индекс
+                self.index.close()
+                # Ошибка формата
+                raise ValueError(f"{path}: не файл записи или другой формат")
+            # Дописываем после последнего кадра из индекса
+            self.end = Recording.indexed_end(path, size)
+        # Новый файл
+        else:
+            # Первый кадр сразу после заголовка
+            self.end = RECORD_HEADER.size
+        # Размер с запасом на рост
+        self.capacity = max(size, self.end + self.GROW_BYTES)
+        # Расширяем файл
+        os.ftruncate(self.fd, self.capacity)
+        # Отображаем файл в память
+        self.map = mmap.mmap(self.fd, self.capacity)
+        # Пишем заголовок
+        self.map[:RECORD_HEADER.size] = RECORD_HEADER.pack(RECORD_MAGIC, RECORD_ROW_BYTES)
+        # Имя -> поле фиксированной длины (кодируется один раз на имя)
+        self.encoded = {}
+    
+    # Поле имени: UTF-8, обрезанный до RECORD_NAME_BYTES и дополненный нулями
+    # (неполный символ на границе обрезки отбрасывается)
+    def _encode(self, name: str) -> bytes:
+        # Поле из кэша
+        field = self.encoded.get(name)
+        # Имя еще не кодировалось
+        if field is None:
+            # Обрезаем байты и отбрасываем неполный символ
+            raw = name.encode()[:RECORD_NAME_BYTES].decode(errors="ignore").encode()
+            # Дополняем нулями и запоминаем
+            field = self.encoded[name] = raw.ljust(RECORD_NAME_BYTES, b"\0")
+        # Возвращаем поле
+        return field
+    
+    # Дописывание снимка в конец записи
+    def append(self, snapshot: ProcessSnapshot):
+        # Заголовок кадра
+        parts = [RECORD_FRAME.pack(RECORD_FRAME_MAGIC, len(snapshot), snapshot.timestamp)]
+        # Перебираем колонки
+        for name, typecode in RECORD_COLUMNS:
+            # Колонка снимка
+            column = snapshot.column(name)
+            # Копия нужна для смены типа или порядка байт (колонку снимка не меняем)
+            if column.typecode != typecode or sys.byteorder == "big":
+                # Копия нужного типа
+                column = array(typecode, column)
+            # Файл хранит числа в little-endian
+            if sys.byteorder == "big":
+                # Меняем порядок байт
+                column.byteswap()
+            # Байты колонки
+            parts.append(column.tobytes())
+        # Таблица имен
+        names = snapshot.table.names
+        # Поля имен всех строк
+        parts.append(b"".join([self._encode(names[i]) for i in snapshot.name_id]))
+        # Кадр целиком
+        data = b"".join(parts)
+        
+        # Конец кадра
+        end = self.end + len(data)
+        # Кадр не помещается в файл
+        if end > self.capacity:
+            # Новый размер с запасом
+            self.capacity = end + self.GROW_BYTES
+            # Расширяем файл
+            os.ftruncate(self.fd, self.capacity)
+            # Расширяем отображение
+            self.map.resize(self.capacity)
+        # Копируем кадр в файл
+        self.map[self.end:end] = data
+        # Кадр становится видимым только после записи в индекс
+        self.index.write(INDEX_ENTRY.pack(snapshot.timestamp, self.end))
+        # Сбрасываем индекс на диск
+        self.index.flush()
+        # Новый конец записи
+        self.end = end
+    
+    # Закрытие: сброс на диск и обрезка неиспользованного хвоста
+    def close(self):
+        # Сбрасываем отображение на диск
+        self.map.flush()
+        # Закрываем отображение
+        self.map.close()
+        # Обрезаем файл до фактического размера
+        os.ftruncate(self.fd, self.end)
+        # Закрываем файл
+        os.close(self.fd)
+        # Закрываем индекс
+        self.index.close()
+
+# Чтение записи: файл и индекс отображаются в память, кадр читается только
+# при обращении к нему, поэтому открытие записи любого размера мгновенно
+class Recording:
+    # Открытие записи для чтения
+    def __init__(self, path: str):
+        # Путь к файлу
+        self.path = path
+        # Открываем файл
+        with open(path, "rb") as data:
+            # Отображаем его в память только для чтения
+            self.data = mmap.mmap(data.fileno(), 0, access=mmap.ACCESS_READ)
+        # Сигнатура и размер строки из заголовка
+        magic, row_bytes = RECORD_HEADER.unpack_from(self.data)
+        # Файл не наш или другой версии
+        if magic != RECORD_MAGIC or row_bytes != RECORD_ROW_BYTES:
+            # Закрываем отображение
+            self.data.close()
+            # Ошибка формата
+            raise ValueError(f"{path}: не файл записи или другой формат")
+        # Пустой файл нельзя отобразить в память - индекс без кадров
+        self.index = None
+        # Число кадров
+        self.count = 0
+        # Индекса может не быть
+        try:
+            # Открываем индекс
+            with open(path + ".idx", "rb") as index:
+                # Размер индекса
+                size = os.fstat(index.fileno()).st_size
+                # Есть хотя бы одна запись
+                if size >= INDEX_ENTRY.size:
+                    # Отображаем индекс в память
+                    self.index = mmap.mmap(index.fileno(), 0, access=mmap.ACCESS_READ)
+                    # Число полных записей
+                    self.count = size // INDEX_ENTRY.size
+        # Индекса нет
+        except FileNotFoundError:
+            # Кадров нет
+            pass
+        # Таблица имен, общая для всех кадров записи
+        self.table = NameTable()
+    
+    # Конец последнего кадра из индекса (с какого места дописывать запись)
+    @staticmethod
+    # Позиция для дописывания
+    def indexed_end(path: str, size: int) -> int:
+        # Открываем запись
+        recording = Recording(path)
+        # Запись закрывается в любом случае
+        try:
+            # Кадров нет
+            if not recording.count:
+                # Сразу после заголовка
+                return RECORD_HEADER.size
+            # Смещение последнего кадра
+            _, offset = recording.entry(recording.count - 1)
+            # Число строк последнего кадра
+            _, rows, _ = RECORD_FRAME.unpack_from(recording.data, offset)
+            # Конец последнего кадра
+            return offset + RECORD_FRAME.size + rows * RECORD_ROW_BYTES
+        # В любом случае
+        finally:
+            # Закрываем запись
+            recording.close()
+    
+    # Число кадров
+    def __len__(self):
+        # Число записей индекса
+        return self.count
+    
+    # Запись индекса кадра n: (время, смещение)
+    def entry(self, n: int) -> tuple:
+        # Читаем запись индекса
+        return INDEX_ENTRY.unpack_from(self.index, n * INDEX_ENTRY.size)
+    
+    # Время кадра n
+    def time(self, n: int) -> float:
+        # Время из записи индекса
+        return self.entry(n)[0]
+    
+    # Номер первого кадра не раньше момента ts (бинарный поиск по индексу)
+    # Поиск написан вручную: bisect с параметром key есть только с Python 3.10
+    def find(self, ts: float) -> int:
+        # Границы поиска
+        low, high = 0, self.count
+        # Пока диапазон не пуст
+        while low < high:
+            # Середина диапазона
+            middle = (low + high) // 2
+            # Кадр раньше нужного момента
+            if self.time(middle) < ts:
+                # Ищем правее
+                low = middle + 1
+            # Кадр не раньше
+            else:
+                # Ищем левее, включая середину
+                high = middle
+        # Номер первого подходящего кадра
+        return low
+    
+    # Кадр n в виде колоночного снимка; читаются только байты этого кадра
+    def frame(self, n: int) -> ProcessSnapshot:
+        # Время и смещение кадра
+        timestamp, offset = self.entry(n)
+        # Заголовок кадра
+        magic, rows, _ = RECORD_FRAME.unpack_from(self.data, offset)
+        # Метка не совпала
+        if magic != RECORD_FRAME_MAGIC:
+            # Ошибка формата
+            raise ValueError(f"{self.path}: поврежден кадр {n}")
+        # Пустой снимок с таблицей имен записи
+        snapshot = ProcessSnapshot(self.table)
+        # Время замера
+        snapshot.timestamp = timestamp
+        # Представление без копирования
+        view = memoryview(self.data)
+        # Начало колонок
+        position = offset + RECORD_FRAME.size
+        # Перебираем колонки
+        for name, typecode in RECORD_COLUMNS:
+            # Пустая колонка типа из файла
+            column = array(typecode)
+            # Размер колонки в байтах
+            size = rows * column.itemsize
+            # Читаем байты колонки
+            column.frombytes(view[position:position + size])
+            # Файл хранит числа в little-endian
+            if sys.byteorder == "big":
+                # Меняем порядок байт
+                column.byteswap()
+            # Колонка снимка
+            target = snapshot.column(name)
+            # Добавляем значения (с приведением типа при необходимости)
+            target.extend(column if target.typecode == typecode else array(target.typecode, column))
+            # Следующая колонка
+            position += size
+        # Имена: сырые байты поля служат ключом таблицы имен, поэтому
+        # строка декодируется один раз на имя, а не на каждую строку кадра
+        block = view[position:position + rows * RECORD_NAME_BYTES].tobytes()
+        # Освобождаем представление
+        view.release()
+        # Метод таблицы имен
+        intern = self.table.intern
+        # Номера имен строк кадра
+        snapshot.name_id.extend([intern(block[start:start + RECORD_NAME_BYTES].rstrip(b"\0"))
+                                 for start in range(0, len(block), RECORD_NAME_BYTES)])
+        # Возвращаем снимок
+        return snapshot
+    
+    # Закрытие записи
+    def close(self):
+        # Индекс был открыт
+        if self.index is not None:
+            # Закрываем индекс
+            self.index.close()
+        # Закрываем файл
+        self.data.close()
+
+# Воспроизведение записи для представлений ProcessManager
+# Заменяет сразу и сборщик замеров (sample), и источник событий (wait, pids,
+# drain_short_lived): каждый замер - следующий кадр записи, ожидание не нужно
+class Replay:
+    # Подпись источника событий
+    kind = "запись"
+    
+    # start - время, с которого начать (None - с первого кадра;
+    # время после конца записи - с последнего кадра)
+    def __init__(self, recording: Recording, start: float = None):
+        # Запись
+        self.recording = recording
+        # Номер следующего кадра
+        self.position = 0
+        # Задан момент начала и есть кадры
+        if start is not None and len(recording):
+            # Первый кадр не раньше момента (не дальше последнего)
+            self.position = min(recording.find(start), len(recording) - 1)
+        # Текущий кадр
+        self.snapshot = None
+    
+    # Следующий кадр; после конца записи повторяется последний
+    def sample(self) -> ProcessSnapshot:
+        # Кадры еще есть
+        if self.position < len(self.recording):
+            # Читаем кадр
+            self.snapshot = self.recording.frame(self.position)
+            # Следующий кадр
+            self.position += 1
+        # Кадров нет совсем
+        elif self.snapshot is None:
+            # Пустой снимок
+            self.snapshot = ProcessSnapshot(self.recording.table)
+        # Возвращаем текущий кадр
+        return self.snapshot
+    
+    # Кадры идут подряд без паузы
+    def wait(self, timeout: float):
+        # Ничего не делаем
+        pass
+    
+    # PID текущего кадра
+    def pids(self) -> set:
+        # Множество PID (пустое до первого кадра)
+        return set(self.snapshot.pid) if self.snapshot is not None else set()
+    
+    # Кратковременные процессы в запись не попадают
+    def drain_short_lived(self) -> list:
+        # Пустой список
+        return []
+    
+    # Закрытие воспроизведения
+    def close(self):
+        # Закрываем запись
+        self.recording.close()
+
+# Запись замеров без меню (аналог run_export)
+def run_record(path: str, backend: str = "psutil", interval: float = 1.0,
+               count: int = None, shards: int = 1):
+    # Открываем запись
+    recorder = Recorder(path)
+    # Запись может быть прервана
+    try:
+        # Перебираем замеры
+        for snapshot in sample_stream(make_sampler(backend, shards=shards), interval, count):
+            # Дописываем замер
+            recorder.append(snapshot)
+    # Ctrl+C - штатное завершение
+    except KeyboardInterrupt:
+        # Ничего не делаем
+        pass
+    # В любом случае
+    finally:
+        # Закрываем запись
+        recorder.close()
+
+# Разбор момента начала воспроизведения: секунды с начала эпохи
+# или смещение от начала записи ("+600")
+def parse_replay_start(text: str, recording: Recording) -> float:
+    # Смещение от начала записи
+    if text.startswith("+"):
+        # Время первого кадра плюс смещение
+        return (recording.time(0) if len(recording) else 0.0) + float(text[1:])
+    # Абсолютное время
+    return float(text)
+
+# ---------- Агент и агрегатор ----------
+# Агент отдает замеры по TCP или Unix-сокету в компактном двоичном виде,
+# агрегатор держит соединения с несколькими агентами и собирает общий топ-k
+#
+# Кадр: заголовок FRAME_HEADER и тело (при выгоде сжимается zlib):
+#   число новых имен, число удаленных PID, число строк (3 x uint32)
+#   новые имена: номер в таблице агента (uint32), длина (uint16), байты UTF-8
+#   PID завершившихся процессов: int32 на каждый
+#   строки по колонкам (см. FRAME_COLUMNS)
+# Полный кадр содержит все процессы; разностный - только строки, изменившиеся
+# с прошлого кадра, и PID завершившихся процессов
+# CPU передается в десятых долях процента, RSS - в килобайтах; числа little-endian
+
+# Сигнатура и версия протокола
+FRAME_MAGIC = b"PM"
+# Версия протокола
+FRAME_VERSION = 1
+# Флаги кадра: полный кадр и сжатое тело
+FRAME_FULL = 1
+# Флаг сжатого тела
+FRAME_ZLIB = 2
+# Сигнатура, версия, флаги, номер кадра, время замера, объем памяти узла, длина тела
+FRAME_HEADER = struct.Struct("<2sBBIdQI")
+# Счетчики тела: новые имена, удаленные PID, строки
+FRAME_COUNTS = struct.Struct("<III")
+# Новое имя: номер и длина
+FRAME_NAME = struct.Struct("<IH")
+# Колонки строки в порядке передачи: (имя, тип array)
+FRAME_COLUMNS = (("pid", "i"), ("name_id", "I"), ("cpu", "H"), ("rss", "I"), ("ppid", "i"), ("threads", "I"))
+# Тело меньше этого размера не сжимаем: выигрыш меньше заголовка zlib
+FRAME_COMPRESS_MIN = 256
+# Запрос клиента на внеочередной полный кадр
+REQUEST_FULL = b"F"
+
+# Разбор адреса: "unix:/путь" или "хост:порт"; возвращает (семейство, адрес)
+def parse_address(text: str) -> tuple:
+    # Unix-сокет
+    if text.startswith("unix:"):
+        # Семейство и путь
+        return socket.AF_UNIX, text[len("unix:"):]
+    # Хост и порт
+    host, _, port = text.rpartition(":")
+    # Семейство и адрес (по умолчанию локальный хост)
+    return socket.AF_INET, (host or "127.0.0.1", int(port))
+
+# Колонка для передачи: массив нужного типа в порядке little-endian
+def _pack_column(typecode: str, values) -> bytes:
+    # Массив нужного типа
+    column = array(typecode, values)
+    # Протокол - little-endian
+    if sys.byteorder == "big":
+        # Меняем порядок байт
+        column.byteswap()
+    # Байты колонки
+    return column.tobytes()
+
+# Кодировщик замеров для одного клиента
+# Помнит, что клиент уже получил: строки прошлого кадра и отправленные имена
+class SnapshotEncoder:
+    # full_every - полный кадр после стольких кадров (остальные - разностные)
+    def __init__(self, full_every: int = 60):
+        # Период полных кадров
+        self.full_every = full_every
+        # PID -> строка прошлого кадра (уже в единицах протокола)
+        self.previous = {}
+        # Таблица имен сборщика и сколько ее имен клиент уже получил
+        self.table = None
+        # Имен еще не отправлено
+        self.names_sent = 0
+        # Номер кадра
+        self.seq = 0
+        # Кадров с последнего полного (None - следующий кадр будет полным)
+        self.since_full = None
+    
+    # Следующий кадр будет полным и заново передаст все имена
+    def request_full(self):
+        # Следующий кадр - полный
+        self.since_full = None
+        # Имена отправляются заново
+        self.names_sent = 0
+    
+    # Кадр для снимка; total_memory - объем памяти узла (для Память%)
+    def encode(self, snapshot: ProcessSnapshot, total_memory: int) -> bytes:
+        # Сменилась таблица имен сборщика
+        if snapshot.table is not self.table:
+            # Запоминаем новую таблицу
+            self.table = snapshot.table
+            # Номера имен изменились - нужен полный кадр
+            self.request_full()
+        # Полный кадр - по запросу или по периоду
+        full = self.since_full is None or self.since_full + 1 >= self.full_every
+        # Счетчик кадров с последнего полного
+        self.since_full = 0 if full else self.since_full + 1
+        # Номер кадра
+        self.seq += 1
+        
+        # Значения в единицах протокола; ограничение сверху - по размеру типа
+        cpu = [min(int(value * 10 + 0.5), 0xFFFF) for value in snapshot.cpu]
+        # RSS в килобайтах
+        rss = [min(value >> 10, 0xFFFFFFFF) for value in snapshot.rss]
+        # Строки кадра
+        rows = list(zip(snapshot.pid, snapshot.name_id, cpu, rss, snapshot.ppid, snapshot.threads))
+        # PID -> строка
+        current = {row[0]: row for row in rows}
+        # Полный кадр
+        if full:
+            # Передаем все строки
+            changed = rows
+            # Удаленных нет
+            removed = []
+        # Разностный кадр
+        else:
+            # Строки прошлого кадра
+            previous = self.previous
+            # Новые и изменившиеся строки
+            changed = [row for row in rows if previous.get(row[0]) != row]
+            # PID, которых больше нет
+            removed = [pid for pid in previous if pid not in current]
+        # Запоминаем текущие строки
+        self.previous = current
+        
+        # Таблица имен
+        names = self.table.names
+        # Имена, которых клиент еще не получил
+        new_names = range(self.names_sent, len(names))
+        # Отмечаем их отправленными
+        self.names_sent = len(names)
+        
+        # Счетчики тела
+        parts = [FRAME_COUNTS.pack(len(new_names), len(removed), len(changed))]
+        # Перебираем новые имена
+        for name_id in new_names:
+            # Байты имени (не длиннее 65535)
+            raw = names[name_id].encode("utf-8", "replace")[:0xFFFF]
+            # Номер и длина имени
+            parts.append(FRAME_NAME.pack(name_id, len(raw)))
+            # Байты имени
+            parts.append(raw)
+        # PID завершившихся процессов
+        parts.append(_pack_column("i", removed))
+        # Колонки строк
+        columns = list(zip(*changed)) if changed else [()] * len(FRAME_COLUMNS)
+        # Перебираем колонки
+        for (_, typecode), values in zip(FRAME_COLUMNS, columns):
+            # Байты колонки
+            parts.append(_pack_column(typecode, values))
+        # Тело кадра
+        payload = b"".join(parts)
+        
+        # Флаги кадра
+        flags = FRAME_FULL if full else 0
+        # Тело достаточно большое
+        if len(payload) >= FRAME_COMPRESS_MIN:
+            # Быстрое сжатие
+            packed = zlib.compress(payload, 1)
+            # Сжатие дало выигрыш
+            if len(packed) < len(payload):
+                # Передаем сжатое тело
+                payload = packed
+                # Отмечаем сжатие
+                flags |= FRAME_ZLIB
+        # Заголовок кадра
+        header = FRAME_HEADER.pack(FRAME_MAGIC, FRAME_VERSION, flags, self.seq,
+                                   snapshot.timestamp, total_memory, len(payload))
+        # Кадр целиком
+        return header + payload
+
+# Выделение целых кадров из накопленных байтов; разобранные байты удаляются из buffer
+# Возвращает список кортежей (флаги, номер, время, объем памяти, тело)
+def split_frames(buffer: bytearray) -> list:
+    # Разобранные кадры
+    frames = []
+    # Начало очередного кадра
+    offset = 0
+    # Пока в буфере есть заголовок
+    while len(buffer) - offset >= FRAME_HEADER.size:
+        # Разбираем заголовок
+        magic, version, flags, seq, timestamp, total_memory, length = FRAME_HEADER.unpack_from(buffer, offset)
+        # Сигнатура или версия не совпали
+        if magic != FRAME_MAGIC or version != FRAME_VERSION:
+            # Ошибка протокола
+            raise ValueError("Неизвестный формат кадра")
+        # Конец кадра
+        end = offset + FRAME_HEADER.size + length
+        # Тело еще не пришло целиком
+        if end > len(buffer):
+            # Ждем остальные байты
+            break
+        # Запоминаем кадр
+        frames.append((flags, seq, timestamp, total_memory, bytes(buffer[offset + FRAME_HEADER.size:end])))
+        # Следующий кадр
+        offset = end
+    # Удаляем разобранные байты
+    del buffer[:offset]
+    # Возвращаем кадры
+    return frames
+
+# Декодировщик кадров одного агента: хранит текущую таблицу процессов узла
+class SnapshotDecoder:
+    # Конструктор класса
+    def __init__(self):
+        # Номер имени у агента -> имя
+        self.names = {}
+        # PID -> (имя, CPU в десятых процента, RSS в КБ, PPID, потоки)
+        self.rows = {}
+        # Номер последнего примененного кадра (None - полного кадра еще не было)
+        self.seq = None
+        # Время замера
+        self.timestamp = 0.0
+        # Объем памяти узла
+        self.total_memory = 1
+        # Таблица имен для снимков этого узла
+        self.table = NameTable()
+    
+    # Применение кадра; False - пропущен кадр и нужен полный (разностный кадр не применен)
+    def apply(self, flags: int, seq: int, timestamp: float, total_memory: int, payload: bytes) -> bool:
+        # Полный кадр
+        full = flags & FRAME_FULL
+        # Разностный кадр не следует за последним примененным
+        if not full and (self.seq is None or seq != self.seq + 1):
+            # Пропуск - нужен полный кадр
+            return False
+        # Тело сжато
+        if flags & FRAME_ZLIB:
+            # Распаковываем
+            payload = zlib.decompress(payload)
+        
+        # Счетчики тела
+        name_count, removed_count, row_count = FRAME_COUNTS.unpack_from(payload)
+        # Начало данных
+        offset = FRAME_COUNTS.size
+        # Перебираем новые имена
+        for _ in range(name_count):
+            # Номер и длина имени
+            name_id, length = FRAME_NAME.unpack_from(payload, offset)
+            # Начало байтов имени
+            offset += FRAME_NAME.size
+            # Запоминаем имя
+            self.names[name_id] = payload[offset:offset + length].decode("utf-8", "replace")
+            # Следующее имя
+            offset += length
+        
+        # Колонки читаются целиком через array.frombytes()
+        def column(typecode: str, count: int) -> array:
+            # Смещение общее с внешней функцией
+            nonlocal offset
+            # Пустой массив
+            values = array(typecode)
+            # Читаем байты
+            values.frombytes(payload[offset:offset + count * values.itemsize])
+            # Протокол - little-endian
+            if sys.byteorder == "big":
+                # Меняем порядок байт
+                values.byteswap()
+            # Сдвигаем смещение
+            offset += count * values.itemsize
+            # Возвращаем колонку
+            return values
+        
+        # PID завершившихся процессов
+        removed = column("i", removed_count)
+        # Колонки строк
+        pids, name_ids, cpu, rss, ppid, threads = [column(typecode, row_count) for _, typecode in FRAME_COLUMNS]
+        
+        # Таблица процессов узла
+        rows = self.rows
+        # Полный кадр
+        if full:
+            # Заменяет таблицу целиком
+            rows.clear()
+        # Перебираем завершившиеся процессы
+        for pid in removed:
+            # Удаляем их строки
+            rows.pop(pid, None)
+        # Имена узла
+        names = self.names
+        # Перебираем строки кадра
+        for pid, name_id, *values in zip(pids, name_ids, cpu, rss, ppid, threads):
+            # Запоминаем строку с именем
+            rows[pid] = (names.get(name_id, "?"), *values)
+        
+        # Номер последнего кадра
+        self.seq = seq
+        # Время замера
+        self.timestamp = timestamp
+        # Объем памяти узла
+        self.total_memory = total_memory or 1
+        # Кадр применен
+        return True
+    
+    # Колоночный снимок текущей таблицы узла
+    def snapshot(self) -> ProcessSnapshot:
+        # Пустой снимок с таблицей имен узла
+        snapshot = ProcessSnapshot(self.table)
+        # Время замера
+        snapshot.timestamp = self.timestamp
+        # Объем памяти узла
+        total_memory = self.total_memory
+        # Перебираем строки таблицы
+        for pid, (name, cpu, rss_kb, ppid, threads) in self.rows.items():
+            # RSS в байтах
+            rss = rss_kb << 10
+            # Добавляем строку
+            snapshot.append(pid, name, cpu / 10, rss / total_memory * 100, rss, ppid, threads)
+        # Возвращаем снимок
+        return snapshot
+
+# Агент: делает замеры по расписанию и рассылает кадры подключенным клиентам
+# Работает в одном потоке: между замерами select() ждет новых клиентов и запросов
+class Agent:
+    # Клиент, который не принимает данные столько секунд, отключается
+    SEND_TIMEOUT = 2.0
+    
+    # address - "хост:порт" или "unix:/путь"; sampler - сборщик (см. make_sampler)
+    # observe - функция, которая получает каждый замер (например, LeakReporter.update)
+    def __init__(self, address: str, sampler, interval: float = 1.0, full_every: int = 60, observe=None):
+        # Семейство и адрес сокета
+        self.family, self.address = parse_address(address)
+        # Сборщик замеров
+        self.sampler = sampler
+        # Получатель замеров
+        self.observe = observe
+        # Интервал замеров
+        self.interval = interval
+        # Период полных кадров
+        self.full_every = full_every
+        # Сокет клиента -> его кодировщик
+        self.clients = {}
+        # Счетчики отправленных кадров и байтов
+        self.frames_sent = 0
+        # Байтов отправлено
+        self.bytes_sent = 0
+        
+        # Слушающий сокет
+        self.server = socket.socket(self.family, socket.SOCK_STREAM)
+        # Unix-сокет
+        if self.family == socket.AF_UNIX:
+            # Файл сокета от прошлого запуска мешает bind()
+            if os.path.exists(self.address):
+                # Удаляем файл
+                os.unlink(self.address)
+        # TCP
+        else:
+            # Разрешаем повторное использование адреса
+            self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        # Привязываем адрес
+        self.server.bind(self.address)
+        # Начинаем принимать подключения
+        self.server.listen()
+    
+    # Новый клиент; первым он получит полный кадр
+    def _accept(self):
+        # Клиент мог уже отключиться
+        try:
+            # Принимаем подключение
+            sock, _ = self.server.accept()
+        # Ошибка подключения
+        except OSError:
+            # Пропускаем
+            return
+        # Ограничиваем время отправки
+        sock.settimeout(self.SEND_TIMEOUT)
+        # TCP-клиент
+        if self.family == socket.AF_INET:
+            # Кадры небольшие - отправляем без задержки алгоритма Нейгла
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        # Новый кодировщик клиента
+        self.clients[sock] = SnapshotEncoder(self.full_every)
+    
+    # Отключение клиента
+    def _drop(self, sock):
+        # Удаляем кодировщик
+        self.clients.pop(sock, None)
+        # Закрываем сокет
+        sock.close()
+    
+    # Данные от клиента: запрос полного кадра или закрытие соединения
+    def _control(self, sock):
+        # Соединение может оборваться
+        try:
+            # Читаем данные клиента
+            data = sock.recv(64)
+        # Ошибка соединения
+        except OSError:
+            # Считаем закрытием
+            data = b""
+        # Клиент закрыл соединение
+        if not data:
+            # Отключаем его
+            self._drop(sock)
+        # Запрос полного кадра
+        elif REQUEST_FULL in data:
+            # Следующий кадр клиента будет полным
+            self.clients[sock].request_full()
+    
+    # Рассылка кадра по снимку всем клиентам
+    def _broadcast(self, snapshot: ProcessSnapshot):
+        # Объем памяти узла
+        total_memory = psutil.virtual_memory().total
+        # Перебираем клиентов (список может измениться)
+        for sock, encoder in list(self.clients.items()):
+            # Кадр для клиента
+            frame = encoder.encode(snapshot, total_memory)
+            # Отправка может не удаться
+            try:
+                # Отправляем кадр целиком
+                sock.sendall(frame)
+            # Ошибка отправки
+            except OSError:
+                # Клиент отключился или не успевает принимать
+                self._drop(sock)
+                # Переходим к следующему клиенту
+                continue
+            # Считаем кадр
+            self.frames_sent += 1
+            # Считаем байты
+            self.bytes_sent += len(frame)
+    
+    # Основной цикл; ticks=None - до Ctrl+C
+    def serve(self, ticks: int = None):
+        # Время первого замера - сразу
+        next_tick = time.monotonic()
+        # Счетчик замеров
+        tick = 0
+        # Соединения закрываются в любом случае
+        try:
+            # Пока замеры не закончились
+            while ticks is None or tick < ticks:
+                # Время до следующего замера
+                timeout = next_tick - time.monotonic()
+                # Время еще не пришло
+                if timeout > 0:
+                    # Ждем подключений и запросов клиентов
+                    readable, _, _ = select.select([self.server, *self.clients], [], [], timeout)
+                    # Перебираем готовые сокеты
+                    for sock in readable:
+                        # Новое подключение
+                        if sock is self.server:
+                            # Принимаем клиента
+                            self._accept()
+                        # Данные от клиента
+                        else:
+                            # Обрабатываем запрос
+                            self._control(sock)
+                    # Проверяем время снова
+                    continue
+                # Замер делается и без клиентов: он служит точкой отсчета для CPU%
+                snapshot = self.sampler.sample()
+                # Получатель задан
+                if self.observe is not None:
+                    # Передаем ему замер
+                    self.observe(snapshot)
+                # Рассылаем замер
+                self._broadcast(snapshot)
+                # Считаем замер
+                tick += 1
+                # Время следующего замера (без серии замеров подряд после задержки)
+                next_tick = max(next_tick + self.interval, time.monotonic())
+        # В любом случае
+        finally:
+            # Закрываем соединения
+            self.close()
+    
+    # Закрытие всех соединений и удаление файла Unix-сокета
+    def close(self):
+        # Перебираем клиентов
+        for sock in list(self.clients):
+            # Отключаем клиента
+            self._drop(sock)
+        # Закрываем слушающий сокет
+        self.server.close()
+        # Unix-сокет оставил файл
+        if self.family == socket.AF_UNIX and os.path.exists(self.address):
+            # Удаляем файл
+            os.unlink(self.address)
+
+# Постоянное соединение агрегатора с одним агентом
+# При обрыве соединение восстанавливается не чаще раза в RETRY секунд
+class AgentConnection:
+    # Пауза между попытками подключения
+    RETRY = 2.0
+    
+    # Конструктор принимает адрес агента ("хост:порт" или "unix:/путь")
+    def __init__(self, address: str):
+        # Адрес агента
+        self.address = address
+        # Соединения еще нет
+        self.sock = None
+        # Принятые, но еще не разобранные байты
+        self.buffer = bytearray()
+        # Декодировщик кадров агента
+        self.decoder = SnapshotDecoder()
+        # Время следующей попытки подключения (монотонные часы)
+        self.retry_at = 0.0
+        # Счетчики принятых байтов и кадров
+        self.bytes_received = 0
+        # Кадров принято
+        self.frames_received = 0
+    
+    # Подключение, если его нет и пора повторить попытку; True - соединение есть
+    def connect(self) -> bool:
+        # Соединение уже есть
+        if self.sock is not None:
+            # Подключаться не нужно
+            return True
+        # Время повторной попытки еще не пришло
+        if time.monotonic() < self.retry_at:
+            # Соединения нет
+            return False
+        # Семейство и адрес агента
+        family, address = parse_address(self.address)
+        # Новый сокет
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        # Ограничиваем время подключения
+        sock.settimeout(self.RETRY)
+        # Агент может быть недоступен
+        try:
+            # Подключаемся
+            sock.connect(address)
+        # Ошибка подключения
+        except OSError:
+            # Закрываем сокет
+            sock.close()
+            # Следующая попытка - через RETRY секунд
+            self.retry_at = time.monotonic() + self.RETRY
+            # Соединения нет
+            return False
+        # Запоминаем сокет
+        self.sock = sock
+        # Новое соединение начинается с полного кадра и новой таблицы имен
+        self.buffer.clear()
+        # Новый декодировщик
+        self.decoder = SnapshotDecoder()
+        # Соединение есть
+        return True
+    
+    # Закрытие соединения; следующая попытка - через RETRY секунд
+    # Таблица отключившегося агента сбрасывается: его устаревшие строки
+    # не должны попадать в общий топ
+    def close(self):
+        # Соединение было
+        if self.sock is not None:
+            # Закрываем сокет
+            self.sock.close()
+            # Соединения больше нет
+            self.sock = None
+        # Сбрасываем таблицу агента
+        self.decoder = SnapshotDecoder()
+        # Время следующей попытки
+        self.retry_at = time.monotonic() + self.RETRY
+    
+    # Прием доступных данных и применение целых кадров
+    def receive(self):
+        # Соединение может оборваться
+        try:
+            # Читаем доступные байты
+            data = self.sock.recv(1 << 16)
+        # Ошибка соединения
+        except OSError:
+            # Считаем закрытием
+            data = b""
+        # Агент закрыл соединение
+        if not data:
+            # Закрываем соединение
+            self.close()
+            # Выходим
+            return
+        # Считаем байты
+        self.bytes_received += len(data)
+        # Добавляем в буфер
+        self.buffer += data
+        # Поток может быть поврежден
+        try:
+            # Перебираем целые кадры
+            for frame in split_frames(self.buffer):
+                # Считаем кадр
+                self.frames_received += 1
+                # Кадр не применен
+                if not self.decoder.apply(*frame):
+                    # Разностный кадр не к чему применить - просим полный
+                    self.sock.sendall(REQUEST_FULL)
+        # Ошибка разбора или отправки
+        except (ValueError, struct.error, zlib.error, OSError):
+            # Поврежденный поток или обрыв - переподключимся
+            self.close()
+
+# Агрегатор: соединения с агентами и общий топ-k по всем узлам
+class Aggregator:
+    # Конструктор принимает список адресов агентов
+    def __init__(self, addresses: Iterable[str]):
+        # Соединение на каждый адрес
+        self.connections = [AgentConnection(address) for address in addresses]
+    
+    # Прием кадров от всех агентов в течение timeout секунд
+    def poll(self, timeout: float):
+        # Время окончания приема
+        deadline = time.monotonic() + timeout
+        # Принимаем до окончания времени
+        while True:
+            # Перебираем соединения
+            for connection in self.connections:
+                # Подключаемся при необходимости
+                connection.connect()
+            # Сокет -> соединение для подключенных агентов
+            live = {connection.sock: connection for connection in self.connections if connection.sock}
+            # Оставшееся время
+            remaining = deadline - time.monotonic()
+            # Время вышло
+            if remaining <= 0:
+                # Выходим
+                return
+            # Нет подключенных агентов
+            if not live:
+                # Ни одного агента: ждем до следующей попытки подключения
+                time.sleep(min(remaining, AgentConnection.RETRY))
+                # Проверяем снова
+                continue
+            # Ждем данных от агентов
+            readable, _, _ = select.select(list(live), [], [], min(remaining, AgentConnection.RETRY))
+            # Перебираем готовые сокеты
+            for sock in readable:
+                # Принимаем данные
+                live[sock].receive()
+    
+    # Общий топ-k: каждый узел дает свои k лучших строк, из них выбираются k лучших
+    # Возвращает список (адрес агента, ProcessInfo)
+    def top(self, k: int, key: str = "cpu") -> List[tuple]:
+        # Строки-кандидаты со всех узлов
+        candidates = []
+        # Перебираем соединения
+        for connection in self.connections:
+            # Учитываются только подключенные агенты с принятым полным кадром
+            if connection.sock is None or connection.decoder.seq is None:
+                # Пропускаем
+                continue
+            # Снимок таблицы узла
+            snapshot = connection.decoder.snapshot()
+            # Колонка ключа
+            values = snapshot.column(key)
+            # k лучших строк узла
+            for i in snapshot.top(k, key):
+                # Значение ключа, адрес и строка
+                candidates.append((values[i], connection.address, snapshot.view(i)))
+        # k лучших из всех кандидатов
+        best = heapq.nlargest(k, candidates, key=lambda item: item[0])
+        # Адрес и строка
+        return [(address, view) for _, address, view in best]
+
+# Запуск агента из командной строки
+def run_agent(address: str, backend: str = "psutil", interval: float = 1.0,
+              count: int = None, shards: int = 1):
+    # Агент со сборщиком выбранного типа; подозрения на утечки пишутся в stderr
+    agent = Agent(address, make_sampler(backend, shards=shards), interval, observe=LeakReporter().update)
+    # Сообщение о запуске
+    print(f"Агент слушает {address}", file=sys.stderr)
+    # Работа до Ctrl+C
+    try:
+        # Основной цикл
+        agent.serve(count)
+    # Ctrl+C - штатное завершение
+    except KeyboardInterrupt:
+        # Ничего не делаем
+        pass
+
+# Запуск агрегатора: каждые interval секунд выводит общий топ-k по узлам
+def run_aggregator(addresses: List[str], interval: float = 1.0, count: int = None, k: int = 10):
+    # Агрегатор
+    aggregator = Aggregator(addresses)
+    # Счетчик тиков
+    tick = 0
+    # Работа до Ctrl+C
+    try:
+        # Пока тики не закончились
+        while count is None or tick < count:
+            # Принимаем кадры в течение интервала
+            aggregator.poll(interval)
+            # Следующий тик
+            tick += 1
+            # Заголовок таблицы
+            print(f"\n{'Узел':<22} {'PID':<8} {'Имя':<20} {'CPU%':<8} {'Память%':<10}")
+            # Разделитель
+            print("-" * 70)
+            # Перебираем строки общего топа
+            for address, proc in aggregator.top(k):
+                # Строка таблицы
+                print(f"{address[:22]:<22} {proc.pid:<8} {proc.name[:20]:<20} "
+                      f"{proc.cpu_percent:<8.1f} {proc.memory_percent:<10.2f}")
+            # Состояние соединений и средний объем кадра (трафик на узел за тик)
+            for connection in aggregator.connections:
+                # Состояние соединения
+                state = "подключен" if connection.sock else "нет связи"
+                # Средний объем кадра
+                average = connection.bytes_received / connection.frames_received if connection.frames_received else 0
+                # Строка состояния
+                print(f"{connection.address}: {state}, процессов {len(connection.decoder.rows)}, "
+                      f"в среднем {average / 1024:.1f} КБ за кадр")
+    # Ctrl+C - штатное завершение
+    except KeyboardInterrupt:
+        # Ничего не делаем
+        pass
+
+# ---------- Системные метрики ----------
+# Загрузка ядер CPU, средняя нагрузка, память и swap, диски и сеть
+# Все счетчики читаются за один проход на тик (SystemSampler.sample), скорости
+# считаются по разнице с прошлым проходом - без блокирующих вызовов с interval=
+
+# Системные метрики одного тика; скорости - в байтах в секунду
+# (на первом тике скоростей и загрузки CPU еще нет - там нули)
+@dataclass
+class SystemMetrics:
+    # Время замера
+    timestamp: float
+    # Загрузка каждого ядра в процентах
+    cores: List[float]
+    # Средняя нагрузка за 1, 5 и 15 минут
+    load: tuple
+    # Использование памяти в процентах
+    memory_percent: float
+    # Используемая память, байты
+    memory_used: int
+    # Объем памяти, байты
+    memory_total: int
+    # Использование swap в процентах
+    swap_percent: float
+    # Используемый swap, байты
+    swap_used: int
+    # Скорость чтения с дисков
+    disk_read: float
+    # Скорость записи на диски
+    disk_write: float
+    # Скорость приема по сети
+    net_recv: float
+    # Скорость отправки по сети
+    net_sent: float
+    # Путь -> заполнение файловой системы в процентах
+    disks: dict
+    
+    # Средняя загрузка CPU по всем ядрам
+    @property
+    def cpu_percent(self) -> float:
+        # Среднее по ядрам (0, если ядер нет)
+        return sum(self.cores) / len(self.cores) if self.cores else 0.0
+
+# Сборщик системных метрик
+# Хранит счетчики прошлого прохода; заполнение дисков меняется медленно
+# и читается раз в usage_every проходов (statvfs на каждый путь)
+class SystemSampler:
+    # Пути для заполнения дисков
+    def __init__(self, disk_paths=("/",), usage_every: int = 10):
+        # Период чтения заполнения дисков
+        self.disk_paths = disk_paths
+        self.usage_every = usage_every
+        # Счетчики прошлого прохода: время, времена CPU по ядрам, диски, сеть
+        self.last = None
+        # Заполнение дисков и число проходов с его чтения
+        self.disks = {}
+        # Заполнение читается на первом проходе
+        self.since_usage = usage_every
+    
+    # Загрузка ядра по разнице времен CPU: доля времени не в простое
+    # (guest уже входит в user, поэтому из суммы исключается, как в psutil)
+    @staticmethod
+    def _busy(previous, current) -> float:
+        # Общее и занятое время ядра
+        def split(times):
+            # Сумма без guest
+            total = sum(times) - getattr(times, "guest", 0.0) - getattr(times, "guest_nice", 0.0)
+            # Простой и ожидание ввода-вывода
+            idle = times.idle + getattr(times, "iowait", 0.0)
+            # Общее и занятое время
+            return total, total - idle
+        # Разница с прошлым проходом
+        total, busy = map(operator.sub, split(current), split(previous))
+        # Доля занятого времени в процентах
+        return min(100.0, max(0.0, busy / total * 100)) if total > 0 else 0.0
+    
+    # Один проход по всем системным счетчикам
+    def sample(self) -> SystemMetrics:
+        # Время прохода
+        now = time.monotonic()
+        # Времена CPU по ядрам
+        cpu = psutil.cpu_times(percpu=True)
+        # Счетчики дисков
+        disk = psutil.disk_io_counters()
+        # Счетчики сети
+        net = psutil.net_io_counters()
+        # Память
+        memory = psutil.virtual_memory()
+        # Swap
+        swap = psutil.swap_memory()
+        # Средняя нагрузка (есть не на всех ОС)
+        load = os.getloadavg() if hasattr(os, "getloadavg") else (0.0, 0.0, 0.0)
+        
+        # Считаем проход
+        self.since_usage += 1
+        # Пора обновить заполнение дисков
+        if self.since_usage >= self.usage_every:
+            # Сбрасываем счетчик
+            self.since_usage = 0
+            # Перебираем пути
+            for path in self.disk_paths:
+                # Путь может быть недоступен
+                try:
+                    # Заполнение файловой системы
+                    self.disks[path] = psutil.disk_usage(path).percent
+                # Путь недоступен
+                except OSError:
+                    # Убираем путь
+                    self.disks.pop(path, None)
+        
+        # Загрузка ядер (нули на первом проходе)
+        cores = [0.0] * len(cpu)
+        # Скорости дисков и сети
+        rates = [0.0] * 4
+        # Есть прошлый проход
+        if self.last is not None:
+            # Прошедшее время
+            elapsed = now - self.last[0]
+            # Счетчики прошлого прохода
+            _, last_cpu, last_disk, last_net = self.last
+            # Загрузка каждого ядра
+            cores = list(map(self._busy, last_cpu, cpu))
+            # Счетчики дисков и сети могут отсутствовать (контейнер без устройств)
+            if elapsed > 0 and disk is not None and last_disk is not None:
+                # Скорость чтения
+                rates[0] = (disk.read_bytes - last_disk.read_bytes) / elapsed
+                # Скорость записи
+                rates[1] = (disk.write_bytes - last_disk.write_bytes) / elapsed
+            # Счетчики сети есть в обоих проходах
+            if elapsed > 0 and net is not None and last_net is not None:
+                # Скорость приема
+                rates[2] = (net.bytes_recv - last_net.bytes_recv) / elapsed
+                # Скорость отправки
+                rates[3] = (net.bytes_sent - last_net.bytes_sent) / elapsed
+        # Запоминаем счетчики прохода
+        self.last = (now, cpu, disk, net)
+        
+        # Метрики тика
+        return SystemMetrics(time.time(), cores, tuple(load), memory.percent, memory.used, memory.total,
+                             swap.percent, swap.used, *rates, dict(self.disks))
+
+# Скорость в байтах в секунду в удобных единицах
+def format_rate(value: float) -> str:
+    # Перебираем единицы
+    for unit in ("B/s", "KB/s", "MB/s"):
+        # Значение меньше следующей единицы
+        if abs(value) < 1024:
+            # Выводим в текущей
+            return f"{value:.1f} {unit}"
+        # Переходим к следующей единице
+        value /= 1024
+    # Гигабайты
+    return f"{value:.1f} GB/s"
+
+# Строки панели системных метрик (для построчного вывода мониторинга)
+def format_system(metrics: SystemMetrics) -> List[str]:
+    # Байт в гигабайте
+    gb = 1024 ** 3
+    # Загрузка ядер
+    cores = " ".join(f"{value:.0f}" for value in metrics.cores)
+    # Заполнение дисков
+    disks = ", ".join(f"{path} {percent:.0f}%" for path, percent in metrics.disks.items())
+    # Строки: CPU, память, диски и сеть
+    return [
+        f"CPU {metrics.cpu_percent:5.1f}%  ядра: {cores}  нагрузка: "
+        + " ".join(f"{value:.2f}" for value in metrics.load),
+        f"Память {metrics.memory_percent:.1f}% ({metrics.memory_used / gb:.1f}/{metrics.memory_total / gb:.1f} GB)"
+        f"  swap {metrics.swap_percent:.1f}% ({metrics.swap_used / gb:.1f} GB)",
+        f"Диск: чтение {format_rate(metrics.disk_read)}, запись {format_rate(metrics.disk_write)}"
+        + (f", заполнение {disks}" if disks else "")
+        + f"  Сеть: прием {format_rate(metrics.net_recv)}, передача {format_rate(metrics.net_sent)}",
+    ]
+
+# ---------- Правила и оповещения ----------
+# Декларативные правила вида "cpu > 90 for 30s" или
+# "rss growth > 50MB/min by name=worker* do terminate"
+# Правило разбирается один раз; на каждом снимке условие проверяется целой
+# колонкой через map() и compress() на уровне C, а состояние хранится только
+# для процессов, у которых условие выполнено (обычно их единицы)
+#
+# Синтаксис: <метрика> <оператор> <значение>[единица] [for <длительность>]
+#            [by name=<шаблон>] [do log|export|terminate]
+#   метрики: cpu, memory (проценты), rss (B, KB, MB, GB), threads,
+#            rss growth (скорость роста RSS: MB/s, MB/min, MB/h и т.п.)
+#   длительность: 30s, 5m, 1h; шаблон имени - как в оболочке (*, ?)
+
+RULE_PATTERN = re.compile(
+    r"^\s*(?P<metric>cpu|memory|rss\s+growth|rss|threads)\s*(?P<op>>=|<=|>|<)\s*"
+    r"(?P<value>\d+(?:\.\d+)?)\s*(?P<unit>[A-Za-z%/]*)"
+    r"(?:\s+for\s+(?P<duration>\d+(?:\.\d+)?)\s*(?P<duration_unit>[smh]))?"
+    r"(?:\s+by\s+name=(?P<name>\S+))?"
+    r"(?:\s+do\s+(?P<action>log|export|terminate))?\s*$")
+
+# Метрика правила -> колонка, по которой она проверяется
+RULE_COLUMNS = {"cpu": "cpu", "memory": "memory", "rss": "rss", "threads": "threads", "rss growth": "rss_growth"}
+# Оператор правила -> функция для partial(функция, порог)(значение):
+# partial(operator.lt, 90)(value) - это 90 < value, то есть value > 90
+RULE_OPERATORS = {">": operator.lt, ">=": operator.le, "<": operator.gt, "<=": operator.ge}
+# Единицы размера -> байты
+SIZE_UNITS = {"": 1, "b": 1, "kb": 1024, "mb": 1024 ** 2, "gb": 1024 ** 3}
+# Единицы времени -> секунды
+TIME_UNITS = {"s": 1, "sec": 1, "m": 60, "min": 60, "h": 3600}
+
+# Правило: разобранное выражение и состояние по процессам
+class Rule:
+    # hysteresis - доля порога: сработавшее правило сбрасывается, только когда
+    # значение отойдет от порога на эту долю (например, cpu > 90 - при cpu <= 81)
+    def __init__(self, text: str, hysteresis: float = 0.1):
+        # Разбираем выражение
+        match = RULE_PATTERN.match(text)
+        # Не разобралось
+        if match is None:
+            # Ошибка правила
+            raise ValueError(f"Неверное правило: {text}")
+        # Текст правила
+        self.text = text.strip()
+        # Метрика (пробелы нормализуются)
+        self.metric = " ".join(match.group("metric").split())
+        # Колонка метрики
+        self.column = RULE_COLUMNS[self.metric]
+        # Порог в базовых единицах
+        self.threshold = float(match.group("value")) * self._unit(match.group("unit").lower(), text)
+        # Отступ гистерезиса
+        margin = abs(self.threshold) * hysteresis
+        # Условие срабатывания и более мягкое условие удержания (гистерезис)
+        compare = RULE_OPERATORS[match.group("op")]
+        # Порог удержания: отступаем от порога в сторону сброса
+        clear = self.threshold - margin if match.group("op") in (">", ">=") else self.threshold + margin
+        # Условие срабатывания
+        self.trigger = partial(compare, self.threshold)
+        # Условие удержания
+        self.hold = partial(compare, clear)
+        # Длительность в секундах
+        self.duration = float(match.group("duration") or 0) * TIME_UNITS.get(match.group("duration_unit") or "s")
+        # Шаблон имени
+        name = match.group("name")
+        # Регулярное выражение шаблона
+        self.pattern = re.compile(fnmatch.translate(name)) if name else None
+        # Действие (по умолчанию - журнал)
+        self.action = match.group("action") or "log"
+        # (PID, время запуска) -> время, с которого условие выполняется
+        self.since = {}
+        # (PID, время запуска) -> имя процесса, для которого правило сработало
+        self.active = {}
+    
+    # Множитель единицы значения: байты для rss, байты в секунду для rss growth
+    def _unit(self, unit: str, text: str) -> float:
+        # Безразмерные метрики
+        if self.column in ("cpu", "memory", "threads"):
+            # Допускается только %
+            if unit not in ("", "%"):
+                # Ошибка единицы
+                raise ValueError(f"Неверная единица в правиле: {text}")
+            # Множитель 1
+            return 1
+        # Размер и единица времени
+        size, _, per = unit.partition("/")
+        # Неизвестный размер или скорость не у той метрики
+        if size not in SIZE_UNITS or (self.column == "rss_growth") != bool(per):
+            # Ошибка единицы
+            raise ValueError(f"Неверная единица в правиле: {text}")
+        # Неизвестная единица времени
+        if per and per not in TIME_UNITS:
+            # Ошибка единицы
+            raise ValueError(f"Неверная единица в правиле: {text}")
+        # Множитель размера (на единицу времени)
+        return SIZE_UNITS[size] / TIME_UNITS[per] if per else SIZE_UNITS[size]
+    
+    # Проверка правила на снимке; возвращает события ("fired" или "cleared", ключ, строка)
+    # names_match - функция номер строки -> подходит ли имя (только при шаблоне имени)
+    # locate - функция без аргументов, возвращающая словарь ключ -> номер строки
+    # Полный проход по колонке один (условие срабатывания, на уровне C);
+    # остальная работа пропорциональна числу подходящих и отслеживаемых процессов
+    def evaluate(self, ts: float, keys: list, column, names_match, locate) -> list:
+        # Строки, где выполнено условие срабатывания
+        rows = compress(range(len(keys)), map(self.trigger, column))
+        # Задан шаблон имени
+        if self.pattern is not None:
+            # Оставляем подходящие имена
+            rows = filter(names_match, rows)
+        # Ключ -> строка сработавших процессов
+        triggered = {keys[i]: i for i in rows}
+        # События
+        events = []
+        
+        # Отслеживаемые процессы остаются, пока выполнено условие удержания;
+        # вышедшие из-под условия срабатывания проверяются по своей строке
+        dropped = self.since.keys() - triggered.keys()
+        # Есть такие процессы
+        if dropped:
+            # Ключ -> номер строки
+            position = locate()
+            # Условие удержания
+            hold = self.hold
+            # Перебираем выпавшие процессы
+            for key in dropped:
+                # Строка процесса
+                i = position.get(key)
+                # Процесс жив и условие удержания выполнено
+                if i is not None and hold(column[i]):
+                    # Продолжаем отслеживать
+                    continue
+                # Перестаем отслеживать
+                del self.since[key]
+                # Правило сработало для процесса
+                if key in self.active:
+                    # Сброс
+                    events.append(("cleared", key, None))
+        
+        # Перебираем сработавшие процессы
+        for key, i in triggered.items():
+            # Время начала выполнения условия
+            since = self.since.setdefault(key, ts)
+            # Еще не сработало и условие держится достаточно долго
+            if key not in self.active and ts - since >= self.duration:
+                # Срабатывание
+                events.append(("fired", key, i))
+        # Возвращаем события
+        return events
+
+# Набор правил: вычисление на каждом снимке и выполнение действий
+# log - строка в журнал (по умолчанию stderr), export - строка NDJSON в файл,
+# terminate - завершение процесса через ProcessTerminator (только если PID
+# по-прежнему принадлежит тому же процессу)
+class RuleEngine:
+    # Набор правил
+    def __init__(self, rules: Iterable[str], hysteresis: float = 0.1, log=None, export_path: str = None):
+        # Разбираем правила
+        self.rules = [Rule(text, hysteresis) for text in rules]
+        # Журнал
+        self.log = log if log is not None else sys.stderr
+        # Файл экспорта событий
+        self.export = open(export_path, "a", encoding="utf-8") if export_path else None
+        # Рост RSS нужен, только если его проверяет хотя бы одно правило
+        self.need_growth = any(rule.column == "rss_growth" for rule in self.rules)
+        # Прошлый снимок для роста RSS: ключи строк, колонка RSS, время
+        self.previous = None
+        # Совпадение шаблонов имен по номеру имени: правило -> {номер имени: bool}
+        self.name_cache = {}
+        # Таблица имен, для которой построен кэш
+        self.table = None
+    
+    # Скорость роста RSS каждого процесса с прошлого снимка (байт в секунду)
+    # При том же наборе строк вычисляется целыми колонками; иначе прошлые
+    # значения выравниваются по ключам, как в DeltaTracker
+    def _growth(self, snapshot: ProcessSnapshot, keys: list) -> list:
+        # Прошлый снимок
+        previous = self.previous
+        # Запоминаем текущий
+        self.previous = (keys, snapshot.rss, snapshot.timestamp)
+        # Прошлого снимка нет или время не изменилось
+        if previous is None or snapshot.timestamp <= previous[2]:
+            # Роста нет
+            return [0] * len(keys)
+        # Ключи, RSS и время прошлого снимка
+        old_keys, old_rss, old_ts = previous
+        # Набор строк изменился
+        if keys != old_keys:
+            # Ключ -> строка прошлого снимка
+            position = dict(zip(old_keys, range(len(old_keys))))
+            # Смещение текущих значений
+            offset = len(old_keys)
+            # Прошлая строка или текущая (новый процесс - рост 0)
+            rows = [position.get(key, offset + i) for i, key in enumerate(keys)]
+            # Выравниваем прошлые RSS
+            old_rss = list(map((old_rss + snapshot.rss).__getitem__, rows))
+        # Обратное прошедшее время
+        scale = 1 / (snapshot.timestamp - old_ts)
+        # Прирост RSS в секунду
+        return list(map(partial(operator.mul, scale), map(operator.sub, snapshot.rss, old_rss)))
+    
+    # Функция номер строки -> подходит ли имя под шаблон правила
+    # Шаблон проверяется один раз на каждое различное имя
+    def _names_match(self, rule: Rule, snapshot: ProcessSnapshot):
+        # Сменилась таблица имен
+        if snapshot.table is not self.table:
+            # Запоминаем таблицу
+            self.table = snapshot.table
+            # Номера имен изменились - кэш сбрасывается
+            self.name_cache.clear()
+        # Кэш правила
+        cache = self.name_cache.setdefault(rule, {})
+        # Имена
+        names = snapshot.table.names
+        # Колонка номеров имен
+        name_id = snapshot.name_id
+        # Метод шаблона
+        match = rule.pattern.match
+        
+        # Проверка строки
+        def names_match(i: int) -> bool:
+            # Номер имени
+            number = name_id[i]
+            # Результат из кэша
+            result = cache.get(number)
+            # Имя еще не проверялось
+            if result is None:
+                # Проверяем и запоминаем
+                result = cache[number] = match(names[number]) is not None
+            # Возвращаем результат
+            return result
+        # Возвращаем функцию
+        return names_match
+    
+    # Проверка всех правил на снимке; возвращает события
+    # (правило, "fired"/"cleared", ключ, имя, значение)
+    def evaluate(self, snapshot: ProcessSnapshot) -> list:
+        # Ключи строк
+        keys = list(zip(snapshot.pid, snapshot.started))
+        # Колонки метрик
+        columns = {"cpu": snapshot.cpu, "memory": snapshot.memory, "rss": snapshot.rss,
+                   "threads": snapshot.threads}
+        # Есть правила роста RSS
+        if self.need_growth:
+            # Скорость роста RSS
+            columns["rss_growth"] = self._growth(snapshot, keys)
+        # Словарь ключ -> строка строится не более раза за снимок и только по запросу
+        position = []
+        
+        # Словарь ключ -> строка
+        def locate() -> dict:
+            # Еще не построен
+            if not position:
+                # Строим
+                position.append(dict(zip(keys, range(len(keys)))))
+            # Возвращаем словарь
+            return position[0]
+        
+        # События
+        events = []
+        # Перебираем правила
+        for rule in self.rules:
+            # Проверка шаблона имени
+            names_match = self._names_match(rule, snapshot) if rule.pattern is not None else None
+            # Колонка метрики
+            column = columns[rule.column]
+            # Перебираем события правила
+            for state, key, i in rule.evaluate(snapshot.timestamp, keys, column, names_match, locate):
+                # Срабатывание
+                if state == "fired":
+                    # Имя процесса
+                    name = snapshot.name(i)
+                    # Запоминаем имя
+                    rule.active[key] = name
+                    # Событие со значением
+                    events.append((rule, state, key, name, column[i]))
+                # Сброс
+                else:
+                    # Событие с именем из срабатывания
+                    events.append((rule, state, key, rule.active.pop(key), None))
+        # Возвращаем события
+        return events
+    
+    # Выполнение действий правил для событий
+    def dispatch(self, events: list, ts: float = None):
+        # Время событий
+        ts = time.time() if ts is None else ts
+        # Время в виде строки
+        stamp = time.strftime("%H:%M:%S", time.localtime(ts))
+        # Перебираем события
+        for rule, state, (pid, started), name, value in events:
+            # Значение метрики
+            shown = "" if value is None else f" = {value:.1f}"
+            # Подпись события
+            label = "сработало" if state == "fired" else "сброшено"
+            # Строка журнала
+            print(f"{stamp} [правило] {rule.text}: {label} для {name}({pid}){shown}", file=self.log)
+            # Действие экспорта
+            if rule.action == "export" and self.export is not None:
+                # Строка NDJSON
+                self.export.write(json.dumps({"ts": round(ts, 3), "rule": rule.text, "event": state,
+                                              "pid": pid, "started": started, "name": name,
+                                              "value": value}) + "\n")
+                # Сбрасываем буфер
+                self.export.flush()
+            # Действие завершения при срабатывании
+            if rule.action == "terminate" and state == "fired":
+                # Завершатель процесса
+                terminator = ProcessTerminator(pid)
+                # PID все еще принадлежит тому же процессу
+                if terminator.proc is not None and same_process(terminator.proc, started):
+                    # Завершаем процесс
+                    done = terminator.terminate()
+                    # Результат - в журнал
+                    print(f"{stamp} [правило] процесс {name}({pid}) "
+                          f"{'завершен' if done else 'завершить не удалось'}", file=self.log)
+    
+    # Проверка правил и выполнение действий за один вызов
+    def process(self, snapshot: ProcessSnapshot) -> list:
+        # Проверяем правила
+        events = self.evaluate(snapshot)
+        # Есть события
+        if events:
+            # Выполняем действия
+            self.dispatch(events, snapshot.timestamp)
+        # Возвращаем события
+        return events
+    
+    # Закрытие набора правил
+    def close(self):
+        # Файл экспорта открыт
+        if self.export is not None:
+            # Закрываем его
+            self.export.close()
+
+# Проверка правил без меню: замеры по расписанию, события - в журнал
+def run_rules(rules: List[str], backend: str = "psutil", interval: float = 1.0, count: int = None,
+              shards: int = 1, log_path: str = None, export_path: str = None):
+    # Журнал в файл или stderr
+    log = open(log_path, "a", encoding="utf-8", buffering=1) if log_path else None
+    # Набор правил
+    engine = RuleEngine(rules, log=log, export_path=export_path)
+    # Подозрения на утечки пишутся в тот же журнал
+    leaks = LeakReporter(engine.log)
+    # Работа до Ctrl+C
+    try:
+        # Перебираем замеры
+        for snapshot in sample_stream(make_sampler(backend, shards=shards), interval, count,
+                                      observe=leaks.update):
+            # Проверяем правила
+            engine.process(snapshot)
+    # Ctrl+C - штатное завершение
+    except KeyboardInterrupt:
+        # Ничего не делаем
+        pass
+    # В любом случае
+    finally:
+        # Закрываем набор правил
+        engine.close()
+        # Журнал открыт из файла
+        if log is not None:
+            # Закрываем журнал
+            log.close()
+
+# ---------- Поиск утечек памяти ----------
+
+# Процесс с устойчивым ростом RSS
+@dataclass
+class LeakSuspect:
+    # PID процесса
+    pid: int
+    # Время запуска
+    started: float
+    # Имя процесса
+    name: str
+    # Скорость роста RSS по прямой наименьших квадратов, МБ в час
+    rate: float
+    # Доля разброса RSS, объясненная линейным ростом (R²), и t-статистика наклона
+    r2: float
+    # t-статистика наклона
+    t_stat: float
+    # Число замеров и время наблюдения, секунды
+    samples: int
+    # Время наблюдения
+    duration: float
+    # RSS на последнем замере, байты
+    rss: int
+
+# Потоковая линейная регрессия RSS по времени для каждого процесса
+# Замеры не хранятся: на процесс - число замеров, время первого замера и
+# суммы t, r, t², t·r, r² (t - секунды с первого замера, r - RSS в МБ),
+# по которым в любой момент считаются наклон, R² и t-статистика
+# Состояние лежит в массивах, выровненных по строкам последнего снимка
+# (как в DeltaTracker), и обновляется целыми колонками на уровне C
+class LeakDetector:
+    # Порядок колонок состояния
+    COLUMNS = ("n", "t0", "st", "sr", "stt", "str", "srr")
+    
+    # Процесс считается подозрительным, если он наблюдается не меньше min_duration
+    # секунд и min_samples замеров, растет не медленнее min_rate МБ в час,
+    # и рост устойчив: R² не меньше min_r2 и t-статистика не меньше min_t
+    def __init__(self, min_duration: float = 600.0, min_samples: int = 30, min_rate: float = 1.0,
+                 min_r2: float = 0.8, min_t: float = 5.0):
+        # Минимальное время наблюдения
+        self.min_duration = min_duration
+        # Минимальное число замеров
+        self.min_samples = min_samples
+        # Минимальная скорость роста
+        self.min_rate = min_rate
+        # Минимальный R²
+        self.min_r2 = min_r2
+        # Минимальная t-статистика
+        self.min_t = min_t
+        # Колонки PID и времени запуска последнего снимка и ключи его строк
+        self.pids = array("i")
+        # Время запуска
+        self.starts = array("d")
+        # Ключи строк
+        self.keys = []
+        # Колонки состояния
+        self.state = [array("d") for _ in self.COLUMNS]
+        # Последний снимок
+        self.snapshot = None
+        # Время последнего замера
+        self.timestamp = 0.0
+    
+    # Добавление замера RSS всех процессов снимка
+    def update(self, snapshot: ProcessSnapshot):
+        # Время замера
+        ts = snapshot.timestamp
+        # Снимок не новее последнего
+        if ts <= self.timestamp:
+            # Пропускаем
+            return
+        # Запоминаем время
+        self.timestamp = ts
+        
+        # Набор процессов изменился - состояние выравнивается по строкам снимка;
+        # новые процессы указывают на одну дополнительную пустую строку
+        if snapshot.pid != self.pids or snapshot.started != self.starts:
+            # Ключи строк снимка
+            keys = list(zip(snapshot.pid, snapshot.started))
+            # Ключ -> строка прошлого состояния
+            position = dict(zip(self.keys, range(len(self.keys))))
+            # Номер пустой строки
+            offset = len(self.keys)
+            # Строка состояния для каждой строки снимка
+            rows = list(map(position.get, keys, [offset] * len(keys)))
+            # Пустая строка: ноль замеров, время первого замера - текущее
+            empty = (0.0, ts, 0.0, 0.0, 0.0, 0.0, 0.0)
+            # Выравниваем колонки состояния
+            self.state = [array("d", map((column + array("d", (value,))).__getitem__, rows))
+                          for column, value in zip(self.state, empty)]
+            # Запоминаем ключи
+            self.keys = keys
+            # Колонка PID
+            self.pids = array("i", snapshot.pid)
+            # Колонка времени запуска
+            self.starts = array("d", snapshot.started)
+        # Запоминаем снимок
+        self.snapshot = snapshot
+        
+        # Колонки состояния
+        n, t0, st, sr, stt, str_, srr = self.state
+        # Время с первого замера
+        t = list(map(partial(operator.sub, ts), t0))
+        # RSS в МБ
+        r = list(map(partial(operator.mul, 1 / (1024 * 1024)), snapshot.rss))
+        # Новые суммы
+        self.state = [
+            array("d", map(partial(operator.add, 1.0), n)),
+            t0,
+            array("d", map(operator.add, st, t)),
+            array("d", map(operator.add, sr, r)),
+            array("d", map(operator.add, stt, map(operator.mul, t, t))),
+            array("d", map(operator.add, str_, map(operator.mul, t, r))),
+            array("d", map(operator.add, srr, map(operator.mul, r, r))),
+        ]
+    
+    # Оценка тренда строки i; None - меньше трех замеров или нулевой интервал
+    def _fit(self, i: int) -> LeakSuspect:
+        # Суммы строки
+        n, t0, st, sr, stt, str_, srr = (column[i] for column in self.state)
+        # Мало замеров
+        if n < 3:
+            # Оценки нет
+            return None
+        # Центрированные суммы: разброс времени, ковариация и разброс RSS
+        sxx = stt - st * st / n
+        # Время не менялось
+        if sxx <= 0:
+            # Оценки нет
+            return None
+        # Ковариация времени и RSS
+        sxy = str_ - st * sr / n
+        # Разброс RSS (не меньше нуля из-за округления)
+        syy = max(srr - sr * sr / n, 0.0)
+        # Наклон, МБ в секунду
+        slope = sxy / sxx
+        # Остаточный разброс
+        residual = max(syy - slope * sxy, 0.0)
+        # Доля объясненного разброса
+        r2 = slope * sxy / syy if syy > 0 else 0.0
+        # Стандартная ошибка наклона
+        error = (residual / (n - 2) / sxx) ** 0.5
+        # t-статистика (бесконечна при идеальной прямой)
+        t_stat = slope / error if error > 0 else (float("inf") if slope else 0.0)
+        # Последний снимок
+        snapshot = self.snapshot
+        # Оценка процесса
+        return LeakSuspect(snapshot.pid[i], snapshot.started[i], snapshot.name(i), slope * 3600,
+                           min(r2, 1.0), t_stat, int(n), self.timestamp - t0, snapshot.rss[i])
+    
+    # Подозрительные процессы по убыванию скорости роста (МБ в час)
+    # Маски числа замеров, времени наблюдения и скорости роста считаются
+    # на уровне C, поэтому полная оценка выполняется только для быстро растущих процессов
+    def suspects(self, k: int = 10) -> List[LeakSuspect]:
+        # Замеров еще не было
+        if self.snapshot is None:
+            # Подозрительных нет
+            return []
+        # Колонки состояния
+        n, t0, st, sr, stt, str_, srr = self.state
+        # Число строк
+        count = len(n)
+        # Маска: достаточно замеров и времени наблюдения
+        enough = map(operator.and_,
+                     map(partial(operator.le, self.min_samples), n),
+                     map(partial(operator.ge, self.timestamp - self.min_duration), t0))
+        # Наклон не меньше min_rate без деления: (n·Σtr - Σt·Σr)·3600 >= min_rate·(n·Σt² - (Σt)²)
+        covariance = map(operator.sub, map(operator.mul, n, str_), map(operator.mul, st, sr))
+        # Разброс времени
+        spread = map(operator.sub, map(operator.mul, n, stt), map(operator.mul, st, st))
+        # Маска: рост не медленнее min_rate
+        growing = map(operator.ge, map(partial(operator.mul, 3600), covariance),
+                      map(partial(operator.mul, self.min_rate), spread))
+        # Подозрительные процессы
+        found = []
+        # Перебираем строки, прошедшие обе маски
+        for i in compress(range(count), map(operator.and_, enough, growing)):
+            # Полная оценка
+            suspect = self._fit(i)
+            # Рост быстрый и устойчивый
+            if (suspect is not None and suspect.rate >= self.min_rate and suspect.r2 >= self.min_r2
+                    and suspect.t_stat >= self.min_t):
+                # Добавляем процесс
+                found.append(suspect)
+        # k самых быстрых
+        return heapq.nlargest(k, found, key=lambda suspect: suspect.rate)
+
+# Поиск утечек без меню (экспорт, правила, агент): тренды обновляются на каждом
+# замере, о каждом новом подозрительном процессе в журнал пишется одна строка
+class LeakReporter:
+    # log - файл журнала (по умолчанию stderr); detector - детектор с порогами
+    def __init__(self, log=None, detector: LeakDetector = None):
+        # Журнал
+        self.log = log if log is not None else sys.stderr
+        # Детектор трендов
+        self.detector = detector if detector is not None else LeakDetector()
+        # Ключи (PID, время запуска) процессов, о которых уже сообщено
+        self.reported = set()
+    
+    # Учет замера; вызывается для каждого снимка потока
+    def update(self, snapshot: ProcessSnapshot):
+        # Время трендов учитывается отдельно
+        with instrumentation.stage("leaks"):
+            # Обновляем тренды RSS
+            self.detector.update(snapshot)
+            # Подозрительные процессы
+            suspects = self.detector.suspects()
+        # Сообщения уже были
+        if self.reported:
+            # Забываем завершившиеся процессы
+            self.reported.intersection_update(self.detector.keys)
+        # Время замера в виде строки
+        stamp = time.strftime("%H:%M:%S", time.localtime(snapshot.timestamp))
+        # Перебираем процессы
+        for s in suspects:
+            # Ключ процесса
+            key = (s.pid, s.started)
+            # О процессе уже сообщено
+            if key in self.reported:
+                # Переходим к следующему
+                continue
+            # Запоминаем процесс
+            self.reported.add(key)
+            # Строка журнала
+            print(f"{stamp} [утечка] {s.name}({s.pid}): рост памяти +{s.rate:.1f} МБ/ч, "
+                  f"R² {s.r2:.2f}, RSS {s.rss / (1024 * 1024):.1f} MB", file=self.log)
+
+# ---------- История замеров ----------
+
+# Кольцевой буфер фиксированного размера
+# Массивы выделяются один раз при создании; новые значения перезаписывают самые старые
+class Ring:
+    # capacity - число строк, fields - число колонок значений
+    def __init__(self, capacity: int, fields: int):
+        # Число строк
+        self.capacity = capacity
+        # Время строки ('d' - 8 байт) и значения ('f' - 4 байта, точности достаточно)
+        # Массив из bytes заполнен нулями и сразу имеет нужный размер
+        self.times = array("d", bytes(8 * capacity))
+        # Колонки значений
+        self.values = [array("f", bytes(4 * capacity)) for _ in range(fields)]
+        # Позиция для следующей записи и число заполненных строк
+        self.head = 0
+        # Строк нет
+        self.count = 0
+    
+    # Добавление строки (перезаписывает самую старую при заполненном буфере)
+    def push(self, ts: float, values):
+        # Позиция записи
+        i = self.head
+        # Время строки
+        self.times[i] = ts
+        # Перебираем колонки
+        for column, value in zip(self.values, values):
+            # Значение строки
+            column[i] = value
+        # Следующая позиция по кругу
+        self.head = (i + 1) % self.capacity
+        # Буфер еще не заполнен
+        if self.count < self.capacity:
+            # Увеличиваем число строк
+            self.count += 1
+    
+    # Строки в хронологическом порядке: пары (время, список значений)
+    def rows(self):
+        # Позиция самой старой строки
+        start = (self.head - self.count) % self.capacity
+        # Перебираем строки
+        for k in range(self.count):
+            # Позиция строки
+            i = (start + k) % self.capacity
+            # Время и значения
+            yield self.times[i], [column[i] for column in self.values]
+    
+    # Объем памяти под данные в байтах
+    @property
+    def nbytes(self) -> int:
+        # Сумма размеров массивов
+        return sum(a.itemsize * len(a) for a in [self.times] + self.values)
+
+# Уровень агрегации: значения за интервал width секунд сворачиваются в min/avg/max
+class Rollup:
+    # Число метрик: CPU%, Память%, RSS
+    METRICS = 3
+    
+    # Уровень агрегации
+    def __init__(self, width: int, capacity: int):
+        # Ширина интервала в секундах
+        self.width = width
+        # На каждую метрику три колонки: минимум, среднее, максимум
+        self.ring = Ring(capacity, self.METRICS * 3)
+        # Начало текущего (еще не закрытого) интервала и накопленные значения
+        self.bucket = None
+        # Минимумы
+        self.low = [0.0] * self.METRICS
+        # Максимумы
+        self.high = [0.0] * self.METRICS
+        # Суммы
+        self.total = [0.0] * self.METRICS
+        # Число замеров в интервале
+        self.n = 0
+    
+    # Значения текущего интервала в виде строки min, avg, max для каждой метрики
+    def _current(self) -> list:
+        # Строка
+        row = []
+        # Перебираем метрики
+        for m in range(self.METRICS):
+            # Минимум, среднее и максимум
+            row += [self.low[m], self.total[m] / self.n, self.high[m]]
+        # Возвращаем строку
+        return row
+    
+    # Добавление замера
+    def add(self, ts: float, values):
+        # Начало интервала замера
+        bucket = ts - ts % self.width
+        # Замер попал в новый интервал - закрываем предыдущий и пишем его в буфер
+        if self.n and bucket != self.bucket:
+            # Пишем закрытый интервал
+            self.ring.push(self.bucket, self._current())
+            # Интервал пуст
+            self.n = 0
+        # Первый замер интервала
+        if not self.n:
+            # Начало интервала
+            self.bucket = bucket
+            # Минимумы
+            self.low = list(values)
+            # Максимумы
+            self.high = list(values)
+            # Суммы
+            self.total = list(values)
+        # Интервал продолжается
+        else:
+            # Перебираем метрики
+            for m, value in enumerate(values):
+                # Новый минимум
+                if value < self.low[m]:
+                    # Запоминаем
+                    self.low[m] = value
+                # Новый максимум
+                if value > self.high[m]:
+                    # Запоминаем
+                    self.high[m] = value
+                # Добавляем к сумме
+                self.total[m] += value
+        # Считаем замер
+        self.n += 1
+    
+    # Строки агрегации, включая текущий незакрытый интервал
+    def rows(self):
+        # Закрытые интервалы
+        yield from self.ring.rows()
+        # Текущий интервал не пуст
+        if self.n:
+            # Добавляем его
+            yield self.bucket, self._current()
+
+# История одного процесса: сырые замеры и агрегации по 10 секунд и 1 минуте
+class ProcessHistory:
+    # Размеры буферов: 2 минуты сырых замеров (при 1 Гц), 30 минут по 10 с, 4 часа по 1 мин
+    RAW_CAPACITY = 120
+    # Уровни агрегации: (ширина интервала, число строк)
+    ROLLUPS = ((10, 180), (60, 240))
     
-    # Поле для хранения имени процесса (строка)
-    name: str
+    # История процесса
+    def __init__(self):
+        # Сырые замеры: CPU%, Память%, RSS
+        self.raw = Ring(self.RAW_CAPACITY, Rollup.METRICS)
+        # Уровни агрегации: ширина интервала в секундах -> Rollup
+        self.rollups = {width: Rollup(width, capacity) for width, capacity in self.ROLLUPS}
+        # Время последнего замера
+        self.last = 0.0
     
-    # Поле для хранения процента использования CPU (число с плавающей точкой)
-    cpu_percent: float
+    # Добавление замера во все уровни
+    def add(self, ts: float, cpu: float, memory: float, rss: int):
+        # Значения замера
+        values = (cpu, memory, rss)
+        # Сырой замер
+        self.raw.push(ts, values)
+        # Перебираем уровни агрегации
+        for rollup in self.rollups.values():
+            # Добавляем замер
+            rollup.add(ts, values)
+        # Время последнего замера
+        self.last = ts
     
-    # Поле для хранения процента использования памяти (число с плавающей точкой)
-    memory_percent: float
+    # Строки истории с разрешением resolution секунд (1, 10 или 60)
+    # Каждая строка: (время, [min, avg, max] для CPU%, Память%, RSS)
+    def series(self, resolution: int = 1):
+        # Сырые замеры
+        if resolution == 1:
+            # Для сырых замеров минимум, среднее и максимум совпадают
+            for ts, (cpu, memory, rss) in self.raw.rows():
+                # Одинаковые min, avg и max
+                yield ts, [cpu, cpu, cpu, memory, memory, memory, rss, rss, rss]
+        # Агрегированные замеры
+        else:
+            # Строки нужного уровня
+            yield from self.rollups[resolution].rows()
     
-    # Определяем метод для преобразования объекта в строку
-    # Используется при печати объекта
-    def __str__(self):
-        # Форматируем вывод с фиксированной шириной колонок:
-        # - PID: 8 символов, выравнивание по левому краю
-        # - Имя: максимум 20 символов, выравнивание по левому краю
-        # - CPU%: 8 символов, 1 знак после точки
-        # - Память%: 10 символов, 2 знака после точки
-        return f"{self.pid:<8} {self.name[:20]:<20} {self.cpu_percent:<8.1f} {self.memory_percent:<10.2f}"
+    # Объем памяти под историю в байтах
+    @property
+    def nbytes(self) -> int:
+        # Сырые замеры и все уровни
+        return self.raw.nbytes + sum(r.ring.nbytes for r in self.rollups.values())
 
-# Класс-итератор для перебора процессов
-# Итератор позволяет использовать объект в цикле for
-class ProcessIterator:
-    # Метод, который вызывается при создании итератора
-    # Возвращает сам объект с инициализированными атрибутами
-    def __iter__(self):
-        # Создаем пустой список для хранения информации о процессах
-        self.processes = []
-        
-        # Проходим по всем процессам в системе
-        # psutil.process_iter() возвращает итератор по процессам
-        # Параметр ['pid', 'name', 'cpu_percent', 'memory_percent'] указывает,
-        # какие атрибуты процесса нужно получить
-        for proc in psutil.process_iter(['pid', 'name', 'cpu_percent', 'memory_percent']):
-            # Обрабатываем возможные исключения при доступе к процессу
-            try:
-                # Получаем словарь с информацией о процессе
-                info = proc.info
-                
-                # Создаем объект ProcessInfo и добавляем его в список
-                self.processes.append(ProcessInfo(
-                    pid=info['pid'],  # Идентификатор процесса
-                    name=info['name'],  # Имя процесса
-                    # Если cpu_percent равен None, используем 0.0
-                    cpu_percent=info['cpu_percent'] or 0.0,
-                    # Если memory_percent равен None, используем 0.0
-                    memory_percent=info['memory_percent'] or 0.0
-                ))
-            except:
-                # Если произошла ошибка (например, нет прав доступа к процессу),
-                # пропускаем этот процесс и продолжаем цикл
+# Хранилище историй всех процессов с общим ограничением памяти
+# При превышении лимита первыми удаляются истории завершившихся процессов,
+# которые дольше всех не обновлялись (LRU)
+class HistoryStore:
+    # Хранилище с лимитом памяти
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        # Лимит памяти в байтах
+        self.max_bytes = max_bytes
+        # PID -> ProcessHistory; порядок - от давно обновлявшихся к недавним
+        self.histories = OrderedDict()
+        # Общий объем памяти всех историй
+        self.nbytes = 0
+        # Размер одной истории (одинаков для всех, считается один раз)
+        self.entry_bytes = ProcessHistory().nbytes
+        # PID завершившихся процессов, о которых сообщила разница снимков
+        # (их истории перенесены в начало очереди и вытесняются первыми)
+        self.exited = set()
+    
+    # Запись снимка в истории процессов
+    def record(self, snapshot: ProcessSnapshot):
+        # Время замера
+        ts = snapshot.timestamp
+        # Истории
+        histories = self.histories
+        # Завершившиеся процессы
+        exited = self.exited
+        # Новые процессы без истории
+        new = []
+        # Перебираем строки снимка
+        for pid, cpu, memory, rss in zip(snapshot.pid, snapshot.cpu, snapshot.memory, snapshot.rss):
+            # PID занят новым процессом - история завершившегося к нему не относится
+            if pid in exited:
+                # Процесс больше не считается завершившимся
+                exited.discard(pid)
+                # Удаляем старую историю
+                del histories[pid]
+                # Освобождаем ее объем
+                self.nbytes -= self.entry_bytes
+            # История процесса
+            history = histories.get(pid)
+            # Истории нет
+            if history is None:
+                # Новый процесс
+                new.append((pid, cpu, memory, rss))
+                # Переходим к следующему
                 continue
+            # Добавляем замер
+            history.add(ts, cpu, memory, rss)
+            # Обновленная история переносится в конец очереди LRU
+            histories.move_to_end(pid)
         
-        # Инициализируем индекс для отслеживания текущей позиции в списке
-        self.index = 0
+        # Живые процессы уже перенесены в конец, поэтому в начале очереди
+        # только завершившиеся; вытесняем их, пока не хватит места для новых
+        needed = self.nbytes + len(new) * self.entry_bytes
+        # Места не хватает и есть что вытеснять
+        while needed > self.max_bytes and histories:
+            # Самая давняя история
+            pid, history = next(iter(histories.items()))
+            # Процесс живой (обновлен в этом замере)
+            if history.last >= ts:
+                # Завершившихся больше нет
+                break
+            # Удаляем историю
+            del histories[pid]
+            # Забываем отметку завершения
+            self.exited.discard(pid)
+            # Освобождаем объем
+            self.nbytes -= self.entry_bytes
+            # Нужно меньше места
+            needed -= self.entry_bytes
+        # Добавляем новые истории
+        self._insert(ts, new)
+    
+    # Запись разницы снимков (см. DeltaTracker): завершившиеся процессы сразу
+    # переносятся в начало очереди LRU и вытесняются первыми
+    # Замер пишется всем строкам снимка, а не только изменившимся: иначе сырые
+    # замеры теряли бы тики, а min/avg/max агрегаций считались бы только по
+    # тикам с изменениями (и изменения RSS ниже порога Память% не попадали бы в историю)
+    def record_delta(self, delta: SnapshotDelta):
+        # Истории
+        histories = self.histories
+        # Перебираем завершившиеся процессы
+        for pid, _ in delta.removed:
+            # История процесса есть
+            if pid in histories:
+                # В начало очереди
+                histories.move_to_end(pid, last=False)
+                # Отмечаем завершившимся
+                self.exited.add(pid)
+        # Пишем замер всех строк снимка
+        self.record(delta.snapshot)
+    
+    # Добавление историй новых процессов, пока позволяет лимит памяти
+    def _insert(self, ts: float, new: list):
+        # Истории
+        histories = self.histories
+        # Перебираем новые процессы
+        for pid, cpu, memory, rss in new:
+            # Лимит памяти исчерпан
+            if self.nbytes + self.entry_bytes > self.max_bytes:
+                # Остальные не добавляем
+                break
+            # Новая история
+            history = histories[pid] = ProcessHistory()
+            # Первый замер
+            history.add(ts, cpu, memory, rss)
+            # Учитываем объем
+            self.nbytes += self.entry_bytes
+    
+    # История процесса по PID (None, если ее нет)
+    def get(self, pid: int) -> ProcessHistory:
+        # История или None
+        return self.histories.get(pid)
+
+# Живой полноэкранный просмотр процессов (curses)
+# Кадр перерисовывается построчно: на экран выводятся только строки,
+# текст которых изменился с прошлого кадра
+# Сортировка и фильтр меняют только выбор строк из уже снятого снимка,
+# поэтому процессы при нажатии клавиш заново не перечисляются
+class LiveView:
+    # Клавиша -> (колонки сортировки, подпись)
+    SORTS = {
+        "c": (("cpu", "memory"), "CPU%"),
+        "m": (("memory",), "Память%"),
+        "p": (("pid",), "PID"),
+    }
+    # Пределы интервала обновления (секунды) для клавиш + и -
+    MIN_INTERVAL = 0.2
+    # Наибольший интервал
+    MAX_INTERVAL = 10.0
+    
+    # sample - функция без аргументов, возвращающая новый снимок ProcessSnapshot
+    def __init__(self, sample, title: str = "ПРОЦЕССЫ", interval: float = 1.0):
+        # Функция замера
+        self.sample = sample
+        # Заголовок кадра
+        self.title = title
+        # Интервал обновления
+        self.interval = interval
+        # Текущая сортировка (клавиша из SORTS) и направление
+        self.sort = "c"
+        # По убыванию
+        self.reverse = True
+        # Подстрока имени для фильтра ("" - без фильтра) и режим ввода фильтра
+        self.filter = ""
+        # Фильтр не вводится
+        self.editing = False
+        # Номера имен, подходящих под фильтр, и сколько имен таблицы уже проверено:
+        # новые имена в таблице проверяются один раз
+        self.matched = set()
+        # Проверенных имен нет
+        self.checked = 0
+        # Последний снимок
+        self.snapshot = None
+        # Строки прошлого кадра (индекс - номер строки экрана)
+        self.lines = []
+        # Время построения и вывода последнего кадра (мс) и число выведенных строк
+        self.frame_ms = 0.0
+        self.changed = 0
+        # Нагрузка самого диспетчера за прошлый интервал (см. Instrumentation.overhead)
+        self.own = {"cpu_percent": 0.0, "rss": 0}
+    
+    # Смена фильтра: проверка имен начинается заново
+    def set_filter(self, text: str):
+        # Новый фильтр
+        self.filter = text
+        # Подходящих имен нет
+        self.matched = set()
+        # Проверенных имен нет
+        self.checked = 0
+    
+    # Номера строк снимка, подходящих под фильтр (None - фильтра нет)
+    def _rows(self, snapshot: ProcessSnapshot):
+        # Фильтра нет
+        if not self.filter:
+            # Все строки
+            return None
+        # Проверяем только имена, появившиеся в таблице с прошлого раза
+        names = snapshot.table.names
+        # Фильтр без учета регистра
+        text = self.filter.lower()
+        # Перебираем новые имена
+        for name_id in range(self.checked, len(names)):
+            # Имя содержит подстроку фильтра
+            if text in names[name_id].lower():
+                # Запоминаем номер имени
+                self.matched.add(name_id)
+        # Все имена проверены
+        self.checked = len(names)
+        # Строки с подходящими именами
+        return list(compress(range(len(snapshot)), map(self.matched.__contains__, snapshot.name_id)))
+    
+    # Строки кадра размером height x width (без вывода на экран)
+    def frame(self, snapshot: ProcessSnapshot, height: int, width: int) -> List[str]:
+        # Колонки и подпись сортировки
+        keys, label = self.SORTS[self.sort]
+        # Строки под фильтром
+        rows = self._rows(snapshot)
+        # Число показываемых процессов
+        total = len(snapshot) if rows is None else len(rows)
+        # Под таблицу остаются все строки, кроме заголовков и подсказки
+        with instrumentation.stage("sort"):
+            # Номера строк для вывода
+            indices = snapshot.top(max(height - 3, 0), keys, self.reverse, rows)
         
-        # Возвращаем сам объект как итератор
-        return self
+        # Стрелка направления
+        arrow = "v" if self.reverse else "^"
+        # Текст фильтра (курсор в режиме ввода)
+        filter_text = self.filter + ("_" if self.editing else "") or "-"
+        # Заголовки кадра
+        lines = [
+            f"{self.title}  процессов: {total}/{len(snapshot)}  сортировка: {label} {arrow}  "
+            f"фильтр: {filter_text}  интервал: {self.interval:.1f} с  кадр: {self.frame_ms:.1f} мс  "
+            f"диспетчер: CPU {self.own['cpu_percent']:.1f}% RSS {self.own['rss'] / (1024 * 1024):.0f} MB",
+            f"{'PID':>8} {'Имя':<20} {'CPU%':>7} {'Память%':>8} {'RSS (MB)':>10}",
+        ]
+        # Перебираем выбранные строки
+        for i in indices:
+            # Строка таблицы
+            lines.append(f"{snapshot.pid[i]:>8} {snapshot.name(i)[:20]:<20} {snapshot.cpu[i]:>7.1f} "
+                         f"{snapshot.memory[i]:>8.2f} {snapshot.rss[i] / (1024 * 1024):>10.1f}")
+        # Пустые строки до подсказки внизу экрана
+        lines.extend([""] * (height - 1 - len(lines)))
+        # Подсказка
+        lines.append("q выход  c/m/p сортировка (повтор - обратный порядок)  / фильтр  +/- интервал")
+        # Последний столбец экрана не заполняем: curses не может писать в правый нижний угол
+        return [line[:width - 1] for line in lines[:height]]
     
-    # Метод для получения следующего элемента итератора
-    def __next__(self):
-        # Проверяем, не достигли ли мы конца списка
-        if self.index < len(self.processes):
-            # Получаем процесс по текущему индексу
-            process = self.processes[self.index]
-            # Увеличиваем индекс для следующего вызова
-            self.index += 1
-            # Возвращаем процесс
-            return process
-        # Если достигли конца списка, вызываем исключение StopIteration
-        # Это сигнализирует Python о завершении итерации
-        raise StopIteration
+    # Вывод кадра: перерисовываются только изменившиеся строки
+    def draw(self, screen, lines: List[str]):
+        # Начало вывода
+        started = time.perf_counter()
+        # Строки прошлого кадра
+        previous = self.lines
+        # Счетчик выведенных строк
+        changed = 0
+        # Перебираем строки кадра
+        for y, line in enumerate(lines):
+            # Строка не изменилась
+            if y < len(previous) and previous[y] == line:
+                # Пропускаем
+                continue
+            # Выводим строку
+            screen.addstr(y, 0, line)
+            # Остаток строки от прошлого кадра стираем
+            screen.clrtoeol()
+            # Считаем строку
+            changed += 1
+        # Запоминаем кадр
+        self.lines = lines
+        # Число выведенных строк
+        self.changed = changed
+        # Обновляем экран
+        screen.refresh()
+        # Время вывода
+        instrumentation.record("render", time.perf_counter() - started)
+    
+    # Построение и вывод кадра по последнему снимку
+    def render(self, screen):
+        # Начало кадра
+        started = time.perf_counter()
+        # Размер экрана
+        height, width = screen.getmaxyx()
+        # Строим и выводим кадр
+        self.draw(screen, self.frame(self.snapshot, height, width))
+        # Время кадра в мс
+        self.frame_ms = (time.perf_counter() - started) * 1000
+    
+    # Обработка клавиши; False - выход из просмотра
+    def handle_key(self, screen, key: int) -> bool:
+        # Изменение размера терминала: следующий кадр выводится целиком
+        if key == curses.KEY_RESIZE:
+            # Очищаем экран
+            screen.clear()
+            # Прошлого кадра нет
+            self.lines = []
+            # Продолжаем
+            return True
+        
+        # Режим ввода фильтра: список обновляется с каждым символом
+        if self.editing:
+            # Enter - конец ввода
+            if key in (curses.KEY_ENTER, 10, 13):
+                # Выходим из режима ввода
+                self.editing = False
+            # Esc
+            elif key == 27:
+                # Esc - отмена фильтра
+                self.editing = False
+                # Сбрасываем фильтр
+                self.set_filter("")
+            # Backspace
+            elif key in (curses.KEY_BACKSPACE, 127, 8):
+                # Удаляем последний символ
+                self.set_filter(self.filter[:-1])
+            # Печатаемый символ
+            elif 32 <= key < 0x110000:
+                # Добавляем к фильтру
+                self.set_filter(self.filter + chr(key))
+            # Продолжаем
+            return True
+        
+        # Символ клавиши
+        char = chr(key) if 0 <= key < 0x110000 else ""
+        # Выход
+        if char in ("q", "Q"):
+            # Завершаем просмотр
+            return False
+        # Клавиша сортировки
+        if char in self.SORTS:
+            # Повторное нажатие той же клавиши меняет направление сортировки
+            if char == self.sort:
+                # Меняем направление
+                self.reverse = not self.reverse
+            # Другая сортировка
+            else:
+                # Запоминаем клавишу
+                self.sort = char
+                # PID - по возрастанию, остальные - по убыванию
+                self.reverse = char != "p"
+        # Ввод фильтра
+        elif char == "/":
+            # Включаем режим ввода
+            self.editing = True
+        # Реже
+        elif char == "+":
+            # Удваиваем интервал
+            self.interval = min(self.interval * 2, self.MAX_INTERVAL)
+        # Чаще
+        elif char == "-":
+            # Уменьшаем интервал вдвое
+            self.interval = max(self.interval / 2, self.MIN_INTERVAL)
+        # Продолжаем
+        return True
+    
+    # Главный цикл: замеры по расписанию, между ними - ожидание клавиш
+    def _loop(self, screen):
+        # Курсор скрываем, если терминал это поддерживает
+        try:
+            # Скрываем курсор
+            curses.curs_set(0)
+        # Не поддерживается
+        except curses.error:
+            # Ничего не делаем
+            pass
+        # Специальные клавиши как коды
+        screen.keypad(True)
+        # Esc без задержки на ожидание escape-последовательности
+        if hasattr(curses, "set_escdelay"):
+            # Задержка 25 мс
+            curses.set_escdelay(25)
+        
+        # Первый замер - сразу
+        next_sample = time.monotonic()
+        # До выхода
+        while True:
+            # Текущее время
+            now = time.monotonic()
+            # Пора делать замер
+            if now >= next_sample:
+                # Новый снимок
+                self.snapshot = self.sample()
+                # Нагрузку диспетчера считаем за интервал между замерами
+                self.own = instrumentation.overhead()
+                # Следующий замер по расписанию; после долгого замера - не раньше, чем сейчас
+                next_sample = max(next_sample + self.interval, now)
+            # Выводим кадр
+            self.render(screen)
+            
+            # Ждем клавишу не дольше, чем до следующего замера
+            screen.timeout(max(1, int((next_sample - time.monotonic()) * 1000)))
+            # Читаем клавишу
+            key = screen.getch()
+            # Клавиша нажата и это выход
+            if key != -1 and not self.handle_key(screen, key):
+                # Выходим
+                break
+    
+    # Запуск просмотра; curses.wrapper восстанавливает терминал при любом выходе
+    def run(self):
+        # Ctrl+C завершает просмотр
+        try:
+            # Запускаем главный цикл
+            curses.wrapper(self._loop)
+        # Ctrl+C
+        except KeyboardInterrupt:
+            # Ничего не делаем
+            pass
 
-# Функция-генератор для получения информации о процессах
-# Генератор отличается от итератора тем, что использует yield
-# и сохраняет свое состояние между вызовами
-def process_generator():
-    # Проходим по всем процессам в системе
-    for proc in psutil.process_iter(['pid', 'name', 'cpu_percent', 'memory_percent']):
+# Запуск дочерних процессов-"спящих" для бенчмарков
+# Возвращает список объектов Popen; если система не дает создать больше
+# процессов (лимиты ОС), возвращает столько, сколько удалось создать
+def spawn_sleepers(count: int) -> List[subprocess.Popen]:
+    # Запущенные процессы
+    sleepers = []
+    # Запускаем нужное число процессов
+    for _ in range(count):
+        # Запуск может не удаться
         try:
-            # Получаем информацию о процессе
-            info = proc.info
+            # sleep почти не занимает памяти, поэтому подходит для массового запуска
+            sleepers.append(subprocess.Popen(["sleep", "3600"], stdin=subprocess.DEVNULL,
+                                             stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+        # Ошибка запуска
+        except OSError:
+            # Достигнут лимит процессов или памяти - останавливаемся
+            break
+    # Возвращаем запущенные процессы
+    return sleepers
+
+# Завершение процессов, запущенных spawn_sleepers()
+def stop_sleepers(sleepers: List[subprocess.Popen]):
+    # Сначала отправляем сигнал всем, потом ждем - так быстрее, чем по одному
+    for proc in sleepers:
+        # Отправляем SIGKILL
+        proc.kill()
+    # Перебираем процессы снова
+    for proc in sleepers:
+        # Ждем завершения
+        proc.wait()
+
+# Синтетический снимок из count процессов со случайными значениями (для бенчмарков)
+def synthetic_snapshot(count: int, seed: int = 0) -> ProcessSnapshot:
+    # Генератор случайных чисел
+    rng = random.Random(seed)
+    # Пустой снимок
+    snapshot = ProcessSnapshot()
+    # Перебираем PID
+    for pid in range(1, count + 1):
+        # Имена повторяются, как у реальных пулов рабочих процессов
+        snapshot.append(pid, f"worker-{pid % 100}", rng.random() * 100,
+                        rng.random() * 10, rng.randrange(1 << 30))
+    # Возвращаем снимок
+    return snapshot
+
+# Микробенчмарк: выбор топ-k через кучу против полной сортировки
+def benchmark_topk(sizes=(10000, 50000, 100000), k: int = 50, repeat: int = 5):
+    # Заголовок таблицы
+    print(f"{'Процессов':<12} {'Сортировка (мс)':<18} {'Топ-k (мс)':<14} {'Ускорение':<10}")
+    # Разделитель
+    print("-" * 56)
+    
+    # Перебираем размеры
+    for size in sizes:
+        # Синтетический снимок
+        snapshot = synthetic_snapshot(size)
+        # Результаты по способам
+        results = {}
+        # Сравниваем полную сортировку со срезом и выбор k элементов
+        cases = {
+            "sort": lambda: snapshot.order("cpu")[:k],
+            "top": lambda: snapshot.top(k, "cpu"),
+        }
+        # Перебираем способы
+        for name, case in cases.items():
+            # Лучшее время
+            best = None
+            # Несколько прогонов
+            for _ in range(repeat):
+                # Начало замера
+                started = time.perf_counter()
+                # Выполняем
+                case()
+                # Время прогона
+                duration = time.perf_counter() - started
+                # Прогон быстрее лучшего
+                if best is None or duration < best:
+                    # Запоминаем
+                    best = duration
+            # Лучшее время в мс
+            results[name] = best * 1000
+        
+        # Ускорение
+        speedup = results["sort"] / results["top"] if results["top"] else 0.0
+        # Строка таблицы
+        print(f"{size:<12} {results['sort']:<18.2f} {results['top']:<14.2f} {speedup:<10.1f}")
+
+# Бенчмарк правил: время проверки набора правил на синтетическом снимке
+# Правила разных видов: пороги колонок, длительность, шаблон имени, рост RSS
+def benchmark_rules(sizes=(10000, 50000), rule_count: int = 100, repeat: int = 5):
+    # Пороги подобраны так, что срабатывает малая доля процессов, как у реальных
+    # оповещений; стоимость проверки от этого почти не зависит - ее определяет
+    # проход по колонке
+    templates = ("cpu > {high}", "memory >= {memory} for 30s", "rss > {n}0MB by name=worker-{n}*",
+                 "threads > {n}", "rss growth > {n}MB/min", "cpu > {high} for 5s by name=worker-1*")
+    # Правила с разными порогами
+    rules = [templates[i % len(templates)].format(n=50 + i % 50, high=99 + (i % 10) / 10,
+                                                  memory=9.9 + (i % 10) / 100)
+             for i in range(rule_count)]
+    # Число правил
+    print(f"Правил: {rule_count}")
+    # Заголовок таблицы
+    print(f"{'Процессов':<12} {'Проверка (мс)':<15} {'На правило (мкс)':<18}")
+    # Разделитель
+    print("-" * 45)
+    # Перебираем размеры
+    for size in sizes:
+        # Набор правил с журналом в никуда
+        engine = RuleEngine(rules, log=open(os.devnull, "w"))
+        # Синтетический снимок
+        snapshot = synthetic_snapshot(size)
+        # Лучшее время
+        best = None
+        # Прогоны (плюс первый)
+        for step in range(repeat + 1):
+            # Новое время снимка, чтобы рост RSS и длительности считались как на живых замерах
+            snapshot.timestamp += 1.0
+            # Начало замера
+            started = time.perf_counter()
+            # Проверяем правила
+            engine.evaluate(snapshot)
+            # Время проверки
+            duration = time.perf_counter() - started
+            # Первый проход заполняет кэши имен и прошлый RSS - его не учитываем
+            if step and (best is None or duration < best):
+                # Запоминаем
+                best = duration
+        # Закрываем журнал
+        engine.log.close()
+        # Строка таблицы
+        print(f"{size:<12} {best * 1000:<15.2f} {best * 1e6 / rule_count:<18.1f}")
+
+# Бенчмарк: обновление трендов RSS и поиск утечек на разном числе процессов
+def benchmark_leaks(sizes=(10000, 50000), repeat: int = 5):
+    # Заголовок таблицы
+    print(f"{'Процессов':<12} {'Обновление (мс)':<17} {'Поиск (мс)':<12} {'Память (байт/процесс)':<22}")
+    # Разделитель
+    print("-" * 65)
+    # Перебираем размеры
+    for size in sizes:
+        # Детектор без ограничений по времени
+        detector = LeakDetector(min_duration=0, min_samples=3)
+        # Синтетический снимок
+        snapshot = synthetic_snapshot(size)
+        # Каждый сотый процесс растет, у остальных RSS колеблется около постоянного значения
+        rng = random.Random(0)
+        # Перебираем строки
+        for i in range(size):
+            # Уменьшаем RSS, чтобы рост не переполнил тип
+            snapshot.rss[i] //= 2
+        # Времена обновления
+        updates = []
+        # Времена поиска
+        searches = []
+        # Прогоны (плюс три накопительных)
+        for step in range(repeat + 3):
+            # Следующий замер
+            snapshot.timestamp += 1.0
+            # Перебираем строки
+            for i in range(size):
+                # Растущий процесс или колебание
+                snapshot.rss[i] += (1 << 20) if i % 100 == 0 else rng.randrange(-256, 257)
+            # Начало обновления
+            started = time.perf_counter()
+            # Обновляем тренды
+            detector.update(snapshot)
+            # Начало поиска
+            middle = time.perf_counter()
+            # Ищем утечки
+            detector.suspects()
+            # Конец поиска
+            finished = time.perf_counter()
+            # Первые проходы накапливают замеры - их не учитываем
+            if step >= 3:
+                # Время обновления
+                updates.append(middle - started)
+                # Время поиска
+                searches.append(finished - middle)
+        # Байт состояния на процесс
+        memory = sum(column.itemsize for column in detector.state)
+        # Строка таблицы
+        print(f"{size:<12} {min(updates) * 1000:<17.2f} {min(searches) * 1000:<12.2f} {memory:<22}")
+
+# Бенчмарк: сравнение источников psutil и /proc на разном числе процессов
+def benchmark_backends(sizes=(1000, 10000, 50000), repeat: int = 5):
+    # Заголовок таблицы
+    print(f"{'Процессов':<12} {'psutil (мс)':<14} {'/proc (мс)':<14} {'Ускорение':<10}")
+    # Разделитель
+    print("-" * 50)
+    
+    # Запущенные процессы
+    sleepers = []
+    # Процессы убираются в любом случае
+    try:
+        # Перебираем размеры по возрастанию
+        for size in sorted(sizes):
+            # Добираем "спящих" до нужного общего числа процессов в системе
+            missing = size - len(psutil.pids())
+            # Процессов не хватает
+            if missing > 0:
+                # Запускаем недостающие
+                sleepers.extend(spawn_sleepers(missing))
+            # Фактическое число процессов
+            actual = len(psutil.pids())
             
-            # Используем yield для возврата значения без завершения функции
-            # При следующем вызове функция продолжит с этого места
-            yield ProcessInfo(
-                pid=info['pid'],
-                name=info['name'],
-                cpu_percent=info['cpu_percent'] or 0.0,
-                memory_percent=info['memory_percent'] or 0.0
-            )
-        except:
-            # Если произошла ошибка, пропускаем этот процесс
+            # Результаты по источникам
+            results = {}
+            # Перебираем источники
+            for backend in BACKENDS:
+                # Первый проход "прогревает" кэши и не учитывается
+                list(process_generator(backend))
+                # Лучшее время
+                best = None
+                # Несколько прогонов
+                for _ in range(repeat):
+                    # Начало замера
+                    started = time.perf_counter()
+                    # Перечисляем процессы
+                    list(process_generator(backend))
+                    # Время прогона
+                    duration = time.perf_counter() - started
+                    # Берем лучший результат - он меньше всего зависит от шума
+                    if best is None or duration < best:
+                        # Запоминаем
+                        best = duration
+                # Лучшее время в мс
+                results[backend] = best * 1000
+            
+            # Ускорение
+            speedup = results["psutil"] / results["proc"] if results["proc"] else 0.0
+            # Строка таблицы
+            print(f"{actual:<12} {results['psutil']:<14.1f} {results['proc']:<14.1f} {speedup:<10.1f}")
+            # Если лимиты ОС не дали создать нужное число процессов, дальше не идем
+            if actual < size:
+                # Сообщение
+                print(f"\nНе удалось запустить {size} процессов (лимит системы)")
+                # Прекращаем
+                break
+    # В любом случае
+    finally:
+        # Всегда убираем за собой запущенные процессы
+        stop_sleepers(sleepers)
+
+# Бенчмарк: последовательное чтение /proc против параллельного по шардам
+# Для каждого размера сравниваются 1 шард и 2, 4, ... шардов до числа ядер
+def benchmark_shards(sizes=(10000, 50000), repeat: int = 5):
+    # Число ядер
+    cores = os.cpu_count() or 1
+    # Числа шардов
+    counts = [1]
+    # Удваиваем до числа ядер
+    while counts[-1] * 2 <= max(cores, 2):
+        # Следующее число шардов
+        counts.append(counts[-1] * 2)
+    
+    # Число ядер
+    print(f"Ядер: {cores}")
+    # Заголовок таблицы
+    print(f"{'Процессов':<12} " + " ".join(f"{f'{n} шард (мс)':<14}" for n in counts))
+    # Разделитель
+    print("-" * (13 + 15 * len(counts)))
+    
+    # Запущенные процессы
+    sleepers = []
+    # Процессы убираются в любом случае
+    try:
+        # Перебираем размеры по возрастанию
+        for size in sorted(sizes):
+            # Недостающие процессы
+            missing = size - len(psutil.pids())
+            # Процессов не хватает
+            if missing > 0:
+                # Запускаем недостающие
+                sleepers.extend(spawn_sleepers(missing))
+            # Фактическое число процессов
+            actual = len(psutil.pids())
+            
+            # Результаты по числу шардов
+            results = []
+            # Перебираем числа шардов
+            for shards in counts:
+                # Сборщик /proc с шардами
+                reader = make_sampler("proc", shards=shards)
+                # Порог размера шарда снимаем, чтобы параллельное чтение шло на любом размере
+                reader.MIN_SHARD_SIZE = 1
+                # Пул закрывается в любом случае
+                try:
+                    # Первый проход запускает пул и не учитывается
+                    reader.sample()
+                    # Лучшее время
+                    best = None
+                    # Несколько прогонов
+                    for _ in range(repeat):
+                        # Начало замера
+                        started = time.perf_counter()
+                        # Замер
+                        reader.sample()
+                        # Время прогона
+                        duration = time.perf_counter() - started
+                        # Прогон быстрее лучшего
+                        if best is None or duration < best:
+                            # Запоминаем
+                            best = duration
+                # В любом случае
+                finally:
+                    # Пул есть только при нескольких шардах
+                    if shards > 1:
+                        # Закрываем пул
+                        reader.close()
+                # Лучшее время в мс
+                results.append(best * 1000)
+            # Строка таблицы
+            print(f"{actual:<12} " + " ".join(f"{value:<14.1f}" for value in results))
+            # Процессов меньше нужного
+            if actual < size:
+                # Сообщение
+                print(f"\nНе удалось запустить {size} процессов (лимит системы)")
+                # Прекращаем
+                break
+    # В любом случае
+    finally:
+        # Завершаем запущенные процессы
+        stop_sleepers(sleepers)
+
+# ---------- Набор бенчмарков ----------
+
+# Число вызовов чтения и записи процесса (syscr + syscw из /proc/self/io)
+# Это только вызовы семейства read/write, а не все системные вызовы
+# None - счетчики недоступны (не Linux или ядро без учета ввода-вывода)
+# Вызовы рабочих процессов (параллельное чтение /proc) сюда не входят
+def io_call_count():
+    # Счетчиков может не быть
+    try:
+        # Открываем /proc/self/io
+        with open(f"{PROC_ROOT}/self/io") as file:
+            # Счетчики "имя: значение"
+            counters = dict(line.split(": ") for line in file.read().splitlines())
+        # Вызовы чтения и записи
+        return int(counters["syscr"]) + int(counters["syscw"])
+    # Файла нет или формат другой
+    except (OSError, KeyError, ValueError):
+        # Счетчиков нет
+        return None
+
+# Процентиль q (0-100) отсортированного списка с линейной интерполяцией
+def percentile(ordered: List[float], q: float) -> float:
+    # Список пуст
+    if not ordered:
+        # Ноль
+        return 0.0
+    # Дробная позиция
+    position = (len(ordered) - 1) * q / 100
+    # Нижний элемент
+    lower = int(position)
+    # Верхний элемент
+    upper = min(lower + 1, len(ordered) - 1)
+    # Интерполяция
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+# Замер одного сценария
+# run(arg) - измеряемое действие; setup() готовит arg вне замера времени
+# Время и вызовы чтения/записи считаются по repeat прогонам, выделения памяти -
+# отдельным прогоном: tracemalloc заметно замедляет код
+def measure(run, repeat: int = 10, setup=None) -> dict:
+    # Подготовка по умолчанию - ничего
+    prepare = setup or (lambda: None)
+    # Стоимость самого чтения /proc/self/io вычитается из каждого замера
+    before = io_call_count()
+    # Стоимость чтения счетчиков
+    probe_cost = io_call_count() - before if before is not None else 0
+    
+    # Прогревочный прогон не учитывается
+    run(prepare())
+    # Времена прогонов
+    times = []
+    # Вызовы чтения/записи прогонов
+    io_calls = []
+    # Несколько прогонов
+    for _ in range(repeat):
+        # Подготовка
+        arg = prepare()
+        # Счетчик до прогона
+        before = io_call_count()
+        # Начало прогона
+        started = time.perf_counter()
+        # Выполняем
+        run(arg)
+        # Время прогона
+        duration = time.perf_counter() - started
+        # Счетчик после прогона
+        after = io_call_count()
+        # Время в мс
+        times.append(duration * 1000)
+        # Счетчики доступны
+        if before is not None and after is not None:
+            # Вызовы прогона без чтения счетчиков
+            io_calls.append(after - before - probe_cost)
+    
+    # Аргумент отдельного прогона
+    arg = prepare()
+    # Включаем учет выделений памяти
+    tracemalloc.start()
+    # Учет выключается в любом случае
+    try:
+        # Выполняем
+        run(arg)
+        # Текущий и пиковый объем выделений
+        current, peak = tracemalloc.get_traced_memory()
+    # В любом случае
+    finally:
+        # Выключаем учет
+        tracemalloc.stop()
+    
+    # Сортируем времена для процентилей
+    times.sort()
+    # Сортируем вызовы чтения/записи
+    io_calls.sort()
+    # Результаты замера
+    return {
+        "p50_ms": percentile(times, 50),
+        "p90_ms": percentile(times, 90),
+        "p99_ms": percentile(times, 99),
+        "max_ms": times[-1],
+        "mean_ms": sum(times) / len(times),
+        "alloc_peak_kb": peak / 1024,
+        "alloc_retained_kb": current / 1024,
+        "io_calls": percentile(io_calls, 50) if io_calls else None,
+    }
+
+# Сравнение с результатами прошлого запуска (JSON из benchmark_suite)
+# Сценарий, у которого медиана выросла больше чем на threshold, отмечается как регрессия
+def compare_results(results: List[dict], baseline: dict, threshold: float = 0.1):
+    # Прошлые результаты по сценарию, источнику и размеру
+    old = {(item["name"], item["backend"], item["size"]): item for item in baseline["results"]}
+    # Заголовок таблицы
+    print(f"\n{'Сценарий':<22} {'Источник':<8} {'Процессов':<10} {'Было p50':>10} {'Стало p50':>10} {'Изм.':>8}")
+    # Разделитель
+    print("-" * 73)
+    # Перебираем новые результаты
+    for item in results:
+        # Прошлый результат сценария
+        previous = old.get((item["name"], item["backend"], item["size"]))
+        # Сравнивать не с чем
+        if previous is None or not previous["p50_ms"]:
+            # Пропускаем
             continue
+        # Относительное изменение медианы
+        change = item["p50_ms"] / previous["p50_ms"] - 1
+        # Отметка регрессии
+        mark = "  РЕГРЕССИЯ" if change > threshold else ""
+        # Строка таблицы
+        print(f"{item['name']:<22} {item['backend']:<8} {item['size']:<10} {previous['p50_ms']:>10.2f} "
+              f"{item['p50_ms']:>10.2f} {change * 100:>+7.1f}%{mark}")
+
+# Набор бенчмарков основных путей: перечисление процессов, итератор, топ-N,
+# тик мониторинга и завершение пачек процессов
+# Для каждого размера запускаются "спящие" процессы до нужного общего числа
+# Результаты печатаются таблицей и (если задан json_path) сохраняются в JSON,
+# чтобы сравнивать запуски на разных коммитах (baseline_path - прошлый JSON)
+def benchmark_suite(sizes=(1000,), repeat: int = 10, json_path: str = None,
+                    baseline_path: str = None, batch: int = 50):
+    # Источники (/proc - только если он есть)
+    backends = [backend for backend in BACKENDS if backend != "proc" or os.path.isdir(PROC_ROOT)]
+    # Результаты сценариев
+    results = []
+    # Фоновые процессы
+    sleepers = []
+    # Процессы, запущенные для сценариев завершения (собираются в конце)
+    victims = []
+    
+    # Пачка "спящих" для завершения; создается вне замера времени
+    def spawn_batch():
+        # Запускаем пачку
+        procs = spawn_sleepers(batch)
+        # Запоминаем для уборки
+        victims.extend(procs)
+        # PID пачки
+        return [proc.pid for proc in procs]
+    
+    # Последовательное завершение по одному процессу (ProcessTerminator)
+    def terminate_each(pids):
+        # Перебираем PID
+        for pid in pids:
+            # Завершаем по одному
+            ProcessTerminator(pid).terminate()
+    
+    # Процессы убираются в любом случае
+    try:
+        # Перебираем размеры по возрастанию
+        for size in sorted(sizes):
+            # Недостающие процессы
+            missing = size - len(psutil.pids())
+            # Процессов не хватает
+            if missing > 0:
+                # Запускаем недостающие
+                sleepers.extend(spawn_sleepers(missing))
+            # Фактическое число процессов
+            actual = len(psutil.pids())
+            
+            # Сценарии размера
+            scenarios = []
+            # Перебираем источники
+            for backend in backends:
+                # Сборщик источника
+                sampler = make_sampler(backend)
+                # Первый замер - точка отсчета для CPU%
+                sampler.sample()
+                # Сценарии источника
+                scenarios += [
+                    ("process_generator", backend, lambda _, b=backend: list(process_generator(b))),
+                    ("ProcessIterator", backend, lambda _, b=backend: list(ProcessIterator(b))),
+                    # Как show_all_processes(): замер и топ-50 по памяти
+                    ("top50_memory", backend, lambda _, s=sampler: s.sample().top(50, "memory")),
+                    # Как один тик _monitor_all(): замер и топ-5 по CPU
+                    ("monitor_tick", backend, lambda _, s=sampler: s.sample().top(5, ("cpu", "memory"))),
+                ]
+            
+            # Перебираем сценарии
+            for name, backend, run in scenarios:
+                # Замер сценария
+                results.append(dict(name=name, backend=backend, size=size, processes=actual,
+                                    **measure(run, repeat)))
+            # Завершение не зависит от источника данных
+            results.append(dict(name=f"terminate_batch_{batch}", backend="-", size=size, processes=actual,
+                                **measure(lambda pids: BatchTerminator(pids).terminate(), repeat, spawn_batch)))
+            # Последовательное завершение
+            results.append(dict(name=f"terminate_each_{batch}", backend="-", size=size, processes=actual,
+                                **measure(terminate_each, repeat, spawn_batch)))
+            
+            # Процессов меньше нужного
+            if actual < size:
+                # Сообщение
+                print(f"\nНе удалось запустить {size} процессов (лимит системы)")
+                # Прекращаем
+                break
+    # В любом случае
+    finally:
+        # Завершаем фоновые процессы
+        stop_sleepers(sleepers)
+        # Завершаем оставшиеся из пачек
+        stop_sleepers(victims)
+    
+    # Заголовок таблицы
+    print(f"{'Сценарий':<22} {'Источник':<8} {'Процессов':<10} {'p50 мс':>9} {'p90 мс':>9} "
+          f"{'p99 мс':>9} {'max мс':>9} {'Пик КБ':>9} {'Чт/зап':>8}")
+    # Разделитель
+    print("-" * 99)
+    # Перебираем результаты
+    for item in results:
+        # Вызовы чтения/записи (если счетчики доступны)
+        io_calls = f"{item['io_calls']:.0f}" if item["io_calls"] is not None else "-"
+        # Строка таблицы
+        print(f"{item['name']:<22} {item['backend']:<8} {item['processes']:<10} {item['p50_ms']:>9.2f} "
+              f"{item['p90_ms']:>9.2f} {item['p99_ms']:>9.2f} {item['max_ms']:>9.2f} "
+              f"{item['alloc_peak_kb']:>9.0f} {io_calls:>8}")
+    
+    # Отчет: сведения о запуске и результаты
+    report = {
+        "meta": {
+            "timestamp": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+    # Задан путь JSON
+    if json_path:
+        # Вывод в stdout
+        if json_path == "-":
+            # Пишем отчет
+            json.dump(report, sys.stdout, indent=2)
+            # Перевод строки
+            print()
+        # Вывод в файл
+        else:
+            # Открываем файл
+            with open(json_path, "w", encoding="utf-8") as file:
+                # Пишем отчет
+                json.dump(report, file, indent=2)
+    # Задан прошлый отчет
+    if baseline_path:
+        # Открываем его
+        with open(baseline_path, encoding="utf-8") as file:
+            # Сравниваем результаты
+            compare_results(results, json.load(file))
+    # Возвращаем отчет
+    return report
 
 # Абстрактный базовый класс для интерфейса завершения процессов
 # Наследование от ABC указывает, что это абстрактный класс
@@ -199,6 +5978,142 @@ class ProcessTerminator(ProcessInterface):
                 # Если и принудительное завершение не сработало, возвращаем False
                 return False
 
+# Коды результатов пакетного завершения и их описания для вывода
+OUTCOME_LABELS = {
+    "terminated": "завершен (SIGTERM)",
+    "killed": "убит (SIGKILL)",
+    "not_found": "не найден",
+    "access_denied": "нет доступа",
+    "failed": "не удалось завершить",
+    "replaced": "PID занят другим процессом",
+    "protected": "защищен (диспетчер, его родители или init)",
+}
+
+# PID, которые никогда не завершаются пакетом: сам диспетчер, все его предки
+# (оболочка, терминал, ...) и init (PID 1)
+# Без этого широкий запрос вроде "re:." с выбором "все" завершил бы всю систему
+def protected_pids() -> set:
+    # Init и сам диспетчер
+    protected = {1, os.getpid()}
+    # Предки могут быть недоступны
+    try:
+        # Вся цепочка родителей диспетчера
+        protected.update(parent.pid for parent in psutil.Process().parents())
+    # Цепочка оборвалась или нет доступа
+    except (psutil.NoSuchProcess, psutil.AccessDenied):
+        # Остаются init и сам диспетчер
+        pass
+    # Возвращаем множество
+    return protected
+
+# Пакетное завершение набора процессов (или целого дерева процессов)
+# SIGTERM отправляется сразу всем, а ожидание идет одновременно через psutil.wait_procs,
+# поэтому общее время - около одного окна ожидания, сколько бы ни было процессов
+# SIGKILL получают только те, кто не завершился за это окно
+class BatchTerminator(ProcessInterface):
+    # Конструктор: pids - список PID, include_children - завершить и всех потомков
+    # started - PID -> время запуска из снимка: если PID уже занят другим
+    # процессом, он не завершается (исход "replaced")
+    def __init__(self, pids: Iterable[int], include_children: bool = False, timeout: float = 2,
+                 started: dict = None):
+        # Окно ожидания
+        self.timeout = timeout
+        # Словарь PID -> объект psutil.Process
+        self.procs = {}
+        # Отчет: PID -> код результата (см. OUTCOME_LABELS)
+        self.report = {}
+        # Диспетчер, его предки и init не завершаются ни при каком наборе PID
+        protected = protected_pids()
+        
+        # Перебираем PID
+        for pid in pids:
+            # Защищенный процесс
+            if pid in protected:
+                # Отмечаем
+                self.report[pid] = "protected"
+                # Не завершаем
+                continue
+            # Процесса может не быть
+            try:
+                # Объект процесса
+                proc = psutil.Process(pid)
+                # PID занят другим процессом
+                if started and not same_process(proc, started.get(pid, 0.0)):
+                    # Отмечаем
+                    self.report[pid] = "replaced"
+                    # Не завершаем
+                    continue
+                # Запоминаем процесс
+                self.procs[pid] = proc
+                # С потомками
+                if include_children:
+                    # Потомки добавляются в тот же набор и получают сигнал одновременно
+                    for child in proc.children(recursive=True):
+                        # Без повторов и без защищенных процессов
+                        if child.pid not in protected:
+                            # Добавляем потомка
+                            self.procs.setdefault(child.pid, child)
+            # Процесса нет
+            except psutil.NoSuchProcess:
+                # Отмечаем
+                self.report[pid] = "not_found"
+            # Нет доступа
+            except psutil.AccessDenied:
+                # Отмечаем
+                self.report[pid] = "access_denied"
+    
+    # Отправка сигнала всем процессам; возвращает тех, кому сигнал дошел
+    def _signal(self, procs, method: str) -> list:
+        # Процессы, которым дошел сигнал
+        sent = []
+        # Перебираем процессы
+        for proc in procs:
+            # Процесс мог уже завершиться
+            try:
+                # Отправляем сигнал
+                getattr(proc, method)()
+                # Запоминаем процесс
+                sent.append(proc)
+            except psutil.NoSuchProcess:
+                # Процесс уже завершился сам - это тоже успех
+                self.report[proc.pid] = "terminated"
+            # Нет доступа
+            except psutil.AccessDenied:
+                # Отмечаем
+                self.report[proc.pid] = "access_denied"
+        # Возвращаем процессы
+        return sent
+    
+    # Реализация абстрактного метода terminate()
+    # Возвращает True, если завершены все процессы из набора
+    def terminate(self) -> bool:
+        # Шаг 1: SIGTERM всем сразу и общее ожидание
+        sent = self._signal(self.procs.values(), "terminate")
+        # Ждем всех одновременно
+        gone, alive = psutil.wait_procs(sent, timeout=self.timeout)
+        # Завершившиеся
+        for proc in gone:
+            # Отмечаем
+            self.report[proc.pid] = "terminated"
+        
+        # Шаг 2: SIGKILL только тем, кто остался жив
+        if alive:
+            # SIGKILL оставшимся
+            sent = self._signal(alive, "kill")
+            # Ждем снова
+            gone, alive = psutil.wait_procs(sent, timeout=self.timeout)
+            # Завершившиеся
+            for proc in gone:
+                # Отмечаем
+                self.report[proc.pid] = "killed"
+            # Оставшиеся
+            for proc in alive:
+                # Отмечаем неудачу
+                self.report[proc.pid] = "failed"
+        
+        # Успех, если все завершены
+        return all(outcome in ("terminated", "killed") for outcome in self.report.values())
+
 # Функция для сортировки процессов по использованию памяти
 # Используется как ключ для метода sort()
 def sort_by_memory(proc):
@@ -211,32 +6126,324 @@ def sort_by_cpu(proc):
     # Возвращает значение cpu_percent для сравнения при сортировке
     return proc.cpu_percent
 
+# ---------- Асинхронный интерфейс ----------
+# Слой для встраивания диспетчера в асинхронные службы (asyncio)
+# Блокирующее чтение /proc и psutil выполняется в ограниченном пуле потоков,
+# поэтому цикл событий не блокируется; одновременные запросы снимка от
+# многих вызывающих объединяются в один замер
+# Консольное меню (ProcessManager) работает через этот же слой
+
+class AsyncProcessAPI:
+    # sampler - готовый сборщик (по умолчанию создается для backend)
+    # max_workers - размер пула потоков для блокирующих вызовов
+    # ttl - снимок моложе стольких секунд отдается из общего кэша без нового замера,
+    # чтобы частые запросы не делали CPU% шумным (интервал замера слишком мал)
+    def __init__(self, backend: str = "psutil", shards: int = 1, max_workers: int = 4,
+                 ttl: float = 0.5, sampler=None):
+        # Сборщик замеров
+        self.sampler = sampler if sampler is not None else make_sampler(backend, shards=shards)
+        # Пул потоков для блокирующих вызовов
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="process-api")
+        # Общий кэш снимков
+        self.cache = SnapshotCache(self.sampler, ttl)
+        # Замер, который выполняется сейчас (общий для всех ожидающих)
+        self.pending = None
+        # Задачи пула, которые еще не выполнены (отменяются при закрытии)
+        self.futures = set()
+    
+    # Выполнение блокирующей функции в пуле потоков
+    async def _run(self, func, *args):
+        # Ставим задачу в пул
+        future = self.executor.submit(func, *args)
+        # Запоминаем задачу до ее завершения
+        self.futures.add(future)
+        # Выполненная задача удаляет себя из набора
+        future.add_done_callback(self.futures.discard)
+        # Ждем результат, не блокируя цикл событий
+        return await asyncio.wrap_future(future)
+    
+    # Замер через кэш в пуле потоков; сборщик не потокобезопасен, но кэш
+    # выполняет только один замер за раз
+    async def _sample(self, max_age: float = None) -> ProcessSnapshot:
+        # Ссылка на замер снимается в любом случае
+        try:
+            # Снимок из кэша или новый замер
+            return await self._run(self.cache.get, max_age)
+        # В любом случае
+        finally:
+            # Следующий запрос начнет новый замер
+            self.pending = None
+    
+    # Колоночный снимок всех процессов не старше max_age секунд (None - ttl кэша)
+    # Одновременные вызовы ждут один и тот же замер; отмена одного вызывающего
+    # не отменяет замер для остальных (asyncio.shield)
+    async def snapshot(self, max_age: float = None) -> ProcessSnapshot:
+        # Снимок из кэша
+        snapshot = self.cache.fresh(max_age)
+        # Кэш свежий
+        if snapshot is not None:
+            # Отдаем его
+            return snapshot
+        # Замер еще не идет
+        if self.pending is None:
+            # Запускаем замер задачей
+            self.pending = asyncio.get_running_loop().create_task(self._sample(max_age))
+        # Ждем общий замер
+        return await asyncio.shield(self.pending)
+    
+    # Топ-k процессов по колонке или составному ключу (как ProcessSnapshot.top)
+    async def top(self, k: int, key="cpu", reverse: bool = True) -> List[ProcessInfo]:
+        # Снимок
+        snapshot = await self.snapshot()
+        # Время выбора учитывается как сортировка
+        with instrumentation.stage("sort"):
+            # k лучших строк
+            return snapshot.views(snapshot.top(k, key, reverse))
+    
+    # Асинхронное расписание тиков: async for tick in self._ticks(1.0)
+    # Время тика n = старт + n * interval (как в tick_schedule), опоздавшие тики пропускаются
+    @staticmethod
+    async def _ticks(interval: float, count: int = None):
+        # Цикл событий
+        loop = asyncio.get_running_loop()
+        # Первый тик - сразу
+        next_tick = loop.time()
+        # Счетчик тиков
+        tick = 0
+        # Пока тики не закончились
+        while count is None or tick < count:
+            # Время до тика
+            delay = next_tick - loop.time()
+            # Время еще не пришло
+            if delay > 0:
+                # Ждем, не блокируя цикл
+                await asyncio.sleep(delay)
+            # Следующий тик
+            tick += 1
+            # Отдаем номер тика
+            yield tick
+            # Время следующего тика
+            next_tick += interval
+            # Текущее время
+            now = loop.time()
+            # Опаздываем больше чем на интервал
+            if next_tick < now:
+                # Переносим тик на ближайшую границу интервала в будущем
+                next_tick += (now - next_tick) // interval * interval + interval
+    
+    # Поток снимков по расписанию: async for snapshot in api.watch(1.0)
+    async def watch(self, interval: float = 1.0, count: int = None):
+        # Ждем тика
+        async for _ in self._ticks(interval, count):
+            # Отдаем снимок
+            yield await self.snapshot()
+    
+    # Поток замеров выбранных процессов (и их потомков): пары (снимок, завершившиеся PID)
+    # Поток заканчивается, когда все наблюдаемые процессы завершились
+    # Замеряются только наблюдаемые процессы - полный снимок системы не нужен
+    async def watch_processes(self, pids: Iterable[int], include_children: bool = False,
+                              interval: float = 1.0, count: int = None):
+        # Сборщик выбранных процессов (создается в пуле: читает процессы)
+        monitor = await self._run(MultiMonitor, list(pids), include_children, interval)
+        # Расписание тиков
+        ticks = self._ticks(interval, count)
+        # Поток могут закрыть на любом замере
+        try:
+            # Ждем тика
+            async for _ in ticks:
+                # Замер наблюдаемых процессов
+                snapshot, exited = await self._run(monitor.sample)
+                # Отдаем замер
+                yield snapshot, exited
+                # Наблюдаемых процессов не осталось
+                if not monitor.handles:
+                    # Поток окончен
+                    return
+        # В любом случае
+        finally:
+            # Закрываем расписание сразу, а не в сборщике мусора цикла событий
+            await ticks.aclose()
+    
+    # Пакетное завершение процессов; возвращает PID -> исход (см. OUTCOME_LABELS)
+    # started - PID -> время запуска из снимка (защита от повторно занятых PID)
+    # После завершения кэш сбрасывается: следующий снимок уже без этих процессов
+    async def terminate(self, pids: Iterable[int], include_children: bool = False,
+                        timeout: float = 2, started: dict = None) -> dict:
+        # Завершатель (создается в пуле: открывает процессы)
+        terminator = await self._run(BatchTerminator, list(pids), include_children, timeout, started)
+        # Завершаем процессы
+        await self._run(terminator.terminate)
+        # Сбрасываем кэш снимка
+        self.cache.invalidate()
+        # Отчет по PID
+        return terminator.report
+    
+    # Остановка пула потоков и сборщика
+    async def close(self):
+        # Отменяем задачи, которые еще не начались (cancel_futures= есть только с Python 3.9)
+        for future in list(self.futures):
+            # Выполняющаяся задача не отменится и завершится сама
+            future.cancel()
+        # Останавливаем пул без ожидания задач
+        self.executor.shutdown(wait=False)
+        # Метод закрытия сборщика (есть не у всех)
+        close = getattr(self.sampler, "close", None)
+        # Метод есть
+        if close is not None:
+            # Закрываем сборщик
+            close()
+    
+    # Вход в async with
+    async def __aenter__(self):
+        # Возвращаем интерфейс
+        return self
+    
+    # Выход из async with
+    async def __aexit__(self, *exc_info):
+        # Закрываем интерфейс
+        await self.close()
+
 # Основной класс для управления процессами
 class ProcessManager:
-    # Конструктор класса, не принимает параметров
-    def __init__(self):
-        # Просто заглушка, можно было бы использовать pass
-        pass
+    # Конструктор класса, принимает источник данных: "psutil" или "proc",
+    # интервал обновления живого просмотра в секундах и число шардов чтения /proc
+    # replay - воспроизведение записи (Replay) вместо замеров живой системы
+    # cache_ttl - сколько секунд пункты меню используют общий снимок без нового замера
+    # rules - правила оповещений (RuleEngine), проверяются на каждом новом снимке
+    def __init__(self, backend: str = "psutil", interval: float = 1.0, shards: int = 1,
+                 shard_threads: bool = False, replay: Replay = None, cache_ttl: float = 2.0,
+                 rules: RuleEngine = None):
+        # Запоминаем источник данных для всех представлений
+        self.backend = backend
+        # Интервал живого просмотра
+        self.interval = interval
+        # Воспроизведение записи
+        if replay is not None:
+            # Кадры записи служат и замерами, и источником событий
+            self.events = self.sampler = replay
+        # Живая система
+        else:
+            # Появление и завершение процессов: события ядра или опрос
+            self.events = open_process_events()
+            # Долгоживущий сборщик замеров, общий для всех мониторингов
+            self.sampler = make_sampler(backend, self.events, shards, shard_threads)
+        # Меню - клиент асинхронного интерфейса: замеры (через общий кэш снимка)
+        # и завершение процессов идут через него в собственном цикле событий
+        self.api = AsyncProcessAPI(sampler=self.sampler, ttl=cache_ttl)
+        # Собственный цикл событий меню
+        self.loop = asyncio.new_event_loop()
+        # Кэш лениво загружаемых полей (командная строка, файлы, потоки)
+        self.details = DetailCache()
+        # Индекс имен, обновляемый вместе со снимком
+        self.index = NameIndex(self.details)
+        # История замеров всех процессов с ограничением памяти
+        self.history = HistoryStore()
+        # Дерево процессов с суммами по поддеревьям
+        self.tree = ProcessTree()
+        # Системные метрики для мониторинга; в записи их нет, поэтому при
+        # воспроизведении панель не выводится
+        self.system = SystemSampler() if replay is None else None
+        # Группы cgroup процессов (пути процессов из записи не известны)
+        self.cgroups = CgroupResolver() if replay is None else None
+        # Правила оповещений
+        self.rules = rules
+        # Тренды RSS всех процессов для поиска утечек памяти
+        self.leaks = LeakDetector()
+        # Разница с прошлым замером и рейтинг по CPU, обновляемый по разнице
+        self.changes = DeltaTracker()
+        # Рейтинг по CPU% (при равных - по памяти)
+        self.ranking = RankedView(("cpu", "memory"))
+        # Разница с прошлым замером
+        self.delta = None
+        # Последний снимок процессов
+        self.snapshot = None
+    
+    # Новый замер: обновляет снимок, индекс имен, историю, дерево и рейтинг
+    # Рейтинг обновляется только по изменившимся процессам, история - по всем строкам
+    # max_age - допустимый возраст снимка: 0 - новый замер (мониторинг, где CPU%
+    # считается за секунду), None - снимок из общего кэша, если он не старше TTL
+    def refresh(self, max_age: float = 0.0) -> ProcessSnapshot:
+        # Снимок через асинхронный интерфейс
+        snapshot = self._call(self.api.snapshot(max_age))
+        # Снимок из кэша уже учтен в индексе, истории, дереве и рейтинге
+        if snapshot is self.snapshot:
+            # Возвращаем его
+            return snapshot
+        # Запоминаем снимок
+        self.snapshot = snapshot
+        # Разница с прошлым замером
+        self.delta = self.changes.diff(self.snapshot)
+        # Обновляем индекс имен
+        self.index.update(self.snapshot)
+        # Пишем историю
+        self.history.record_delta(self.delta)
+        # Обновляем дерево
+        self.tree.update(self.snapshot)
+        # Время рейтинга учитывается как сортировка
+        with instrumentation.stage("sort"):
+            # Обновляем рейтинг
+            self.ranking.apply(self.delta)
+        # Время трендов учитывается отдельно
+        with instrumentation.stage("leaks"):
+            # Обновляем тренды RSS
+            self.leaks.update(self.snapshot)
+        # Правила заданы
+        if self.rules is not None:
+            # Проверяем правила
+            self.rules.process(self.snapshot)
+        # Возвращаем снимок
+        return self.snapshot
+    
+    # Выполнение вызова асинхронного интерфейса до завершения
+    def _call(self, coroutine):
+        # Выполняем в собственном цикле событий
+        return self.loop.run_until_complete(coroutine)
+    
+    # Синхронный обход асинхронного потока (например, api.watch_processes)
+    # Закрытие генератора закрывает и поток
+    def _stream(self, stream):
+        # Обход может прерваться на любом элементе
+        try:
+            # До конца потока
+            while True:
+                # Поток может закончиться
+                try:
+                    # Следующий элемент потока
+                    item = self._call(stream.__anext__())
+                # Поток закончился
+                except StopAsyncIteration:
+                    # Завершаем генератор
+                    return
+                # Отдаем элемент
+                yield item
+        # В любом случае
+        finally:
+            # Закрываем поток в цикле диспетчера
+            self._call(stream.aclose())
+    
+    # Топ-k процессов по колонке или составному ключу
+    # key - "cpu", "memory", "rss", "pid" или кортеж, например ("cpu", "memory")
+    # Если снимок не передан, делается новый замер
+    def top(self, k: int, key="cpu", reverse: bool = True, snapshot: ProcessSnapshot = None) -> List[ProcessInfo]:
+        # Снимок не передан
+        if snapshot is None:
+            # Новый замер
+            snapshot = self.refresh()
+        # Объекты ProcessInfo создаются только для k выбранных строк
+        with instrumentation.stage("sort"):
+            # k лучших строк
+            return snapshot.views(snapshot.top(k, key, reverse))
     
     # Метод для отображения всех процессов
     # Декоратор @header_decorator добавляет форматированный заголовок
     @header_decorator("ВСЕ ПРОЦЕССЫ")
     def show_all_processes(self):
-        # Создаем пустой список для хранения процессов
-        processes = []
-        
-        # Счетчик для подсчета общего количества процессов
-        count = 0
+        # Получаем колоночный снимок всех процессов (из общего кэша, если он свежий)
+        snapshot = self.refresh(max_age=None)
         
-        # Используем генератор для получения информации о каждом процессе
-        for proc in process_generator():
-            # Добавляем процесс в список
-            processes.append(proc)
-            # Увеличиваем счетчик
-            count += 1
-        
-        # Сортируем процессы по использованию памяти в обратном порядке (от большего к меньшему)
-        processes.sort(key=sort_by_memory, reverse=True)
+        # Выбираем 50 процессов с наибольшим использованием памяти
+        # Полная сортировка не нужна: куча выбирает топ-50 за O(n log 50)
+        processes = self.top(50, "memory", snapshot=snapshot)
         
         # Выводим заголовок таблицы
         # Используем форматирование с фиксированной шириной колонок
@@ -245,14 +6452,167 @@ class ProcessManager:
         print("-" * 50)
         
         # Выводим топ-50 процессов (или все, если их меньше 50)
-        # Используем срез списка [:50] для получения первых 50 элементов
-        for proc in processes[:50]:
-            # Печатаем информацию о процессе
-            # Метод __str__ класса ProcessInfo вызывается автоматически
-            print(proc)
+        with instrumentation.stage("render"):
+            # Перебираем процессы
+            for proc in processes:
+                # Печатаем информацию о процессе
+                # Метод __str__ класса ProcessInfo вызывается автоматически
+                print(proc)
         
         # Выводим общее количество процессов
-        print(f"\nВсего процессов: {count}")
+        print(f"\nВсего процессов: {len(snapshot)}")
+    
+    # Дерево процессов: у каждого узла суммы по всему поддереву
+    # Дети упорядочены по суммарному RSS; у узла показываются не более max_children детей
+    @header_decorator("ДЕРЕВО ПРОЦЕССОВ")
+    def show_tree(self, max_children: int = 5, max_depth: int = 6):
+        # Снимок (из кэша, если свежий)
+        self.refresh(max_age=None)
+        # Дерево процессов
+        tree = self.tree
+        
+        # Заголовок таблицы
+        print(f"{'PID':<8} {'Имя':<34} {'Процессов':>9} {'CPU%':>8} {'RSS (MB)':>10} {'Потоков':>8}")
+        # Разделитель
+        print("-" * 82)
+        
+        # Обход в глубину через явный стек: (PID, глубина, скрытых процессов)
+        # Запись с PID None - строка-сводка о скрытых детях
+        stack = [(pid, 0, 0) for pid in reversed(tree.ranked(tree.roots()))]
+        # Пока стек не пуст
+        while stack:
+            # Очередная запись
+            pid, depth, hidden = stack.pop()
+            # Строка-сводка
+            if pid is None:
+                # Число скрытых процессов
+                print(f"{'':<8} {'  ' * depth}... еще процессов: {hidden}")
+                # Переходим к следующей записи
+                continue
+            # Суммы поддерева
+            cpu, rss, threads, count = tree.totals[pid]
+            # Имя с отступом по глубине
+            label = ("  " * depth + tree.names[pid])[:34]
+            # Суммы CPU% накапливаются разницами, поэтому погрешность около нуля отбрасываем
+            print(f"{pid:<8} {label:<34} {count:>9} {max(cpu, 0.0):>8.1f} "
+                  f"{rss / (1024 * 1024):>10.1f} {threads:>8}")
+            # Достигнута наибольшая глубина
+            if depth + 1 >= max_depth:
+                # Детей не показываем
+                continue
+            # Дети по суммарному RSS
+            children = tree.ranked(tree.children[pid])
+            # Дети сверх max_children
+            hidden = children[max_children:]
+            # Есть скрытые дети
+            if hidden:
+                # Число процессов в их поддеревьях
+                hidden_count = sum(tree.totals[child][tree.COUNT] for child in hidden)
+                # Сводка после показанных детей
+                stack.append((None, depth + 1, hidden_count))
+            # Показанные дети (в обратном порядке для стека)
+            for child in reversed(children[:max_children]):
+                # Кладем в стек
+                stack.append((child, depth + 1, 0))
+        
+        # Общее число процессов
+        print(f"\nВсего процессов: {len(tree.own)}")
+    
+    # Топ-k служб: поддеревья под init, сложенные по имени
+    # Показывает, например, что пул из 200 рабочих процессов занимает больше всего памяти
+    @header_decorator("ТОП СЛУЖБ")
+    def show_services(self, k: int = 10, key: str = "rss"):
+        # Снимок (из кэша, если свежий)
+        self.refresh(max_age=None)
+        # Заголовок таблицы
+        print(f"{'Служба':<24} {'Процессов':>9} {'CPU%':>8} {'RSS (MB)':>10} {'Потоков':>8}")
+        # Разделитель
+        print("-" * 63)
+        # Перебираем службы
+        for name, (cpu, rss, threads, count) in self.tree.top_services(k, key):
+            # Строка таблицы
+            print(f"{name[:24]:<24} {count:>9} {max(cpu, 0.0):>8.1f} "
+                  f"{rss / (1024 * 1024):>10.1f} {threads:>8}")
+    
+    # Группы cgroup (контейнеры и юниты systemd): суммы процессов группы
+    # и счетчики самого ядра - память вместе со страничным кэшем, CPU и диск
+    # Группы упорядочены по памяти группы (memory.current)
+    @header_decorator("ГРУППЫ CGROUP")
+    def show_cgroups(self, k: int = 15):
+        # cgroup v2 недоступна
+        if self.cgroups is None or self.cgroups.cgroup_root is None:
+            # Сообщение
+            print("cgroup v2 недоступна")
+            # Выходим
+            return
+        # Снимок (из кэша, если свежий)
+        snapshot = self.refresh(max_age=None)
+        # Группы процессов снимка
+        groups = self.cgroups.groups(snapshot)
+        # Строки: путь, подпись, суммы процессов и счетчики ядра
+        rows = [(path, label, count, cpu, rss, self.cgroups.stats(path))
+                for path, (label, count, cpu, rss) in groups.items()]
+        # По памяти группы, затем по RSS процессов
+        rows.sort(key=lambda row: (row[5].memory, row[4]), reverse=True)
+        
+        # Байт в мегабайте
+        mb = 1024 * 1024
+        # Заголовок таблицы
+        print(f"{'Группа':<28} {'Процессов':>9} {'CPU%':>7} {'RSS (MB)':>9} "
+              f"{'Память (MB)':>11} {'CPU% гр.':>8} {'Диск (MB)':>9}")
+        # Разделитель
+        print("-" * 88)
+        # Первые k групп
+        for path, label, count, cpu, rss, stats in rows[:k]:
+            # CPU% группы (нет на первом просмотре)
+            group_cpu = f"{stats.cpu_percent:.1f}" if stats.cpu_percent is not None else "-"
+            # Строка таблицы
+            print(f"{label[:28]:<28} {count:>9} {max(cpu, 0.0):>7.1f} {rss / mb:>9.1f} "
+                  f"{stats.memory / mb:>11.1f} {group_cpu:>8} {(stats.io_read + stats.io_write) / mb:>9.1f}")
+        # Пояснение
+        print(f"\nГрупп: {len(groups)}; память и диск - счетчики ядра для всей группы "
+              f"(включая страничный кэш), CPU% гр. - с прошлого просмотра")
+    
+    # Статистика самого диспетчера: время этапов, пропущенные процессы и собственная нагрузка
+    @header_decorator("СТАТИСТИКА ДИСПЕТЧЕРА")
+    def show_stats(self):
+        # Отчет инструментирования
+        report = instrumentation.report()
+        
+        # Заголовок таблицы этапов
+        print(f"{'Этап':<12} {'Вызовов':>8} {'Последний (мс)':>15} {'Средний (мс)':>13} {'Всего (мс)':>12}")
+        # Разделитель
+        print("-" * 64)
+        # Перебираем этапы
+        for name, stage in report["stages"].items():
+            # Строка этапа
+            print(f"{name:<12} {stage['calls']:>8} {stage['last_ms']:>15.2f} "
+                  f"{stage['avg_ms']:>13.2f} {stage['total_ms']:>12.1f}")
+        
+        # Пропущенные процессы
+        skipped = report["skipped"]
+        # Число пропущенных процессов по причинам
+        print(f"\nПропущено процессов: завершились - {skipped['vanished']}, "
+              f"нет доступа - {skipped['denied']}, ошибка разбора - {skipped['malformed']}")
+        
+        # Собственная нагрузка
+        own = report["self"]
+        # Строка нагрузки
+        print(f"Нагрузка диспетчера: CPU {own['cpu_percent_total']:.2f}% одного ядра с запуска "
+              f"({own['cpu_percent']:.2f}% с прошлого запроса), RSS {own['rss'] / (1024 * 1024):.1f} MB, "
+              f"потоков {own['threads']}")
+    
+    # Живой полноэкранный просмотр всех процессов
+    # Каждый кадр берет новый замер от общего сборщика (индекс и история тоже обновляются)
+    def live_view(self):
+        # Модуля curses нет (например, Windows)
+        if curses is None:
+            # Сообщение
+            print("\nЖивой просмотр недоступен: нет модуля curses")
+            # Выходим
+            return
+        # Запускаем просмотр с замерами через refresh()
+        LiveView(self.refresh, "ВСЕ ПРОЦЕССЫ", self.interval).run()
     
     # Метод для завершения процесса
     # Декоратор @header_decorator добавляет форматированный заголовок
@@ -260,47 +6620,89 @@ class ProcessManager:
     def kill_process(self):
         # Запрашиваем у пользователя идентификатор процесса
         # strip() удаляет пробелы в начале и конце строки
-        identifier = input("Введите PID или имя процесса: ").strip()
+        # Кроме имени можно искать по командной строке (cmd:), пользователю (user:)
+        # и регулярному выражению (re:)
+        identifier = input("Введите PID или имя процесса (или cmd:, user:, re:): ").strip()
+        
+        # Текст запроса без префикса cmd:, user: или re:
+        query = identifier.split(":", 1)[1] if identifier.startswith(("cmd:", "user:", "re:")) else identifier
+        # Пустой запрос (как и пустой текст после префикса) подошел бы ко всем процессам
+        if not query.strip():
+            # Сообщение
+            print("Пустой запрос")
+            # Выходим
+            return
         
+        # Несколько PID через пробел или запятую завершаются одним пакетом
+        parts = identifier.replace(",", " ").split()
+        # Все части - числа
+        if len(parts) > 1 and all(part.isdigit() for part in parts):
+            # Завершаем пакетом
+            self._kill_batch([int(part) for part in parts])
         # Проверяем, является ли введенная строка числом
-        if identifier.isdigit():
+        elif identifier.isdigit():
             # Преобразуем строку в целое число
             pid = int(identifier)
             
-            # Создаем объект ProcessTerminator для этого PID
-            terminator = ProcessTerminator(pid)
+            # Завершаем через асинхронный интерфейс: он защищает диспетчер
+            # и сбрасывает кэш снимка
+            report = self._call(self.api.terminate([pid]))
+            # Исход для этого PID
+            outcome = report.get(pid, "failed")
             
-            # Пытаемся завершить процесс
-            if terminator.terminate():
+            # Процесс завершен
+            if outcome in ("terminated", "killed"):
                 # Если успешно, выводим сообщение
                 print(f"Процесс {pid} завершен")
             else:
-                # Если не удалось, выводим сообщение об ошибке
-                print(f"Не удалось завершить процесс {pid}")
+                # Если не удалось, выводим причину
+                print(f"Не удалось завершить процесс {pid}: {OUTCOME_LABELS[outcome]}")
         else:
             # Если введено не число, считаем что это имя процесса
             # Вызываем вспомогательный метод для завершения по имени
             self._kill_by_name(identifier)
     
+    # Пакетное завершение набора процессов с выводом отчета по каждому PID
+    # started - PID -> время запуска из снимка (см. BatchTerminator)
+    def _kill_batch(self, pids: List[int], started: dict = None):
+        # Спрашиваем, нужно ли завершать и дочерние процессы
+        tree = input("Завершить и дочерние процессы? (д/н): ").strip().lower() in ("д", "y")
+        
+        # Завершаем через асинхронный интерфейс
+        report = self._call(self.api.terminate(pids, include_children=tree, started=started))
+        
+        # Выводим результат по каждому процессу
+        print(f"\n{'PID':<8} {'Результат':<25}")
+        print("-" * 35)
+        # Перебираем PID по порядку
+        for pid, outcome in sorted(report.items()):
+            # Строка отчета
+            print(f"{pid:<8} {OUTCOME_LABELS[outcome]:<25}")
+    
     # Вспомогательный метод для завершения процессов по имени
     # Начинается с подчеркивания, что указывает на "приватность" метода
     # (хотя в Python нет настоящих приватных методов)
     def _kill_by_name(self, name: str):
-        # Создаем пустой список для хранения найденных процессов
-        found = []
+        # Снимок берется из общего кэша: после просмотра списка процессов
+        # поиск по имени не перечисляет процессы заново
+        # Индекс имен обновится только для новых и завершившихся PID
+        snapshot = self.refresh(max_age=None)
         
-        # Проходим по всем процессам в системе
-        # Запрашиваем только pid и name для оптимизации
-        for proc in psutil.process_iter(['pid', 'name']):
-            try:
-                # Проверяем, содержится ли введенное имя в имени процесса
-                # Используем lower() для регистронезависимого поиска
-                if name.lower() in proc.info['name'].lower():
-                    # Если нашли совпадение, добавляем информацию о процессе в список
-                    found.append(proc.info)
-            except:
-                # Если произошла ошибка, пропускаем процесс
-                continue
+        try:
+            # Ищем процессы по индексу вместо проверки каждого процесса
+            pids = self.index.search(name)
+        except re.error:
+            # Неверное регулярное выражение в запросе re:
+            print("Неверное регулярное выражение")
+            return
+        
+        # Список найденных процессов в виде словарей с PID и именем
+        found = [{'pid': pid, 'name': self.index.name(pid)} for pid in pids]
+        # Время запуска найденных процессов: завершаем только их, даже если
+        # PID успел освободиться и достаться новому процессу
+        wanted = set(pids)
+        # Время запуска найденных PID из снимка
+        started = {snapshot.pid[i]: snapshot.started[i] for i in snapshot.where("pid", wanted.__contains__)}
         
         # Проверяем, найдены ли процессы
         if not found:
@@ -325,8 +6727,27 @@ class ProcessManager:
         else:
             # Если процессов несколько, запрашиваем выбор у пользователя
             try:
-                # Преобразуем ввод в целое число
-                choice = int(input(f"\nВыберите процесс (1-{len(found)}): "))
+                # Преобразуем ввод в целое число; 0 - завершить все найденные
+                choice = int(input(f"\nВыберите процесс (1-{len(found)}, 0 - все): "))
+                
+                # Все найденные процессы завершаем одним пакетом
+                if choice == 0:
+                    # Диспетчер, его предки и init в пакет не попадают
+                    protected = protected_pids()
+                    # PID для завершения
+                    batch = [p['pid'] for p in found if p['pid'] not in protected]
+                    # Сколько процессов будет завершено и сколько пропущено
+                    print(f"Будет завершено процессов: {len(batch)} "
+                          f"(пропущено защищенных: {len(found) - len(batch)})")
+                    # Без явного подтверждения ничего не завершаем
+                    if not batch or input("Введите 'да' для подтверждения: ").strip().lower() not in ("да", "yes"):
+                        # Сообщение
+                        print("Отменено")
+                        # Выходим
+                        return
+                    # Завершаем пакетом
+                    self._kill_batch(batch, started)
+                    return
                 
                 # Проверяем, находится ли выбор в допустимом диапазоне
                 if not 1 <= choice <= len(found):
@@ -342,16 +6763,17 @@ class ProcessManager:
         # choice-1 потому что список индексируется с 0, а номера выводились с 1
         pid = found[choice-1]['pid']
         
-        # Создаем объект ProcessTerminator для выбранного PID
-        terminator = ProcessTerminator(pid)
-        
-        # Пытаемся завершить процесс
-        if terminator.terminate():
+        # Завершаем процесс с проверкой времени запуска
+        report = self._call(self.api.terminate([pid], started=started))
+        # Исход для выбранного PID
+        outcome = report.get(pid, "failed")
+        # Процесс завершен
+        if outcome in ("terminated", "killed"):
             # Если успешно, выводим сообщение
             print(f"Процесс {pid} завершен")
         else:
-            # Если не удалось, выводим сообщение об ошибке
-            print(f"Не удалось завершить процесс {pid}")
+            # Если не удалось, выводим причину
+            print(f"Не удалось завершить процесс {pid}: {OUTCOME_LABELS[outcome]}")
     
     # Метод для мониторинга ресурсов
     # Декоратор @header_decorator добавляет форматированный заголовок
@@ -360,9 +6782,13 @@ class ProcessManager:
         # Выводим варианты мониторинга
         print("1. Мониторинг всех процессов (топ по CPU)")
         print("2. Мониторинг конкретного процесса")
+        print("3. История процесса")
+        print("4. Подробности процесса")
+        print("5. Живой мониторинг конкретных процессов")
+        print("6. Возможные утечки памяти")
         
         # Запрашиваем выбор пользователя
-        choice = input("Выбор (1-2): ").strip()
+        choice = input("Выбор (1-6): ").strip()
         
         # Обрабатываем выбор
         if choice == "1":
@@ -371,6 +6797,18 @@ class ProcessManager:
         elif choice == "2":
             # Если выбран мониторинг конкретного процесса
             self._monitor_specific()
+        elif choice == "3":
+            # Если выбран просмотр накопленной истории
+            self._show_history()
+        elif choice == "4":
+            # Если выбран просмотр подробностей процесса
+            self._show_details()
+        elif choice == "5":
+            # Если выбран живой мониторинг (полноэкранный, с обновлением строк)
+            self._monitor_specific(live=True)
+        elif choice == "6":
+            # Если выбран поиск процессов с устойчивым ростом памяти
+            self._show_leaks()
         else:
             # Если введен неверный выбор
             print("Неверный выбор")
@@ -378,97 +6816,538 @@ class ProcessManager:
     # Вспомогательный метод для мониторинга всех процессов
     def _monitor_all(self):
         # Выводим описание функции
-        print("\nМониторинг топ-5 процессов по CPU (5 секунд)")
+        print(f"\nМониторинг топ-5 процессов по CPU (5 секунд, отслеживание: {self.events.kind})")
         
         # Выводим заголовок таблицы
         print(f"{'Время':<8} {'PID':<8} {'Имя':<15} {'CPU%':<8} {'Память%':<10}")
         print("-" * 60)
         
+        # Первый замер служит точкой отсчета для CPU%
+        # (объекты процессов сохраняются в self.sampler между замерами)
+        self.refresh()
+        
+        # Первый проход по системным счетчикам - точка отсчета для скоростей
+        if self.system is not None:
+            # Точка отсчета
+            self.system.sample()
+        
+        # Процессы, завершившиеся до первого замера, не показываем
+        self.events.drain_short_lived()
+        # Точка отсчета для строки с нагрузкой самого диспетчера
+        instrumentation.overhead()
+        
         # Мониторим в течение 5 секунд
         # range(5) создает последовательность [0, 1, 2, 3, 4]
         for second in range(5):
-            # Создаем пустой список для текущих процессов
-            processes = []
+            # Ждем 1 секунду, чтобы накопился прирост процессорного времени
+            # (события ядра о процессах обрабатываются во время ожидания)
+            self.events.wait(1)
             
-            # Собираем информацию о всех текущих процессах
-            for proc in process_generator():
-                processes.append(proc)
+            # Получаем замер: CPU% посчитан по разнице с прошлым замером
+            self.refresh()
+            # Системные метрики того же тика (скорости - по разнице с прошлым тиком)
+            system = None
+            # Системные метрики доступны
+            if self.system is not None:
+                # Время учитывается отдельным этапом
+                with instrumentation.stage("system"):
+                    # Проход по системным счетчикам
+                    system = self.system.sample()
             
-            # Сортируем процессы по использованию CPU в обратном порядке
-            processes.sort(key=sort_by_cpu, reverse=True)
+            # Топ-5 по CPU (при равном CPU выше процесс с большим использованием памяти)
+            # берется из рейтинга, который обновлен только по изменившимся процессам
+            processes = self.ranking.top(5)
             
-            # Выводим номер текущей секунды
-            print(f"\n{second+1} сек:")
+            # Выводим номер текущей секунды и число изменений с прошлого замера
+            delta = self.delta
+            # Число новых, завершившихся и изменившихся
+            print(f"\n{second+1} сек: новых {len(delta.added)}, завершилось {len(delta.removed)}, "
+                  f"изменилось {len(delta.changed)}")
+            # Есть системные метрики
+            if system is not None:
+                # Перебираем строки панели
+                for line in format_system(system):
+                    # Строка панели с отступом
+                    print(f"{'':<8} {line}")
             
             # Выводим топ-5 процессов (или меньше, если процессов меньше 5)
-            # min(5, len(processes)) гарантирует, что не выйдем за границы списка
-            for i in range(min(5, len(processes))):
-                # Получаем i-й процесс
-                p = processes[i]
+            render_started = time.perf_counter()
+            for p in processes:
                 # Выводим информацию о процессе
                 print(f"{'':<8} {p.pid:<8} {p.name[:15]:<15} {p.cpu_percent:<8.1f} {p.memory_percent:<10.2f}")
+            # Время вывода
+            instrumentation.record("render", time.perf_counter() - render_started)
             
-            # Если это не последняя итерация (second < 4), делаем паузу
-            if second < 4:
-                # Ждем 1 секунду перед следующим измерением
-                time.sleep(1)
+            # Строка "сам": нагрузка диспетчера за эту секунду (CPU в процентах одного ядра)
+            own = instrumentation.overhead()
+            # Строка диспетчера
+            print(f"{'':<8} {os.getpid():<8} {'[диспетчер]':<15} {own['cpu_percent']:<8.1f} {own['memory_percent']:<10.2f}")
+            
+            # Процессы, прожившие меньше секунды между замерами
+            short_lived = self.events.drain_short_lived()
+            # Есть кратковременные процессы
+            if short_lived:
+                # Первые 10 процессов
+                listed = ", ".join(f"{name or '?'}({pid})" for pid, name in short_lived[:10])
+                # Сколько еще не показано
+                more = f" и еще {len(short_lived) - 10}" if len(short_lived) > 10 else ""
+                # Строка кратковременных процессов
+                print(f"{'':<8} Кратковременные процессы ({len(short_lived)}): {listed}{more}")
+            
+            # Процессы с устойчивым ростом памяти (по всем замерам с запуска диспетчера)
+            suspects = self.leaks.suspects(3)
+            # Есть подозрительные процессы
+            if suspects:
+                # Имя, PID и скорость роста
+                listed = ", ".join(f"{s.name}({s.pid}) +{s.rate:.1f} МБ/ч" for s in suspects)
+                # Строка роста памяти
+                print(f"{'':<8} Рост памяти: {listed}")
     
     # Вспомогательный метод для мониторинга конкретного процесса
-    def _monitor_specific(self):
+    # live=True - полноэкранный просмотр вместо построчного вывода
+    def _monitor_specific(self, live: bool = False):
+        # Живой просмотр без curses
+        if live and curses is None:
+            # Сообщение
+            print("\nЖивой просмотр недоступен: нет модуля curses")
+            # Выходим
+            return
+        
         try:
-            # Запрашиваем PID процесса у пользователя
-            # Преобразуем ввод в целое число
-            pid = int(input("\nВведите PID процесса: ").strip())
-            
-            # Выводим заголовок мониторинга
-            print(f"\nМониторинг процесса {pid} (10 секунд)")
-            
-            # Выводим заголовок таблицы
-            print(f"{'Время':<8} {'CPU%':<8} {'Память%':<10} {'Память (MB)':<12}")
-            print("-" * 60)
-            
-            # Мониторим в течение 10 секунд
-            for i in range(10):
-                try:
-                    # Создаем объект процесса по PID
-                    proc = psutil.Process(pid)
-                    
-                    # Получаем процент использования CPU за последнюю секунду
-                    # interval=1 означает, что метод будет ждать 1 секунду для измерения
-                    cpu = proc.cpu_percent(interval=1)
-                    
-                    # Получаем процент использования памяти
-                    mem_percent = proc.memory_percent()
-                    
-                    # Получаем использование памяти в байтах и преобразуем в мегабайты
-                    # memory_info().rss возвращает Resident Set Size (фактическую память в ОЗУ)
-                    # // - целочисленное деление
-                    mem_mb = proc.memory_info().rss // (1024 * 1024)
-                    
-                    # Выводим информацию о процессе
-                    print(f"{i+1} сек:{'':<4} {cpu:<8.1f} {mem_percent:<10.2f} {mem_mb:<12}")
-                    
-                except psutil.NoSuchProcess:
-                    # Исключение возникает, если процесс не найден (завершился)
-                    print(f"\nПроцесс {pid} завершен")
-                    # Прерываем цикл мониторинга
-                    break
-                    
-                except:
-                    # Если произошла другая ошибка
-                    print(f"\nОшибка мониторинга")
-                    # Прерываем цикл мониторинга
-                    break
-                    
+            # Запрашиваем PID процессов у пользователя (можно несколько через пробел или запятую)
+            # Преобразуем каждый PID в целое число
+            raw = input("\nВведите PID процесса (можно несколько через пробел): ")
+            # Номера PID из строки
+            pids = [int(part) for part in raw.replace(",", " ").split()]
         except ValueError:
             # Исключение возникает, если ввод не может быть преобразован в число
             print("PID должен быть числом")
+            return
+        
+        # Ничего не введено
+        if not pids:
+            # Сообщение
+            print("PID должен быть числом")
+            # Выходим
+            return
+        
+        # Спрашиваем, нужно ли следить за всеми потомками (дерево процессов)
+        tree = input("Следить и за дочерними процессами? (д/н): ").strip().lower() in ("д", "y")
+        
+        # Поток замеров через асинхронный интерфейс: CPU% считается без блокировки
+        # для всех PID сразу; в живом просмотре расписание задает LiveView, поэтому
+        # поток ждет не дольше наименьшего интервала просмотра
+        frames = self._stream(self.api.watch_processes(
+            pids, include_children=tree, interval=LiveView.MIN_INTERVAL if live else self.interval,
+            count=None if live else 10))
+        # Первый замер (всегда есть: первый тик - сразу)
+        snapshot, exited = next(frames)
+        # Ни одного процесса не найдено
+        if not len(snapshot) and not exited:
+            # Закрываем поток
+            frames.close()
+            # Сообщение
+            print(f"\nПроцессы {', '.join(map(str, pids))} не найдены")
+            # Выходим
+            return
+        
+        # Полноэкранный просмотр
+        if live:
+            # Каждый кадр - новый замер; замеры сохраняются в историю
+            def sample():
+                # Замер (пустой снимок, когда все процессы завершились)
+                snapshot, exited = next(frames, (ProcessSnapshot(NameTable()), []))
+                # Пишем в историю
+                self.history.record(snapshot)
+                # Возвращаем снимок
+                return snapshot
+            # Запускаем просмотр
+            LiveView(sample, "МОНИТОРИНГ", self.interval).run()
+            # Закрываем поток после просмотра
+            frames.close()
+            # Выходим после просмотра
+            return
+        
+        # Выводим заголовок мониторинга
+        print(f"\nМониторинг процессов: {len(snapshot) + len(exited)} (10 секунд)")
+        
+        # Выводим заголовок таблицы
+        print(f"{'Время':<8} {'PID':<8} {'Имя':<15} {'CPU%':<8} {'Память%':<10} {'Память (MB)':<12}")
+        # Разделитель
+        print("-" * 70)
+        
+        # Мониторим в течение 10 секунд: все процессы опрашиваются за один проход
+        for tick, (snapshot, exited) in enumerate(chain([(snapshot, exited)], frames), 1):
+            # Выводим номер текущей секунды
+            print(f"\n{tick} сек:")
+            # Перебираем строки снимка
+            for i in range(len(snapshot)):
+                # Память в мегабайтах; // - целочисленное деление
+                mem_mb = snapshot.rss[i] // (1024 * 1024)
+                # Строка процесса
+                print(f"{'':<8} {snapshot.pid[i]:<8} {snapshot.name(i)[:15]:<15} "
+                      f"{snapshot.cpu[i]:<8.1f} {snapshot.memory[i]:<10.2f} {mem_mb:<12}")
+            # Сохраняем замер в историю процессов
+            self.history.record(snapshot)
+            # Сообщаем о завершившихся процессах
+            for pid in exited:
+                # Сообщение о завершении
+                print(f"Процесс {pid} завершен")
+    
+    # Процессы с устойчивым ростом RSS по убыванию скорости роста
+    def _show_leaks(self, k: int = 10):
+        # Новый замер, чтобы тренды включали текущее состояние
+        self.refresh()
+        # Подозрительные процессы
+        suspects = self.leaks.suspects(k)
+        # Детектор (для параметров в сообщении)
+        detector = self.leaks
+        # Подозрительных нет
+        if not suspects:
+            # Сообщение с требованиями к наблюдению
+            print(f"\nУстойчивого роста памяти не найдено (нужно не меньше {detector.min_samples} замеров "
+                  f"за {detector.min_duration / 60:.0f} мин: мониторинг, живой просмотр)")
+            # Выходим
+            return
+        # Заголовок таблицы
+        print(f"\n{'PID':<8} {'Имя':<15} {'Рост (МБ/ч)':>12} {'R²':>6} {'t':>8} "
+              f"{'Замеров':>8} {'Время (мин)':>12} {'RSS (MB)':>10}")
+        # Разделитель
+        print("-" * 85)
+        # Перебираем процессы
+        for s in suspects:
+            # Строка таблицы
+            print(f"{s.pid:<8} {s.name[:15]:<15} {s.rate:>12.1f} {s.r2:>6.2f} {min(s.t_stat, 9999):>8.1f} "
+                  f"{s.samples:>8} {s.duration / 60:>12.1f} {s.rss / (1024 * 1024):>10.1f}")
+    
+    # Вывод подробностей процесса; дорогие поля загружаются только здесь
+    # и запоминаются до завершения процесса
+    def _show_details(self):
+        # Ввод может быть не числом
+        try:
+            # PID процесса
+            pid = int(input("\nВведите PID процесса: ").strip())
+        # Не число
+        except ValueError:
+            # Сообщение
+            print("PID должен быть числом")
+            # Выходим
+            return
+        
+        # Командная строка (из кэша или загружается)
+        cmdline = self.details.get(pid, "cmdline")
+        # Процесса нет
+        if cmdline is None and not psutil.pid_exists(pid):
+            # Сообщение
+            print(f"Процесс {pid} не найден")
+            # Выходим
+            return
+        
+        # Недоступные поля (нет прав) выводятся как "-"
+        open_files = self.details.get(pid, "open_files")
+        # Командная строка
+        print(f"\nКомандная строка: {cmdline or '-'}")
+        # Исполняемый файл
+        print(f"Исполняемый файл: {self.details.get(pid, 'exe') or '-'}")
+        # Пользователь
+        print(f"Пользователь: {self.details.get(pid, 'username') or '-'}")
+        # Число потоков
+        print(f"Потоков: {self.details.get(pid, 'num_threads') or '-'}")
+        # Число открытых файлов
+        print(f"Открытых файлов: {len(open_files) if open_files is not None else '-'}")
+    
+    # Вывод накопленной истории процесса с разным разрешением
+    def _show_history(self):
+        # Ввод может быть не числом
+        try:
+            # PID процесса
+            pid = int(input("\nВведите PID процесса: ").strip())
+        # Не число
+        except ValueError:
+            # Сообщение
+            print("PID должен быть числом")
+            # Выходим
+            return
+        
+        # История процесса
+        history = self.history.get(pid)
+        # Истории нет
+        if history is None:
+            # Сообщение
+            print(f"История процесса {pid} не найдена (запустите мониторинг)")
+            # Выходим
+            return
+        
+        # Последние 10 строк для каждого разрешения
+        for resolution, title in ((1, "1 сек"), (10, "10 сек"), (60, "1 мин")):
+            # Последние 10 строк
+            rows = list(history.series(resolution))[-10:]
+            # Заголовок разрешения
+            print(f"\nРазрешение {title}:")
+            # Заголовок таблицы
+            print(f"{'Время':<10} {'CPU% min/avg/max':<22} {'Память% avg':<12} {'RSS max (MB)':<12}")
+            # Разделитель
+            print("-" * 60)
+            # Перебираем строки
+            for ts, values in rows:
+                # Время строки
+                clock = time.strftime("%H:%M:%S", time.localtime(ts))
+                # CPU% min/avg/max
+                cpu = f"{values[0]:.1f}/{values[1]:.1f}/{values[2]:.1f}"
+                # Строка таблицы
+                print(f"{clock:<10} {cpu:<22} {values[4]:<12.2f} {values[8] / (1024 * 1024):<12.1f}")
 
 # Главная функция программы
 # Точка входа при запуске скрипта напрямую
 def main():
+    # Разбираем аргументы командной строки
+    parser = argparse.ArgumentParser(description="Консольный диспетчер задач")
+    # Источник данных о процессах
+    parser.add_argument("--backend", choices=BACKENDS, default="psutil",
+                        help="источник данных о процессах (proc - прямое чтение /proc, только Linux)")
+    # Запуск бенчмарка вместо интерактивного меню
+    parser.add_argument("--bench", choices=["backends", "topk", "shards", "suite", "rules", "leaks"],
+                        help="запустить бенчмарк и выйти")
+    # Параметры набора бенчмарков (--bench suite)
+    parser.add_argument("--repeat", type=int, default=10,
+                        help="число прогонов каждого сценария")
+    # Файл JSON с результатами
+    parser.add_argument("--json", metavar="PATH",
+                        help="сохранить результаты набора бенчмарков в JSON (- для stdout)")
+    # Прошлый JSON для сравнения
+    parser.add_argument("--baseline", metavar="PATH",
+                        help="сравнить результаты с прошлым JSON")
+    # Размеры (число процессов) для бенчмарка
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000],
+                        help="число процессов для бенчмарка")
+    # Потоковый экспорт замеров без интерактивного меню
+    parser.add_argument("--export", choices=EXPORT_FORMATS,
+                        help="выводить замеры в формате ndjson, csv или prometheus без меню")
+    # Файл экспорта
+    parser.add_argument("--output", default="-",
+                        help="файл для экспорта (по умолчанию stdout)")
+    # Экспорт только изменений
+    parser.add_argument("--delta", action="store_true",
+                        help="экспортировать только изменения между замерами (ndjson, csv)")
+    # Правила оповещений (можно указать несколько раз)
+    parser.add_argument("--rule", action="append", default=[], metavar="RULE",
+                        help='правило, например "cpu > 90 for 30s" или "rss growth > 50MB/min by name=worker*"')
+    # Журнал правил
+    parser.add_argument("--rule-log", metavar="PATH",
+                        help="журнал срабатываний правил (по умолчанию stderr)")
+    # Файл экспорта событий правил
+    parser.add_argument("--rule-export", metavar="PATH",
+                        help="файл NDJSON для правил с действием export")
+    # Проверка правил без меню
+    parser.add_argument("--watch-rules", action="store_true",
+                        help="проверять правила без меню")
+    # Запись замеров в файл и воспроизведение записи
+    parser.add_argument("--record", metavar="PATH",
+                        help="записывать замеры в файл (дописывается, если уже существует)")
+    # Воспроизведение записи
+    parser.add_argument("--replay", metavar="PATH",
+                        help="показать запись: все процессы и мониторинг топ-5 (или --live)")
+    # Момент начала воспроизведения
+    parser.add_argument("--at", metavar="TIME",
+                        help="момент начала воспроизведения: секунды с начала эпохи или +смещение от начала записи")
+    # Интервал замеров
+    parser.add_argument("--interval", type=float, default=1.0,
+                        help="интервал между замерами в секундах (экспорт и живой просмотр)")
+    # Время жизни общего снимка
+    parser.add_argument("--cache-ttl", type=float, default=2.0,
+                        help="сколько секунд пункты меню используют общий снимок без нового замера")
+    # Параллельное чтение /proc
+    parser.add_argument("--shards", type=int, default=1,
+                        help="число шардов для чтения /proc (1 - последовательно, 0 - по числу ядер)")
+    # Шарды в потоках
+    parser.add_argument("--shard-threads", action="store_true",
+                        help="читать шарды в потоках, а не в рабочих процессах")
+    # Агент и агрегатор для нескольких машин
+    parser.add_argument("--agent", metavar="ADDRESS",
+                        help="режим агента: отдавать замеры по адресу хост:порт или unix:/путь")
+    # Адреса агентов
+    parser.add_argument("--aggregate", metavar="ADDRESS", nargs="+",
+                        help="режим агрегатора: общий топ процессов с нескольких агентов")
+    # Число строк общего топа
+    parser.add_argument("--top", type=int, default=10,
+                        help="число строк общего топа агрегатора")
+    # Сразу открыть живой полноэкранный просмотр
+    parser.add_argument("--live", action="store_true",
+                        help="открыть живой просмотр процессов (curses) без меню")
+    # Число замеров
+    parser.add_argument("--count", type=int, default=None,
+                        help="число замеров (по умолчанию - до Ctrl+C)")
+    # Разбираем аргументы
+    args = parser.parse_args()
+    
+    # Если /proc недоступен (не Linux), возвращаемся к psutil
+    # Сообщение идет в stderr, чтобы не смешиваться с экспортом в stdout
+    if args.backend == "proc" and not os.path.isdir(PROC_ROOT):
+        # Сообщение
+        print(f"{PROC_ROOT} недоступен, используется psutil", file=sys.stderr)
+        # Переключаемся на psutil
+        args.backend = "psutil"
+    
+    # Режимы агента и агрегатора без меню
+    if args.agent:
+        # Запускаем агента
+        run_agent(args.agent, args.backend, args.interval, args.count, args.shards)
+        # Выходим
+        return
+    # Режим агрегатора
+    if args.aggregate:
+        # Запускаем агрегатор
+        run_aggregator(args.aggregate, args.interval, args.count, args.top)
+        # Выходим
+        return
+    
+    # Экспорт замеров без меню и без input()
+    if args.export:
+        # Формат не поддерживает разницы
+        if args.delta and args.export not in DELTA_FORMATTERS:
+            # Ошибка аргументов
+            parser.error(f"--delta не поддерживается для формата {args.export}")
+        # Запускаем экспорт
+        run_export(args.export, args.backend, args.interval, args.count, args.output, args.shards,
+                   args.delta)
+        # Выходим
+        return
+    
+    # Проверка правил без меню
+    if args.watch_rules:
+        # Правил нет
+        if not args.rule:
+            # Ошибка аргументов
+            parser.error("--watch-rules требует хотя бы одного --rule")
+        # Правило может не разобраться
+        try:
+            # Запускаем проверку правил
+            run_rules(args.rule, args.backend, args.interval, args.count, args.shards,
+                      args.rule_log, args.rule_export)
+        # Неверное правило
+        except ValueError as error:
+            # Ошибка аргументов
+            parser.error(str(error))
+        # Выходим
+        return
+    
+    # Запись замеров без меню
+    if args.record:
+        # Запускаем запись
+        run_record(args.record, args.backend, args.interval, args.count, args.shards)
+        # Выходим
+        return
+    
+    # Воспроизведение записи через те же представления, что и для живой системы
+    if args.replay:
+        # Файл может быть недоступен или другого формата
+        try:
+            # Открываем запись
+            recording = Recording(args.replay)
+            # Момент начала (если задан)
+            start = parse_replay_start(args.at, recording) if args.at else None
+        # Ошибка открытия
+        except (OSError, ValueError) as error:
+            # Сообщение
+            print(f"Не удалось открыть запись: {error}", file=sys.stderr)
+            # Выходим
+            return
+        # Кадров нет
+        if not len(recording):
+            # Сообщение
+            print("Запись пуста")
+            # Закрываем запись
+            recording.close()
+            # Выходим
+            return
+        # Воспроизведение с нужного момента
+        replay = Replay(recording, start)
+        # Сведения о записи: число кадров и время начала и конца
+        print(f"Запись: {len(recording)} кадров, "
+              f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(recording.time(0)))} - "
+              f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(recording.time(len(recording) - 1)))}")
+        # Диспетчер поверх записи
+        manager = ProcessManager(interval=args.interval, replay=replay)
+        # Запись закрывается в любом случае
+        try:
+            # Живой просмотр
+            if args.live:
+                # Запускаем его
+                manager.live_view()
+            # Без живого просмотра
+            else:
+                # Все процессы
+                manager.show_all_processes()
+                # Мониторинг топ-5
+                manager._monitor_all()
+        # В любом случае
+        finally:
+            # Закрываем запись
+            replay.close()
+        # Выходим
+        return
+    
+    # Бенчмарк источников данных
+    if args.bench == "backends":
+        # Запускаем бенчмарк
+        benchmark_backends(args.sizes)
+        # Выходим
+        return
+    # Микробенчмарк выбора топ-k
+    if args.bench == "topk":
+        # Запускаем бенчмарк
+        benchmark_topk(args.sizes)
+        # Выходим
+        return
+    # Бенчмарк параллельного чтения /proc
+    if args.bench == "shards":
+        # Запускаем бенчмарк
+        benchmark_shards(args.sizes)
+        # Выходим
+        return
+    # Набор бенчмарков основных путей с выводом в JSON
+    if args.bench == "suite":
+        # Запускаем набор
+        benchmark_suite(args.sizes, args.repeat, args.json, args.baseline)
+        # Выходим
+        return
+    # Бенчмарк проверки правил
+    if args.bench == "rules":
+        # Запускаем бенчмарк
+        benchmark_rules(args.sizes)
+        # Выходим
+        return
+    # Бенчмарк поиска утечек памяти
+    if args.bench == "leaks":
+        # Запускаем бенчмарк
+        benchmark_leaks(args.sizes)
+        # Выходим
+        return
+    
+    # Правила оповещений для меню и живого просмотра
+    rules = None
+    # Правила заданы
+    if args.rule:
+        # Правило может не разобраться
+        try:
+            # Журнал правил в файл или stderr
+            log = open(args.rule_log, "a", encoding="utf-8", buffering=1) if args.rule_log else None
+            # Набор правил
+            rules = RuleEngine(args.rule, log=log, export_path=args.rule_export)
+        except ValueError as error:
+            # Ошибка аргументов
+            parser.error(str(error))
+    
     # Создаем объект ProcessManager
-    manager = ProcessManager()
+    manager = ProcessManager(args.backend, args.interval, args.shards, args.shard_threads,
+                             cache_ttl=args.cache_ttl, rules=rules)
+    
+    # Живой просмотр без меню
+    if args.live:
+        # Запускаем просмотр
+        manager.live_view()
+        # Выходим
+        return
     
     # Бесконечный цикл для работы с меню
     # while True будет выполняться до явного выхода
@@ -480,10 +7359,15 @@ def main():
         print("1. Показать все процессы")
         print("2. Завершить процесс")
         print("3. Мониторинг ресурсов")
-        print("4. Выход")
+        print("4. Живой просмотр процессов")
+        print("5. Дерево процессов")
+        print("6. Топ служб по памяти")
+        print("7. Статистика диспетчера")
+        print("8. Группы cgroup (контейнеры, службы)")
+        print("9. Выход")
         
         # Запрашиваем выбор пользователя
-        choice = input("\nВыбор (1-4): ").strip()
+        choice = input("\nВыбор (1-9): ").strip()
         
         # Обрабатываем выбор пользователя
         if choice == "1":
@@ -496,6 +7380,21 @@ def main():
             # Мониторим ресурсы
             manager.monitor_resources()
         elif choice == "4":
+            # Полноэкранный просмотр с обновлением только изменившихся строк
+            manager.live_view()
+        elif choice == "5":
+            # Дерево процессов с суммами по поддеревьям
+            manager.show_tree()
+        elif choice == "6":
+            # Службы, занимающие больше всего памяти вместе с потомками
+            manager.show_services()
+        elif choice == "7":
+            # Сколько стоит работа самого диспетчера
+            manager.show_stats()
+        elif choice == "8":
+            # Контейнеры и юниты systemd со счетчиками ядра
+            manager.show_cgroups()
+        elif choice == "9":
             # Выходим из программы
             print("\nВыход из программы")
             # break прерывает цикл while
@@ -503,9 +7402,6 @@ def main():
         else:
             # Если введен неверный выбор
             print("\nНеверный выбор")
-        
-        # Делаем небольшую паузу для удобства чтения вывода
-        time.sleep(0.5)
 
 # Проверка, запущен ли скрипт напрямую (а не импортирован как модуль)
 if __name__ == "__main__":
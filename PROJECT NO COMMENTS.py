@@ -1,9 +1,110 @@
 import psutil
 import time
+import os
+import subprocess
+import sys
+import random
+import argparse
+import re
+import json
+from collections import OrderedDict, deque
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
-from typing import List, Generator
-from functools import wraps
+from typing import List, Generator, Iterable
+from functools import wraps, partial
+from contextlib import contextmanager
+import operator
+from array import array
+import heapq
+from itertools import compress, chain
+from bisect import bisect_left, insort
+import socket
+import struct
+import select
+import errno
+import zlib
+import mmap
+import asyncio
+import threading
+import fnmatch
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, BrokenExecutor
+import tracemalloc
+import platform
+
+try:
+    import curses
+except ImportError:
+    curses = None
+
+PROC_ROOT = "/proc"
+
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+BACKENDS = ("psutil", "proc")
+
+PROCESS_FIELDS = ("pid", "name", "cpu_percent", "memory_percent", "rss", "ppid", "num_threads",
+                  "create_time")
+
+class Instrumentation:
+    STAGES = ("enumerate", "fetch", "sort", "render", "system", "leaks")
+    COUNTERS = ("vanished", "denied", "malformed")
+    
+    def __init__(self):
+        self.stages = {stage: [0, 0.0, 0.0] for stage in self.STAGES}
+        self.counters = dict.fromkeys(self.COUNTERS, 0)
+        self.started = (time.monotonic(), time.process_time())
+        self.last = self.started
+    
+    def record(self, name: str, seconds: float):
+        entry = self.stages[name]
+        entry[0] += 1
+        entry[1] += seconds
+        entry[2] = seconds
+    
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+    
+    def count(self, name: str, amount: int = 1):
+        self.counters[name] += amount
+    
+    def overhead(self) -> dict:
+        now = (time.monotonic(), time.process_time())
+        
+        def percent(since):
+            elapsed = now[0] - since[0]
+            return (now[1] - since[1]) / elapsed * 100 if elapsed > 0 else 0.0
+        
+        result = {"cpu_percent": percent(self.last), "cpu_percent_total": percent(self.started)}
+        self.last = now
+        try:
+            own = psutil.Process()
+            with own.oneshot():
+                result["rss"] = own.memory_info().rss
+                result["memory_percent"] = own.memory_percent()
+                result["threads"] = own.num_threads()
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            result.update(rss=0, memory_percent=0.0, threads=0)
+        return result
+    
+    def report(self) -> dict:
+        stages = {}
+        for name, (calls, total, last) in self.stages.items():
+            stages[name] = {
+                "calls": calls,
+                "total_ms": total * 1000,
+                "avg_ms": total / calls * 1000 if calls else 0.0,
+                "last_ms": last * 1000,
+            }
+        return {"stages": stages, "skipped": dict(self.counters), "self": self.overhead()}
+
+instrumentation = Instrumentation()
 
 def header_decorator(title: str):
     def decorator(func):
@@ -16,52 +117,2960 @@ def header_decorator(title: str):
         return wrapper
     return decorator
 
-@dataclass(order=True)
-class ProcessInfo:
+@dataclass(order=True)
+class ProcessInfo:
+    pid: int
+    name: str
+    cpu_percent: float
+    memory_percent: float
+    
+    ppid: int = 0
+    num_threads: int = 0
+    
+    def __str__(self):
+        return f"{self.pid:<8} {self.name[:20]:<20} {self.cpu_percent:<8.1f} {self.memory_percent:<10.2f}"
+
+class NameTable:
+    def __init__(self):
+        self.names = []
+        self.ids = {}
+    
+    def intern(self, key) -> int:
+        index = self.ids.get(key)
+        if index is None:
+            name = key.decode(errors="replace") if isinstance(key, bytes) else key
+            index = len(self.names)
+            self.names.append(name)
+            self.ids[key] = index
+        return index
+
+class ProcessSnapshot:
+    COLUMNS = ("pid", "cpu", "memory", "rss", "ppid", "threads", "started")
+    
+    def __init__(self, table: NameTable = None):
+        self.timestamp = time.time()
+        self.table = table if table is not None else NameTable()
+        self.pid = array("i")
+        self.cpu = array("d")
+        self.memory = array("d")
+        self.rss = array("Q")
+        self.ppid = array("i")
+        self.threads = array("I")
+        self.started = array("d")
+        self.name_id = array("I")
+    
+    def append(self, pid: int, name, cpu: float, memory: float, rss: int,
+               ppid: int = 0, threads: int = 0, started: float = 0.0):
+        self.pid.append(pid)
+        self.name_id.append(self.table.intern(name))
+        self.cpu.append(cpu)
+        self.memory.append(memory)
+        self.rss.append(rss)
+        self.ppid.append(ppid)
+        self.threads.append(threads)
+        self.started.append(started)
+    
+    def __len__(self):
+        return len(self.pid)
+    
+    def __iter__(self):
+        return (self.view(i) for i in range(len(self.pid)))
+    
+    def name(self, i: int) -> str:
+        return self.table.names[self.name_id[i]]
+    
+    def view(self, i: int) -> ProcessInfo:
+        return ProcessInfo(
+            pid=self.pid[i],
+            name=self.table.names[self.name_id[i]],
+            cpu_percent=self.cpu[i],
+            memory_percent=self.memory[i],
+            ppid=self.ppid[i],
+            num_threads=self.threads[i]
+        )
+    
+    def views(self, indices) -> List[ProcessInfo]:
+        return [self.view(i) for i in indices]
+    
+    def column(self, key: str) -> array:
+        if key not in self.COLUMNS:
+            raise ValueError(f"Неизвестная колонка: {key}")
+        return getattr(self, key)
+    
+    def order(self, key: str = "cpu", reverse: bool = True) -> List[int]:
+        return sorted(range(len(self.pid)), key=self.column(key).__getitem__, reverse=reverse)
+    
+    def where(self, key: str, predicate) -> List[int]:
+        return list(compress(range(len(self.pid)), map(predicate, self.column(key))))
+    
+    def top(self, k: int, key="cpu", reverse: bool = True, rows=None) -> List[int]:
+        keys = (key,) if isinstance(key, str) else tuple(key)
+        columns = [self.column(name) for name in keys]
+        if rows is None:
+            rows = range(len(self.pid))
+        return self._select(rows, columns, k, reverse)
+    
+    def _select(self, indices, columns, k: int, reverse: bool) -> List[int]:
+        if k <= 0:
+            return []
+        if not columns:
+            return heapq.nsmallest(k, indices, key=self.pid.__getitem__)
+        
+        column = columns[0]
+        if isinstance(indices, range):
+            values = column
+        else:
+            values = list(map(column.__getitem__, indices))
+        select = heapq.nlargest if reverse else heapq.nsmallest
+        
+        best = select(k, values)
+        if not best:
+            return []
+        bound = best[-1]
+        
+        inside = partial(operator.le if reverse else operator.ge, bound)
+        candidates = list(compress(indices, map(inside, values)))
+        
+        sign = -1 if reverse else 1
+        pid = self.pid
+        full_key = lambda i: tuple([c[i] for c in columns] + [sign * pid[i]])
+        
+        if len(candidates) <= 4 * k:
+            return select(k, candidates, key=full_key)
+        
+        winners = [i for i in candidates if column[i] != bound]
+        ties = [i for i in candidates if column[i] == bound]
+        winners.sort(key=full_key, reverse=reverse)
+        return winners + self._select(ties, columns[1:], k - len(winners), reverse)
+
+class ProcessIterator:
+    def __init__(self, backend: str = "psutil"):
+        self.backend = backend
+    
+    def __iter__(self):
+        self.snapshot = collect_snapshot(self.backend)
+        self.index = 0
+        return self
+    
+    def __next__(self):
+        if self.index < len(self.snapshot):
+            process = self.snapshot.view(self.index)
+            self.index += 1
+            return process
+        raise StopIteration
+
+def process_generator(backend: str = "psutil", fields=None) -> Generator[ProcessInfo, None, None]:
+    if backend == "proc":
+        yield from get_proc_reader().sample(fields)
+        return
+    
+    for pid, name, cpu, memory, rss, ppid, threads, _ in _psutil_rows(fields):
+        yield ProcessInfo(pid=pid, name=name, cpu_percent=cpu, memory_percent=memory,
+                          ppid=ppid, num_threads=threads)
+
+_DENIED = object()
+
+def _psutil_rows(fields=None):
+    wanted = set(fields) if fields is not None else {"pid", "name", "cpu_percent", "memory_percent"}
+    attrs = ['pid']
+    if "name" in wanted:
+        attrs.append('name')
+    if "cpu_percent" in wanted:
+        attrs.append('cpu_percent')
+    need_memory = "memory_percent" in wanted or "rss" in wanted
+    if need_memory:
+        attrs.append('memory_info')
+    if "ppid" in wanted:
+        attrs.append('ppid')
+    if "num_threads" in wanted:
+        attrs.append('num_threads')
+    if "create_time" in wanted:
+        attrs.append('create_time')
+    total_memory = psutil.virtual_memory().total if need_memory else 1
+    expected = len(psutil.pids())
+    seen = 0
+    
+    for proc in psutil.process_iter(attrs, ad_value=_DENIED):
+        info = proc.info
+        seen += 1
+        if any(value is _DENIED for value in info.values()):
+            instrumentation.count("denied")
+            continue
+        memory_info = info.get('memory_info')
+        rss = memory_info.rss if memory_info else 0
+        yield (info['pid'], info.get('name') or "", info.get('cpu_percent') or 0.0,
+               rss / total_memory * 100, rss, info.get('ppid') or 0, info.get('num_threads') or 0,
+               info.get('create_time') or 0.0)
+    
+    instrumentation.count("vanished", max(0, expected - seen))
+
+_psutil_names = NameTable()
+
+def collect_snapshot(backend: str = "psutil", fields=PROCESS_FIELDS) -> ProcessSnapshot:
+    if backend == "proc":
+        return get_proc_reader().sample(fields)
+    
+    snapshot = ProcessSnapshot(_psutil_names)
+    with instrumentation.stage("fetch"):
+        for row in _psutil_rows(fields):
+            snapshot.append(*row)
+    return snapshot
+
+class DetailCache:
+    LOADERS = {
+        "cmdline": lambda proc: " ".join(proc.cmdline()),
+        "username": lambda proc: proc.username(),
+        "open_files": lambda proc: [f.path for f in proc.open_files()],
+        "num_threads": lambda proc: proc.num_threads(),
+        "exe": lambda proc: proc.exe(),
+    }
+    
+    def __init__(self):
+        self.entries = {}
+    
+    def _entry(self, pid: int, started: float = None):
+        if started is None:
+            started = psutil.Process(pid).create_time()
+        entry = self.entries.get(pid)
+        if entry is None or abs(entry[0] - started) > 1 / CLOCK_TICKS:
+            self.forget(pid)
+            proc = psutil.Process(pid)
+            if not same_process(proc, started):
+                raise psutil.NoSuchProcess(pid)
+            entry = self.entries[pid] = (started, proc, {})
+        return entry
+    
+    def get(self, pid: int, field: str, started: float = None):
+        try:
+            _, proc, values = self._entry(pid, started)
+            if field not in values:
+                values[field] = self.LOADERS[field](proc)
+            return values[field]
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            return None
+    
+    def forget(self, pid: int):
+        self.entries.pop(pid, None)
+
+class PollingEvents:
+    kind = "опрос"
+    
+    def wait(self, timeout: float):
+        time.sleep(timeout)
+    
+    def pids(self) -> set:
+        return set(psutil.pids())
+    
+    def drain_short_lived(self) -> list:
+        return []
+    
+    def close(self):
+        pass
+
+class NetlinkEvents:
+    kind = "netlink"
+    NETLINK_CONNECTOR = 11
+    CN_IDX_PROC = 1
+    CN_VAL_PROC = 1
+    PROC_CN_MCAST_LISTEN = 1
+    PROC_CN_MCAST_IGNORE = 2
+    PROC_EVENT_FORK = 0x00000001
+    PROC_EVENT_EXEC = 0x00000002
+    PROC_EVENT_EXIT = 0x80000000
+    NLMSG = struct.Struct("=IHHII")
+    CN_MSG = struct.Struct("=IIIIHH")
+    EVENT_OFFSET = 36
+    DATA_OFFSET = 52
+    NLMSG_DONE = 3
+    RECEIVE_BUFFER = 1 << 20
+    RESYNC = 30.0
+    SHORT_LIVED_LIMIT = 1000
+    
+    def __init__(self):
+        self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, self.NETLINK_CONNECTOR)
+        try:
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.RECEIVE_BUFFER)
+            self.sock.bind((0, self.CN_IDX_PROC))
+            self._control(self.PROC_CN_MCAST_LISTEN)
+            self.sock.setblocking(False)
+            self.live = set(psutil.pids())
+            self.synced = time.monotonic()
+            self.born = {}
+            self.short_lived = deque(maxlen=self.SHORT_LIVED_LIMIT)
+            self._probe()
+        except OSError:
+            self.sock.close()
+            raise
+    
+    def _control(self, op: int):
+        payload = struct.pack("=I", op)
+        cn_msg = self.CN_MSG.pack(self.CN_IDX_PROC, self.CN_VAL_PROC, 0, 0, len(payload), 0)
+        length = self.NLMSG.size + len(cn_msg) + len(payload)
+        self.sock.send(self.NLMSG.pack(length, self.NLMSG_DONE, 0, 0, os.getpid()) + cn_msg + payload)
+    
+    def _probe(self):
+        child = os.fork()
+        if child == 0:
+            os._exit(0)
+        os.waitpid(child, 0)
+        deadline = time.monotonic() + 1.0
+        while child not in dict(self.short_lived):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([self.sock], [], [], remaining)[0]:
+                raise OSError("события proc connector не приходят")
+            self._drain()
+        self.short_lived = deque((item for item in self.short_lived if item[0] != child),
+                                 maxlen=self.SHORT_LIVED_LIMIT)
+    
+    @staticmethod
+    def _comm(pid: int) -> str:
+        try:
+            with open(f"{PROC_ROOT}/{pid}/comm", "rb") as file:
+                return file.read().rstrip(b"\n").decode(errors="replace")
+        except OSError:
+            return ""
+    
+    def _parse(self, data: bytes):
+        offset = 0
+        while offset + self.DATA_OFFSET <= len(data):
+            length = self.NLMSG.unpack_from(data, offset)[0]
+            what = struct.unpack_from("=I", data, offset + self.EVENT_OFFSET)[0]
+            body = offset + self.DATA_OFFSET
+            if what == self.PROC_EVENT_FORK:
+                _, _, pid, tgid = struct.unpack_from("=4I", data, body)
+                if pid == tgid:
+                    self.live.add(pid)
+                    self.born[pid] = self._comm(pid)
+            elif what == self.PROC_EVENT_EXEC:
+                pid = struct.unpack_from("=I", data, body)[0]
+                if pid in self.born:
+                    self.born[pid] = self._comm(pid) or self.born[pid]
+            elif what == self.PROC_EVENT_EXIT:
+                pid, tgid = struct.unpack_from("=2I", data, body)
+                if pid == tgid:
+                    self.live.discard(pid)
+                    if pid in self.born:
+                        self.short_lived.append((pid, self.born.pop(pid)))
+            if length <= 0:
+                break
+            offset += (length + 3) & ~3
+    
+    def _drain(self):
+        while True:
+            try:
+                data = self.sock.recv(65536)
+            except BlockingIOError:
+                return
+            except OSError as error:
+                if error.errno != errno.ENOBUFS:
+                    raise
+                self.live = set(psutil.pids())
+                self.synced = time.monotonic()
+                continue
+            self._parse(data)
+    
+    def wait(self, timeout: float):
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            ready, _, _ = select.select([self.sock], [], [], remaining)
+            if ready:
+                self._drain()
+    
+    def pids(self) -> set:
+        self._drain()
+        if time.monotonic() - self.synced > self.RESYNC:
+            self.live = set(psutil.pids())
+            self.synced = time.monotonic()
+        self.born.clear()
+        return set(self.live)
+    
+    def drain_short_lived(self) -> list:
+        self._drain()
+        result = list(self.short_lived)
+        self.short_lived.clear()
+        return result
+    
+    def close(self):
+        try:
+            self._control(self.PROC_CN_MCAST_IGNORE)
+        except OSError:
+            pass
+        self.sock.close()
+
+def open_process_events():
+    if hasattr(socket, "AF_NETLINK") and os.path.isdir(PROC_ROOT):
+        try:
+            return NetlinkEvents()
+        except OSError:
+            pass
+    return PollingEvents()
+
+def _stat_start(proc):
+    parse = getattr(proc._proc, "_parse_stat_file", None)
+    if parse is None:
+        return None
+    return parse()["create_time"]
+
+class ProcessSampler:
+    def __init__(self, events=None):
+        self.events = events
+        self.handles = {}
+        self.names = {}
+        self.started = {}
+        self.start_ticks = {}
+        self.table = NameTable()
+        self.cpu_totals = {}
+        self.last_time = None
+    
+    def _add(self, pid: int):
+        try:
+            proc = psutil.Process(pid)
+            self.names[pid] = proc.name()
+            self.started[pid] = proc.create_time()
+            self.start_ticks[pid] = _stat_start(proc)
+            self.handles[pid] = proc
+        except psutil.NoSuchProcess:
+            instrumentation.count("vanished")
+        except psutil.AccessDenied:
+            instrumentation.count("denied")
+    
+    def _drop(self, pid: int):
+        self.handles.pop(pid, None)
+        self.names.pop(pid, None)
+        self.started.pop(pid, None)
+        self.start_ticks.pop(pid, None)
+        self.cpu_totals.pop(pid, None)
+    
+    def sample(self) -> ProcessSnapshot:
+        now = time.monotonic()
+        elapsed = now - self.last_time if self.last_time is not None else 0.0
+        
+        with instrumentation.stage("enumerate"):
+            current = self.events.pids() if self.events is not None else set(psutil.pids())
+        
+        for pid in self.handles.keys() - current:
+            self._drop(pid)
+        
+        for pid in current - self.handles.keys():
+            self._add(pid)
+        
+        total_memory = psutil.virtual_memory().total
+        snapshot = ProcessSnapshot(self.table)
+        vanished = []
+        
+        fetch_started = time.perf_counter()
+        for pid, proc in self.handles.items():
+            try:
+                with proc.oneshot():
+                    times = proc.cpu_times()
+                    rss = proc.memory_info().rss
+                    ppid = proc.ppid()
+                    threads = proc.num_threads()
+                    ticks = _stat_start(proc)
+            except (psutil.NoSuchProcess, psutil.AccessDenied) as error:
+                instrumentation.count("denied" if isinstance(error, psutil.AccessDenied) else "vanished")
+                vanished.append(pid)
+                continue
+            
+            if ticks != self.start_ticks[pid] or (ticks is None and not proc.is_running()):
+                vanished.append(pid)
+                continue
+            
+            total = times.user + times.system
+            previous = self.cpu_totals.get(pid)
+            self.cpu_totals[pid] = total
+            
+            if previous is not None and elapsed > 0:
+                cpu = (total - previous) / elapsed * 100
+            else:
+                cpu = 0.0
+            
+            snapshot.append(pid, self.names[pid], cpu, rss / total_memory * 100, rss, ppid, threads,
+                            self.started[pid])
+        instrumentation.record("fetch", time.perf_counter() - fetch_started)
+        
+        for pid in vanished:
+            self._drop(pid)
+        
+        self.last_time = now
+        return snapshot
+
+def read_proc_shard(root: str, pids, need_stat: bool = True, need_values: bool = True,
+                    need_statm: bool = True) -> tuple:
+    buf = bytearray(4096)
+    buffers = [buf]
+    rows = (array("i"), [], array("i"), array("I"), array("Q"), array("Q"), array("Q"), array("I", [0, 0, 0]))
+    out_pid, out_name, out_ppid, out_threads, out_ticks, out_start, out_pages, skipped = rows
+    
+    for pid in pids:
+        name = b""
+        ppid = threads = total = started = pages = 0
+        try:
+            if need_stat:
+                fd = os.open(f"{root}/{pid}/stat", os.O_RDONLY)
+                try:
+                    size = os.readv(fd, buffers)
+                finally:
+                    os.close(fd)
+                start = buf.find(b"(", 0, size)
+                end = buf.rfind(b")", 0, size)
+                name = bytes(buf[start + 1:end])
+                if need_values:
+                    values = buf[end + 2:size].split()
+                    ppid = int(values[1])
+                    threads = int(values[17])
+                    total = int(values[11]) + int(values[12])
+                    started = int(values[19])
+            
+            if need_statm:
+                fd = os.open(f"{root}/{pid}/statm", os.O_RDONLY)
+                try:
+                    size = os.readv(fd, buffers)
+                finally:
+                    os.close(fd)
+                pages = int(buf[:size].split(None, 2)[1])
+        except PermissionError:
+            skipped[1] += 1
+            continue
+        except OSError:
+            skipped[0] += 1
+            continue
+        except (ValueError, IndexError):
+            skipped[2] += 1
+            continue
+        
+        out_pid.append(pid)
+        out_name.append(name)
+        out_ppid.append(ppid)
+        out_threads.append(threads)
+        out_ticks.append(total)
+        out_start.append(started)
+        out_pages.append(pages)
+    return rows
+
+class ProcReader:
+    def __init__(self, root: str = PROC_ROOT, events=None):
+        self.root = root
+        self.events = events
+        self.cpu_totals = {}
+        self.last_time = None
+        self.table = NameTable()
+        self.boot_time = psutil.boot_time()
+    
+    def pids(self) -> List[int]:
+        if self.events is not None:
+            return sorted(self.events.pids())
+        return [int(entry) for entry in os.listdir(self.root) if entry.isdigit()]
+    
+    def _read_parts(self, pids: List[int], need_stat: bool, need_values: bool, need_statm: bool) -> list:
+        return [read_proc_shard(self.root, pids, need_stat, need_values, need_statm)]
+    
+    def sample(self, fields=None) -> ProcessSnapshot:
+        wanted = PROCESS_FIELDS if fields is None else fields
+        need_cpu = "cpu_percent" in wanted
+        need_values = need_cpu or "ppid" in wanted or "num_threads" in wanted
+        need_stat = need_values or "name" in wanted
+        need_statm = "memory_percent" in wanted or "rss" in wanted
+        
+        now = time.monotonic()
+        elapsed = now - self.last_time if self.last_time is not None else 0.0
+        with instrumentation.stage("enumerate"):
+            pids = self.pids()
+        fetch_started = time.perf_counter()
+        parts = self._read_parts(pids, need_stat, need_values, need_statm)
+        
+        previous_totals = self.cpu_totals
+        totals = {}
+        total_memory = psutil.virtual_memory().total if need_statm else 1
+        snapshot = ProcessSnapshot(self.table)
+        
+        for pids, names, ppids, threads, ticks, starts, pages, skipped in parts:
+            for reason, amount in zip(Instrumentation.COUNTERS, skipped):
+                instrumentation.count(reason, amount)
+            snapshot.pid.extend(pids)
+            snapshot.ppid.extend(ppids)
+            snapshot.threads.extend(threads)
+            snapshot.name_id.extend(map(self.table.intern, names))
+            rss = [count * PAGE_SIZE for count in pages]
+            snapshot.rss.extend(rss)
+            snapshot.memory.extend([value / total_memory * 100 for value in rss])
+            if need_values:
+                snapshot.started.extend([self.boot_time + start / CLOCK_TICKS for start in starts])
+            else:
+                snapshot.started.extend(array("d", bytes(8 * len(pids))))
+            
+            if not need_cpu:
+                snapshot.cpu.extend(array("d", bytes(8 * len(pids))))
+                continue
+            cpu = []
+            for pid, total, started in zip(pids, ticks, starts):
+                totals[pid] = (started, total)
+                previous = previous_totals.get(pid)
+                if previous is not None and previous[0] == started and elapsed > 0:
+                    cpu.append((total - previous[1]) / CLOCK_TICKS / elapsed * 100)
+                else:
+                    cpu.append(0.0)
+            snapshot.cpu.extend(cpu)
+        
+        instrumentation.record("fetch", time.perf_counter() - fetch_started)
+        
+        if need_cpu:
+            self.cpu_totals = totals
+            self.last_time = now
+        return snapshot
+
+class ShardedProcReader(ProcReader):
+    MIN_SHARD_SIZE = 2000
+    
+    def __init__(self, root: str = PROC_ROOT, events=None, shards: int = None, use_threads: bool = False):
+        super().__init__(root, events)
+        self.shards = shards or os.cpu_count() or 1
+        self.use_threads = use_threads
+        self.pool = None
+        self.serial = self.shards < 2
+    
+    def _pool(self):
+        if self.pool is None:
+            executor = ThreadPoolExecutor if self.use_threads else ProcessPoolExecutor
+            self.pool = executor(max_workers=self.shards)
+        return self.pool
+    
+    def _read_parts(self, pids: List[int], need_stat: bool, need_values: bool, need_statm: bool) -> list:
+        shards = min(self.shards, len(pids) // self.MIN_SHARD_SIZE)
+        if self.serial or shards < 2:
+            return super()._read_parts(pids, need_stat, need_values, need_statm)
+        
+        size = -(-len(pids) // shards)
+        chunks = [pids[start:start + size] for start in range(0, len(pids), size)]
+        try:
+            pool = self._pool()
+            read = partial(read_proc_shard, self.root, need_stat=need_stat,
+                           need_values=need_values, need_statm=need_statm)
+            return list(pool.map(read, chunks))
+        except (OSError, BrokenExecutor) as error:
+            print(f"Параллельное чтение /proc недоступно ({error}), используется последовательное",
+                  file=sys.stderr)
+            self.close()
+            self.serial = True
+            return super()._read_parts(pids, need_stat, need_values, need_statm)
+    
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False)
+            self.pool = None
+
+_proc_reader = None
+
+def get_proc_reader() -> ProcReader:
+    global _proc_reader
+    if _proc_reader is None:
+        _proc_reader = ProcReader()
+    return _proc_reader
+
+def make_sampler(backend: str = "psutil", events=None, shards: int = 1, use_threads: bool = False):
+    if backend == "proc":
+        if shards != 1:
+            return ShardedProcReader(events=events, shards=shards or None, use_threads=use_threads)
+        return ProcReader(events=events)
+    return ProcessSampler(events)
+
+class SnapshotCache:
+    def __init__(self, sampler, ttl: float = 2.0):
+        self.sampler = sampler
+        self.ttl = ttl
+        self.entry = (None, 0.0)
+        self.lock = threading.Lock()
+    
+    def fresh(self, max_age: float = None, requested: float = None):
+        snapshot, taken = self.entry
+        if snapshot is None:
+            return None
+        max_age = self.ttl if max_age is None else max_age
+        if time.monotonic() - taken < max_age or (requested is not None and taken >= requested):
+            return snapshot
+        return None
+    
+    def get(self, max_age: float = None) -> ProcessSnapshot:
+        requested = time.monotonic()
+        snapshot = self.fresh(max_age)
+        if snapshot is not None:
+            return snapshot
+        with self.lock:
+            snapshot = self.fresh(max_age, requested)
+            if snapshot is None:
+                started = time.monotonic()
+                snapshot = self.sampler.sample()
+                self.entry = (snapshot, started)
+            return snapshot
+    
+    def invalidate(self):
+        self.entry = (None, 0.0)
+
+def same_process(proc, started: float) -> bool:
+    return not started or abs(proc.create_time() - started) <= 1 / CLOCK_TICKS
+
+class NameIndex:
+    def __init__(self, details: DetailCache = None):
+        self.entries = {}
+        self.by_name = {}
+        self.trigrams = {}
+        self.details = details if details is not None else DetailCache()
+        self.lowered = {"cmdline": {}, "username": {}}
+        self.by_detail = {"cmdline": {}, "username": {}}
+        self.pending = {"cmdline": set(), "username": set()}
+    
+    @staticmethod
+    def _grams(text: str) -> set:
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+    
+    def add(self, pid: int, name: str, started: float = 0.0):
+        lower = name.lower()
+        self.entries[pid] = (name, lower, started)
+        for pending in self.pending.values():
+            pending.add(pid)
+        pids = self.by_name.get(lower)
+        if pids is None:
+            pids = self.by_name[lower] = set()
+            for gram in self._grams(lower):
+                self.trigrams.setdefault(gram, set()).add(lower)
+        pids.add(pid)
+    
+    def remove(self, pid: int):
+        name, lower, _ = self.entries.pop(pid)
+        pids = self.by_name[lower]
+        pids.discard(pid)
+        if not pids:
+            del self.by_name[lower]
+            for gram in self._grams(lower):
+                names = self.trigrams[gram]
+                names.discard(lower)
+                if not names:
+                    del self.trigrams[gram]
+        for field, values in self.lowered.items():
+            self.pending[field].discard(pid)
+            value = values.pop(pid, None)
+            if value is not None:
+                pids = self.by_detail[field][value]
+                pids.discard(pid)
+                if not pids:
+                    del self.by_detail[field][value]
+        self.details.forget(pid)
+    
+    def update(self, snapshot: ProcessSnapshot):
+        names = snapshot.table.names
+        current = dict(zip(snapshot.pid, zip(map(names.__getitem__, snapshot.name_id), snapshot.started)))
+        for pid in self.entries.keys() - current.keys():
+            self.remove(pid)
+        entries = self.entries
+        for pid, (name, started) in current.items():
+            entry = entries.get(pid)
+            if entry is None:
+                self.add(pid, name, started)
+            elif entry[0] != name or entry[2] != started:
+                self.remove(pid)
+                self.add(pid, name, started)
+    
+    def name(self, pid: int) -> str:
+        return self.entries[pid][0]
+    
+    def _substring(self, text: str) -> List[str]:
+        if len(text) < 3:
+            return [lower for lower in self.by_name if text in lower]
+        sets = sorted((self.trigrams.get(gram, set()) for gram in self._grams(text)), key=len)
+        candidates = set.intersection(*sets)
+        return [lower for lower in candidates if text in lower]
+    
+    def _details(self, field: str) -> dict:
+        values = self.lowered[field]
+        by_value = self.by_detail[field]
+        for pid in self.pending[field]:
+            value = values[pid] = (self.details.get(pid, field, self.entries[pid][2]) or "").lower()
+            by_value.setdefault(value, set()).add(pid)
+        self.pending[field].clear()
+        return by_value
+    
+    def search(self, query: str) -> List[int]:
+        if query.startswith("cmd:") or query.startswith("user:"):
+            prefix, text = query.split(":", 1)
+            field = "cmdline" if prefix == "cmd" else "username"
+            text = text.lower()
+            return sorted(pid for value, pids in self._details(field).items() if text in value for pid in pids)
+        
+        if query.startswith("re:"):
+            pattern = re.compile(query[3:], re.IGNORECASE)
+            names = [lower for lower in self.by_name if pattern.search(lower)]
+        else:
+            names = self._substring(query.lower())
+        return sorted(pid for lower in names for pid in self.by_name[lower])
+
+class ProcessTree:
+    CPU, RSS, THREADS, COUNT = range(4)
+    KEYS = {"cpu": CPU, "rss": RSS, "threads": THREADS, "count": COUNT}
+    
+    def __init__(self):
+        self.own = {}
+        self.totals = {}
+        self.parent = {}
+        self.children = {}
+        self.ppid = {}
+        self.waiting = {}
+        self.names = {}
+    
+    def _propagate(self, pid, cpu: float, rss: int, threads: int, count: int):
+        totals = self.totals
+        parent = self.parent
+        while pid is not None:
+            total = totals[pid]
+            total[0] += cpu
+            total[1] += rss
+            total[2] += threads
+            total[3] += count
+            pid = parent[pid]
+    
+    def _detach(self, pid: int):
+        parent = self.parent[pid]
+        if parent is None:
+            return
+        cpu, rss, threads, count = self.totals[pid]
+        self._propagate(parent, -cpu, -rss, -threads, -count)
+        self.children[parent].discard(pid)
+        self.parent[pid] = None
+    
+    def _attach(self, pid: int, parent: int):
+        ancestor = parent
+        while ancestor is not None:
+            if ancestor == pid:
+                return
+            ancestor = self.parent[ancestor]
+        self.parent[pid] = parent
+        self.children[parent].add(pid)
+        self._propagate(parent, *self.totals[pid])
+    
+    def _unwait(self, pid: int):
+        parent = self.ppid[pid]
+        waiting = self.waiting.get(parent)
+        if waiting is not None:
+            waiting.discard(pid)
+            if not waiting:
+                del self.waiting[parent]
+    
+    def _remove(self, pid: int):
+        for child in list(self.children[pid]):
+            self._detach(child)
+            self.waiting.setdefault(pid, set()).add(child)
+        self._detach(pid)
+        self._unwait(pid)
+        for table in (self.own, self.totals, self.parent, self.children, self.ppid, self.names):
+            del table[pid]
+    
+    def update(self, snapshot: ProcessSnapshot):
+        own = self.own
+        for pid in own.keys() - set(snapshot.pid):
+            self._remove(pid)
+        
+        relink = []
+        names = snapshot.table.names
+        rows = zip(snapshot.pid, snapshot.ppid, snapshot.cpu, snapshot.rss, snapshot.threads, snapshot.name_id)
+        for pid, ppid, cpu, rss, threads, name_id in rows:
+            values = own.get(pid)
+            if values is None:
+                own[pid] = [cpu, rss, threads, 1]
+                self.totals[pid] = [cpu, rss, threads, 1]
+                self.parent[pid] = None
+                self.children[pid] = set()
+                self.ppid[pid] = ppid
+                self.names[pid] = names[name_id]
+                relink.append(pid)
+                continue
+            
+            if values[0] != cpu or values[1] != rss or values[2] != threads:
+                self._propagate(pid, cpu - values[0], rss - values[1], threads - values[2], 0)
+                values[0] = cpu
+                values[1] = rss
+                values[2] = threads
+            if self.ppid[pid] != ppid:
+                self._unwait(pid)
+                self.ppid[pid] = ppid
+                relink.append(pid)
+        
+        for pid in relink:
+            self._detach(pid)
+            parent = self.ppid[pid]
+            if parent == pid:
+                continue
+            if parent in own:
+                self._attach(pid, parent)
+            else:
+                self.waiting.setdefault(parent, set()).add(pid)
+        
+        for pid in relink:
+            for child in self.waiting.pop(pid, ()):
+                if self.parent[child] is None:
+                    self._attach(child, pid)
+    
+    def roots(self) -> List[int]:
+        return [pid for pid, parent in self.parent.items() if parent is None]
+    
+    def ranked(self, pids, key: str = "rss") -> List[int]:
+        index = self.KEYS[key]
+        return sorted(pids, key=lambda pid: self.totals[pid][index], reverse=True)
+    
+    def services(self) -> dict:
+        groups = {}
+        for root in self.roots():
+            members = [(root, self.own[root])]
+            members += [(child, self.totals[child]) for child in self.children[root]]
+            for pid, values in members:
+                group = groups.setdefault(self.names[pid], [0.0, 0, 0, 0])
+                for i, value in enumerate(values):
+                    group[i] += value
+        return groups
+    
+    def top_services(self, k: int, key: str = "rss") -> List[tuple]:
+        index = self.KEYS[key]
+        return heapq.nlargest(k, self.services().items(), key=lambda item: item[1][index])
+
+
+CGROUP_ROOTS = ("/sys/fs/cgroup", "/sys/fs/cgroup/unified")
+
+def find_cgroup_root(candidates=CGROUP_ROOTS):
+    for root in candidates:
+        if os.path.exists(os.path.join(root, "cgroup.controllers")):
+            return root
+    return None
+
+CONTAINER_PATTERN = re.compile(r"^(?:(docker|cri-containerd|crio|libpod)-)?([0-9a-f]{64})(?:\.scope)?$")
+
+@dataclass
+class CgroupStats:
+    memory: int = 0
+    cpu_seconds: float = 0.0
+    cpu_percent: float = None
+    io_read: int = 0
+    io_write: int = 0
+
+def cgroup_group(path: str) -> tuple:
+    parts = path.strip("/").split("/") if path.strip("/") else []
+    for depth, part in enumerate(parts):
+        match = CONTAINER_PATTERN.match(part)
+        if match:
+            runtime = match.group(1) or "container"
+            return f"{runtime}:{match.group(2)[:12]}", "/" + "/".join(parts[:depth + 1])
+    for depth in range(len(parts) - 1, -1, -1):
+        if parts[depth].endswith((".service", ".scope")):
+            return parts[depth], "/" + "/".join(parts[:depth + 1])
+    return path or "/", path or "/"
+
+class CgroupResolver:
+    def __init__(self, proc_root: str = PROC_ROOT, cgroup_root: str = None, ttl: float = 1.0):
+        self.proc_root = proc_root
+        self.cgroup_root = cgroup_root if cgroup_root is not None else find_cgroup_root()
+        self.ttl = ttl
+        self.paths = {}
+        self.interned = {}
+        self.stats_cache = {}
+    
+    def _read_path(self, pid: int):
+        try:
+            with open(f"{self.proc_root}/{pid}/cgroup", "rb") as file:
+                for line in file:
+                    if line.startswith(b"0::"):
+                        path = line[3:].strip().decode(errors="replace")
+                        return self.interned.setdefault(path, path)
+        except OSError:
+            return None
+        return "/"
+    
+    def resolve(self, snapshot: ProcessSnapshot) -> List[str]:
+        paths = self.paths
+        keys = list(zip(snapshot.pid, snapshot.started))
+        result = []
+        for key in keys:
+            path = paths.get(key)
+            if path is None:
+                path = self._read_path(key[0])
+                if path is not None:
+                    paths[key] = path
+            result.append(path)
+        if len(paths) > len(keys):
+            for key in paths.keys() - set(keys):
+                del paths[key]
+        return result
+    
+    def _read(self, directory: str, name: str):
+        try:
+            with open(os.path.join(directory, name), "rb") as file:
+                return file.read()
+        except OSError:
+            return None
+    
+    def stats(self, group_path: str) -> CgroupStats:
+        now = time.monotonic()
+        cached = self.stats_cache.get(group_path)
+        if cached is not None and now - cached[0] < self.ttl:
+            return cached[1]
+        
+        stats = CgroupStats()
+        if self.cgroup_root is not None:
+            directory = self.cgroup_root + group_path.rstrip("/")
+            memory = self._read(directory, "memory.current")
+            if memory is not None and memory.strip().isdigit():
+                stats.memory = int(memory)
+            cpu = self._read(directory, "cpu.stat")
+            for line in (cpu or b"").splitlines():
+                name, _, value = line.partition(b" ")
+                if name == b"usage_usec":
+                    stats.cpu_seconds = int(value) / 1e6
+            io = self._read(directory, "io.stat")
+            for line in (io or b"").splitlines():
+                for field in line.split()[1:]:
+                    name, _, value = field.partition(b"=")
+                    if name == b"rbytes":
+                        stats.io_read += int(value)
+                    elif name == b"wbytes":
+                        stats.io_write += int(value)
+        if cached is not None and now > cached[0]:
+            stats.cpu_percent = (stats.cpu_seconds - cached[1].cpu_seconds) / (now - cached[0]) * 100
+        self.stats_cache[group_path] = (now, stats)
+        return stats
+    
+    def groups(self, snapshot: ProcessSnapshot) -> dict:
+        groups = {}
+        labels = {}
+        for path, cpu, rss in zip(self.resolve(snapshot), snapshot.cpu, snapshot.rss):
+            if path is None:
+                continue
+            label = labels.get(path)
+            if label is None:
+                label = labels[path] = cgroup_group(path)
+            group = groups.get(label[1])
+            if group is None:
+                group = groups[label[1]] = [label[0], 0, 0.0, 0]
+            group[1] += 1
+            group[2] += cpu
+            group[3] += rss
+        return groups
+
+class MultiMonitor:
+    def __init__(self, pids: Iterable[int], include_children: bool = False, interval: float = 1.0):
+        self.roots = list(pids)
+        self.include_children = include_children
+        self.interval = interval
+        self.handles = {}
+        self.names = {}
+        self.started = {}
+        self.table = NameTable()
+        self.max_lag = 0.0
+        
+        for pid in self.roots:
+            self._watch(pid)
+        if include_children:
+            self._add_children()
+    
+    def _watch(self, pid: int):
+        try:
+            proc = psutil.Process(pid)
+            self.names[pid] = proc.name()
+            self.started[pid] = proc.create_time()
+            proc.cpu_percent(interval=None)
+            self.handles[pid] = proc
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            pass
+    
+    def _add_children(self):
+        children = {}
+        for proc in psutil.process_iter(["ppid"]):
+            children.setdefault(proc.info["ppid"], []).append(proc.pid)
+        
+        stack = [pid for pid in self.roots if pid in self.handles]
+        seen = set(stack)
+        while stack:
+            for child in children.get(stack.pop(), ()):
+                if child in seen:
+                    continue
+                seen.add(child)
+                stack.append(child)
+                if child not in self.handles:
+                    self._watch(child)
+    
+    def sample(self):
+        if self.include_children:
+            self._add_children()
+        
+        total_memory = psutil.virtual_memory().total
+        snapshot = ProcessSnapshot(self.table)
+        exited = []
+        fetch_started = time.perf_counter()
+        for pid, proc in self.handles.items():
+            try:
+                with proc.oneshot():
+                    cpu = proc.cpu_percent(interval=None)
+                    rss = proc.memory_info().rss
+                    ppid = proc.ppid()
+                    threads = proc.num_threads()
+            except (psutil.NoSuchProcess, psutil.AccessDenied) as error:
+                instrumentation.count("denied" if isinstance(error, psutil.AccessDenied) else "vanished")
+                exited.append(pid)
+                continue
+            snapshot.append(pid, self.names[pid], cpu, rss / total_memory * 100, rss, ppid, threads,
+                            self.started[pid])
+        instrumentation.record("fetch", time.perf_counter() - fetch_started)
+        
+        for pid in exited:
+            del self.handles[pid]
+        return snapshot, exited
+    
+    def run(self, ticks: int):
+        for tick, lag in tick_schedule(self.interval, ticks):
+            self.max_lag = max(self.max_lag, lag)
+            snapshot, exited = self.sample()
+            yield tick, snapshot, exited
+            
+            if not self.handles:
+                return
+
+def tick_schedule(interval: float, count: int = None) -> Generator[tuple, None, None]:
+    next_tick = time.monotonic() + interval
+    tick = 0
+    while count is None or tick < count:
+        delay = next_tick - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        tick += 1
+        yield tick, max(0.0, -delay)
+        
+        next_tick += interval
+        now = time.monotonic()
+        if next_tick < now:
+            next_tick += (now - next_tick) // interval * interval + interval
+
+
+class SnapshotDelta:
+    def __init__(self, snapshot: ProcessSnapshot, added: List[int], changed: List[int], removed: List[tuple]):
+        self.snapshot = snapshot
+        self.added = added
+        self.changed = changed
+        self.removed = removed
+    
+    def __len__(self):
+        return len(self.added) + len(self.changed) + len(self.removed)
+    
+    def rows(self):
+        return chain(self.added, self.changed)
+
+class DeltaTracker:
+    TRACKED = ("cpu", "memory", "ppid", "threads")
+    
+    def __init__(self, cpu_threshold: float = 0.5, memory_threshold: float = 0.02):
+        self.cpu_threshold = cpu_threshold
+        self.memory_threshold = memory_threshold
+        self.reset()
+    
+    def reset(self):
+        self.pids = array("i")
+        self.starts = array("d")
+        self.keys = []
+        self.reported = [array("d"), array("d"), array("i"), array("I")]
+    
+    def diff(self, snapshot: ProcessSnapshot) -> SnapshotDelta:
+        count = len(snapshot)
+        current = [snapshot.column(name) for name in self.TRACKED]
+        added = []
+        removed = []
+        
+        if snapshot.pid != self.pids or snapshot.started != self.starts:
+            keys = list(zip(snapshot.pid, snapshot.started))
+            position = dict(zip(self.keys, range(len(self.keys))))
+            rows = list(map(position.get, keys))
+            added = list(compress(range(count), map(operator.is_, rows, [None] * count)))
+            offset = len(self.keys)
+            for i in added:
+                rows[i] = offset + i
+            self.reported = [array(old.typecode, map((old + column).__getitem__, rows))
+                             for old, column in zip(self.reported, current)]
+            if offset > count - len(added):
+                removed = list(position.keys() - set(keys))
+            self.keys = keys
+            self.pids = array("i", snapshot.pid)
+            self.starts = array("d", snapshot.started)
+        
+        cpu, memory, ppid, threads = current
+        old_cpu, old_memory, old_ppid, old_threads = self.reported
+        masks = (
+            map(partial(operator.lt, self.cpu_threshold), map(abs, map(operator.sub, cpu, old_cpu))),
+            map(partial(operator.lt, self.memory_threshold), map(abs, map(operator.sub, memory, old_memory))),
+            map(operator.ne, ppid, old_ppid),
+            map(operator.ne, threads, old_threads),
+        )
+        changed = sorted(set().union(*(compress(range(count), mask) for mask in masks)))
+        
+        for i in changed:
+            for old, column in zip(self.reported, current):
+                old[i] = column[i]
+        return SnapshotDelta(snapshot, added, changed, removed)
+
+class RankedView:
+    def __init__(self, key="cpu", reverse: bool = True):
+        self.keys = (key,) if isinstance(key, str) else tuple(key)
+        self.sign = -1 if reverse else 1
+        self.order = []
+        self.entries = {}
+    
+    def _discard(self, key: tuple):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            del self.order[bisect_left(self.order, entry[0])]
+    
+    def apply(self, delta: SnapshotDelta):
+        for key in delta.removed:
+            self._discard(key)
+        snapshot = delta.snapshot
+        columns = [snapshot.column(name) for name in self.keys]
+        sign = self.sign
+        batch = []
+        for i in delta.rows():
+            key = (snapshot.pid[i], snapshot.started[i])
+            self._discard(key)
+            entry = tuple([sign * column[i] for column in columns]) + key
+            batch.append(entry)
+            self.entries[key] = (entry, (snapshot.name(i), snapshot.cpu[i], snapshot.memory[i],
+                                         snapshot.ppid[i], snapshot.threads[i]))
+        if len(batch) * 8 < len(self.order):
+            for entry in batch:
+                insort(self.order, entry)
+        else:
+            self.order.extend(batch)
+            self.order.sort()
+    
+    def top(self, k: int) -> List[ProcessInfo]:
+        result = []
+        for entry in self.order[:k]:
+            pid = entry[-2]
+            name, cpu, memory, ppid, threads = self.entries[entry[-2:]][1]
+            result.append(ProcessInfo(pid=pid, name=name, cpu_percent=cpu, memory_percent=memory,
+                                      ppid=ppid, num_threads=threads))
+        return result
+    
+    def __len__(self):
+        return len(self.order)
+
+
+EXPORT_FORMATS = ("ndjson", "csv", "prometheus")
+
+def sample_stream(sampler, interval: float = 1.0, count: int = None,
+                  observe=None) -> Generator[ProcessSnapshot, None, None]:
+    sampler.sample()
+    for _ in tick_schedule(interval, count):
+        snapshot = sampler.sample()
+        if observe is not None:
+            observe(snapshot)
+        yield snapshot
+
+def format_ndjson(snapshots) -> Generator[str, None, None]:
+    for snapshot in snapshots:
+        ts = snapshot.timestamp
+        names = snapshot.table.names
+        for pid, name_id, cpu, memory, rss in zip(snapshot.pid, snapshot.name_id, snapshot.cpu,
+                                                  snapshot.memory, snapshot.rss):
+            yield (f'{{"ts": {ts:.3f}, "pid": {pid}, "name": {json.dumps(names[name_id])}, '
+                   f'"cpu_percent": {cpu:.2f}, "memory_percent": {memory:.3f}, "rss": {rss}}}\n')
+        yield None
+
+def _csv_field(value: str) -> str:
+    if any(char in value for char in ',"\n\r'):
+        return '"' + value.replace('"', '""') + '"'
+    return value
+
+def format_csv(snapshots) -> Generator[str, None, None]:
+    yield "ts,pid,name,cpu_percent,memory_percent,rss\n"
+    for snapshot in snapshots:
+        ts = snapshot.timestamp
+        escaped = {}
+        names = snapshot.table.names
+        for pid, name_id, cpu, memory, rss in zip(snapshot.pid, snapshot.name_id, snapshot.cpu,
+                                                  snapshot.memory, snapshot.rss):
+            name = escaped.get(name_id)
+            if name is None:
+                name = escaped[name_id] = _csv_field(names[name_id])
+            yield f"{ts:.3f},{pid},{name},{cpu:.2f},{memory:.3f},{rss}\n"
+        yield None
+
+def _prometheus_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+PROMETHEUS_METRICS = (
+    ("process_cpu_percent", "cpu", "CPU usage of the process in percent"),
+    ("process_memory_percent", "memory", "Resident memory of the process in percent of total"),
+    ("process_resident_memory_bytes", "rss", "Resident memory of the process in bytes"),
+)
+
+def format_prometheus(snapshots) -> Generator[str, None, None]:
+    for snapshot in snapshots:
+        ts = int(snapshot.timestamp * 1000)
+        names = snapshot.table.names
+        labels = [f'pid="{pid}",name="{_prometheus_label(names[name_id])}"'
+                  for pid, name_id in zip(snapshot.pid, snapshot.name_id)]
+        for metric, column, description in PROMETHEUS_METRICS:
+            yield f"# HELP {metric} {description}\n# TYPE {metric} gauge\n"
+            for label, value in zip(labels, snapshot.column(column)):
+                yield f"{metric}{{{label}}} {value} {ts}\n"
+        yield None
+
+FORMATTERS = {
+    "ndjson": format_ndjson,
+    "csv": format_csv,
+    "prometheus": format_prometheus,
+}
+
+def delta_stream(snapshots, tracker: DeltaTracker = None) -> Generator[SnapshotDelta, None, None]:
+    tracker = tracker if tracker is not None else DeltaTracker()
+    for snapshot in snapshots:
+        yield tracker.diff(snapshot)
+
+def format_ndjson_delta(deltas) -> Generator[str, None, None]:
+    for delta in deltas:
+        snapshot = delta.snapshot
+        ts = snapshot.timestamp
+        names = snapshot.table.names
+        for op, rows in (("add", delta.added), ("change", delta.changed)):
+            for i in rows:
+                yield (f'{{"ts": {ts:.3f}, "op": "{op}", "pid": {snapshot.pid[i]}, '
+                       f'"started": {snapshot.started[i]:.2f}, "name": {json.dumps(names[snapshot.name_id[i]])}, '
+                       f'"cpu_percent": {snapshot.cpu[i]:.2f}, "memory_percent": {snapshot.memory[i]:.3f}, '
+                       f'"rss": {snapshot.rss[i]}}}\n')
+        for pid, started in delta.removed:
+            yield f'{{"ts": {ts:.3f}, "op": "remove", "pid": {pid}, "started": {started:.2f}}}\n'
+        yield None
+
+def format_csv_delta(deltas) -> Generator[str, None, None]:
+    yield "ts,op,pid,started,name,cpu_percent,memory_percent,rss\n"
+    for delta in deltas:
+        snapshot = delta.snapshot
+        ts = snapshot.timestamp
+        names = snapshot.table.names
+        for op, rows in (("add", delta.added), ("change", delta.changed)):
+            for i in rows:
+                yield (f"{ts:.3f},{op},{snapshot.pid[i]},{snapshot.started[i]:.2f},"
+                       f"{_csv_field(names[snapshot.name_id[i]])},{snapshot.cpu[i]:.2f},"
+                       f"{snapshot.memory[i]:.3f},{snapshot.rss[i]}\n")
+        for pid, started in delta.removed:
+            yield f"{ts:.3f},remove,{pid},{started:.2f},,,,\n"
+        yield None
+
+DELTA_FORMATTERS = {
+    "ndjson": format_ndjson_delta,
+    "csv": format_csv_delta,
+}
+
+def write_stream(lines, path: str = None, buffer_size: int = 1 << 16):
+    if path is None or path == "-":
+        out = open(sys.stdout.fileno(), "w", buffering=buffer_size, encoding="utf-8", closefd=False)
+    else:
+        out = open(path, "w", buffering=buffer_size, encoding="utf-8")
+    with out:
+        write = out.write
+        for line in lines:
+            if line is None:
+                out.flush()
+            else:
+                write(line)
+
+def run_export(fmt: str, backend: str = "psutil", interval: float = 1.0,
+               count: int = None, path: str = None, shards: int = 1, delta: bool = False):
+    snapshots = sample_stream(make_sampler(backend, shards=shards), interval, count,
+                              observe=LeakReporter().update)
+    try:
+        if delta:
+            write_stream(DELTA_FORMATTERS[fmt](delta_stream(snapshots)), path)
+        else:
+            write_stream(FORMATTERS[fmt](snapshots), path)
+    except (KeyboardInterrupt, BrokenPipeError):
+        pass
+
+
+RECORD_MAGIC = b"PMREC\x00\x00\x01"
+RECORD_HEADER = struct.Struct("<8sI4x")
+RECORD_FRAME_MAGIC = b"PMFR"
+RECORD_FRAME = struct.Struct("<4sId")
+RECORD_COLUMNS = (("pid", "i"), ("cpu", "f"), ("memory", "f"), ("rss", "Q"),
+                  ("ppid", "i"), ("threads", "I"), ("started", "d"))
+RECORD_NAME_BYTES = 24
+RECORD_ROW_BYTES = sum(array(typecode).itemsize for _, typecode in RECORD_COLUMNS) + RECORD_NAME_BYTES
+INDEX_ENTRY = struct.Struct("<dQ")
+
+class Recorder:
+    GROW_BYTES = 64 * 1024 * 1024
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        self.index = open(path + ".idx", "ab")
+        size = os.fstat(self.fd).st_size
+        if size:
+            with open(path, "rb") as existing:
+                magic, row_bytes = RECORD_HEADER.unpack(existing.read(RECORD_HEADER.size))
+            if magic != RECORD_MAGIC or row_bytes != RECORD_ROW_BYTES:
+                os.close(self.fd)
+                self.index.close()
+                raise ValueError(f"{path}: не файл записи или другой формат")
+            self.end = Recording.indexed_end(path, size)
+        else:
+            self.end = RECORD_HEADER.size
+        self.capacity = max(size, self.end + self.GROW_BYTES)
+        os.ftruncate(self.fd, self.capacity)
+        self.map = mmap.mmap(self.fd, self.capacity)
+        self.map[:RECORD_HEADER.size] = RECORD_HEADER.pack(RECORD_MAGIC, RECORD_ROW_BYTES)
+        self.encoded = {}
+    
+    def _encode(self, name: str) -> bytes:
+        field = self.encoded.get(name)
+        if field is None:
+            raw = name.encode()[:RECORD_NAME_BYTES].decode(errors="ignore").encode()
+            field = self.encoded[name] = raw.ljust(RECORD_NAME_BYTES, b"\0")
+        return field
+    
+    def append(self, snapshot: ProcessSnapshot):
+        parts = [RECORD_FRAME.pack(RECORD_FRAME_MAGIC, len(snapshot), snapshot.timestamp)]
+        for name, typecode in RECORD_COLUMNS:
+            column = snapshot.column(name)
+            if column.typecode != typecode or sys.byteorder == "big":
+                column = array(typecode, column)
+            if sys.byteorder == "big":
+                column.byteswap()
+            parts.append(column.tobytes())
+        names = snapshot.table.names
+        parts.append(b"".join([self._encode(names[i]) for i in snapshot.name_id]))
+        data = b"".join(parts)
+        
+        end = self.end + len(data)
+        if end > self.capacity:
+            self.capacity = end + self.GROW_BYTES
+            os.ftruncate(self.fd, self.capacity)
+            self.map.resize(self.capacity)
+        self.map[self.end:end] = data
+        self.index.write(INDEX_ENTRY.pack(snapshot.timestamp, self.end))
+        self.index.flush()
+        self.end = end
+    
+    def close(self):
+        self.map.flush()
+        self.map.close()
+        os.ftruncate(self.fd, self.end)
+        os.close(self.fd)
+        self.index.close()
+
+class Recording:
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as data:
+            self.data = mmap.mmap(data.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, row_bytes = RECORD_HEADER.unpack_from(self.data)
+        if magic != RECORD_MAGIC or row_bytes != RECORD_ROW_BYTES:
+            self.data.close()
+            raise ValueError(f"{path}: не файл записи или другой формат")
+        self.index = None
+        self.count = 0
+        try:
+            with open(path + ".idx", "rb") as index:
+                size = os.fstat(index.fileno()).st_size
+                if size >= INDEX_ENTRY.size:
+                    self.index = mmap.mmap(index.fileno(), 0, access=mmap.ACCESS_READ)
+                    self.count = size // INDEX_ENTRY.size
+        except FileNotFoundError:
+            pass
+        self.table = NameTable()
+    
+    @staticmethod
+    def indexed_end(path: str, size: int) -> int:
+        recording = Recording(path)
+        try:
+            if not recording.count:
+                return RECORD_HEADER.size
+            _, offset = recording.entry(recording.count - 1)
+            _, rows, _ = RECORD_FRAME.unpack_from(recording.data, offset)
+            return offset + RECORD_FRAME.size + rows * RECORD_ROW_BYTES
+        finally:
+            recording.close()
+    
+    def __len__(self):
+        return self.count
+    
+    def entry(self, n: int) -> tuple:
+        return INDEX_ENTRY.unpack_from(self.index, n * INDEX_ENTRY.size)
+    
+    def time(self, n: int) -> float:
+        return self.entry(n)[0]
+    
+    def find(self, ts: float) -> int:
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.time(middle) < ts:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+    
+    def frame(self, n: int) -> ProcessSnapshot:
+        timestamp, offset = self.entry(n)
+        magic, rows, _ = RECORD_FRAME.unpack_from(self.data, offset)
+        if magic != RECORD_FRAME_MAGIC:
+            raise ValueError(f"{self.path}: поврежден кадр {n}")
+        snapshot = ProcessSnapshot(self.table)
+        snapshot.timestamp = timestamp
+        view = memoryview(self.data)
+        position = offset + RECORD_FRAME.size
+        for name, typecode in RECORD_COLUMNS:
+            column = array(typecode)
+            size = rows * column.itemsize
+            column.frombytes(view[position:position + size])
+            if sys.byteorder == "big":
+                column.byteswap()
+            target = snapshot.column(name)
+            target.extend(column if target.typecode == typecode else array(target.typecode, column))
+            position += size
+        block = view[position:position + rows * RECORD_NAME_BYTES].tobytes()
+        view.release()
+        intern = self.table.intern
+        snapshot.name_id.extend([intern(block[start:start + RECORD_NAME_BYTES].rstrip(b"\0"))
+                                 for start in range(0, len(block), RECORD_NAME_BYTES)])
+        return snapshot
+    
+    def close(self):
+        if self.index is not None:
+            self.index.close()
+        self.data.close()
+
+class Replay:
+    kind = "запись"
+    
+    def __init__(self, recording: Recording, start: float = None):
+        self.recording = recording
+        self.position = 0
+        if start is not None and len(recording):
+            self.position = min(recording.find(start), len(recording) - 1)
+        self.snapshot = None
+    
+    def sample(self) -> ProcessSnapshot:
+        if self.position < len(self.recording):
+            self.snapshot = self.recording.frame(self.position)
+            self.position += 1
+        elif self.snapshot is None:
+            self.snapshot = ProcessSnapshot(self.recording.table)
+        return self.snapshot
+    
+    def wait(self, timeout: float):
+        pass
+    
+    def pids(self) -> set:
+        return set(self.snapshot.pid) if self.snapshot is not None else set()
+    
+    def drain_short_lived(self) -> list:
+        return []
+    
+    def close(self):
+        self.recording.close()
+
+def run_record(path: str, backend: str = "psutil", interval: float = 1.0,
+               count: int = None, shards: int = 1):
+    recorder = Recorder(path)
+    try:
+        for snapshot in sample_stream(make_sampler(backend, shards=shards), interval, count):
+            recorder.append(snapshot)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        recorder.close()
+
+def parse_replay_start(text: str, recording: Recording) -> float:
+    if text.startswith("+"):
+        return (recording.time(0) if len(recording) else 0.0) + float(text[1:])
+    return float(text)
+
+
+FRAME_MAGIC = b"PM"
+FRAME_VERSION = 1
+FRAME_FULL = 1
+FRAME_ZLIB = 2
+FRAME_HEADER = struct.Struct("<2sBBIdQI")
+FRAME_COUNTS = struct.Struct("<III")
+FRAME_NAME = struct.Struct("<IH")
+FRAME_COLUMNS = (("pid", "i"), ("name_id", "I"), ("cpu", "H"), ("rss", "I"), ("ppid", "i"), ("threads", "I"))
+FRAME_COMPRESS_MIN = 256
+REQUEST_FULL = b"F"
+
+def parse_address(text: str) -> tuple:
+    if text.startswith("unix:"):
+        return socket.AF_UNIX, text[len("unix:"):]
+    host, _, port = text.rpartition(":")
+    return socket.AF_INET, (host or "127.0.0.1", int(port))
+
+def _pack_column(typecode: str, values) -> bytes:
+    column = array(typecode, values)
+    if sys.byteorder == "big":
+        column.byteswap()
+    return column.tobytes()
+
+class SnapshotEncoder:
+    def __init__(self, full_every: int = 60):
+        self.full_every = full_every
+        self.previous = {}
+        self.table = None
+        self.names_sent = 0
+        self.seq = 0
+        self.since_full = None
+    
+    def request_full(self):
+        self.since_full = None
+        self.names_sent = 0
+    
+    def encode(self, snapshot: ProcessSnapshot, total_memory: int) -> bytes:
+        if snapshot.table is not self.table:
+            self.table = snapshot.table
+            self.request_full()
+        full = self.since_full is None or self.since_full + 1 >= self.full_every
+        self.since_full = 0 if full else self.since_full + 1
+        self.seq += 1
+        
+        cpu = [min(int(value * 10 + 0.5), 0xFFFF) for value in snapshot.cpu]
+        rss = [min(value >> 10, 0xFFFFFFFF) for value in snapshot.rss]
+        rows = list(zip(snapshot.pid, snapshot.name_id, cpu, rss, snapshot.ppid, snapshot.threads))
+        current = {row[0]: row for row in rows}
+        if full:
+            changed = rows
+            removed = []
+        else:
+            previous = self.previous
+            changed = [row for row in rows if previous.get(row[0]) != row]
+            removed = [pid for pid in previous if pid not in current]
+        self.previous = current
+        
+        names = self.table.names
+        new_names = range(self.names_sent, len(names))
+        self.names_sent = len(names)
+        
+        parts = [FRAME_COUNTS.pack(len(new_names), len(removed), len(changed))]
+        for name_id in new_names:
+            raw = names[name_id].encode("utf-8", "replace")[:0xFFFF]
+            parts.append(FRAME_NAME.pack(name_id, len(raw)))
+            parts.append(raw)
+        parts.append(_pack_column("i", removed))
+        columns = list(zip(*changed)) if changed else [()] * len(FRAME_COLUMNS)
+        for (_, typecode), values in zip(FRAME_COLUMNS, columns):
+            parts.append(_pack_column(typecode, values))
+        payload = b"".join(parts)
+        
+        flags = FRAME_FULL if full else 0
+        if len(payload) >= FRAME_COMPRESS_MIN:
+            packed = zlib.compress(payload, 1)
+            if len(packed) < len(payload):
+                payload = packed
+                flags |= FRAME_ZLIB
+        header = FRAME_HEADER.pack(FRAME_MAGIC, FRAME_VERSION, flags, self.seq,
+                                   snapshot.timestamp, total_memory, len(payload))
+        return header + payload
+
+def split_frames(buffer: bytearray) -> list:
+    frames = []
+    offset = 0
+    while len(buffer) - offset >= FRAME_HEADER.size:
+        magic, version, flags, seq, timestamp, total_memory, length = FRAME_HEADER.unpack_from(buffer, offset)
+        if magic != FRAME_MAGIC or version != FRAME_VERSION:
+            raise ValueError("Неизвестный формат кадра")
+        end = offset + FRAME_HEADER.size + length
+        if end > len(buffer):
+            break
+        frames.append((flags, seq, timestamp, total_memory, bytes(buffer[offset + FRAME_HEADER.size:end])))
+        offset = end
+    del buffer[:offset]
+    return frames
+
+class SnapshotDecoder:
+    def __init__(self):
+        self.names = {}
+        self.rows = {}
+        self.seq = None
+        self.timestamp = 0.0
+        self.total_memory = 1
+        self.table = NameTable()
+    
+    def apply(self, flags: int, seq: int, timestamp: float, total_memory: int, payload: bytes) -> bool:
+        full = flags & FRAME_FULL
+        if not full and (self.seq is None or seq != self.seq + 1):
+            return False
+        if flags & FRAME_ZLIB:
+            payload = zlib.decompress(payload)
+        
+        name_count, removed_count, row_count = FRAME_COUNTS.unpack_from(payload)
+        offset = FRAME_COUNTS.size
+        for _ in range(name_count):
+            name_id, length = FRAME_NAME.unpack_from(payload, offset)
+            offset += FRAME_NAME.size
+            self.names[name_id] = payload[offset:offset + length].decode("utf-8", "replace")
+            offset += length
+        
+        def column(typecode: str, count: int) -> array:
+            nonlocal offset
+            values = array(typecode)
+            values.frombytes(payload[offset:offset + count * values.itemsize])
+            if sys.byteorder == "big":
+                values.byteswap()
+            offset += count * values.itemsize
+            return values
+        
+        removed = column("i", removed_count)
+        pids, name_ids, cpu, rss, ppid, threads = [column(typecode, row_count) for _, typecode in FRAME_COLUMNS]
+        
+        rows = self.rows
+        if full:
+            rows.clear()
+        for pid in removed:
+            rows.pop(pid, None)
+        names = self.names
+        for pid, name_id, *values in zip(pids, name_ids, cpu, rss, ppid, threads):
+            rows[pid] = (names.get(name_id, "?"), *values)
+        
+        self.seq = seq
+        self.timestamp = timestamp
+        self.total_memory = total_memory or 1
+        return True
+    
+    def snapshot(self) -> ProcessSnapshot:
+        snapshot = ProcessSnapshot(self.table)
+        snapshot.timestamp = self.timestamp
+        total_memory = self.total_memory
+        for pid, (name, cpu, rss_kb, ppid, threads) in self.rows.items():
+            rss = rss_kb << 10
+            snapshot.append(pid, name, cpu / 10, rss / total_memory * 100, rss, ppid, threads)
+        return snapshot
+
+class Agent:
+    SEND_TIMEOUT = 2.0
+    
+    def __init__(self, address: str, sampler, interval: float = 1.0, full_every: int = 60, observe=None):
+        self.family, self.address = parse_address(address)
+        self.sampler = sampler
+        self.observe = observe
+        self.interval = interval
+        self.full_every = full_every
+        self.clients = {}
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        
+        self.server = socket.socket(self.family, socket.SOCK_STREAM)
+        if self.family == socket.AF_UNIX:
+            if os.path.exists(self.address):
+                os.unlink(self.address)
+        else:
+            self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind(self.address)
+        self.server.listen()
+    
+    def _accept(self):
+        try:
+            sock, _ = self.server.accept()
+        except OSError:
+            return
+        sock.settimeout(self.SEND_TIMEOUT)
+        if self.family == socket.AF_INET:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.clients[sock] = SnapshotEncoder(self.full_every)
+    
+    def _drop(self, sock):
+        self.clients.pop(sock, None)
+        sock.close()
+    
+    def _control(self, sock):
+        try:
+            data = sock.recv(64)
+        except OSError:
+            data = b""
+        if not data:
+            self._drop(sock)
+        elif REQUEST_FULL in data:
+            self.clients[sock].request_full()
+    
+    def _broadcast(self, snapshot: ProcessSnapshot):
+        total_memory = psutil.virtual_memory().total
+        for sock, encoder in list(self.clients.items()):
+            frame = encoder.encode(snapshot, total_memory)
+            try:
+                sock.sendall(frame)
+            except OSError:
+                self._drop(sock)
+                continue
+            self.frames_sent += 1
+            self.bytes_sent += len(frame)
+    
+    def serve(self, ticks: int = None):
+        next_tick = time.monotonic()
+        tick = 0
+        try:
+            while ticks is None or tick < ticks:
+                timeout = next_tick - time.monotonic()
+                if timeout > 0:
+                    readable, _, _ = select.select([self.server, *self.clients], [], [], timeout)
+                    for sock in readable:
+                        if sock is self.server:
+                            self._accept()
+                        else:
+                            self._control(sock)
+                    continue
+                snapshot = self.sampler.sample()
+                if self.observe is not None:
+                    self.observe(snapshot)
+                self._broadcast(snapshot)
+                tick += 1
+                next_tick = max(next_tick + self.interval, time.monotonic())
+        finally:
+            self.close()
+    
+    def close(self):
+        for sock in list(self.clients):
+            self._drop(sock)
+        self.server.close()
+        if self.family == socket.AF_UNIX and os.path.exists(self.address):
+            os.unlink(self.address)
+
+class AgentConnection:
+    RETRY = 2.0
+    
+    def __init__(self, address: str):
+        self.address = address
+        self.sock = None
+        self.buffer = bytearray()
+        self.decoder = SnapshotDecoder()
+        self.retry_at = 0.0
+        self.bytes_received = 0
+        self.frames_received = 0
+    
+    def connect(self) -> bool:
+        if self.sock is not None:
+            return True
+        if time.monotonic() < self.retry_at:
+            return False
+        family, address = parse_address(self.address)
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.settimeout(self.RETRY)
+        try:
+            sock.connect(address)
+        except OSError:
+            sock.close()
+            self.retry_at = time.monotonic() + self.RETRY
+            return False
+        self.sock = sock
+        self.buffer.clear()
+        self.decoder = SnapshotDecoder()
+        return True
+    
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+        self.decoder = SnapshotDecoder()
+        self.retry_at = time.monotonic() + self.RETRY
+    
+    def receive(self):
+        try:
+            data = self.sock.recv(1 << 16)
+        except OSError:
+            data = b""
+        if not data:
+            self.close()
+            return
+        self.bytes_received += len(data)
+        self.buffer += data
+        try:
+            for frame in split_frames(self.buffer):
+                self.frames_received += 1
+                if not self.decoder.apply(*frame):
+                    self.sock.sendall(REQUEST_FULL)
+        except (ValueError, struct.error, zlib.error, OSError):
+            self.close()
+
+class Aggregator:
+    def __init__(self, addresses: Iterable[str]):
+        self.connections = [AgentConnection(address) for address in addresses]
+    
+    def poll(self, timeout: float):
+        deadline = time.monotonic() + timeout
+        while True:
+            for connection in self.connections:
+                connection.connect()
+            live = {connection.sock: connection for connection in self.connections if connection.sock}
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            if not live:
+                time.sleep(min(remaining, AgentConnection.RETRY))
+                continue
+            readable, _, _ = select.select(list(live), [], [], min(remaining, AgentConnection.RETRY))
+            for sock in readable:
+                live[sock].receive()
+    
+    def top(self, k: int, key: str = "cpu") -> List[tuple]:
+        candidates = []
+        for connection in self.connections:
+            if connection.sock is None or connection.decoder.seq is None:
+                continue
+            snapshot = connection.decoder.snapshot()
+            values = snapshot.column(key)
+            for i in snapshot.top(k, key):
+                candidates.append((values[i], connection.address, snapshot.view(i)))
+        best = heapq.nlargest(k, candidates, key=lambda item: item[0])
+        return [(address, view) for _, address, view in best]
+
+def run_agent(address: str, backend: str = "psutil", interval: float = 1.0,
+              count: int = None, shards: int = 1):
+    agent = Agent(address, make_sampler(backend, shards=shards), interval, observe=LeakReporter().update)
+    print(f"Агент слушает {address}", file=sys.stderr)
+    try:
+        agent.serve(count)
+    except KeyboardInterrupt:
+        pass
+
+def run_aggregator(addresses: List[str], interval: float = 1.0, count: int = None, k: int = 10):
+    aggregator = Aggregator(addresses)
+    tick = 0
+    try:
+        while count is None or tick < count:
+            aggregator.poll(interval)
+            tick += 1
+            print(f"\n{'Узел':<22} {'PID':<8} {'Имя':<20} {'CPU%':<8} {'Память%':<10}")
+            print("-" * 70)
+            for address, proc in aggregator.top(k):
+                print(f"{address[:22]:<22} {proc.pid:<8} {proc.name[:20]:<20} "
+                      f"{proc.cpu_percent:<8.1f} {proc.memory_percent:<10.2f}")
+            for connection in aggregator.connections:
+                state = "подключен" if connection.sock else "нет связи"
+                average = connection.bytes_received / connection.frames_received if connection.frames_received else 0
+                print(f"{connection.address}: {state}, процессов {len(connection.decoder.rows)}, "
+                      f"в среднем {average / 1024:.1f} КБ за кадр")
+    except KeyboardInterrupt:
+        pass
+
+
+@dataclass
+class SystemMetrics:
+    timestamp: float
+    cores: List[float]
+    load: tuple
+    memory_percent: float
+    memory_used: int
+    memory_total: int
+    swap_percent: float
+    swap_used: int
+    disk_read: float
+    disk_write: float
+    net_recv: float
+    net_sent: float
+    disks: dict
+    
+    @property
+    def cpu_percent(self) -> float:
+        return sum(self.cores) / len(self.cores) if self.cores else 0.0
+
+class SystemSampler:
+    def __init__(self, disk_paths=("/",), usage_every: int = 10):
+        self.disk_paths = disk_paths
+        self.usage_every = usage_every
+        self.last = None
+        self.disks = {}
+        self.since_usage = usage_every
+    
+    @staticmethod
+    def _busy(previous, current) -> float:
+        def split(times):
+            total = sum(times) - getattr(times, "guest", 0.0) - getattr(times, "guest_nice", 0.0)
+            idle = times.idle + getattr(times, "iowait", 0.0)
+            return total, total - idle
+        total, busy = map(operator.sub, split(current), split(previous))
+        return min(100.0, max(0.0, busy / total * 100)) if total > 0 else 0.0
+    
+    def sample(self) -> SystemMetrics:
+        now = time.monotonic()
+        cpu = psutil.cpu_times(percpu=True)
+        disk = psutil.disk_io_counters()
+        net = psutil.net_io_counters()
+        memory = psutil.virtual_memory()
+        swap = psutil.swap_memory()
+        load = os.getloadavg() if hasattr(os, "getloadavg") else (0.0, 0.0, 0.0)
+        
+        self.since_usage += 1
+        if self.since_usage >= self.usage_every:
+            self.since_usage = 0
+            for path in self.disk_paths:
+                try:
+                    self.disks[path] = psutil.disk_usage(path).percent
+                except OSError:
+                    self.disks.pop(path, None)
+        
+        cores = [0.0] * len(cpu)
+        rates = [0.0] * 4
+        if self.last is not None:
+            elapsed = now - self.last[0]
+            _, last_cpu, last_disk, last_net = self.last
+            cores = list(map(self._busy, last_cpu, cpu))
+            if elapsed > 0 and disk is not None and last_disk is not None:
+                rates[0] = (disk.read_bytes - last_disk.read_bytes) / elapsed
+                rates[1] = (disk.write_bytes - last_disk.write_bytes) / elapsed
+            if elapsed > 0 and net is not None and last_net is not None:
+                rates[2] = (net.bytes_recv - last_net.bytes_recv) / elapsed
+                rates[3] = (net.bytes_sent - last_net.bytes_sent) / elapsed
+        self.last = (now, cpu, disk, net)
+        
+        return SystemMetrics(time.time(), cores, tuple(load), memory.percent, memory.used, memory.total,
+                             swap.percent, swap.used, *rates, dict(self.disks))
+
+def format_rate(value: float) -> str:
+    for unit in ("B/s", "KB/s", "MB/s"):
+        if abs(value) < 1024:
+            return f"{value:.1f} {unit}"
+        value /= 1024
+    return f"{value:.1f} GB/s"
+
+def format_system(metrics: SystemMetrics) -> List[str]:
+    gb = 1024 ** 3
+    cores = " ".join(f"{value:.0f}" for value in metrics.cores)
+    disks = ", ".join(f"{path} {percent:.0f}%" for path, percent in metrics.disks.items())
+    return [
+        f"CPU {metrics.cpu_percent:5.1f}%  ядра: {cores}  нагрузка: "
+        + " ".join(f"{value:.2f}" for value in metrics.load),
+        f"Память {metrics.memory_percent:.1f}% ({metrics.memory_used / gb:.1f}/{metrics.memory_total / gb:.1f} GB)"
+        f"  swap {metrics.swap_percent:.1f}% ({metrics.swap_used / gb:.1f} GB)",
+        f"Диск: чтение {format_rate(metrics.disk_read)}, запись {format_rate(metrics.disk_write)}"
+        + (f", заполнение {disks}" if disks else "")
+        + f"  Сеть: прием {format_rate(metrics.net_recv)}, передача {format_rate(metrics.net_sent)}",
+    ]
+
+
+RULE_PATTERN = re.compile(
+    r"^\s*(?P<metric>cpu|memory|rss\s+growth|rss|threads)\s*(?P<op>>=|<=|>|<)\s*"
+    r"(?P<value>\d+(?:\.\d+)?)\s*(?P<unit>[A-Za-z%/]*)"
+    r"(?:\s+for\s+(?P<duration>\d+(?:\.\d+)?)\s*(?P<duration_unit>[smh]))?"
+    r"(?:\s+by\s+name=(?P<name>\S+))?"
+    r"(?:\s+do\s+(?P<action>log|export|terminate))?\s*$")
+
+RULE_COLUMNS = {"cpu": "cpu", "memory": "memory", "rss": "rss", "threads": "threads", "rss growth": "rss_growth"}
+RULE_OPERATORS = {">": operator.lt, ">=": operator.le, "<": operator.gt, "<=": operator.ge}
+SIZE_UNITS = {"": 1, "b": 1, "kb": 1024, "mb": 1024 ** 2, "gb": 1024 ** 3}
+TIME_UNITS = {"s": 1, "sec": 1, "m": 60, "min": 60, "h": 3600}
+
+class Rule:
+    def __init__(self, text: str, hysteresis: float = 0.1):
+        match = RULE_PATTERN.match(text)
+        if match is None:
+            raise ValueError(f"Неверное правило: {text}")
+        self.text = text.strip()
+        self.metric = " ".join(match.group("metric").split())
+        self.column = RULE_COLUMNS[self.metric]
+        self.threshold = float(match.group("value")) * self._unit(match.group("unit").lower(), text)
+        margin = abs(self.threshold) * hysteresis
+        compare = RULE_OPERATORS[match.group("op")]
+        clear = self.threshold - margin if match.group("op") in (">", ">=") else self.threshold + margin
+        self.trigger = partial(compare, self.threshold)
+        self.hold = partial(compare, clear)
+        self.duration = float(match.group("duration") or 0) * TIME_UNITS.get(match.group("duration_unit") or "s")
+        name = match.group("name")
+        self.pattern = re.compile(fnmatch.translate(name)) if name else None
+        self.action = match.group("action") or "log"
+        self.since = {}
+        self.active = {}
+    
+    def _unit(self, unit: str, text: str) -> float:
+        if self.column in ("cpu", "memory", "threads"):
+            if unit not in ("", "%"):
+                raise ValueError(f"Неверная единица в правиле: {text}")
+            return 1
+        size, _, per = unit.partition("/")
+        if size not in SIZE_UNITS or (self.column == "rss_growth") != bool(per):
+            raise ValueError(f"Неверная единица в правиле: {text}")
+        if per and per not in TIME_UNITS:
+            raise ValueError(f"Неверная единица в правиле: {text}")
+        return SIZE_UNITS[size] / TIME_UNITS[per] if per else SIZE_UNITS[size]
+    
+    def evaluate(self, ts: float, keys: list, column, names_match, locate) -> list:
+        rows = compress(range(len(keys)), map(self.trigger, column))
+        if self.pattern is not None:
+            rows = filter(names_match, rows)
+        triggered = {keys[i]: i for i in rows}
+        events = []
+        
+        dropped = self.since.keys() - triggered.keys()
+        if dropped:
+            position = locate()
+            hold = self.hold
+            for key in dropped:
+                i = position.get(key)
+                if i is not None and hold(column[i]):
+                    continue
+                del self.since[key]
+                if key in self.active:
+                    events.append(("cleared", key, None))
+        
+        for key, i in triggered.items():
+            since = self.since.setdefault(key, ts)
+            if key not in self.active and ts - since >= self.duration:
+                events.append(("fired", key, i))
+        return events
+
+class RuleEngine:
+    def __init__(self, rules: Iterable[str], hysteresis: float = 0.1, log=None, export_path: str = None):
+        self.rules = [Rule(text, hysteresis) for text in rules]
+        self.log = log if log is not None else sys.stderr
+        self.export = open(export_path, "a", encoding="utf-8") if export_path else None
+        self.need_growth = any(rule.column == "rss_growth" for rule in self.rules)
+        self.previous = None
+        self.name_cache = {}
+        self.table = None
+    
+    def _growth(self, snapshot: ProcessSnapshot, keys: list) -> list:
+        previous = self.previous
+        self.previous = (keys, snapshot.rss, snapshot.timestamp)
+        if previous is None or snapshot.timestamp <= previous[2]:
+            return [0] * len(keys)
+        old_keys, old_rss, old_ts = previous
+        if keys != old_keys:
+            position = dict(zip(old_keys, range(len(old_keys))))
+            offset = len(old_keys)
+            rows = [position.get(key, offset + i) for i, key in enumerate(keys)]
+            old_rss = list(map((old_rss + snapshot.rss).__getitem__, rows))
+        scale = 1 / (snapshot.timestamp - old_ts)
+        return list(map(partial(operator.mul, scale), map(operator.sub, snapshot.rss, old_rss)))
+    
+    def _names_match(self, rule: Rule, snapshot: ProcessSnapshot):
+        if snapshot.table is not self.table:
+            self.table = snapshot.table
+            self.name_cache.clear()
+        cache = self.name_cache.setdefault(rule, {})
+        names = snapshot.table.names
+        name_id = snapshot.name_id
+        match = rule.pattern.match
+        
+        def names_match(i: int) -> bool:
+            number = name_id[i]
+            result = cache.get(number)
+            if result is None:
+                result = cache[number] = match(names[number]) is not None
+            return result
+        return names_match
+    
+    def evaluate(self, snapshot: ProcessSnapshot) -> list:
+        keys = list(zip(snapshot.pid, snapshot.started))
+        columns = {"cpu": snapshot.cpu, "memory": snapshot.memory, "rss": snapshot.rss,
+                   "threads": snapshot.threads}
+        if self.need_growth:
+            columns["rss_growth"] = self._growth(snapshot, keys)
+        position = []
+        
+        def locate() -> dict:
+            if not position:
+                position.append(dict(zip(keys, range(len(keys)))))
+            return position[0]
+        
+        events = []
+        for rule in self.rules:
+            names_match = self._names_match(rule, snapshot) if rule.pattern is not None else None
+            column = columns[rule.column]
+            for state, key, i in rule.evaluate(snapshot.timestamp, keys, column, names_match, locate):
+                if state == "fired":
+                    name = snapshot.name(i)
+                    rule.active[key] = name
+                    events.append((rule, state, key, name, column[i]))
+                else:
+                    events.append((rule, state, key, rule.active.pop(key), None))
+        return events
+    
+    def dispatch(self, events: list, ts: float = None):
+        ts = time.time() if ts is None else ts
+        stamp = time.strftime("%H:%M:%S", time.localtime(ts))
+        for rule, state, (pid, started), name, value in events:
+            shown = "" if value is None else f" = {value:.1f}"
+            label = "сработало" if state == "fired" else "сброшено"
+            print(f"{stamp} [правило] {rule.text}: {label} для {name}({pid}){shown}", file=self.log)
+            if rule.action == "export" and self.export is not None:
+                self.export.write(json.dumps({"ts": round(ts, 3), "rule": rule.text, "event": state,
+                                              "pid": pid, "started": started, "name": name,
+                                              "value": value}) + "\n")
+                self.export.flush()
+            if rule.action == "terminate" and state == "fired":
+                terminator = ProcessTerminator(pid)
+                if terminator.proc is not None and same_process(terminator.proc, started):
+                    done = terminator.terminate()
+                    print(f"{stamp} [правило] процесс {name}({pid}) "
+                          f"{'завершен' if done else 'завершить не удалось'}", file=self.log)
+    
+    def process(self, snapshot: ProcessSnapshot) -> list:
+        events = self.evaluate(snapshot)
+        if events:
+            self.dispatch(events, snapshot.timestamp)
+        return events
+    
+    def close(self):
+        if self.export is not None:
+            self.export.close()
+
+def run_rules(rules: List[str], backend: str = "psutil", interval: float = 1.0, count: int = None,
+              shards: int = 1, log_path: str = None, export_path: str = None):
+    log = open(log_path, "a", encoding="utf-8", buffering=1) if log_path else None
+    engine = RuleEngine(rules, log=log, export_path=export_path)
+    leaks = LeakReporter(engine.log)
+    try:
+        for snapshot in sample_stream(make_sampler(backend, shards=shards), interval, count,
+                                      observe=leaks.update):
+            engine.process(snapshot)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        engine.close()
+        if log is not None:
+            log.close()
+
+
+@dataclass
+class LeakSuspect:
     pid: int
+    started: float
     name: str
-    cpu_percent: float
-    memory_percent: float
+    rate: float
+    r2: float
+    t_stat: float
+    samples: int
+    duration: float
+    rss: int
+
+class LeakDetector:
+    COLUMNS = ("n", "t0", "st", "sr", "stt", "str", "srr")
     
-    def __str__(self):
-        return f"{self.pid:<8} {self.name[:20]:<20} {self.cpu_percent:<8.1f} {self.memory_percent:<10.2f}"
+    def __init__(self, min_duration: float = 600.0, min_samples: int = 30, min_rate: float = 1.0,
+                 min_r2: float = 0.8, min_t: float = 5.0):
+        self.min_duration = min_duration
+        self.min_samples = min_samples
+        self.min_rate = min_rate
+        self.min_r2 = min_r2
+        self.min_t = min_t
+        self.pids = array("i")
+        self.starts = array("d")
+        self.keys = []
+        self.state = [array("d") for _ in self.COLUMNS]
+        self.snapshot = None
+        self.timestamp = 0.0
+    
+    def update(self, snapshot: ProcessSnapshot):
+        ts = snapshot.timestamp
+        if ts <= self.timestamp:
+            return
+        self.timestamp = ts
+        
+        if snapshot.pid != self.pids or snapshot.started != self.starts:
+            keys = list(zip(snapshot.pid, snapshot.started))
+            position = dict(zip(self.keys, range(len(self.keys))))
+            offset = len(self.keys)
+            rows = list(map(position.get, keys, [offset] * len(keys)))
+            empty = (0.0, ts, 0.0, 0.0, 0.0, 0.0, 0.0)
+            self.state = [array("d", map((column + array("d", (value,))).__getitem__, rows))
+                          for column, value in zip(self.state, empty)]
+            self.keys = keys
+            self.pids = array("i", snapshot.pid)
+            self.starts = array("d", snapshot.started)
+        self.snapshot = snapshot
+        
+        n, t0, st, sr, stt, str_, srr = self.state
+        t = list(map(partial(operator.sub, ts), t0))
+        r = list(map(partial(operator.mul, 1 / (1024 * 1024)), snapshot.rss))
+        self.state = [
+            array("d", map(partial(operator.add, 1.0), n)),
+            t0,
+            array("d", map(operator.add, st, t)),
+            array("d", map(operator.add, sr, r)),
+            array("d", map(operator.add, stt, map(operator.mul, t, t))),
+            array("d", map(operator.add, str_, map(operator.mul, t, r))),
+            array("d", map(operator.add, srr, map(operator.mul, r, r))),
+        ]
+    
+    def _fit(self, i: int) -> LeakSuspect:
+        n, t0, st, sr, stt, str_, srr = (column[i] for column in self.state)
+        if n < 3:
+            return None
+        sxx = stt - st * st / n
+        if sxx <= 0:
+            return None
+        sxy = str_ - st * sr / n
+        syy = max(srr - sr * sr / n, 0.0)
+        slope = sxy / sxx
+        residual = max(syy - slope * sxy, 0.0)
+        r2 = slope * sxy / syy if syy > 0 else 0.0
+        error = (residual / (n - 2) / sxx) ** 0.5
+        t_stat = slope / error if error > 0 else (float("inf") if slope else 0.0)
+        snapshot = self.snapshot
+        return LeakSuspect(snapshot.pid[i], snapshot.started[i], snapshot.name(i), slope * 3600,
+                           min(r2, 1.0), t_stat, int(n), self.timestamp - t0, snapshot.rss[i])
+    
+    def suspects(self, k: int = 10) -> List[LeakSuspect]:
+        if self.snapshot is None:
+            return []
+        n, t0, st, sr, stt, str_, srr = self.state
+        count = len(n)
+        enough = map(operator.and_,
+                     map(partial(operator.le, self.min_samples), n),
+                     map(partial(operator.ge, self.timestamp - self.min_duration), t0))
+        covariance = map(operator.sub, map(operator.mul, n, str_), map(operator.mul, st, sr))
+        spread = map(operator.sub, map(operator.mul, n, stt), map(operator.mul, st, st))
+        growing = map(operator.ge, map(partial(operator.mul, 3600), covariance),
+                      map(partial(operator.mul, self.min_rate), spread))
+        found = []
+        for i in compress(range(count), map(operator.and_, enough, growing)):
+            suspect = self._fit(i)
+            if (suspect is not None and suspect.rate >= self.min_rate and suspect.r2 >= self.min_r2
+                    and suspect.t_stat >= self.min_t):
+                found.append(suspect)
+        return heapq.nlargest(k, found, key=lambda suspect: suspect.rate)
 
-class ProcessIterator:
-    def __iter__(self):
-        self.processes = []
-        for proc in psutil.process_iter(['pid', 'name', 'cpu_percent', 'memory_percent']):
-            try:
-                info = proc.info
-                self.processes.append(ProcessInfo(
-                    pid=info['pid'],
-                    name=info['name'],
-                    cpu_percent=info['cpu_percent'] or 0.0,
-                    memory_percent=info['memory_percent'] or 0.0
-                ))
-            except:
+class LeakReporter:
+    def __init__(self, log=None, detector: LeakDetector = None):
+        self.log = log if log is not None else sys.stderr
+        self.detector = detector if detector is not None else LeakDetector()
+        self.reported = set()
+    
+    def update(self, snapshot: ProcessSnapshot):
+        with instrumentation.stage("leaks"):
+            self.detector.update(snapshot)
+            suspects = self.detector.suspects()
+        if self.reported:
+            self.reported.intersection_update(self.detector.keys)
+        stamp = time.strftime("%H:%M:%S", time.localtime(snapshot.timestamp))
+        for s in suspects:
+            key = (s.pid, s.started)
+            if key in self.reported:
                 continue
-        self.index = 0
-        return self
+            self.reported.add(key)
+            print(f"{stamp} [утечка] {s.name}({s.pid}): рост памяти +{s.rate:.1f} МБ/ч, "
+                  f"R² {s.r2:.2f}, RSS {s.rss / (1024 * 1024):.1f} MB", file=self.log)
+
+
+class Ring:
+    def __init__(self, capacity: int, fields: int):
+        self.capacity = capacity
+        self.times = array("d", bytes(8 * capacity))
+        self.values = [array("f", bytes(4 * capacity)) for _ in range(fields)]
+        self.head = 0
+        self.count = 0
     
-    def __next__(self):
-        if self.index < len(self.processes):
-            process = self.processes[self.index]
-            self.index += 1
-            return process
-        raise StopIteration
+    def push(self, ts: float, values):
+        i = self.head
+        self.times[i] = ts
+        for column, value in zip(self.values, values):
+            column[i] = value
+        self.head = (i + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+    
+    def rows(self):
+        start = (self.head - self.count) % self.capacity
+        for k in range(self.count):
+            i = (start + k) % self.capacity
+            yield self.times[i], [column[i] for column in self.values]
+    
+    @property
+    def nbytes(self) -> int:
+        return sum(a.itemsize * len(a) for a in [self.times] + self.values)
+
+class Rollup:
+    METRICS = 3
+    
+    def __init__(self, width: int, capacity: int):
+        self.width = width
+        self.ring = Ring(capacity, self.METRICS * 3)
+        self.bucket = None
+        self.low = [0.0] * self.METRICS
+        self.high = [0.0] * self.METRICS
+        self.total = [0.0] * self.METRICS
+        self.n = 0
+    
+    def _current(self) -> list:
+        row = []
+        for m in range(self.METRICS):
+            row += [self.low[m], self.total[m] / self.n, self.high[m]]
+        return row
+    
+    def add(self, ts: float, values):
+        bucket = ts - ts % self.width
+        if self.n and bucket != self.bucket:
+            self.ring.push(self.bucket, self._current())
+            self.n = 0
+        if not self.n:
+            self.bucket = bucket
+            self.low = list(values)
+            self.high = list(values)
+            self.total = list(values)
+        else:
+            for m, value in enumerate(values):
+                if value < self.low[m]:
+                    self.low[m] = value
+                if value > self.high[m]:
+                    self.high[m] = value
+                self.total[m] += value
+        self.n += 1
+    
+    def rows(self):
+        yield from self.ring.rows()
+        if self.n:
+            yield self.bucket, self._current()
+
+class ProcessHistory:
+    RAW_CAPACITY = 120
+    ROLLUPS = ((10, 180), (60, 240))
+    
+    def __init__(self):
+        self.raw = Ring(self.RAW_CAPACITY, Rollup.METRICS)
+        self.rollups = {width: Rollup(width, capacity) for width, capacity in self.ROLLUPS}
+        self.last = 0.0
+    
+    def add(self, ts: float, cpu: float, memory: float, rss: int):
+        values = (cpu, memory, rss)
+        self.raw.push(ts, values)
+        for rollup in self.rollups.values():
+            rollup.add(ts, values)
+        self.last = ts
+    
+    def series(self, resolution: int = 1):
+        if resolution == 1:
+            for ts, (cpu, memory, rss) in self.raw.rows():
+                yield ts, [cpu, cpu, cpu, memory, memory, memory, rss, rss, rss]
+        else:
+            yield from self.rollups[resolution].rows()
+    
+    @property
+    def nbytes(self) -> int:
+        return self.raw.nbytes + sum(r.ring.nbytes for r in self.rollups.values())
+
+class HistoryStore:
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.histories = OrderedDict()
+        self.nbytes = 0
+        self.entry_bytes = ProcessHistory().nbytes
+        self.exited = set()
+    
+    def record(self, snapshot: ProcessSnapshot):
+        ts = snapshot.timestamp
+        histories = self.histories
+        exited = self.exited
+        new = []
+        for pid, cpu, memory, rss in zip(snapshot.pid, snapshot.cpu, snapshot.memory, snapshot.rss):
+            if pid in exited:
+                exited.discard(pid)
+                del histories[pid]
+                self.nbytes -= self.entry_bytes
+            history = histories.get(pid)
+            if history is None:
+                new.append((pid, cpu, memory, rss))
+                continue
+            history.add(ts, cpu, memory, rss)
+            histories.move_to_end(pid)
+        
+        needed = self.nbytes + len(new) * self.entry_bytes
+        while needed > self.max_bytes and histories:
+            pid, history = next(iter(histories.items()))
+            if history.last >= ts:
+                break
+            del histories[pid]
+            self.exited.discard(pid)
+            self.nbytes -= self.entry_bytes
+            needed -= self.entry_bytes
+        self._insert(ts, new)
+    
+    def record_delta(self, delta: SnapshotDelta):
+        histories = self.histories
+        for pid, _ in delta.removed:
+            if pid in histories:
+                histories.move_to_end(pid, last=False)
+                self.exited.add(pid)
+        self.record(delta.snapshot)
+    
+    def _insert(self, ts: float, new: list):
+        histories = self.histories
+        for pid, cpu, memory, rss in new:
+            if self.nbytes + self.entry_bytes > self.max_bytes:
+                break
+            history = histories[pid] = ProcessHistory()
+            history.add(ts, cpu, memory, rss)
+            self.nbytes += self.entry_bytes
+    
+    def get(self, pid: int) -> ProcessHistory:
+        return self.histories.get(pid)
 
-def process_generator():
-    for proc in psutil.process_iter(['pid', 'name', 'cpu_percent', 'memory_percent']):
+class LiveView:
+    SORTS = {
+        "c": (("cpu", "memory"), "CPU%"),
+        "m": (("memory",), "Память%"),
+        "p": (("pid",), "PID"),
+    }
+    MIN_INTERVAL = 0.2
+    MAX_INTERVAL = 10.0
+    
+    def __init__(self, sample, title: str = "ПРОЦЕССЫ", interval: float = 1.0):
+        self.sample = sample
+        self.title = title
+        self.interval = interval
+        self.sort = "c"
+        self.reverse = True
+        self.filter = ""
+        self.editing = False
+        self.matched = set()
+        self.checked = 0
+        self.snapshot = None
+        self.lines = []
+        self.frame_ms = 0.0
+        self.changed = 0
+        self.own = {"cpu_percent": 0.0, "rss": 0}
+    
+    def set_filter(self, text: str):
+        self.filter = text
+        self.matched = set()
+        self.checked = 0
+    
+    def _rows(self, snapshot: ProcessSnapshot):
+        if not self.filter:
+            return None
+        names = snapshot.table.names
+        text = self.filter.lower()
+        for name_id in range(self.checked, len(names)):
+            if text in names[name_id].lower():
+                self.matched.add(name_id)
+        self.checked = len(names)
+        return list(compress(range(len(snapshot)), map(self.matched.__contains__, snapshot.name_id)))
+    
+    def frame(self, snapshot: ProcessSnapshot, height: int, width: int) -> List[str]:
+        keys, label = self.SORTS[self.sort]
+        rows = self._rows(snapshot)
+        total = len(snapshot) if rows is None else len(rows)
+        with instrumentation.stage("sort"):
+            indices = snapshot.top(max(height - 3, 0), keys, self.reverse, rows)
+        
+        arrow = "v" if self.reverse else "^"
+        filter_text = self.filter + ("_" if self.editing else "") or "-"
+        lines = [
+            f"{self.title}  процессов: {total}/{len(snapshot)}  сортировка: {label} {arrow}  "
+            f"фильтр: {filter_text}  интервал: {self.interval:.1f} с  кадр: {self.frame_ms:.1f} мс  "
+            f"диспетчер: CPU {self.own['cpu_percent']:.1f}% RSS {self.own['rss'] / (1024 * 1024):.0f} MB",
+            f"{'PID':>8} {'Имя':<20} {'CPU%':>7} {'Память%':>8} {'RSS (MB)':>10}",
+        ]
+        for i in indices:
+            lines.append(f"{snapshot.pid[i]:>8} {snapshot.name(i)[:20]:<20} {snapshot.cpu[i]:>7.1f} "
+                         f"{snapshot.memory[i]:>8.2f} {snapshot.rss[i] / (1024 * 1024):>10.1f}")
+        lines.extend([""] * (height - 1 - len(lines)))
+        lines.append("q выход  c/m/p сортировка (повтор - обратный порядок)  / фильтр  +/- интервал")
+        return [line[:width - 1] for line in lines[:height]]
+    
+    def draw(self, screen, lines: List[str]):
+        started = time.perf_counter()
+        previous = self.lines
+        changed = 0
+        for y, line in enumerate(lines):
+            if y < len(previous) and previous[y] == line:
+                continue
+            screen.addstr(y, 0, line)
+            screen.clrtoeol()
+            changed += 1
+        self.lines = lines
+        self.changed = changed
+        screen.refresh()
+        instrumentation.record("render", time.perf_counter() - started)
+    
+    def render(self, screen):
+        started = time.perf_counter()
+        height, width = screen.getmaxyx()
+        self.draw(screen, self.frame(self.snapshot, height, width))
+        self.frame_ms = (time.perf_counter() - started) * 1000
+    
+    def handle_key(self, screen, key: int) -> bool:
+        if key == curses.KEY_RESIZE:
+            screen.clear()
+            self.lines = []
+            return True
+        
+        if self.editing:
+            if key in (curses.KEY_ENTER, 10, 13):
+                self.editing = False
+            elif key == 27:
+                self.editing = False
+                self.set_filter("")
+            elif key in (curses.KEY_BACKSPACE, 127, 8):
+                self.set_filter(self.filter[:-1])
+            elif 32 <= key < 0x110000:
+                self.set_filter(self.filter + chr(key))
+            return True
+        
+        char = chr(key) if 0 <= key < 0x110000 else ""
+        if char in ("q", "Q"):
+            return False
+        if char in self.SORTS:
+            if char == self.sort:
+                self.reverse = not self.reverse
+            else:
+                self.sort = char
+                self.reverse = char != "p"
+        elif char == "/":
+            self.editing = True
+        elif char == "+":
+            self.interval = min(self.interval * 2, self.MAX_INTERVAL)
+        elif char == "-":
+            self.interval = max(self.interval / 2, self.MIN_INTERVAL)
+        return True
+    
+    def _loop(self, screen):
         try:
-            info = proc.info
-            yield ProcessInfo(
-                pid=info['pid'],
-                name=info['name'],
-                cpu_percent=info['cpu_percent'] or 0.0,
-                memory_percent=info['memory_percent'] or 0.0
-            )
-        except:
+            curses.curs_set(0)
+        except curses.error:
+            pass
+        screen.keypad(True)
+        if hasattr(curses, "set_escdelay"):
+            curses.set_escdelay(25)
+        
+        next_sample = time.monotonic()
+        while True:
+            now = time.monotonic()
+            if now >= next_sample:
+                self.snapshot = self.sample()
+                self.own = instrumentation.overhead()
+                next_sample = max(next_sample + self.interval, now)
+            self.render(screen)
+            
+            screen.timeout(max(1, int((next_sample - time.monotonic()) * 1000)))
+            key = screen.getch()
+            if key != -1 and not self.handle_key(screen, key):
+                break
+    
+    def run(self):
+        try:
+            curses.wrapper(self._loop)
+        except KeyboardInterrupt:
+            pass
+
+def spawn_sleepers(count: int) -> List[subprocess.Popen]:
+    sleepers = []
+    for _ in range(count):
+        try:
+            sleepers.append(subprocess.Popen(["sleep", "3600"], stdin=subprocess.DEVNULL,
+                                             stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+        except OSError:
+            break
+    return sleepers
+
+def stop_sleepers(sleepers: List[subprocess.Popen]):
+    for proc in sleepers:
+        proc.kill()
+    for proc in sleepers:
+        proc.wait()
+
+def synthetic_snapshot(count: int, seed: int = 0) -> ProcessSnapshot:
+    rng = random.Random(seed)
+    snapshot = ProcessSnapshot()
+    for pid in range(1, count + 1):
+        snapshot.append(pid, f"worker-{pid % 100}", rng.random() * 100,
+                        rng.random() * 10, rng.randrange(1 << 30))
+    return snapshot
+
+def benchmark_topk(sizes=(10000, 50000, 100000), k: int = 50, repeat: int = 5):
+    print(f"{'Процессов':<12} {'Сортировка (мс)':<18} {'Топ-k (мс)':<14} {'Ускорение':<10}")
+    print("-" * 56)
+    
+    for size in sizes:
+        snapshot = synthetic_snapshot(size)
+        results = {}
+        cases = {
+            "sort": lambda: snapshot.order("cpu")[:k],
+            "top": lambda: snapshot.top(k, "cpu"),
+        }
+        for name, case in cases.items():
+            best = None
+            for _ in range(repeat):
+                started = time.perf_counter()
+                case()
+                duration = time.perf_counter() - started
+                if best is None or duration < best:
+                    best = duration
+            results[name] = best * 1000
+        
+        speedup = results["sort"] / results["top"] if results["top"] else 0.0
+        print(f"{size:<12} {results['sort']:<18.2f} {results['top']:<14.2f} {speedup:<10.1f}")
+
+def benchmark_rules(sizes=(10000, 50000), rule_count: int = 100, repeat: int = 5):
+    templates = ("cpu > {high}", "memory >= {memory} for 30s", "rss > {n}0MB by name=worker-{n}*",
+                 "threads > {n}", "rss growth > {n}MB/min", "cpu > {high} for 5s by name=worker-1*")
+    rules = [templates[i % len(templates)].format(n=50 + i % 50, high=99 + (i % 10) / 10,
+                                                  memory=9.9 + (i % 10) / 100)
+             for i in range(rule_count)]
+    print(f"Правил: {rule_count}")
+    print(f"{'Процессов':<12} {'Проверка (мс)':<15} {'На правило (мкс)':<18}")
+    print("-" * 45)
+    for size in sizes:
+        engine = RuleEngine(rules, log=open(os.devnull, "w"))
+        snapshot = synthetic_snapshot(size)
+        best = None
+        for step in range(repeat + 1):
+            snapshot.timestamp += 1.0
+            started = time.perf_counter()
+            engine.evaluate(snapshot)
+            duration = time.perf_counter() - started
+            if step and (best is None or duration < best):
+                best = duration
+        engine.log.close()
+        print(f"{size:<12} {best * 1000:<15.2f} {best * 1e6 / rule_count:<18.1f}")
+
+def benchmark_leaks(sizes=(10000, 50000), repeat: int = 5):
+    print(f"{'Процессов':<12} {'Обновление (мс)':<17} {'Поиск (мс)':<12} {'Память (байт/процесс)':<22}")
+    print("-" * 65)
+    for size in sizes:
+        detector = LeakDetector(min_duration=0, min_samples=3)
+        snapshot = synthetic_snapshot(size)
+        rng = random.Random(0)
+        for i in range(size):
+            snapshot.rss[i] //= 2
+        updates = []
+        searches = []
+        for step in range(repeat + 3):
+            snapshot.timestamp += 1.0
+            for i in range(size):
+                snapshot.rss[i] += (1 << 20) if i % 100 == 0 else rng.randrange(-256, 257)
+            started = time.perf_counter()
+            detector.update(snapshot)
+            middle = time.perf_counter()
+            detector.suspects()
+            finished = time.perf_counter()
+            if step >= 3:
+                updates.append(middle - started)
+                searches.append(finished - middle)
+        memory = sum(column.itemsize for column in detector.state)
+        print(f"{size:<12} {min(updates) * 1000:<17.2f} {min(searches) * 1000:<12.2f} {memory:<22}")
+
+def benchmark_backends(sizes=(1000, 10000, 50000), repeat: int = 5):
+    print(f"{'Процессов':<12} {'psutil (мс)':<14} {'/proc (мс)':<14} {'Ускорение':<10}")
+    print("-" * 50)
+    
+    sleepers = []
+    try:
+        for size in sorted(sizes):
+            missing = size - len(psutil.pids())
+            if missing > 0:
+                sleepers.extend(spawn_sleepers(missing))
+            actual = len(psutil.pids())
+            
+            results = {}
+            for backend in BACKENDS:
+                list(process_generator(backend))
+                best = None
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    list(process_generator(backend))
+                    duration = time.perf_counter() - started
+                    if best is None or duration < best:
+                        best = duration
+                results[backend] = best * 1000
+            
+            speedup = results["psutil"] / results["proc"] if results["proc"] else 0.0
+            print(f"{actual:<12} {results['psutil']:<14.1f} {results['proc']:<14.1f} {speedup:<10.1f}")
+            if actual < size:
+                print(f"\nНе удалось запустить {size} процессов (лимит системы)")
+                break
+    finally:
+        stop_sleepers(sleepers)
+
+def benchmark_shards(sizes=(10000, 50000), repeat: int = 5):
+    cores = os.cpu_count() or 1
+    counts = [1]
+    while counts[-1] * 2 <= max(cores, 2):
+        counts.append(counts[-1] * 2)
+    
+    print(f"Ядер: {cores}")
+    print(f"{'Процессов':<12} " + " ".join(f"{f'{n} шард (мс)':<14}" for n in counts))
+    print("-" * (13 + 15 * len(counts)))
+    
+    sleepers = []
+    try:
+        for size in sorted(sizes):
+            missing = size - len(psutil.pids())
+            if missing > 0:
+                sleepers.extend(spawn_sleepers(missing))
+            actual = len(psutil.pids())
+            
+            results = []
+            for shards in counts:
+                reader = make_sampler("proc", shards=shards)
+                reader.MIN_SHARD_SIZE = 1
+                try:
+                    reader.sample()
+                    best = None
+                    for _ in range(repeat):
+                        started = time.perf_counter()
+                        reader.sample()
+                        duration = time.perf_counter() - started
+                        if best is None or duration < best:
+                            best = duration
+                finally:
+                    if shards > 1:
+                        reader.close()
+                results.append(best * 1000)
+            print(f"{actual:<12} " + " ".join(f"{value:<14.1f}" for value in results))
+            if actual < size:
+                print(f"\nНе удалось запустить {size} процессов (лимит системы)")
+                break
+    finally:
+        stop_sleepers(sleepers)
+
+
+def io_call_count():
+    try:
+        with open(f"{PROC_ROOT}/self/io") as file:
+            counters = dict(line.split(": ") for line in file.read().splitlines())
+        return int(counters["syscr"]) + int(counters["syscw"])
+    except (OSError, KeyError, ValueError):
+        return None
+
+def percentile(ordered: List[float], q: float) -> float:
+    if not ordered:
+        return 0.0
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+def measure(run, repeat: int = 10, setup=None) -> dict:
+    prepare = setup or (lambda: None)
+    before = io_call_count()
+    probe_cost = io_call_count() - before if before is not None else 0
+    
+    run(prepare())
+    times = []
+    io_calls = []
+    for _ in range(repeat):
+        arg = prepare()
+        before = io_call_count()
+        started = time.perf_counter()
+        run(arg)
+        duration = time.perf_counter() - started
+        after = io_call_count()
+        times.append(duration * 1000)
+        if before is not None and after is not None:
+            io_calls.append(after - before - probe_cost)
+    
+    arg = prepare()
+    tracemalloc.start()
+    try:
+        run(arg)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    
+    times.sort()
+    io_calls.sort()
+    return {
+        "p50_ms": percentile(times, 50),
+        "p90_ms": percentile(times, 90),
+        "p99_ms": percentile(times, 99),
+        "max_ms": times[-1],
+        "mean_ms": sum(times) / len(times),
+        "alloc_peak_kb": peak / 1024,
+        "alloc_retained_kb": current / 1024,
+        "io_calls": percentile(io_calls, 50) if io_calls else None,
+    }
+
+def compare_results(results: List[dict], baseline: dict, threshold: float = 0.1):
+    old = {(item["name"], item["backend"], item["size"]): item for item in baseline["results"]}
+    print(f"\n{'Сценарий':<22} {'Источник':<8} {'Процессов':<10} {'Было p50':>10} {'Стало p50':>10} {'Изм.':>8}")
+    print("-" * 73)
+    for item in results:
+        previous = old.get((item["name"], item["backend"], item["size"]))
+        if previous is None or not previous["p50_ms"]:
             continue
+        change = item["p50_ms"] / previous["p50_ms"] - 1
+        mark = "  РЕГРЕССИЯ" if change > threshold else ""
+        print(f"{item['name']:<22} {item['backend']:<8} {item['size']:<10} {previous['p50_ms']:>10.2f} "
+              f"{item['p50_ms']:>10.2f} {change * 100:>+7.1f}%{mark}")
+
+def benchmark_suite(sizes=(1000,), repeat: int = 10, json_path: str = None,
+                    baseline_path: str = None, batch: int = 50):
+    backends = [backend for backend in BACKENDS if backend != "proc" or os.path.isdir(PROC_ROOT)]
+    results = []
+    sleepers = []
+    victims = []
+    
+    def spawn_batch():
+        procs = spawn_sleepers(batch)
+        victims.extend(procs)
+        return [proc.pid for proc in procs]
+    
+    def terminate_each(pids):
+        for pid in pids:
+            ProcessTerminator(pid).terminate()
+    
+    try:
+        for size in sorted(sizes):
+            missing = size - len(psutil.pids())
+            if missing > 0:
+                sleepers.extend(spawn_sleepers(missing))
+            actual = len(psutil.pids())
+            
+            scenarios = []
+            for backend in backends:
+                sampler = make_sampler(backend)
+                sampler.sample()
+                scenarios += [
+                    ("process_generator", backend, lambda _, b=backend: list(process_generator(b))),
+                    ("ProcessIterator", backend, lambda _, b=backend: list(ProcessIterator(b))),
+                    ("top50_memory", backend, lambda _, s=sampler: s.sample().top(50, "memory")),
+                    ("monitor_tick", backend, lambda _, s=sampler: s.sample().top(5, ("cpu", "memory"))),
+                ]
+            
+            for name, backend, run in scenarios:
+                results.append(dict(name=name, backend=backend, size=size, processes=actual,
+                                    **measure(run, repeat)))
+            results.append(dict(name=f"terminate_batch_{batch}", backend="-", size=size, processes=actual,
+                                **measure(lambda pids: BatchTerminator(pids).terminate(), repeat, spawn_batch)))
+            results.append(dict(name=f"terminate_each_{batch}", backend="-", size=size, processes=actual,
+                                **measure(terminate_each, repeat, spawn_batch)))
+            
+            if actual < size:
+                print(f"\nНе удалось запустить {size} процессов (лимит системы)")
+                break
+    finally:
+        stop_sleepers(sleepers)
+        stop_sleepers(victims)
+    
+    print(f"{'Сценарий':<22} {'Источник':<8} {'Процессов':<10} {'p50 мс':>9} {'p90 мс':>9} "
+          f"{'p99 мс':>9} {'max мс':>9} {'Пик КБ':>9} {'Чт/зап':>8}")
+    print("-" * 99)
+    for item in results:
+        io_calls = f"{item['io_calls']:.0f}" if item["io_calls"] is not None else "-"
+        print(f"{item['name']:<22} {item['backend']:<8} {item['processes']:<10} {item['p50_ms']:>9.2f} "
+              f"{item['p90_ms']:>9.2f} {item['p99_ms']:>9.2f} {item['max_ms']:>9.2f} "
+              f"{item['alloc_peak_kb']:>9.0f} {io_calls:>8}")
+    
+    report = {
+        "meta": {
+            "timestamp": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+    if json_path:
+        if json_path == "-":
+            json.dump(report, sys.stdout, indent=2)
+            print()
+        else:
+            with open(json_path, "w", encoding="utf-8") as file:
+                json.dump(report, file, indent=2)
+    if baseline_path:
+        with open(baseline_path, encoding="utf-8") as file:
+            compare_results(results, json.load(file))
+    return report
 
 class ProcessInterface(ABC):
     @abstractmethod
@@ -90,56 +3099,381 @@ class ProcessTerminator(ProcessInterface):
             except:
                 return False
 
+OUTCOME_LABELS = {
+    "terminated": "завершен (SIGTERM)",
+    "killed": "убит (SIGKILL)",
+    "not_found": "не найден",
+    "access_denied": "нет доступа",
+    "failed": "не удалось завершить",
+    "replaced": "PID занят другим процессом",
+    "protected": "защищен (диспетчер, его родители или init)",
+}
+
+def protected_pids() -> set:
+    protected = {1, os.getpid()}
+    try:
+        protected.update(parent.pid for parent in psutil.Process().parents())
+    except (psutil.NoSuchProcess, psutil.AccessDenied):
+        pass
+    return protected
+
+class BatchTerminator(ProcessInterface):
+    def __init__(self, pids: Iterable[int], include_children: bool = False, timeout: float = 2,
+                 started: dict = None):
+        self.timeout = timeout
+        self.procs = {}
+        self.report = {}
+        protected = protected_pids()
+        
+        for pid in pids:
+            if pid in protected:
+                self.report[pid] = "protected"
+                continue
+            try:
+                proc = psutil.Process(pid)
+                if started and not same_process(proc, started.get(pid, 0.0)):
+                    self.report[pid] = "replaced"
+                    continue
+                self.procs[pid] = proc
+                if include_children:
+                    for child in proc.children(recursive=True):
+                        if child.pid not in protected:
+                            self.procs.setdefault(child.pid, child)
+            except psutil.NoSuchProcess:
+                self.report[pid] = "not_found"
+            except psutil.AccessDenied:
+                self.report[pid] = "access_denied"
+    
+    def _signal(self, procs, method: str) -> list:
+        sent = []
+        for proc in procs:
+            try:
+                getattr(proc, method)()
+                sent.append(proc)
+            except psutil.NoSuchProcess:
+                self.report[proc.pid] = "terminated"
+            except psutil.AccessDenied:
+                self.report[proc.pid] = "access_denied"
+        return sent
+    
+    def terminate(self) -> bool:
+        sent = self._signal(self.procs.values(), "terminate")
+        gone, alive = psutil.wait_procs(sent, timeout=self.timeout)
+        for proc in gone:
+            self.report[proc.pid] = "terminated"
+        
+        if alive:
+            sent = self._signal(alive, "kill")
+            gone, alive = psutil.wait_procs(sent, timeout=self.timeout)
+            for proc in gone:
+                self.report[proc.pid] = "killed"
+            for proc in alive:
+                self.report[proc.pid] = "failed"
+        
+        return all(outcome in ("terminated", "killed") for outcome in self.report.values())
+
 def sort_by_memory(proc):
     return proc.memory_percent
 
 def sort_by_cpu(proc):
     return proc.cpu_percent
 
+
+class AsyncProcessAPI:
+    def __init__(self, backend: str = "psutil", shards: int = 1, max_workers: int = 4,
+                 ttl: float = 0.5, sampler=None):
+        self.sampler = sampler if sampler is not None else make_sampler(backend, shards=shards)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="process-api")
+        self.cache = SnapshotCache(self.sampler, ttl)
+        self.pending = None
+        self.futures = set()
+    
+    async def _run(self, func, *args):
+        future = self.executor.submit(func, *args)
+        self.futures.add(future)
+        future.add_done_callback(self.futures.discard)
+        return await asyncio.wrap_future(future)
+    
+    async def _sample(self, max_age: float = None) -> ProcessSnapshot:
+        try:
+            return await self._run(self.cache.get, max_age)
+        finally:
+            self.pending = None
+    
+    async def snapshot(self, max_age: float = None) -> ProcessSnapshot:
+        snapshot = self.cache.fresh(max_age)
+        if snapshot is not None:
+            return snapshot
+        if self.pending is None:
+            self.pending = asyncio.get_running_loop().create_task(self._sample(max_age))
+        return await asyncio.shield(self.pending)
+    
+    async def top(self, k: int, key="cpu", reverse: bool = True) -> List[ProcessInfo]:
+        snapshot = await self.snapshot()
+        with instrumentation.stage("sort"):
+            return snapshot.views(snapshot.top(k, key, reverse))
+    
+    @staticmethod
+    async def _ticks(interval: float, count: int = None):
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        tick = 0
+        while count is None or tick < count:
+            delay = next_tick - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tick += 1
+            yield tick
+            next_tick += interval
+            now = loop.time()
+            if next_tick < now:
+                next_tick += (now - next_tick) // interval * interval + interval
+    
+    async def watch(self, interval: float = 1.0, count: int = None):
+        async for _ in self._ticks(interval, count):
+            yield await self.snapshot()
+    
+    async def watch_processes(self, pids: Iterable[int], include_children: bool = False,
+                              interval: float = 1.0, count: int = None):
+        monitor = await self._run(MultiMonitor, list(pids), include_children, interval)
+        ticks = self._ticks(interval, count)
+        try:
+            async for _ in ticks:
+                snapshot, exited = await self._run(monitor.sample)
+                yield snapshot, exited
+                if not monitor.handles:
+                    return
+        finally:
+            await ticks.aclose()
+    
+    async def terminate(self, pids: Iterable[int], include_children: bool = False,
+                        timeout: float = 2, started: dict = None) -> dict:
+        terminator = await self._run(BatchTerminator, list(pids), include_children, timeout, started)
+        await self._run(terminator.terminate)
+        self.cache.invalidate()
+        return terminator.report
+    
+    async def close(self):
+        for future in list(self.futures):
+            future.cancel()
+        self.executor.shutdown(wait=False)
+        close = getattr(self.sampler, "close", None)
+        if close is not None:
+            close()
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
 class ProcessManager:
-    def __init__(self):
-        pass
+    def __init__(self, backend: str = "psutil", interval: float = 1.0, shards: int = 1,
+                 shard_threads: bool = False, replay: Replay = None, cache_ttl: float = 2.0,
+                 rules: RuleEngine = None):
+        self.backend = backend
+        self.interval = interval
+        if replay is not None:
+            self.events = self.sampler = replay
+        else:
+            self.events = open_process_events()
+            self.sampler = make_sampler(backend, self.events, shards, shard_threads)
+        self.api = AsyncProcessAPI(sampler=self.sampler, ttl=cache_ttl)
+        self.loop = asyncio.new_event_loop()
+        self.details = DetailCache()
+        self.index = NameIndex(self.details)
+        self.history = HistoryStore()
+        self.tree = ProcessTree()
+        self.system = SystemSampler() if replay is None else None
+        self.cgroups = CgroupResolver() if replay is None else None
+        self.rules = rules
+        self.leaks = LeakDetector()
+        self.changes = DeltaTracker()
+        self.ranking = RankedView(("cpu", "memory"))
+        self.delta = None
+        self.snapshot = None
+    
+    def refresh(self, max_age: float = 0.0) -> ProcessSnapshot:
+        snapshot = self._call(self.api.snapshot(max_age))
+        if snapshot is self.snapshot:
+            return snapshot
+        self.snapshot = snapshot
+        self.delta = self.changes.diff(self.snapshot)
+        self.index.update(self.snapshot)
+        self.history.record_delta(self.delta)
+        self.tree.update(self.snapshot)
+        with instrumentation.stage("sort"):
+            self.ranking.apply(self.delta)
+        with instrumentation.stage("leaks"):
+            self.leaks.update(self.snapshot)
+        if self.rules is not None:
+            self.rules.process(self.snapshot)
+        return self.snapshot
+    
+    def _call(self, coroutine):
+        return self.loop.run_until_complete(coroutine)
+    
+    def _stream(self, stream):
+        try:
+            while True:
+                try:
+                    item = self._call(stream.__anext__())
+                except StopAsyncIteration:
+                    return
+                yield item
+        finally:
+            self._call(stream.aclose())
+    
+    def top(self, k: int, key="cpu", reverse: bool = True, snapshot: ProcessSnapshot = None) -> List[ProcessInfo]:
+        if snapshot is None:
+            snapshot = self.refresh()
+        with instrumentation.stage("sort"):
+            return snapshot.views(snapshot.top(k, key, reverse))
     
     @header_decorator("ВСЕ ПРОЦЕССЫ")
     def show_all_processes(self):
-        processes = []
-        count = 0
-        for proc in process_generator():
-            processes.append(proc)
-            count += 1
-        
-        processes.sort(key=sort_by_memory, reverse=True)
+        snapshot = self.refresh(max_age=None)
+        processes = self.top(50, "memory", snapshot=snapshot)
         
         print(f"{'PID':<8} {'Имя':<20} {'CPU%':<8} {'Память%':<10}")
         print("-" * 50)
         
-        for proc in processes[:50]:
-            print(proc)
+        with instrumentation.stage("render"):
+            for proc in processes:
+                print(proc)
+        
+        print(f"\nВсего процессов: {len(snapshot)}")
+    
+    @header_decorator("ДЕРЕВО ПРОЦЕССОВ")
+    def show_tree(self, max_children: int = 5, max_depth: int = 6):
+        self.refresh(max_age=None)
+        tree = self.tree
+        
+        print(f"{'PID':<8} {'Имя':<34} {'Процессов':>9} {'CPU%':>8} {'RSS (MB)':>10} {'Потоков':>8}")
+        print("-" * 82)
+        
+        stack = [(pid, 0, 0) for pid in reversed(tree.ranked(tree.roots()))]
+        while stack:
+            pid, depth, hidden = stack.pop()
+            if pid is None:
+                print(f"{'':<8} {'  ' * depth}... еще процессов: {hidden}")
+                continue
+            cpu, rss, threads, count = tree.totals[pid]
+            label = ("  " * depth + tree.names[pid])[:34]
+            print(f"{pid:<8} {label:<34} {count:>9} {max(cpu, 0.0):>8.1f} "
+                  f"{rss / (1024 * 1024):>10.1f} {threads:>8}")
+            if depth + 1 >= max_depth:
+                continue
+            children = tree.ranked(tree.children[pid])
+            hidden = children[max_children:]
+            if hidden:
+                hidden_count = sum(tree.totals[child][tree.COUNT] for child in hidden)
+                stack.append((None, depth + 1, hidden_count))
+            for child in reversed(children[:max_children]):
+                stack.append((child, depth + 1, 0))
+        
+        print(f"\nВсего процессов: {len(tree.own)}")
+    
+    @header_decorator("ТОП СЛУЖБ")
+    def show_services(self, k: int = 10, key: str = "rss"):
+        self.refresh(max_age=None)
+        print(f"{'Служба':<24} {'Процессов':>9} {'CPU%':>8} {'RSS (MB)':>10} {'Потоков':>8}")
+        print("-" * 63)
+        for name, (cpu, rss, threads, count) in self.tree.top_services(k, key):
+            print(f"{name[:24]:<24} {count:>9} {max(cpu, 0.0):>8.1f} "
+                  f"{rss / (1024 * 1024):>10.1f} {threads:>8}")
+    
+    @header_decorator("ГРУППЫ CGROUP")
+    def show_cgroups(self, k: int = 15):
+        if self.cgroups is None or self.cgroups.cgroup_root is None:
+            print("cgroup v2 недоступна")
+            return
+        snapshot = self.refresh(max_age=None)
+        groups = self.cgroups.groups(snapshot)
+        rows = [(path, label, count, cpu, rss, self.cgroups.stats(path))
+                for path, (label, count, cpu, rss) in groups.items()]
+        rows.sort(key=lambda row: (row[5].memory, row[4]), reverse=True)
+        
+        mb = 1024 * 1024
+        print(f"{'Группа':<28} {'Процессов':>9} {'CPU%':>7} {'RSS (MB)':>9} "
+              f"{'Память (MB)':>11} {'CPU% гр.':>8} {'Диск (MB)':>9}")
+        print("-" * 88)
+        for path, label, count, cpu, rss, stats in rows[:k]:
+            group_cpu = f"{stats.cpu_percent:.1f}" if stats.cpu_percent is not None else "-"
+            print(f"{label[:28]:<28} {count:>9} {max(cpu, 0.0):>7.1f} {rss / mb:>9.1f} "
+                  f"{stats.memory / mb:>11.1f} {group_cpu:>8} {(stats.io_read + stats.io_write) / mb:>9.1f}")
+        print(f"\nГрупп: {len(groups)}; память и диск - счетчики ядра для всей группы "
+              f"(включая страничный кэш), CPU% гр. - с прошлого просмотра")
+    
+    @header_decorator("СТАТИСТИКА ДИСПЕТЧЕРА")
+    def show_stats(self):
+        report = instrumentation.report()
+        
+        print(f"{'Этап':<12} {'Вызовов':>8} {'Последний (мс)':>15} {'Средний (мс)':>13} {'Всего (мс)':>12}")
+        print("-" * 64)
+        for name, stage in report["stages"].items():
+            print(f"{name:<12} {stage['calls']:>8} {stage['last_ms']:>15.2f} "
+                  f"{stage['avg_ms']:>13.2f} {stage['total_ms']:>12.1f}")
         
-        print(f"\nВсего процессов: {count}")
+        skipped = report["skipped"]
+        print(f"\nПропущено процессов: завершились - {skipped['vanished']}, "
+              f"нет доступа - {skipped['denied']}, ошибка разбора - {skipped['malformed']}")
+        
+        own = report["self"]
+        print(f"Нагрузка диспетчера: CPU {own['cpu_percent_total']:.2f}% одного ядра с запуска "
+              f"({own['cpu_percent']:.2f}% с прошлого запроса), RSS {own['rss'] / (1024 * 1024):.1f} MB, "
+              f"потоков {own['threads']}")
+    
+    def live_view(self):
+        if curses is None:
+            print("\nЖивой просмотр недоступен: нет модуля curses")
+            return
+        LiveView(self.refresh, "ВСЕ ПРОЦЕССЫ", self.interval).run()
     
     @header_decorator("ЗАВЕРШЕНИЕ ПРОЦЕССА")
     def kill_process(self):
-        identifier = input("Введите PID или имя процесса: ").strip()
+        identifier = input("Введите PID или имя процесса (или cmd:, user:, re:): ").strip()
+        
+        query = identifier.split(":", 1)[1] if identifier.startswith(("cmd:", "user:", "re:")) else identifier
+        if not query.strip():
+            print("Пустой запрос")
+            return
         
-        if identifier.isdigit():
+        parts = identifier.replace(",", " ").split()
+        if len(parts) > 1 and all(part.isdigit() for part in parts):
+            self._kill_batch([int(part) for part in parts])
+        elif identifier.isdigit():
             pid = int(identifier)
-            terminator = ProcessTerminator(pid)
-            if terminator.terminate():
+            report = self._call(self.api.terminate([pid]))
+            outcome = report.get(pid, "failed")
+            if outcome in ("terminated", "killed"):
                 print(f"Процесс {pid} завершен")
             else:
-                print(f"Не удалось завершить процесс {pid}")
+                print(f"Не удалось завершить процесс {pid}: {OUTCOME_LABELS[outcome]}")
         else:
             self._kill_by_name(identifier)
     
+    def _kill_batch(self, pids: List[int], started: dict = None):
+        tree = input("Завершить и дочерние процессы? (д/н): ").strip().lower() in ("д", "y")
+        
+        report = self._call(self.api.terminate(pids, include_children=tree, started=started))
+        
+        print(f"\n{'PID':<8} {'Результат':<25}")
+        print("-" * 35)
+        for pid, outcome in sorted(report.items()):
+            print(f"{pid:<8} {OUTCOME_LABELS[outcome]:<25}")
+    
     def _kill_by_name(self, name: str):
-        found = []
-        for proc in psutil.process_iter(['pid', 'name']):
-            try:
-                if name.lower() in proc.info['name'].lower():
-                    found.append(proc.info)
-            except:
-                continue
+        snapshot = self.refresh(max_age=None)
+        try:
+            pids = self.index.search(name)
+        except re.error:
+            print("Неверное регулярное выражение")
+            return
+        
+        found = [{'pid': pid, 'name': self.index.name(pid)} for pid in pids]
+        wanted = set(pids)
+        started = {snapshot.pid[i]: snapshot.started[i] for i in snapshot.where("pid", wanted.__contains__)}
         
         if not found:
             print(f"Процессы с именем '{name}' не найдены")
@@ -153,7 +3487,18 @@ class ProcessManager:
             choice = 1
         else:
             try:
-                choice = int(input(f"\nВыберите процесс (1-{len(found)}): "))
+                choice = int(input(f"\nВыберите процесс (1-{len(found)}, 0 - все): "))
+                
+                if choice == 0:
+                    protected = protected_pids()
+                    batch = [p['pid'] for p in found if p['pid'] not in protected]
+                    print(f"Будет завершено процессов: {len(batch)} "
+                          f"(пропущено защищенных: {len(found) - len(batch)})")
+                    if not batch or input("Введите 'да' для подтверждения: ").strip().lower() not in ("да", "yes"):
+                        print("Отменено")
+                        return
+                    self._kill_batch(batch, started)
+                    return
                 if not 1 <= choice <= len(found):
                     print("Неверный выбор")
                     return
@@ -162,74 +3507,339 @@ class ProcessManager:
                 return
         
         pid = found[choice-1]['pid']
-        terminator = ProcessTerminator(pid)
-        if terminator.terminate():
+        report = self._call(self.api.terminate([pid], started=started))
+        outcome = report.get(pid, "failed")
+        if outcome in ("terminated", "killed"):
             print(f"Процесс {pid} завершен")
         else:
-            print(f"Не удалось завершить процесс {pid}")
+            print(f"Не удалось завершить процесс {pid}: {OUTCOME_LABELS[outcome]}")
     
     @header_decorator("МОНИТОРИНГ РЕСУРСОВ")
     def monitor_resources(self):
         print("1. Мониторинг всех процессов (топ по CPU)")
         print("2. Мониторинг конкретного процесса")
+        print("3. История процесса")
+        print("4. Подробности процесса")
+        print("5. Живой мониторинг конкретных процессов")
+        print("6. Возможные утечки памяти")
         
-        choice = input("Выбор (1-2): ").strip()
+        choice = input("Выбор (1-6): ").strip()
         
         if choice == "1":
             self._monitor_all()
         elif choice == "2":
             self._monitor_specific()
+        elif choice == "3":
+            self._show_history()
+        elif choice == "4":
+            self._show_details()
+        elif choice == "5":
+            self._monitor_specific(live=True)
+        elif choice == "6":
+            self._show_leaks()
         else:
             print("Неверный выбор")
     
     def _monitor_all(self):
-        print("\nМониторинг топ-5 процессов по CPU (5 секунд)")
+        print(f"\nМониторинг топ-5 процессов по CPU (5 секунд, отслеживание: {self.events.kind})")
         print(f"{'Время':<8} {'PID':<8} {'Имя':<15} {'CPU%':<8} {'Память%':<10}")
         print("-" * 60)
         
+        self.refresh()
+        
+        if self.system is not None:
+            self.system.sample()
+        
+        self.events.drain_short_lived()
+        instrumentation.overhead()
+        
         for second in range(5):
-            processes = []
-            for proc in process_generator():
-                processes.append(proc)
+            self.events.wait(1)
+            self.refresh()
+            system = None
+            if self.system is not None:
+                with instrumentation.stage("system"):
+                    system = self.system.sample()
             
-            processes.sort(key=sort_by_cpu, reverse=True)
+            processes = self.ranking.top(5)
             
-            print(f"\n{second+1} сек:")
-            for i in range(min(5, len(processes))):
-                p = processes[i]
+            delta = self.delta
+            print(f"\n{second+1} сек: новых {len(delta.added)}, завершилось {len(delta.removed)}, "
+                  f"изменилось {len(delta.changed)}")
+            if system is not None:
+                for line in format_system(system):
+                    print(f"{'':<8} {line}")
+            render_started = time.perf_counter()
+            for p in processes:
                 print(f"{'':<8} {p.pid:<8} {p.name[:15]:<15} {p.cpu_percent:<8.1f} {p.memory_percent:<10.2f}")
+            instrumentation.record("render", time.perf_counter() - render_started)
+            
+            own = instrumentation.overhead()
+            print(f"{'':<8} {os.getpid():<8} {'[диспетчер]':<15} {own['cpu_percent']:<8.1f} {own['memory_percent']:<10.2f}")
             
-            if second < 4:
-                time.sleep(1)
+            short_lived = self.events.drain_short_lived()
+            if short_lived:
+                listed = ", ".join(f"{name or '?'}({pid})" for pid, name in short_lived[:10])
+                more = f" и еще {len(short_lived) - 10}" if len(short_lived) > 10 else ""
+                print(f"{'':<8} Кратковременные процессы ({len(short_lived)}): {listed}{more}")
+            
+            suspects = self.leaks.suspects(3)
+            if suspects:
+                listed = ", ".join(f"{s.name}({s.pid}) +{s.rate:.1f} МБ/ч" for s in suspects)
+                print(f"{'':<8} Рост памяти: {listed}")
+    
+    def _monitor_specific(self, live: bool = False):
+        if live and curses is None:
+            print("\nЖивой просмотр недоступен: нет модуля curses")
+            return
+        
+        try:
+            raw = input("\nВведите PID процесса (можно несколько через пробел): ")
+            pids = [int(part) for part in raw.replace(",", " ").split()]
+        except ValueError:
+            print("PID должен быть числом")
+            return
+        
+        if not pids:
+            print("PID должен быть числом")
+            return
+        
+        tree = input("Следить и за дочерними процессами? (д/н): ").strip().lower() in ("д", "y")
+        
+        frames = self._stream(self.api.watch_processes(
+            pids, include_children=tree, interval=LiveView.MIN_INTERVAL if live else self.interval,
+            count=None if live else 10))
+        snapshot, exited = next(frames)
+        if not len(snapshot) and not exited:
+            frames.close()
+            print(f"\nПроцессы {', '.join(map(str, pids))} не найдены")
+            return
+        
+        if live:
+            def sample():
+                snapshot, exited = next(frames, (ProcessSnapshot(NameTable()), []))
+                self.history.record(snapshot)
+                return snapshot
+            LiveView(sample, "МОНИТОРИНГ", self.interval).run()
+            frames.close()
+            return
+        
+        print(f"\nМониторинг процессов: {len(snapshot) + len(exited)} (10 секунд)")
+        
+        print(f"{'Время':<8} {'PID':<8} {'Имя':<15} {'CPU%':<8} {'Память%':<10} {'Память (MB)':<12}")
+        print("-" * 70)
+        
+        for tick, (snapshot, exited) in enumerate(chain([(snapshot, exited)], frames), 1):
+            print(f"\n{tick} сек:")
+            for i in range(len(snapshot)):
+                mem_mb = snapshot.rss[i] // (1024 * 1024)
+                print(f"{'':<8} {snapshot.pid[i]:<8} {snapshot.name(i)[:15]:<15} "
+                      f"{snapshot.cpu[i]:<8.1f} {snapshot.memory[i]:<10.2f} {mem_mb:<12}")
+            self.history.record(snapshot)
+            for pid in exited:
+                print(f"Процесс {pid} завершен")
+    
+    def _show_leaks(self, k: int = 10):
+        self.refresh()
+        suspects = self.leaks.suspects(k)
+        detector = self.leaks
+        if not suspects:
+            print(f"\nУстойчивого роста памяти не найдено (нужно не меньше {detector.min_samples} замеров "
+                  f"за {detector.min_duration / 60:.0f} мин: мониторинг, живой просмотр)")
+            return
+        print(f"\n{'PID':<8} {'Имя':<15} {'Рост (МБ/ч)':>12} {'R²':>6} {'t':>8} "
+              f"{'Замеров':>8} {'Время (мин)':>12} {'RSS (MB)':>10}")
+        print("-" * 85)
+        for s in suspects:
+            print(f"{s.pid:<8} {s.name[:15]:<15} {s.rate:>12.1f} {s.r2:>6.2f} {min(s.t_stat, 9999):>8.1f} "
+                  f"{s.samples:>8} {s.duration / 60:>12.1f} {s.rss / (1024 * 1024):>10.1f}")
     
-    def _monitor_specific(self):
+    def _show_details(self):
         try:
             pid = int(input("\nВведите PID процесса: ").strip())
-            
-            print(f"\nМониторинг процесса {pid} (10 секунд)")
-            print(f"{'Время':<8} {'CPU%':<8} {'Память%':<10} {'Память (MB)':<12}")
-            print("-" * 60)
-            
-            for i in range(10):
-                try:
-                    proc = psutil.Process(pid)
-                    cpu = proc.cpu_percent(interval=1)
-                    mem_percent = proc.memory_percent()
-                    mem_mb = proc.memory_info().rss // (1024 * 1024)
-                    
-                    print(f"{i+1} сек:{'':<4} {cpu:<8.1f} {mem_percent:<10.2f} {mem_mb:<12}")
-                except psutil.NoSuchProcess:
-                    print(f"\nПроцесс {pid} завершен")
-                    break
-                except:
-                    print(f"\nОшибка мониторинга")
-                    break
-                    
         except ValueError:
             print("PID должен быть числом")
+            return
+        
+        cmdline = self.details.get(pid, "cmdline")
+        if cmdline is None and not psutil.pid_exists(pid):
+            print(f"Процесс {pid} не найден")
+            return
+        
+        open_files = self.details.get(pid, "open_files")
+        print(f"\nКомандная строка: {cmdline or '-'}")
+        print(f"Исполняемый файл: {self.details.get(pid, 'exe') or '-'}")
+        print(f"Пользователь: {self.details.get(pid, 'username') or '-'}")
+        print(f"Потоков: {self.details.get(pid, 'num_threads') or '-'}")
+        print(f"Открытых файлов: {len(open_files) if open_files is not None else '-'}")
+    
+    def _show_history(self):
+        try:
+            pid = int(input("\nВведите PID процесса: ").strip())
+        except ValueError:
+            print("PID должен быть числом")
+            return
+        
+        history = self.history.get(pid)
+        if history is None:
+            print(f"История процесса {pid} не найдена (запустите мониторинг)")
+            return
+        
+        for resolution, title in ((1, "1 сек"), (10, "10 сек"), (60, "1 мин")):
+            rows = list(history.series(resolution))[-10:]
+            print(f"\nРазрешение {title}:")
+            print(f"{'Время':<10} {'CPU% min/avg/max':<22} {'Память% avg':<12} {'RSS max (MB)':<12}")
+            print("-" * 60)
+            for ts, values in rows:
+                clock = time.strftime("%H:%M:%S", time.localtime(ts))
+                cpu = f"{values[0]:.1f}/{values[1]:.1f}/{values[2]:.1f}"
+                print(f"{clock:<10} {cpu:<22} {values[4]:<12.2f} {values[8] / (1024 * 1024):<12.1f}")
 
 def main():
-    manager = ProcessManager()
+    parser = argparse.ArgumentParser(description="Консольный диспетчер задач")
+    parser.add_argument("--backend", choices=BACKENDS, default="psutil",
+                        help="источник данных о процессах (proc - прямое чтение /proc, только Linux)")
+    parser.add_argument("--bench", choices=["backends", "topk", "shards", "suite", "rules", "leaks"],
+                        help="запустить бенчмарк и выйти")
+    parser.add_argument("--repeat", type=int, default=10,
+                        help="число прогонов каждого сценария")
+    parser.add_argument("--json", metavar="PATH",
+                        help="сохранить результаты набора бенчмарков в JSON (- для stdout)")
+    parser.add_argument("--baseline", metavar="PATH",
+                        help="сравнить результаты с прошлым JSON")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000],
+                        help="число процессов для бенчмарка")
+    parser.add_argument("--export", choices=EXPORT_FORMATS,
+                        help="выводить замеры в формате ndjson, csv или prometheus без меню")
+    parser.add_argument("--output", default="-",
+                        help="файл для экспорта (по умолчанию stdout)")
+    parser.add_argument("--delta", action="store_true",
+                        help="экспортировать только изменения между замерами (ndjson, csv)")
+    parser.add_argument("--rule", action="append", default=[], metavar="RULE",
+                        help='правило, например "cpu > 90 for 30s" или "rss growth > 50MB/min by name=worker*"')
+    parser.add_argument("--rule-log", metavar="PATH",
+                        help="журнал срабатываний правил (по умолчанию stderr)")
+    parser.add_argument("--rule-export", metavar="PATH",
+                        help="файл NDJSON для правил с действием export")
+    parser.add_argument("--watch-rules", action="store_true",
+                        help="проверять правила без меню")
+    parser.add_argument("--record", metavar="PATH",
+                        help="записывать замеры в файл (дописывается, если уже существует)")
+    parser.add_argument("--replay", metavar="PATH",
+                        help="показать запись: все процессы и мониторинг топ-5 (или --live)")
+    parser.add_argument("--at", metavar="TIME",
+                        help="момент начала воспроизведения: секунды с начала эпохи или +смещение от начала записи")
+    parser.add_argument("--interval", type=float, default=1.0,
+                        help="интервал между замерами в секундах (экспорт и живой просмотр)")
+    parser.add_argument("--cache-ttl", type=float, default=2.0,
+                        help="сколько секунд пункты меню используют общий снимок без нового замера")
+    parser.add_argument("--shards", type=int, default=1,
+                        help="число шардов для чтения /proc (1 - последовательно, 0 - по числу ядер)")
+    parser.add_argument("--shard-threads", action="store_true",
+                        help="читать шарды в потоках, а не в рабочих процессах")
+    parser.add_argument("--agent", metavar="ADDRESS",
+                        help="режим агента: отдавать замеры по адресу хост:порт или unix:/путь")
+    parser.add_argument("--aggregate", metavar="ADDRESS", nargs="+",
+                        help="режим агрегатора: общий топ процессов с нескольких агентов")
+    parser.add_argument("--top", type=int, default=10,
+                        help="число строк общего топа агрегатора")
+    parser.add_argument("--live", action="store_true",
+                        help="открыть живой просмотр процессов (curses) без меню")
+    parser.add_argument("--count", type=int, default=None,
+                        help="число замеров (по умолчанию - до Ctrl+C)")
+    args = parser.parse_args()
+    
+    if args.backend == "proc" and not os.path.isdir(PROC_ROOT):
+        print(f"{PROC_ROOT} недоступен, используется psutil", file=sys.stderr)
+        args.backend = "psutil"
+    
+    if args.agent:
+        run_agent(args.agent, args.backend, args.interval, args.count, args.shards)
+        return
+    if args.aggregate:
+        run_aggregator(args.aggregate, args.interval, args.count, args.top)
+        return
+    
+    if args.export:
+        if args.delta and args.export not in DELTA_FORMATTERS:
+            parser.error(f"--delta не поддерживается для формата {args.export}")
+        run_export(args.export, args.backend, args.interval, args.count, args.output, args.shards,
+                   args.delta)
+        return
+    
+    if args.watch_rules:
+        if not args.rule:
+            parser.error("--watch-rules требует хотя бы одного --rule")
+        try:
+            run_rules(args.rule, args.backend, args.interval, args.count, args.shards,
+                      args.rule_log, args.rule_export)
+        except ValueError as error:
+            parser.error(str(error))
+        return
+    
+    if args.record:
+        run_record(args.record, args.backend, args.interval, args.count, args.shards)
+        return
+    
+    if args.replay:
+        try:
+            recording = Recording(args.replay)
+            start = parse_replay_start(args.at, recording) if args.at else None
+        except (OSError, ValueError) as error:
+            print(f"Не удалось открыть запись: {error}", file=sys.stderr)
+            return
+        if not len(recording):
+            print("Запись пуста")
+            recording.close()
+            return
+        replay = Replay(recording, start)
+        print(f"Запись: {len(recording)} кадров, "
+              f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(recording.time(0)))} - "
+              f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(recording.time(len(recording) - 1)))}")
+        manager = ProcessManager(interval=args.interval, replay=replay)
+        try:
+            if args.live:
+                manager.live_view()
+            else:
+                manager.show_all_processes()
+                manager._monitor_all()
+        finally:
+            replay.close()
+        return
+    
+    if args.bench == "backends":
+        benchmark_backends(args.sizes)
+        return
+    if args.bench == "topk":
+        benchmark_topk(args.sizes)
+        return
+    if args.bench == "shards":
+        benchmark_shards(args.sizes)
+        return
+    if args.bench == "suite":
+        benchmark_suite(args.sizes, args.repeat, args.json, args.baseline)
+        return
+    if args.bench == "rules":
+        benchmark_rules(args.sizes)
+        return
+    if args.bench == "leaks":
+        benchmark_leaks(args.sizes)
+        return
+    
+    rules = None
+    if args.rule:
+        try:
+            log = open(args.rule_log, "a", encoding="utf-8", buffering=1) if args.rule_log else None
+            rules = RuleEngine(args.rule, log=log, export_path=args.rule_export)
+        except ValueError as error:
+            parser.error(str(error))
+    
+    manager = ProcessManager(args.backend, args.interval, args.shards, args.shard_threads,
+                             cache_ttl=args.cache_ttl, rules=rules)
+    
+    if args.live:
+        manager.live_view()
+        return
     
     while True:
         print("\n" + "=" * 50)
@@ -238,9 +3848,14 @@ def main():
         print("1. Показать все процессы")
         print("2. Завершить процесс")
         print("3. Мониторинг ресурсов")
-        print("4. Выход")
+        print("4. Живой просмотр процессов")
+        print("5. Дерево процессов")
+        print("6. Топ служб по памяти")
+        print("7. Статистика диспетчера")
+        print("8. Группы cgroup (контейнеры, службы)")
+        print("9. Выход")
         
-        choice = input("\nВыбор (1-4): ").strip()
+        choice = input("\nВыбор (1-9): ").strip()
         
         if choice == "1":
             manager.show_all_processes()
@@ -249,12 +3864,20 @@ def main():
         elif choice == "3":
             manager.monitor_resources()
         elif choice == "4":
+            manager.live_view()
+        elif choice == "5":
+            manager.show_tree()
+        elif choice == "6":
+            manager.show_services()
+        elif choice == "7":
+            manager.show_stats()
+        elif choice == "8":
+            manager.show_cgroups()
+        elif choice == "9":
             print("\nВыход из программы")
             break
         else:
             print("\nНеверный выбор")
-        
-        time.sleep(0.5)
 
 if __name__ == "__main__":
     main()